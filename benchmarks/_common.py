@@ -0,0 +1,45 @@
+"""
+Helpers shared by the benchmark scripts.
+
+The scripts import this module by name: Python puts the directory of the
+script it runs on ``sys.path``.
+"""
+
+import statistics
+import time
+from collections.abc import Callable
+
+import numpy as np
+
+
+def median_seconds(func: Callable[[], object], repeat: int) -> float:
+	"""Return the median wall time of ``func`` in seconds."""
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		func()
+		times.append(time.perf_counter() - start)
+	return statistics.median(times)
+
+
+def median_seconds_on_copies(
+	func: Callable[[np.ndarray], object], data: np.ndarray, repeat: int
+) -> float:
+	"""Return the median wall time of ``func`` on fresh, untimed copies of ``data``."""
+	times = []
+	for _ in range(repeat):
+		work = data.copy()
+		start = time.perf_counter()
+		func(work)
+		times.append(time.perf_counter() - start)
+	return statistics.median(times)
+
+
+def make_scan(side: int, rng: np.random.Generator) -> np.ndarray:
+	"""Return an RGBA scan: noisy paper white with random content in the middle."""
+	data = np.empty((side, side, 4), dtype=np.uint8)
+	data[:, :, :3] = 255 - rng.integers(0, 12, (side, side, 3), dtype=np.uint8)
+	data[:, :, 3] = 255
+	band = slice(side // 3, 2 * side // 3)
+	data[band, :, :3] = rng.integers(0, 256, (band.stop - band.start, side, 3))
+	return data
@@ -0,0 +1,80 @@
+"""
+Connected (flood fill) background removal against the global color match.
+
+Masks a synthetic scan at several sizes: noisy paper white covered with dark
+"letters", each a block with a white counter in the middle, so a global match
+punches holes into every letter while the connected mode keeps them. Variants:
+
+- ``global``: ``metric_alpha(..., inplace=True)``, the default.
+- ``connected``: ``ImageProcessor(connected=True)``, the same match followed by
+  the flood fill from the border.
+- ``fill``: ``connected_mask`` alone, on the precomputed match.
+
+The ns/px column shows that the fill scales linearly with the image size.
+
+Usage:
+    uv run python benchmarks/bench_connected.py [--megapixels 6.25 25 100]
+"""
+
+import argparse
+
+import numpy as np
+from _common import median_seconds_on_copies
+
+from rmbg.core import ImageProcessor
+from rmbg.metrics import metric_alpha
+from rmbg.region import connected_mask
+
+WHITE = (255, 255, 255)
+
+
+def make_letters(side: int, rng: np.random.Generator) -> np.ndarray:
+	"""Return a scan of paper white with a grid of letters with white counters."""
+	data = np.empty((side, side, 4), dtype=np.uint8)
+	data[:, :, :3] = 255 - rng.integers(0, 6, (side, side, 1), dtype=np.uint8)
+	data[:, :, 3] = 255
+	# 24 px letter cells, inside a 10% margin
+	cells = np.zeros((24, 24), dtype=bool)
+	cells[4:20, 6:18] = True
+	cells[9:15, 10:14] = False
+	margin = side // 10
+	inner = (side - 2 * margin) // 24 * 24
+	tiled = np.tile(cells, (inner // 24, inner // 24))
+	area = data[margin : margin + inner, margin : margin + inner, :3]
+	area[tiled] = rng.integers(0, 80, 3, dtype=np.uint8)
+	return data
+
+
+def main() -> None:
+	"""Run the comparison and print one row per size and variant."""
+	parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+	parser.add_argument("--megapixels", type=float, nargs="+", default=[6.25, 25, 100])
+	parser.add_argument("--tolerance", type=int, default=10)
+	parser.add_argument("--repeat", type=int, default=3)
+	args = parser.parse_args()
+
+	processor = ImageProcessor(connected=True)
+	print(f"{'MP':>6} {'variant':<10} {'median ms':>10} {'ns/px':>6} {'ratio':>6}")
+	for megapixels in args.megapixels:
+		side = int((megapixels * 1e6) ** 0.5)
+		data = make_letters(side, np.random.default_rng(0))
+		mask = metric_alpha(data, WHITE, args.tolerance) == 0
+		variants = {
+			"global": lambda x: metric_alpha(x, WHITE, args.tolerance, inplace=True),
+			"connected": lambda x: processor.make_transparent_array(
+				x, WHITE, args.tolerance
+			),
+			"fill": lambda _, mask=mask: connected_mask(mask),
+		}
+		baseline = None
+		for name, func in variants.items():
+			seconds = median_seconds_on_copies(func, data, args.repeat)
+			baseline = baseline or seconds
+			print(
+				f"{side * side / 1e6:>6.1f} {name:<10} {seconds * 1e3:>10.1f} "
+				f"{seconds / (side * side) * 1e9:>6.2f} {seconds / baseline:>6.2f}"
+			)
+
+
+if __name__ == "__main__":
+	main()
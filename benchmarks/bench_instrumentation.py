@@ -0,0 +1,75 @@
+"""
+Overhead of the per-stage instrumentation of ``ImageProcessor``.
+
+Loads, masks and encodes a small synthetic scan, where the fixed cost of the
+stages weighs the most, with:
+
+- ``off``: no collector, the default.
+- ``metrics``: a ``StageMetrics`` collector, as used by ``--profile``.
+- ``traced``: a ``StageMetrics`` collector tracing allocations, as used by
+  ``--trace-allocations``.
+
+The ratio column is relative to ``off``.
+
+Usage:
+    uv run python benchmarks/bench_instrumentation.py [--megapixels 0.01 0.25 1]
+"""
+
+import argparse
+import io
+import tempfile
+from functools import partial
+from pathlib import Path
+
+from _common import median_seconds
+from PIL import Image
+
+from rmbg.bench import BENCH_COLOR, BENCH_TOLERANCE, synthetic_scan
+from rmbg.core import ImageProcessor
+from rmbg.instrument import StageMetrics
+
+
+def process(processor: ImageProcessor, path: Path) -> None:
+	"""Process ``path`` into memory."""
+	data = processor.load_array(path)
+	processor.make_transparent_array(data, BENCH_COLOR, BENCH_TOLERANCE)
+	processor.save_array(data, io.BytesIO(), (300, 300))
+
+
+def main() -> None:
+	"""Run the comparison and print one row per size and variant."""
+	parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+	parser.add_argument("--megapixels", type=float, nargs="+", default=[0.01, 0.25, 1])
+	parser.add_argument("--repeat", type=int, default=50)
+	args = parser.parse_args()
+
+	variants = {
+		"off": lambda: ImageProcessor(output_format="png", save_profile="fast"),
+		"metrics": lambda: ImageProcessor(
+			output_format="png", save_profile="fast", instrument=StageMetrics()
+		),
+		"traced": lambda: ImageProcessor(
+			output_format="png",
+			save_profile="fast",
+			instrument=StageMetrics(trace_allocations=True),
+		),
+	}
+	print(f"{'MP':>6} {'variant':<8} {'median ms':>10} {'ratio':>6}")
+	with tempfile.TemporaryDirectory() as directory:
+		for megapixels in args.megapixels:
+			side = int((megapixels * 1e6) ** 0.5)
+			path = Path(directory) / f"scan-{side}.png"
+			Image.fromarray(synthetic_scan(side, side)).save(path)
+			baseline = None
+			for name, make in variants.items():
+				processor = make()
+				seconds = median_seconds(partial(process, processor, path), args.repeat)
+				baseline = baseline or seconds
+				print(
+					f"{side * side / 1e6:>6.2f} {name:<8} {seconds * 1e3:>10.2f} "
+					f"{seconds / baseline:>6.2f}"
+				)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,72 @@
+"""
+Compiled lookup-table rules against per-channel comparisons.
+
+Masks synthetic scans (noisy paper white with a band of random content) of
+several sizes with:
+
+- ``compare``: ``transparency_alpha(..., inplace=True)``, the default path.
+- ``lut256``: a compiled exact 256³ rule, ``rule.alpha(..., inplace=True)``.
+- ``lut32``: a compiled binned 32³ rule.
+
+Rules are compiled once before timing; the compile time of each (the cost a
+cache miss pays) is printed separately.
+
+Usage:
+    uv run python benchmarks/bench_lut.py [--sizes 1 4 16] [--colors 1 8]
+"""
+
+import argparse
+from functools import partial
+
+import numpy as np
+from _common import make_scan, median_seconds
+
+from rmbg.masking import transparency_alpha
+from rmbg.rules import clear_rule_cache, compile_rule
+
+
+def main() -> None:
+	"""Run the comparison and print one row per size, color count and variant."""
+	parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+	parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16])
+	parser.add_argument("--colors", type=int, nargs="+", default=[1, 8])
+	parser.add_argument("--repeat", type=int, default=5)
+	args = parser.parse_args()
+
+	rng = np.random.default_rng(0)
+	print(f"{'colors':>6} {'variant':<8} {'compile ms':>10}")
+	targets = {}
+	for count in args.colors:
+		colors = [(255, 255, 255)] + [
+			tuple(c) for c in rng.integers(0, 256, (count - 1, 3)).tolist()
+		]
+		targets[count] = colors
+		for resolution in (256, 32):
+			clear_rule_cache()
+			seconds = median_seconds(
+				partial(compile_rule, colors, 15, resolution=resolution), 1
+			)
+			print(f"{count:>6} {f'lut{resolution}':<8} {seconds * 1e3:>10.1f}")
+
+	print()
+	print(f"{'MP':>5} {'colors':>6} {'variant':<8} {'median ms':>10} {'MP/s':>8}")
+	for megapixels in args.sizes:
+		side = int((megapixels * 1e6) ** 0.5)
+		data = make_scan(side, rng)
+		for count, colors in targets.items():
+			rules = {r: compile_rule(colors, 15, resolution=r) for r in (256, 32)}
+			variants = {
+				"compare": partial(transparency_alpha, data, colors, 15, inplace=True),
+				"lut256": partial(rules[256].alpha, data, inplace=True),
+				"lut32": partial(rules[32].alpha, data, inplace=True),
+			}
+			for name, func in variants.items():
+				seconds = median_seconds(func, args.repeat)
+				print(
+					f"{side * side / 1e6:>5.1f} {count:>6} {name:<8} "
+					f"{seconds * 1e3:>10.1f} {side * side / 1e6 / seconds:>8.1f}"
+				)
+
+
+if __name__ == "__main__":
+	main()
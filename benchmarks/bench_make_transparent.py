@@ -0,0 +1,88 @@
+"""
+Throughput and temporary memory of make_transparent.
+
+Compares, on random RGB images of several sizes:
+
+- ``legacy``: the original ``make_transparent`` (per-channel ``abs`` on uint8,
+  which wraps, then ``copy`` and ``np.where``).
+- ``pil``: the current ``ImageProcessor.make_transparent`` (PIL in, PIL out).
+- ``array``: ``transparency_alpha(..., inplace=True)`` on an RGBA array.
+
+Temporary memory is the tracemalloc peak during the call, which NumPy reports
+its buffers to.
+
+Usage:
+    uv run python benchmarks/bench_make_transparent.py [--sizes 1 4 16 36]
+"""
+
+import argparse
+import tracemalloc
+from functools import partial
+
+import numpy as np
+from _common import median_seconds
+from PIL import Image
+
+from rmbg.core import ImageProcessor
+from rmbg.masking import transparency_alpha
+
+
+def legacy_make_transparent(image, target_color, tolerance):
+	"""Reproduce the original implementation for comparison."""
+	if image.mode != "RGBA":
+		image = image.convert("RGBA")
+	data = np.array(image)
+	r, g, b, *_ = target_color
+	mask = (
+		(abs(data[:, :, 0] - r) <= tolerance)
+		& (abs(data[:, :, 1] - g) <= tolerance)
+		& (abs(data[:, :, 2] - b) <= tolerance)
+	)
+	result = data.copy()
+	result[:, :, 3] = np.where(mask, 0, 255)
+	return Image.fromarray(result)
+
+
+def measure(func, repeat: int) -> tuple[float, float]:
+	"""Return the median seconds and tracemalloc peak MiB of ``func``."""
+	seconds = median_seconds(func, repeat)
+	tracemalloc.start()
+	func()
+	peak = tracemalloc.get_traced_memory()[1] / 2**20
+	tracemalloc.stop()
+	return seconds, peak
+
+
+def main() -> None:
+	"""Run the comparison and print one row per size and variant."""
+	parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+	parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16, 36])
+	parser.add_argument("--repeat", type=int, default=5)
+	args = parser.parse_args()
+
+	processor = ImageProcessor()
+	rng = np.random.default_rng(0)
+	color = (255, 255, 255)
+
+	print(f"{'MP':>5} {'variant':<8} {'median ms':>10} {'MP/s':>8} {'temp MiB':>9}")
+	for megapixels in args.sizes:
+		side = int((megapixels * 1e6) ** 0.5)
+		rgb = rng.integers(0, 256, (side, side, 3), dtype=np.uint8)
+		image = Image.fromarray(rgb)
+		rgba = np.dstack([rgb, np.full((side, side), 255, np.uint8)])
+
+		variants = {
+			"legacy": partial(legacy_make_transparent, image, color, 10),
+			"pil": partial(processor.make_transparent, image, color, 10),
+			"array": partial(transparency_alpha, rgba, color, 10, inplace=True),
+		}
+		for name, func in variants.items():
+			seconds, peak = measure(func, args.repeat)
+			print(
+				f"{side * side / 1e6:>5.1f} {name:<8} {seconds * 1e3:>10.1f} "
+				f"{side * side / 1e6 / seconds:>8.1f} {peak:>9.1f}"
+			)
+
+
+if __name__ == "__main__":
+	main()
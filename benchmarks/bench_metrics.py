@@ -0,0 +1,63 @@
+"""
+Throughput of the color matching metrics.
+
+Masks a synthetic scan (noisy paper white with a band of random content) with
+every registered metric, once evaluated directly per pixel
+(``metric_alpha(..., inplace=True)``) and once through a compiled binned
+lookup-table rule (``--lut 32``), whose compile time is printed separately.
+
+Usage:
+    uv run python benchmarks/bench_metrics.py [--megapixels 4] [--repeat 3]
+"""
+
+import argparse
+import time
+from functools import partial
+
+import numpy as np
+from _common import make_scan, median_seconds
+
+from rmbg.metrics import METRICS, metric_alpha
+from rmbg.rules import clear_rule_cache, compile_rule
+
+
+def main() -> None:
+	"""Run every metric and print one row per metric and variant."""
+	parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+	parser.add_argument("--megapixels", type=float, default=4)
+	parser.add_argument("--tolerance", type=int, default=10)
+	parser.add_argument("--repeat", type=int, default=3)
+	args = parser.parse_args()
+
+	side = int((args.megapixels * 1e6) ** 0.5)
+	data = make_scan(side, np.random.default_rng(0))
+	megapixels = side * side / 1e6
+	white, tolerance = (255, 255, 255), args.tolerance
+
+	print(f"{megapixels:.1f} MP, tolerance {tolerance}")
+	print(
+		f"{'metric':<10} {'variant':<8} {'compile ms':>10} {'median ms':>10} {'MP/s':>8}"
+	)
+	for name in METRICS:
+		seconds = median_seconds(
+			partial(metric_alpha, data, white, tolerance, name, inplace=True),
+			args.repeat,
+		)
+		print(
+			f"{name:<10} {'direct':<8} {'':>10} {seconds * 1e3:>10.1f} "
+			f"{megapixels / seconds:>8.1f}"
+		)
+
+		clear_rule_cache()
+		start = time.perf_counter()
+		rule = compile_rule(white, tolerance, name, resolution=32)
+		compile_ms = (time.perf_counter() - start) * 1e3
+		seconds = median_seconds(partial(rule.alpha, data, inplace=True), args.repeat)
+		print(
+			f"{name:<10} {'lut32':<8} {compile_ms:>10.1f} {seconds * 1e3:>10.1f} "
+			f"{megapixels / seconds:>8.1f}"
+		)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,56 @@
+"""
+Cost of matching several colors at once.
+
+Compares, on a random RGBA image, masking N colors:
+
+- ``loop``: one ``color_mask`` call per color, OR-ed together.
+- ``one-pass``: a single ``color_mask`` call with every color, which uses the
+  per-channel bitmask lookup tables.
+
+Usage:
+    uv run python benchmarks/bench_multi_color.py [--megapixels 9] [--colors 1 2 4 8]
+"""
+
+import argparse
+from functools import partial
+
+import numpy as np
+from _common import median_seconds
+
+from rmbg.masking import color_mask
+
+
+def main() -> None:
+	"""Run the comparison and print one row per color count."""
+	parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+	parser.add_argument("--megapixels", type=float, default=9)
+	parser.add_argument(
+		"--colors", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64, 128]
+	)
+	parser.add_argument("--repeat", type=int, default=3)
+	args = parser.parse_args()
+
+	rng = np.random.default_rng(0)
+	side = int((args.megapixels * 1e6) ** 0.5)
+	data = rng.integers(0, 256, (side, side, 4), dtype=np.uint8)
+
+	def loop(colors) -> np.ndarray:
+		mask = np.zeros((side, side), dtype=bool)
+		for color in colors:
+			mask |= color_mask(data, color, 20)
+		return mask
+
+	print(f"{side * side / 1e6:.1f} MP")
+	print(f"{'colors':>6} {'loop ms':>9} {'one-pass ms':>12} {'speedup':>8}")
+	for count in args.colors:
+		colors = [tuple(c) for c in rng.integers(0, 256, (count, 3)).tolist()]
+		looped = median_seconds(partial(loop, colors), args.repeat)
+		single = median_seconds(partial(color_mask, data, colors, 20), args.repeat)
+		print(
+			f"{count:>6} {looped * 1e3:>9.1f} {single * 1e3:>12.1f} "
+			f"{looped / single:>7.1f}x"
+		)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,161 @@
+"""
+Peak memory of the PDF page pipeline.
+
+Renders one synthetic A0 drawing page, makes white transparent and saves the
+PNG, once per pipeline variant. Every variant runs in a fresh interpreter so
+its peak RSS is measured in isolation:
+
+- ``legacy``: the original path (RGB pixmap -> ``Image.frombytes`` -> RGBA
+  convert -> ``np.array`` -> ``copy`` -> ``Image.fromarray``).
+- ``image``: ``load_image`` -> ``make_transparent`` -> ``save_image``.
+- ``array``: ``load_array`` -> ``make_transparent_array`` -> ``save_array``,
+  which works on a view of the pixmap buffer throughout.
+- ``stream``: ``make_transparent_streaming``, which renders, masks and writes
+  the page in bands of rows, so the peak is bounded by the band size.
+
+Usage:
+    uv run python benchmarks/bench_pdf_memory.py [--dpi 150]
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import fitz
+import numpy as np
+from PIL import Image
+
+from rmbg.core import ImageProcessor
+
+A0_POINTS = (2384, 3370)
+VARIANTS = ("legacy", "image", "array", "stream")
+TOLERANCE = 10
+
+
+def make_pdf(path: Path) -> None:
+	"""Write a one-page A0 PDF with some line work on a white background."""
+	doc = fitz.open()
+	page = doc.new_page(width=A0_POINTS[0], height=A0_POINTS[1])
+	for i in range(0, A0_POINTS[0], 100):
+		page.draw_line((i, 0), (A0_POINTS[0] - i, A0_POINTS[1]), width=2)
+	page.draw_rect(fitz.Rect(200, 200, 1200, 900), fill=(0.8, 0.2, 0.2))
+	page.insert_text((300, 1200), "Drawing 001", fontsize=120)
+	doc.save(path)
+	doc.close()
+
+
+def peak_rss_mb() -> float:
+	"""Return the peak resident set size of this process in MiB."""
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_variant(variant: str, pdf_path: Path, dpi: int, output: Path) -> dict:
+	"""Run one pipeline variant in this process and report its peak memory."""
+	processor = ImageProcessor()
+	baseline = peak_rss_mb()
+	start = time.perf_counter()
+
+	if variant == "legacy":
+		doc = fitz.open(pdf_path)
+		zoom = dpi / 72
+		pix = doc[0].get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+		image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+		image = image.convert("RGBA")
+		data = np.array(image)
+		mask = (
+			(abs(data[:, :, 0] - 255) <= TOLERANCE)
+			& (abs(data[:, :, 1] - 255) <= TOLERANCE)
+			& (abs(data[:, :, 2] - 255) <= TOLERANCE)
+		)
+		result = data.copy()
+		result[:, :, 3] = np.where(mask, 0, 255)
+		Image.fromarray(result).save(output, "PNG", dpi=(dpi, dpi), compress_level=1)
+		doc.close()
+		shape = result.shape
+	elif variant == "image":
+		image = processor.load_image(pdf_path, dpi=dpi)
+		result = processor.make_transparent(image, (255, 255, 255), TOLERANCE)
+		result.save(output, "PNG", dpi=(dpi, dpi), compress_level=1)
+		shape = (result.height, result.width, 4)
+	elif variant == "stream":
+		width, height = processor.make_transparent_streaming(
+			pdf_path, output, (255, 255, 255), TOLERANCE, dpi=dpi, output_dpi=(dpi, dpi)
+		)
+		shape = (height, width, 4)
+	else:
+		data = processor.load_array(pdf_path, dpi=dpi)
+		processor.make_transparent_array(data, (255, 255, 255), TOLERANCE)
+		Image.fromarray(data).save(output, "PNG", dpi=(dpi, dpi), compress_level=1)
+		shape = data.shape
+
+	frame_mb = shape[0] * shape[1] * 4 / 2**20
+	peak = peak_rss_mb() - baseline
+	return {
+		"variant": variant,
+		"dpi": dpi,
+		"megapixels": round(shape[0] * shape[1] / 1e6, 1),
+		"frame_mb": round(frame_mb, 1),
+		"peak_rss_mb": round(peak, 1),
+		"frames": round(peak / frame_mb, 2),
+		"seconds": round(time.perf_counter() - start, 2),
+	}
+
+
+def main() -> None:
+	"""Run every variant in its own interpreter and print a comparison."""
+	parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+	parser.add_argument("--dpi", type=int, default=150)
+	parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+	parser.add_argument("--pdf", type=Path, help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.variant:
+		with tempfile.TemporaryDirectory() as tmp:
+			output = Path(tmp) / "out.png"
+			print(json.dumps(run_variant(args.variant, args.pdf, args.dpi, output)))
+		return
+
+	with tempfile.TemporaryDirectory() as tmp:
+		pdf_path = Path(tmp) / "a0.pdf"
+		make_pdf(pdf_path)
+		rows = []
+		for variant in VARIANTS:
+			completed = subprocess.run(  # noqa: S603 - reruns this script
+				[
+					sys.executable,
+					__file__,
+					"--variant",
+					variant,
+					"--pdf",
+					str(pdf_path),
+					"--dpi",
+					str(args.dpi),
+				],
+				check=True,
+				capture_output=True,
+				text=True,
+			)
+			rows.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+	legacy = rows[0]["peak_rss_mb"]
+	print(
+		f"A0 page at {args.dpi} dpi: {rows[0]['megapixels']} MP, "
+		f"{rows[0]['frame_mb']} MiB per RGBA frame"
+	)
+	print(
+		f"{'variant':<8} {'peak MiB':>9} {'frames':>7} {'vs legacy':>10} {'time s':>7}"
+	)
+	for row in rows:
+		print(
+			f"{row['variant']:<8} {row['peak_rss_mb']:>9.1f} {row['frames']:>7.2f} "
+			f"{row['peak_rss_mb'] / legacy:>9.0%} {row['seconds']:>7.2f}"
+		)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,97 @@
+"""
+PNG save profiles: encode time against file size.
+
+Encodes two masked RGBA images with every profile, whole and cropped to the
+non-transparent content (``crop_to_content``):
+
+- ``scan``: noisy paper white made transparent, with a band of random content
+  in the middle. The transparent pixels keep their noisy colors.
+- ``logo``: two flat colors on a transparent margin, so it fits in a palette.
+
+The ratio columns compare each row with ``balanced``, uncropped.
+
+Usage:
+    uv run python benchmarks/bench_png_profiles.py [--megapixels 4] [--repeat 3]
+"""
+
+import argparse
+import io
+
+import numpy as np
+from _common import make_scan, median_seconds
+from PIL import Image
+
+from rmbg.encoding import PNG_PROFILES, crop_to_content, save_png
+from rmbg.metrics import metric_alpha
+
+
+def make_masked_scan(side: int, rng: np.random.Generator) -> np.ndarray:
+	"""Return a scan whose noisy paper white was made transparent."""
+	data = make_scan(side, rng)
+	metric_alpha(data, (255, 255, 255), 12, inplace=True)
+	return data
+
+
+def make_logo(side: int) -> np.ndarray:
+	"""Return two nested flat squares on a transparent background."""
+	data = np.zeros((side, side, 4), dtype=np.uint8)
+	data[side // 4 : 3 * side // 4, side // 4 : 3 * side // 4] = [200, 0, 0, 255]
+	data[2 * side // 5 : 3 * side // 5, 2 * side // 5 : 3 * side // 5] = [
+		0,
+		0,
+		200,
+		255,
+	]
+	return data
+
+
+def encode(image: Image.Image, profile: str, crop: bool) -> int:
+	"""Encode ``image`` in memory and return the PNG size in bytes."""
+	if crop:
+		image, _ = crop_to_content(image)
+	buffer = io.BytesIO()
+	save_png(image, buffer, profile=profile)
+	return buffer.tell()
+
+
+def median_encode(image: Image.Image, profile: str, crop: bool, repeat: int):
+	"""Return the median encode time in seconds and the PNG size in bytes."""
+	seconds = median_seconds(lambda: encode(image, profile, crop), repeat)
+	return seconds, encode(image, profile, crop)
+
+
+def main() -> None:
+	"""Run every profile on both images and print one row per combination."""
+	parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+	parser.add_argument("--megapixels", type=float, default=4)
+	parser.add_argument("--repeat", type=int, default=3)
+	args = parser.parse_args()
+
+	side = int((args.megapixels * 1e6) ** 0.5)
+	images = {
+		"scan": make_masked_scan(side, np.random.default_rng(0)),
+		"logo": make_logo(side),
+	}
+	print(f"{side * side / 1e6:.1f} MP")
+	print(
+		f"{'image':<6} {'profile':<9} {'crop':<5} {'encode ms':>10} {'KiB':>9} "
+		f"{'time':>6} {'size':>6}"
+	)
+	for name, data in images.items():
+		image = Image.fromarray(data)
+		results = {
+			(profile, crop): median_encode(image, profile, crop, args.repeat)
+			for profile in PNG_PROFILES
+			for crop in (False, True)
+		}
+		base_seconds, base_size = results["balanced", False]
+		for (profile, crop), (seconds, size) in results.items():
+			print(
+				f"{name:<6} {profile:<9} {'yes' if crop else 'no':<5} "
+				f"{seconds * 1e3:>10.1f} {size / 1024:>9.1f} "
+				f"{seconds / base_seconds:>6.2f} {size / base_size:>6.2f}"
+			)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,65 @@
+"""Baseline comparison for the pytest-benchmark tests."""
+
+from pathlib import Path
+
+import pytest
+
+from rmbg.bench import (
+	DEFAULT_MAX_SLOWDOWN,
+	BenchCase,
+	calibrate,
+	load_report,
+	speed_ratio,
+)
+
+BASELINE = Path(__file__).with_name("baseline.json")
+
+
+def pytest_addoption(parser):
+	"""Add the largest tolerated slowdown over the baseline."""
+	parser.addoption(
+		"--max-slowdown",
+		type=float,
+		default=DEFAULT_MAX_SLOWDOWN,
+		help="Largest tolerated growth of a median over the baseline, as a fraction",
+	)
+
+
+@pytest.fixture(scope="session")
+def baseline():
+	"""Return the stored baseline report, or an empty one."""
+	return load_report(BASELINE) if BASELINE.exists() else {}
+
+
+@pytest.fixture(scope="session")
+def baseline_cases(baseline):
+	"""Return the cases of the stored baseline report, by name."""
+	return {case["name"]: case for case in baseline.get("cases", [])}
+
+
+@pytest.fixture(scope="session")
+def baseline_scale(baseline):
+	"""Return how many times slower this machine is than the baseline's."""
+	if not baseline.get("calibration_ms"):
+		return 1.0
+	return speed_ratio({"calibration_ms": calibrate()}, baseline)
+
+
+@pytest.fixture
+def check_baseline(request, baseline_cases, baseline_scale):
+	"""Return a check of a finished benchmark against the scaled baseline median."""
+	max_slowdown = request.config.getoption("--max-slowdown")
+
+	def check(benchmark, case: BenchCase, stage: str) -> None:
+		stored = baseline_cases.get(case.name, {}).get("stages", {}).get(stage)
+		# Nothing to compare with --benchmark-disable, or for new cases
+		if benchmark.stats is None or stored is None:
+			return
+		median_ms = benchmark.stats.stats.median * 1e3
+		expected = stored["p50_ms"] * baseline_scale
+		assert median_ms <= expected * (1 + max_slowdown), (
+			f"{case.name} {stage}: median {median_ms:.1f} ms, "
+			f"baseline {expected:.1f} ms on this machine"
+		)
+
+	return check
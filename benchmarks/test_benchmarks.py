@@ -0,0 +1,69 @@
+"""
+pytest-benchmark tests of the decode, mask and encode stages.
+
+Uses the synthetic inputs of ``rmbg bench`` (see ``rmbg.bench``). The
+``check_baseline`` fixture of ``conftest.py`` fails a stage whose median is
+more than ``--max-slowdown`` slower than the same case and stage in the stored
+baseline, ``benchmarks/baseline.json``, a report of ``rmbg bench``. The stored
+medians are absolute times from the machine that wrote the baseline, so they
+are first scaled by how much slower this machine runs the reference workload
+of ``rmbg.bench.calibrate``: what is compared is each stage's time relative to
+that workload, which holds across machines. Refresh the baseline after an
+intended change with:
+
+    uv run cli bench --output benchmarks/baseline.json
+
+Usage:
+    uv run pytest benchmarks --no-cov [--max-slowdown 0.25]
+"""
+
+import pytest
+
+from rmbg.bench import BENCH_COLOR, BENCH_DPI, BENCH_TOLERANCE, BenchCase, write_input
+from rmbg.core import ImageProcessor
+
+CASES = [BenchCase("image", 1.0), BenchCase("image", 4.0), BenchCase("pdf", 1.0, 8)]
+
+
+@pytest.fixture(scope="module", params=CASES, ids=lambda case: case.name)
+def case_input(request, tmp_path_factory):
+	"""Generate the input of one case once per module."""
+	case = request.param
+	return case, write_input(case, tmp_path_factory.mktemp("bench"))
+
+
+def test_decode(benchmark, case_input, check_baseline):
+	"""Benchmark decoding the PNG, or rendering the first PDF page."""
+	case, path = case_input
+	processor = ImageProcessor()
+	page = 0 if case.kind == "pdf" else None
+	benchmark(processor.load_array, path, page=page, dpi=BENCH_DPI)
+	check_baseline(benchmark, case, "decode")
+
+
+def test_mask(benchmark, case_input, check_baseline):
+	"""Benchmark masking the paper white, on a fresh copy every round."""
+	case, path = case_input
+	processor = ImageProcessor()
+	page = 0 if case.kind == "pdf" else None
+	data = processor.load_array(path, page=page, dpi=BENCH_DPI)
+
+	def setup() -> tuple[tuple, dict]:
+		return (data.copy(), BENCH_COLOR, BENCH_TOLERANCE), {}
+
+	benchmark.pedantic(
+		processor.make_transparent_array, setup=setup, rounds=5, warmup_rounds=1
+	)
+	check_baseline(benchmark, case, "mask")
+
+
+def test_encode(benchmark, case_input, check_baseline, tmp_path):
+	"""Benchmark encoding the masked image as PNG."""
+	case, path = case_input
+	processor = ImageProcessor()
+	page = 0 if case.kind == "pdf" else None
+	data = processor.load_array(path, page=page, dpi=BENCH_DPI)
+	processor.make_transparent_array(data, BENCH_COLOR, BENCH_TOLERANCE)
+	output = tmp_path / "out.png"
+	benchmark.pedantic(processor.save_array, args=(data, output), rounds=3)
+	check_baseline(benchmark, case, "encode")
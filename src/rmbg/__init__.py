@@ -2,9 +2,39 @@
 .. include:: ../../README.md
 """
 
-from .cli import main as cli_main
-from .core import ImageProcessor
-from .gui import main as gui_main
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+	from .aio import AsyncImageProcessor
+	from .cli import main as cli_main
+	from .core import ImageProcessor
+	from .gui import main as gui_main
 
 __version__ = "0.1.0"
-__all__ = ["ImageProcessor", "cli_main", "gui_main"]
+__all__ = ["AsyncImageProcessor", "ImageProcessor", "cli_main", "gui_main"]
+
+# Public name -> (submodule, attribute). The submodules pull in NumPy, PyMuPDF,
+# rich and Streamlit, so they are only imported on first access.
+_LAZY = {
+	"AsyncImageProcessor": ("rmbg.aio", "AsyncImageProcessor"),
+	"ImageProcessor": ("rmbg.core", "ImageProcessor"),
+	"cli_main": ("rmbg.cli", "main"),
+	"gui_main": ("rmbg.gui", "main"),
+}
+
+
+def __getattr__(name: str) -> object:
+	"""Import a public name from its submodule on first access."""
+	try:
+		module, attribute = _LAZY[name]
+	except KeyError:
+		raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+	value = getattr(import_module(module), attribute)
+	globals()[name] = value
+	return value
+
+
+def __dir__() -> list[str]:
+	"""List the lazily imported names alongside the loaded ones."""
+	return sorted(set(globals()) | set(__all__))
@@ -6,19 +6,35 @@ This module provides entry points for both CLI and GUI interfaces.
 
 import subprocess
 import sys
+from enum import StrEnum
 from pathlib import Path
 
 import typer
-from rich.console import Console
 
 from rmbg import cli
+from rmbg.bench import (
+	DEFAULT_MAX_SLOWDOWN,
+	DEFAULT_MEGAPIXELS,
+	DEFAULT_PDF_PAGES,
+	DEFAULT_REPEAT,
+)
+from rmbg.cache import DEFAULT_CACHE_SIZE
+from rmbg.metrics import METRICS
+from rmbg.streaming import DEFAULT_BAND_ROWS
+from rmbg.writers import DEFAULT_SAVE_PROFILE, SAVE_PROFILES, describe_formats
 
 app = typer.Typer(
 	name="rmbg",
 	help="Make specific colors transparent in images and PDFs.",
 	add_completion=False,
 )
-console = Console()
+
+
+class LutResolution(StrEnum):
+	"""Grid points per channel of a compiled color lookup table."""
+
+	binned = "32"
+	exact = "256"
 
 
 @app.command()
@@ -31,14 +47,15 @@ def main(
 	),
 	output_file: Path = typer.Argument(
 		...,
-		help="Path to output PNG file",
+		help="Path to output file (.png, .webp, .avif, .tif, .pdf)",
 		dir_okay=False,
 	),
-	color: str = typer.Option(
-		"255,255,255",
+	color: list[str] = typer.Option(
+		["255,255,255"],
 		"--color",
 		"-c",
-		help="Target color in format R,G,B or #RRGGBB (default: white)",
+		help="Target color in format R,G,B or #RRGGBB, optionally with its own "
+		"tolerance as COLOR:TOL. Repeat for several colors (default: white)",
 	),
 	tolerance: int = typer.Option(
 		10,
@@ -58,13 +75,752 @@ def main(
 	dpi: int = typer.Option(
 		300,
 		"--dpi",
-		help="Output DPI for PNG files",
+		help="Resolution PDF pages are rasterized at, and output DPI for PNG files",
 		min=72,
 		max=1200,
 	),
+	clip: str = typer.Option(
+		None,
+		"--clip",
+		help="Only rasterize this PDF page region, 'x0,y0,x1,y1' in points",
+	),
+	stream: bool = typer.Option(
+		False,
+		"--stream",
+		help="Process in bands of rows so memory is bounded by the band size",
+	),
+	band_rows: int = typer.Option(
+		DEFAULT_BAND_ROWS,
+		"--band-rows",
+		help="Pixel rows per band with --stream",
+		min=1,
+	),
+	memmap_above: int = typer.Option(
+		None,
+		"--memmap-above",
+		help="Keep working images of at least this many MiB in a memory-mapped "
+		"scratch file (in TMPDIR) instead of RAM",
+		min=1,
+	),
+	metric: str = typer.Option(
+		"box",
+		"--metric",
+		"-m",
+		help=f"Color distance metric: {', '.join(METRICS)}. The tolerance is in "
+		"its units (channel levels for RGB metrics, ΔE for cie76/ciede2000)",
+	),
+	feather: int = typer.Option(
+		None,
+		"--feather",
+		"-f",
+		help="Soft edges: alpha ramps from transparent at the tolerance to "
+		"opaque at tolerance + FEATHER instead of a hard cut",
+		min=1,
+	),
+	despill: bool = typer.Option(
+		True,
+		"--despill/--no-despill",
+		help="With --feather, remove the background color from semi-transparent "
+		"edge pixels",
+	),
+	save_profile: str = typer.Option(
+		DEFAULT_SAVE_PROFILE,
+		"--save-profile",
+		help=f"Save profile: {', '.join(SAVE_PROFILES)}. fast encodes several "
+		"times faster, smallest gives the smallest files",
+	),
+	crop: bool = typer.Option(
+		False,
+		"--crop",
+		help="Crop outputs to the bounding box of the non-transparent pixels",
+	),
+	output_format: str = typer.Option(
+		None,
+		"--format",
+		help=f"Output format: {describe_formats()} (default: from the output "
+		"file extension)",
+	),
+	cache_dir: Path = typer.Option(
+		None,
+		"--cache",
+		help="Directory of a result cache: inputs already processed with the "
+		"same options are copied from it instead of being processed again",
+		file_okay=False,
+	),
+	cache_size: int = typer.Option(
+		DEFAULT_CACHE_SIZE >> 20,
+		"--cache-size",
+		help="Size of the result cache in MiB; the least recently used "
+		"results are evicted beyond it",
+		min=1,
+	),
+	auto: bool = typer.Option(
+		False,
+		"--auto",
+		help="Detect the background color(s) of the input and a tolerance for "
+		"each from a sample of its pixels, instead of using --color and "
+		"--tolerance",
+	),
+	connected: bool = typer.Option(
+		False,
+		"--connected",
+		help="Only remove matching pixels connected to the border of the image "
+		"(flood fill), keeping enclosed areas of the color such as the "
+		"counters of letters",
+	),
+	seed: list[str] = typer.Option(
+		None,
+		"--seed",
+		help="Flood fill from pixel X,Y instead of the border; implies "
+		"--connected. Repeat for several points",
+	),
+	profile: bool = typer.Option(
+		False,
+		"--profile",
+		help="Print the wall time, CPU time, throughput and bytes read and "
+		"written of every stage (decode, mask, encode, ...)",
+	),
+	metrics_json: Path = typer.Option(
+		None,
+		"--metrics-json",
+		help="Write the stage metrics to this JSON file",
+		dir_okay=False,
+	),
+	metrics_prom: Path = typer.Option(
+		None,
+		"--metrics-prom",
+		help="Write the stage metrics to this Prometheus textfile, e.g. in the "
+		"node exporter's textfile collector directory",
+		dir_okay=False,
+	),
+	trace_allocations: bool = typer.Option(
+		False,
+		"--trace-allocations",
+		help="Also measure the peak memory allocated by every stage; slows "
+		"down processing",
+	),
+	lut: LutResolution = typer.Option(
+		None,
+		"--lut",
+		help="Mask through a precomputed 3D color lookup table with this many "
+		"steps per channel (256 exact, 32 binned)",
+	),
 ) -> None:
 	"""Make a specific color transparent in an image or PDF page."""
-	cli.main(input_file, output_file, color, tolerance, page, dpi)
+	cli.main(
+		input_file,
+		output_file,
+		color,
+		tolerance,
+		page,
+		dpi,
+		clip,
+		stream,
+		band_rows,
+		memmap_above,
+		metric,
+		feather,
+		despill,
+		save_profile,
+		crop,
+		output_format,
+		cache_dir,
+		cache_size,
+		auto,
+		connected,
+		seed,
+		profile,
+		metrics_json,
+		metrics_prom,
+		trace_allocations,
+		None if lut is None else int(lut.value),
+	)
+
+
+@app.command()
+def batch(
+	source: Path = typer.Argument(
+		...,
+		help="Input directory or glob pattern (e.g. 'scans/**/*.jpg')",
+	),
+	output_dir: Path = typer.Argument(
+		...,
+		help="Directory receiving the results",
+		file_okay=False,
+	),
+	pattern: str = typer.Option(
+		"*",
+		"--pattern",
+		help="Glob pattern applied when SOURCE is a directory (e.g. '**/*')",
+	),
+	color: list[str] = typer.Option(
+		["255,255,255"],
+		"--color",
+		"-c",
+		help="Target color in format R,G,B or #RRGGBB, optionally with its own "
+		"tolerance as COLOR:TOL. Repeat for several colors (default: white)",
+	),
+	tolerance: int = typer.Option(
+		10,
+		"--tolerance",
+		"-t",
+		help="Color matching tolerance (0-255)",
+		min=0,
+		max=255,
+	),
+	dpi: int = typer.Option(
+		300,
+		"--dpi",
+		help="Resolution PDF pages are rasterized at, and output DPI for PNG files",
+		min=72,
+		max=1200,
+	),
+	workers: int = typer.Option(
+		None,
+		"--workers",
+		"-w",
+		help="Number of worker processes (default: CPU count)",
+		min=1,
+	),
+	report: Path = typer.Option(
+		None,
+		"--report",
+		help="Path of the per-file JSON report (default: OUTPUT_DIR/rmbg-report.json)",
+		dir_okay=False,
+	),
+	memmap_above: int = typer.Option(
+		None,
+		"--memmap-above",
+		help="Keep working images of at least this many MiB in a memory-mapped "
+		"scratch file (in TMPDIR) instead of RAM",
+		min=1,
+	),
+	lut: LutResolution = typer.Option(
+		None,
+		"--lut",
+		help="Mask through a precomputed 3D color lookup table with this many "
+		"steps per channel (256 exact, 32 binned), built once per worker",
+	),
+	metric: str = typer.Option(
+		"box",
+		"--metric",
+		"-m",
+		help=f"Color distance metric: {', '.join(METRICS)}. The tolerance is in "
+		"its units (channel levels for RGB metrics, ΔE for cie76/ciede2000)",
+	),
+	feather: int = typer.Option(
+		None,
+		"--feather",
+		"-f",
+		help="Soft edges: alpha ramps from transparent at the tolerance to "
+		"opaque at tolerance + FEATHER instead of a hard cut",
+		min=1,
+	),
+	despill: bool = typer.Option(
+		True,
+		"--despill/--no-despill",
+		help="With --feather, remove the background color from semi-transparent "
+		"edge pixels",
+	),
+	save_profile: str = typer.Option(
+		DEFAULT_SAVE_PROFILE,
+		"--save-profile",
+		help=f"Save profile: {', '.join(SAVE_PROFILES)}. fast encodes several "
+		"times faster, smallest gives the smallest files",
+	),
+	crop: bool = typer.Option(
+		False,
+		"--crop",
+		help="Crop outputs to the bounding box of the non-transparent pixels",
+	),
+	output_format: str = typer.Option(
+		None,
+		"--format",
+		help=f"Output format: {describe_formats()} (default: png)",
+	),
+	cache_dir: Path = typer.Option(
+		None,
+		"--cache",
+		help="Directory of a result cache: inputs already processed with the "
+		"same options are copied from it instead of being processed again",
+		file_okay=False,
+	),
+	cache_size: int = typer.Option(
+		DEFAULT_CACHE_SIZE >> 20,
+		"--cache-size",
+		help="Size of the result cache in MiB; the least recently used "
+		"results are evicted beyond it",
+		min=1,
+	),
+	incremental: bool = typer.Option(
+		False,
+		"--incremental",
+		help="Skip inputs whose output is still up to date, as recorded in a "
+		"manifest next to the outputs by earlier runs",
+	),
+	auto: bool = typer.Option(
+		False,
+		"--auto",
+		help="Detect the background color(s) of every input and a tolerance for "
+		"each from a sample of its pixels, instead of using --color and "
+		"--tolerance",
+	),
+	connected: bool = typer.Option(
+		False,
+		"--connected",
+		help="Only remove matching pixels connected to the border of each image "
+		"(flood fill), keeping enclosed areas of the color such as the "
+		"counters of letters",
+	),
+	profile: bool = typer.Option(
+		False,
+		"--profile",
+		help="Print the wall time, CPU time, throughput and bytes read and "
+		"written of every stage (decode, mask, encode, ...)",
+	),
+	metrics_json: Path = typer.Option(
+		None,
+		"--metrics-json",
+		help="Write the stage metrics to this JSON file",
+		dir_okay=False,
+	),
+	metrics_prom: Path = typer.Option(
+		None,
+		"--metrics-prom",
+		help="Write the stage metrics to this Prometheus textfile, e.g. in the "
+		"node exporter's textfile collector directory",
+		dir_okay=False,
+	),
+	trace_allocations: bool = typer.Option(
+		False,
+		"--trace-allocations",
+		help="Also measure the peak memory allocated by every stage; slows "
+		"down processing",
+	),
+) -> None:
+	"""Make a specific color transparent in every image of a directory."""
+	cli.batch(
+		source,
+		output_dir,
+		pattern,
+		color,
+		tolerance,
+		dpi,
+		workers,
+		report,
+		memmap_above,
+		None if lut is None else int(lut.value),
+		metric,
+		feather,
+		despill,
+		save_profile,
+		crop,
+		output_format,
+		cache_dir,
+		cache_size,
+		incremental,
+		auto,
+		connected,
+		profile,
+		metrics_json,
+		metrics_prom,
+		trace_allocations,
+	)
+
+
+@app.command()
+def pdf(
+	input_file: Path = typer.Argument(
+		...,
+		help="Path to input PDF file",
+		exists=True,
+		dir_okay=False,
+	),
+	output: Path = typer.Argument(
+		...,
+		help="Directory for numbered pages, or a .tif/.tiff or .pdf multi-page file",
+	),
+	pages: str = typer.Option(
+		"all",
+		"--pages",
+		"-p",
+		help="Pages to process (0-based), e.g. 'all', '0-9' or '0,3-5,10-'",
+	),
+	color: list[str] = typer.Option(
+		["255,255,255"],
+		"--color",
+		"-c",
+		help="Target color in format R,G,B or #RRGGBB, optionally with its own "
+		"tolerance as COLOR:TOL. Repeat for several colors (default: white)",
+	),
+	tolerance: int = typer.Option(
+		10,
+		"--tolerance",
+		"-t",
+		help="Color matching tolerance (0-255)",
+		min=0,
+		max=255,
+	),
+	dpi: int = typer.Option(
+		300,
+		"--dpi",
+		help="Resolution the pages are rasterized at",
+		min=72,
+		max=1200,
+	),
+	workers: int = typer.Option(
+		None,
+		"--workers",
+		"-w",
+		help="Number of worker processes (default: CPU count)",
+		min=1,
+	),
+	report: Path = typer.Option(
+		None,
+		"--report",
+		help="Path of the per-page JSON report",
+		dir_okay=False,
+	),
+	clip: str = typer.Option(
+		None,
+		"--clip",
+		help="Only rasterize this region of every page, 'x0,y0,x1,y1' in points",
+	),
+	metric: str = typer.Option(
+		"box",
+		"--metric",
+		"-m",
+		help=f"Color distance metric: {', '.join(METRICS)}. The tolerance is in "
+		"its units (channel levels for RGB metrics, ΔE for cie76/ciede2000)",
+	),
+	feather: int = typer.Option(
+		None,
+		"--feather",
+		"-f",
+		help="Soft edges: alpha ramps from transparent at the tolerance to "
+		"opaque at tolerance + FEATHER instead of a hard cut",
+		min=1,
+	),
+	despill: bool = typer.Option(
+		True,
+		"--despill/--no-despill",
+		help="With --feather, remove the background color from semi-transparent "
+		"edge pixels",
+	),
+	save_profile: str = typer.Option(
+		DEFAULT_SAVE_PROFILE,
+		"--save-profile",
+		help=f"Save profile: {', '.join(SAVE_PROFILES)}. fast encodes several "
+		"times faster, smallest gives the smallest files",
+	),
+	crop: bool = typer.Option(
+		False,
+		"--crop",
+		help="Crop outputs to the bounding box of the non-transparent pixels",
+	),
+	output_format: str = typer.Option(
+		None,
+		"--format",
+		help=f"Output format: {describe_formats()} (default: png pages, or from "
+		"the output file extension)",
+	),
+	auto: bool = typer.Option(
+		False,
+		"--auto",
+		help="Detect the background color(s) of every page and a tolerance for "
+		"each from a sample of its pixels, instead of using --color and "
+		"--tolerance",
+	),
+	connected: bool = typer.Option(
+		False,
+		"--connected",
+		help="Only remove matching pixels connected to the border of each page "
+		"(flood fill), keeping enclosed areas of the color such as the "
+		"counters of letters",
+	),
+	profile: bool = typer.Option(
+		False,
+		"--profile",
+		help="Print the wall time, CPU time, throughput and bytes read and "
+		"written of every stage (decode, mask, encode, ...)",
+	),
+	metrics_json: Path = typer.Option(
+		None,
+		"--metrics-json",
+		help="Write the stage metrics to this JSON file",
+		dir_okay=False,
+	),
+	metrics_prom: Path = typer.Option(
+		None,
+		"--metrics-prom",
+		help="Write the stage metrics to this Prometheus textfile, e.g. in the "
+		"node exporter's textfile collector directory",
+		dir_okay=False,
+	),
+	trace_allocations: bool = typer.Option(
+		False,
+		"--trace-allocations",
+		help="Also measure the peak memory allocated by every stage; slows "
+		"down processing",
+	),
+	lut: LutResolution = typer.Option(
+		None,
+		"--lut",
+		help="Mask through a precomputed 3D color lookup table with this many "
+		"steps per channel (256 exact, 32 binned), built once per worker",
+	),
+) -> None:
+	"""Make a specific color transparent on every page of a PDF."""
+	cli.pdf(
+		input_file,
+		output,
+		pages,
+		color,
+		tolerance,
+		dpi,
+		workers,
+		report,
+		clip,
+		metric,
+		feather,
+		despill,
+		save_profile,
+		crop,
+		output_format,
+		auto,
+		connected,
+		profile,
+		metrics_json,
+		metrics_prom,
+		trace_allocations,
+		None if lut is None else int(lut.value),
+	)
+
+
+@app.command()
+def serve(
+	host: str = typer.Option(
+		"127.0.0.1",
+		"--host",
+		help="Address to listen on. Requests can read and write any path the "
+		"server can, so only listen beyond localhost on a trusted network",
+	),
+	port: int = typer.Option(
+		8765,
+		"--port",
+		help="TCP port to listen on",
+		min=0,
+		max=65535,
+	),
+	socket_path: Path = typer.Option(
+		None,
+		"--socket",
+		help="Listen on this Unix socket instead of --host/--port",
+		dir_okay=False,
+	),
+	workers: int = typer.Option(
+		1,
+		"--workers",
+		"-w",
+		help="Requests processed at the same time; more than one runs a pool "
+		"of worker processes",
+		min=1,
+	),
+	max_pending: int = typer.Option(
+		None,
+		"--max-pending",
+		help="Requests in flight before new ones are refused with 503 "
+		"(default: 4 per worker)",
+		min=1,
+	),
+	memmap_above: int = typer.Option(
+		None,
+		"--memmap-above",
+		help="Keep working images of at least this many MiB in a memory-mapped "
+		"scratch file (in TMPDIR) instead of RAM",
+		min=1,
+	),
+	lut: LutResolution = typer.Option(
+		None,
+		"--lut",
+		help="Mask through a precomputed 3D color lookup table with this many "
+		"steps per channel (256 exact, 32 binned), built once per worker",
+	),
+	metric: str = typer.Option(
+		"box",
+		"--metric",
+		"-m",
+		help=f"Color distance metric: {', '.join(METRICS)}. The tolerance is in "
+		"its units (channel levels for RGB metrics, ΔE for cie76/ciede2000)",
+	),
+	feather: int = typer.Option(
+		None,
+		"--feather",
+		"-f",
+		help="Soft edges: alpha ramps from transparent at the tolerance to "
+		"opaque at tolerance + FEATHER instead of a hard cut",
+		min=1,
+	),
+	despill: bool = typer.Option(
+		True,
+		"--despill/--no-despill",
+		help="With --feather, remove the background color from semi-transparent "
+		"edge pixels",
+	),
+	save_profile: str = typer.Option(
+		DEFAULT_SAVE_PROFILE,
+		"--save-profile",
+		help=f"Save profile: {', '.join(SAVE_PROFILES)}. fast encodes several "
+		"times faster, smallest gives the smallest files",
+	),
+	crop: bool = typer.Option(
+		False,
+		"--crop",
+		help="Crop outputs to the bounding box of the non-transparent pixels",
+	),
+	output_format: str = typer.Option(
+		None,
+		"--format",
+		help=f"Output format: {describe_formats()} (default: png for returned images)",
+	),
+	quiet: bool = typer.Option(
+		False,
+		"--quiet",
+		"-q",
+		help="Do not log each request",
+	),
+	max_body: int = typer.Option(
+		None,
+		"--max-body",
+		help="Largest request body in MiB; larger ones are refused with 413 "
+		"(default: 256)",
+		min=1,
+	),
+) -> None:
+	"""Keep warm workers and process images sent over HTTP or a Unix socket."""
+	cli.serve(
+		host,
+		port,
+		socket_path,
+		workers,
+		max_pending,
+		memmap_above,
+		None if lut is None else int(lut.value),
+		metric,
+		feather,
+		despill,
+		save_profile,
+		crop,
+		output_format,
+		quiet,
+		max_body,
+	)
+
+
+@app.command()
+def cache(
+	cache_dir: Path = typer.Argument(
+		...,
+		help="Directory of the result cache",
+		file_okay=False,
+	),
+	clear: bool = typer.Option(
+		False,
+		"--clear",
+		help="Remove every cached result and reset the statistics",
+	),
+) -> None:
+	"""Show the hit/miss statistics of a result cache."""
+	cli.cache_stats(cache_dir, clear)
+
+
+@app.command()
+def detect(
+	input_file: Path = typer.Argument(
+		...,
+		help="Path to input image or PDF file",
+		exists=True,
+		dir_okay=False,
+	),
+	page: int = typer.Option(
+		None,
+		"--page",
+		"-p",
+		help="PDF page number (0-based, default: first page)",
+		min=0,
+	),
+	dpi: int = typer.Option(
+		300,
+		"--dpi",
+		help="Resolution PDF pages are rasterized at",
+		min=72,
+		max=1200,
+	),
+	metric: str = typer.Option(
+		"box",
+		"--metric",
+		"-m",
+		help=f"Color distance metric the tolerances are suggested in: "
+		f"{', '.join(METRICS)}",
+	),
+) -> None:
+	"""Show the detected background colors and suggested tolerances."""
+	cli.detect(input_file, page, dpi, metric)
+
+
+@app.command()
+def bench(
+	output: Path = typer.Option(
+		Path("rmbg-bench.json"),
+		"--output",
+		"-o",
+		help="Path of the JSON report. Store one as a baseline for --baseline",
+		dir_okay=False,
+	),
+	megapixels: list[float] = typer.Option(
+		list(DEFAULT_MEGAPIXELS),
+		"--megapixels",
+		help="Size of a synthetic image to benchmark, in megapixels. Repeat for "
+		"several sizes",
+		min=0.01,
+		max=1000,
+	),
+	pdf_pages: int = typer.Option(
+		DEFAULT_PDF_PAGES,
+		"--pdf-pages",
+		help="Pages of the synthetic PDF, each of the smallest image size (0 for "
+		"no PDF)",
+		min=0,
+	),
+	repeat: int = typer.Option(
+		DEFAULT_REPEAT,
+		"--repeat",
+		"-r",
+		help="Number of times every image or page is decoded, masked and encoded",
+		min=1,
+	),
+	baseline: Path = typer.Option(
+		None,
+		"--baseline",
+		help="Report of an earlier run; exit with an error if a stage got slower "
+		"or a case uses more memory by more than --max-slowdown",
+		exists=True,
+		dir_okay=False,
+	),
+	max_slowdown: float = typer.Option(
+		DEFAULT_MAX_SLOWDOWN,
+		"--max-slowdown",
+		help="Largest tolerated growth over the baseline, as a fraction",
+		min=0,
+	),
+	isolate: bool = typer.Option(
+		True,
+		"--isolate/--no-isolate",
+		help="Run every case in a fresh process, so its peak RSS is its own",
+	),
+) -> None:
+	"""Benchmark decoding, masking and encoding on synthetic inputs."""
+	cli.bench(output, megapixels, pdf_pages, repeat, baseline, max_slowdown, isolate)
 
 
 @app.command()
@@ -76,13 +832,13 @@ def gui() -> None:
 			[sys.executable, "-m", "streamlit", "run", str(gui_path)], check=True
 		)
 	except ImportError:
-		console.print(
+		cli.get_console().print(
 			"[red]Error: Streamlit is not installed. "
 			"Please install it with 'uv pip install streamlit'[/red]"
 		)
 		sys.exit(1)
 	except subprocess.CalledProcessError as e:
-		console.print(f"[red]Error launching GUI: {e}[/red]")
+		cli.get_console().print(f"[red]Error launching GUI: {e}[/red]")
 		sys.exit(1)
 
 
@@ -0,0 +1,349 @@
+"""
+Asyncio front end to the ImageProcessor.
+
+Every blocking step (decoding, PDF rendering, masking, encoding and file I/O)
+runs on an executor so the event loop stays responsive. The default executor is
+a private thread pool: decoding, masking and encoding release the GIL for most
+of their work. A ``ProcessPoolExecutor`` may be passed instead; the processor
+is then pickled along with each call, so prefer ``process``, which makes one
+round trip per image, over chaining ``load``/``make_transparent``/``save``,
+and pass bytes rather than streams, which cannot cross a process boundary.
+
+At most ``max_concurrency`` calls run at a time. Further calls wait for a free
+slot before anything is submitted, which gives producers natural backpressure:
+an ingestion loop that awaits each call never has more than that many images
+decoded at once.
+
+On the thread pool, all calls share one processor. Its options are only read,
+so this is safe, and an ``instrument`` collector from ``rmbg.instrument`` may
+be shared too: spans and ``StageMetrics`` are thread-safe. Spans running at
+the same time count each other's allocations, since ``tracemalloc`` traces the
+whole process.
+"""
+
+import asyncio
+import io
+import os
+from collections.abc import Callable
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from types import TracebackType
+from typing import Self, TypeVar
+
+import numpy as np
+from PIL import Image
+
+from .core import ImageProcessor
+from .masking import ColorSpec, ToleranceSpec
+from .pixels import PDF_BASE_DPI, ClipRect, ImageDestination, ImageSource
+
+Destination = ImageDestination | None
+"""A path or binary stream to write the output to, or None to return its bytes."""
+
+T = TypeVar("T")
+
+
+def _load_image(
+	processor: ImageProcessor,
+	source: ImageSource,
+	page: int | None,
+	dpi: int,
+	clip: ClipRect | None,
+) -> Image.Image:
+	"""Open and fully decode ``source``, so no decoding is left for the caller."""
+	image = processor.load_image(source, page, dpi, clip)
+	try:
+		image.load()
+	except Exception as e:
+		raise ValueError(f"Failed to load image: {e}") from None
+	return image
+
+
+def _save_image(
+	processor: ImageProcessor,
+	image: Image.Image,
+	destination: Destination,
+	dpi: tuple[int, int],
+) -> bytes | None:
+	"""Write ``image`` to a path or stream, or return the encoded bytes."""
+	if destination is not None:
+		processor.save_image(image, destination, dpi)
+		return None
+	buffer = io.BytesIO()
+	processor.save_image(image, buffer, dpi)
+	return buffer.getvalue()
+
+
+def _process(  # noqa: PLR0913, PLR0917
+	processor: ImageProcessor,
+	source: ImageSource,
+	target_color: ColorSpec,
+	tolerance: ToleranceSpec,
+	destination: Destination,
+	page: int | None,
+	dpi: int,
+	clip: ClipRect | None,
+) -> bytes | None:
+	"""Load, mask and save one image in a single executor call."""
+	output = io.BytesIO() if destination is None else destination
+	processor.process_file(
+		source, output, target_color, tolerance, page, dpi, clip, (dpi, dpi)
+	)
+	return output.getvalue() if destination is None else None
+
+
+class AsyncImageProcessor:
+	"""Awaitable ImageProcessor with offloaded, bounded work."""
+
+	def __init__(
+		self,
+		processor: ImageProcessor | None = None,
+		executor: Executor | None = None,
+		max_concurrency: int | None = None,
+	) -> None:
+		"""
+		Initialize the AsyncImageProcessor.
+
+		Args:
+		    processor: Processor doing the work (default: ``ImageProcessor()``).
+		    executor: Executor the blocking steps run on. Defaults to a thread
+		        pool of ``max_concurrency`` threads, shut down by ``close``; an
+		        executor passed in is left running.
+		    max_concurrency: Maximum number of calls running at a time
+		        (default: CPU count).
+
+		Raises:
+		    ValueError: If ``max_concurrency`` is not positive.
+
+		"""
+		max_concurrency = max_concurrency or os.cpu_count() or 1
+		if max_concurrency < 1:
+			raise ValueError(f"max_concurrency must be positive, got {max_concurrency}")
+		self.processor = processor or ImageProcessor()
+		self.max_concurrency = max_concurrency
+		self.in_flight = 0
+		self._owns_executor = executor is None
+		self._executor = executor or ThreadPoolExecutor(
+			max_workers=max_concurrency, thread_name_prefix="rmbg"
+		)
+		self._slots = asyncio.Semaphore(max_concurrency)
+
+	async def _run(self, func: Callable[..., T], *args: object) -> T:
+		"""Run ``func(self.processor, *args)`` on the executor once a slot is free."""
+		async with self._slots:
+			self.in_flight += 1
+			try:
+				loop = asyncio.get_running_loop()
+				return await loop.run_in_executor(
+					self._executor, partial(func, self.processor, *args)
+				)
+			finally:
+				self.in_flight -= 1
+
+	async def load_image(
+		self,
+		source: ImageSource,
+		page: int | None = None,
+		dpi: int = PDF_BASE_DPI,
+		clip: ClipRect | None = None,
+	) -> Image.Image:
+		"""
+		Load an image from a path, bytes or a binary stream.
+
+		Args:
+		    source: Path to an image or PDF file, or its contents in memory.
+		    page: PDF page number to load (0-based, default: first page).
+		    dpi: Resolution PDF pages are rasterized at.
+		    clip: Optional (x0, y0, x1, y1) PDF page region, in points.
+
+		Returns:
+		    PIL Image object, fully decoded.
+
+		Raises:
+		    FileNotFoundError: If the file doesn't exist.
+		    ValueError: If the image cannot be decoded.
+
+		"""
+		return await self._run(_load_image, source, page, dpi, clip)
+
+	async def load_array(
+		self,
+		source: ImageSource,
+		page: int | None = None,
+		dpi: int = PDF_BASE_DPI,
+		clip: ClipRect | None = None,
+	) -> np.ndarray:
+		"""
+		Load an image from a path, bytes or a binary stream as an RGBA array.
+
+		Args:
+		    source: Path to an image or PDF file, or its contents in memory.
+		    page: PDF page number to load (0-based, default: first page).
+		    dpi: Resolution PDF pages are rasterized at.
+		    clip: Optional (x0, y0, x1, y1) PDF page region, in points.
+
+		Returns:
+		    (H, W, 4) uint8 RGBA array.
+
+		Raises:
+		    FileNotFoundError: If the file doesn't exist.
+		    ValueError: If the image cannot be decoded.
+
+		"""
+		return await self._run(ImageProcessor.load_array, source, page, dpi, clip)
+
+	async def make_transparent(
+		self,
+		image: Image.Image,
+		target_color: ColorSpec,
+		tolerance: ToleranceSpec = 10,
+	) -> Image.Image:
+		"""
+		Make the target color(s) transparent, as ``ImageProcessor.make_transparent``.
+
+		Args:
+		    image: PIL Image object to process.
+		    target_color: RGB tuple of the color to make transparent, or a
+		        sequence of them.
+		    tolerance: Color matching tolerance, shared or one per color.
+
+		Returns:
+		    New RGBA image with the target color(s) transparent.
+
+		"""
+		return await self._run(
+			ImageProcessor.make_transparent, image, target_color, tolerance
+		)
+
+	async def make_transparent_array(
+		self,
+		data: np.ndarray,
+		target_color: ColorSpec,
+		tolerance: ToleranceSpec = 10,
+	) -> np.ndarray:
+		"""
+		Make the target color(s) transparent in an RGBA array.
+
+		The array is updated in place on a thread pool; on a process pool the
+		work happens on a copy, so always use the returned array.
+
+		Args:
+		    data: (H, W, 4) uint8 RGBA array.
+		    target_color: RGB tuple of the color to make transparent, or a
+		        sequence of them.
+		    tolerance: Color matching tolerance, shared or one per color.
+
+		Returns:
+		    The processed array.
+
+		"""
+		return await self._run(
+			ImageProcessor.make_transparent_array, data, target_color, tolerance
+		)
+
+	async def save_image(
+		self,
+		image: Image.Image,
+		destination: Destination = None,
+		dpi: tuple[int, int] = (300, 300),
+	) -> bytes | None:
+		"""
+		Save an image to a path or a binary stream, or encode it to bytes.
+
+		The format is chosen as by ``ImageProcessor.save_image``: the
+		processor's ``output_format``, else the path's extension, else PNG.
+
+		Args:
+		    image: PIL Image object to save.
+		    destination: Output path, writable binary stream, or None.
+		    dpi: DPI resolution for the output image.
+
+		Returns:
+		    The encoded bytes when ``destination`` is None, else None.
+
+		Raises:
+		    ValueError: If the output format is not supported.
+
+		"""
+		return await self._run(_save_image, image, destination, dpi)
+
+	async def save_array(
+		self,
+		data: np.ndarray,
+		destination: Destination = None,
+		dpi: tuple[int, int] = (300, 300),
+	) -> bytes | None:
+		"""
+		Save an RGBA array; see ``save_image``.
+
+		Args:
+		    data: (H, W, 4) uint8 RGBA array to save.
+		    destination: Output path, writable binary stream, or None.
+		    dpi: DPI resolution for the output image.
+
+		Returns:
+		    The encoded bytes when ``destination`` is None, else None.
+
+		Raises:
+		    ValueError: If the output format is not supported.
+
+		"""
+		return await self.save_image(Image.fromarray(data), destination, dpi)
+
+	async def process(  # noqa: PLR0913, PLR0917
+		self,
+		source: ImageSource,
+		target_color: ColorSpec,
+		tolerance: ToleranceSpec = 10,
+		destination: Destination = None,
+		page: int | None = None,
+		dpi: int = 300,
+		clip: ClipRect | None = None,
+	) -> bytes | None:
+		"""
+		Load, mask and save one image in a single executor call.
+
+		With a ``cache`` on the processor, repeated inputs are copied from it
+		(see ``ImageProcessor.process_file``).
+
+		Args:
+		    source: Path to an image or PDF file, or its contents in memory.
+		    target_color: RGB tuple of the color to make transparent, or a
+		        sequence of them.
+		    tolerance: Color matching tolerance, shared or one per color.
+		    destination: Output path, writable binary stream, or None.
+		    page: PDF page number (0-based, default: first page).
+		    dpi: Resolution PDF pages are rasterized at, and output DPI.
+		    clip: Optional (x0, y0, x1, y1) PDF page region, in points.
+
+		Returns:
+		    The encoded bytes when ``destination`` is None, else None.
+
+		Raises:
+		    FileNotFoundError: If the input file doesn't exist.
+		    ValueError: If the input cannot be decoded or the output format
+		        is not supported.
+
+		"""
+		return await self._run(
+			_process, source, target_color, tolerance, destination, page, dpi, clip
+		)
+
+	def close(self) -> None:
+		"""Shut down the executor if it was created by this instance."""
+		if self._owns_executor:
+			self._executor.shutdown()
+
+	async def __aenter__(self) -> Self:
+		"""Enter the runtime context."""
+		return self
+
+	async def __aexit__(
+		self,
+		exc_type: type[BaseException] | None,
+		exc: BaseException | None,
+		traceback: TracebackType | None,
+	) -> None:
+		"""Shut down the executor without blocking the event loop."""
+		if self._owns_executor:
+			await asyncio.to_thread(self._executor.shutdown)
@@ -0,0 +1,57 @@
+"""
+Files replaced atomically, so that readers never see one half written.
+
+An ``AtomicFile`` is written under a hidden temporary name next to its
+destination, ``.<name>.<pid>.tmp``, and only renamed over the destination
+once it is complete. A rename within a directory is atomic, so a reader sees
+either the previous file or the new one, and a run that fails or is killed
+leaves the destination untouched. The process id keeps concurrent processes
+writing the same destination from sharing a temporary file.
+"""
+
+import os
+from pathlib import Path
+from types import TracebackType
+from typing import BinaryIO
+
+
+class AtomicFile:
+	"""Binary file written under a temporary name, then renamed into place."""
+
+	def __init__(self, path: str | Path) -> None:
+		"""
+		Open the temporary file for writing.
+
+		Args:
+		    path: Destination of the file.
+
+		"""
+		self.path = Path(path)
+		self.temporary = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+		self.file: BinaryIO = self.temporary.open("wb")
+
+	def commit(self) -> None:
+		"""Close the temporary file and rename it over the destination."""
+		self.file.close()
+		self.temporary.replace(self.path)
+
+	def abort(self) -> None:
+		"""Close and remove the temporary file, leaving the destination alone."""
+		self.file.close()
+		self.temporary.unlink(missing_ok=True)
+
+	def __enter__(self) -> BinaryIO:
+		"""Return the temporary file to write to."""
+		return self.file
+
+	def __exit__(
+		self,
+		exc_type: type[BaseException] | None,
+		exc: BaseException | None,
+		traceback: TracebackType | None,
+	) -> None:
+		"""Commit the file, or abort it if an error occurred."""
+		if exc_type is None:
+			self.commit()
+		else:
+			self.abort()
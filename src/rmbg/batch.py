@@ -0,0 +1,737 @@
+"""
+Batch processing engine for the image transparency tool.
+
+This module spreads loading, masking and saving of many files (or of the pages
+of one PDF) across a pool of worker processes. Each worker builds a single
+ImageProcessor when it starts, so interpreter startup and import cost is paid
+once per worker instead of once per file.
+"""
+
+import contextlib
+import json
+import os
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+from PIL import Image
+
+from .cache import ResultCache, options_digest, source_digest
+from .core import MULTIPAGE_SUFFIXES, ClipRect, ImageProcessor
+from .instrument import Collector, StageLog, StageRecord
+from .manifest import Manifest
+from .masking import ColorSpec, ToleranceSpec
+from .metrics import ColorMetric, get_metric
+from .writers import DEFAULT_SAVE_PROFILE, OutputWriter, get_writer
+
+if TYPE_CHECKING:
+	import fitz
+
+SUPPORTED_SUFFIXES = frozenset(
+	{".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp", ".pdf"}
+)
+
+_worker_processor: ImageProcessor | None = None
+_worker_documents: dict[Path, "fitz.Document"] = {}
+_worker_digests = False
+
+
+@dataclass(frozen=True)
+class BatchTask:
+	"""A single input/output pair together with its processing parameters."""
+
+	input_file: Path
+	output_file: Path
+	target_color: ColorSpec
+	tolerance: ToleranceSpec = 10
+	dpi: int = 300
+
+
+@dataclass(frozen=True)
+class PageTask:
+	"""
+	A single PDF page together with its processing parameters.
+
+	When ``output_file`` is None the processed page is returned to the caller
+	instead of being written by the worker.
+	"""
+
+	pdf_file: Path
+	page: int
+	output_file: Path | None
+	target_color: ColorSpec
+	tolerance: ToleranceSpec = 10
+	dpi: int = 300
+	clip: ClipRect | None = None
+
+
+@dataclass
+class FileResult:
+	"""Outcome of processing a single file."""
+
+	input_file: str
+	output_file: str
+	status: str
+	seconds: float
+	error: str | None = None
+	cached: bool = False
+	stages: list[StageRecord] | None = None
+	"""Measurements of every stage, when the batch is instrumented."""
+	digest: str | None = None
+	"""Content digest of the input, when the batch keeps a manifest."""
+
+	@property
+	def ok(self) -> bool:
+		"""Whether the file was processed successfully or was up to date."""
+		return self.status in {"ok", "skipped"}
+
+
+PageOutcome = tuple[FileResult, np.ndarray | None]
+"""The result of one page and, when the caller writes it, its RGBA array."""
+
+
+@dataclass
+class BatchSummary:
+	"""Aggregate outcome of a batch run."""
+
+	results: list[FileResult] = field(default_factory=list)
+	elapsed: float = 0.0
+	workers: int = 1
+
+	@property
+	def succeeded(self) -> int:
+		"""Number of files processed successfully."""
+		return sum(result.ok for result in self.results)
+
+	@property
+	def failed(self) -> int:
+		"""Number of files that failed."""
+		return len(self.results) - self.succeeded
+
+	@property
+	def skipped(self) -> int:
+		"""Number of files whose output was already up to date."""
+		return sum(result.status == "skipped" for result in self.results)
+
+	@property
+	def cached(self) -> int:
+		"""Number of files copied from the result cache."""
+		return sum(result.cached for result in self.results)
+
+	@property
+	def throughput(self) -> float:
+		"""Successfully processed images per second of wall time."""
+		if self.elapsed <= 0:
+			return 0.0
+		return (self.succeeded - self.skipped) / self.elapsed
+
+	def to_dict(self) -> dict:
+		"""Return the summary as a JSON-serialisable dictionary."""
+		return {
+			"total": len(self.results),
+			"succeeded": self.succeeded,
+			"failed": self.failed,
+			"skipped": self.skipped,
+			"cached": self.cached,
+			"workers": self.workers,
+			"elapsed_seconds": round(self.elapsed, 6),
+			"images_per_second": round(self.throughput, 3),
+			"files": [asdict(result) for result in self.results],
+		}
+
+
+def collect_inputs(source: str | Path, pattern: str = "*") -> list[Path]:
+	"""
+	Collect supported input files from a directory or a glob pattern.
+
+	Args:
+	    source: Directory to scan, or a glob pattern such as ``scans/**/*.jpg``.
+	    pattern: Glob pattern applied inside ``source`` when it is a directory.
+
+	Returns:
+	    Sorted list of input file paths with a supported suffix.
+
+	Raises:
+	    FileNotFoundError: If no supported input files were found.
+
+	"""
+	source_path = Path(source)
+	if source_path.is_dir():
+		candidates = source_path.glob(pattern)
+	else:
+		candidates = _glob(source_path)
+
+	inputs = sorted(
+		p for p in candidates if p.is_file() and p.suffix.lower() in SUPPORTED_SUFFIXES
+	)
+	if not inputs:
+		raise FileNotFoundError(f"No supported input files found in: {source}")
+	return inputs
+
+
+def _glob(pattern: Path) -> Iterable[Path]:
+	"""Expand a path pattern whose wildcards may be in any of its parts."""
+	parts = pattern.parts
+	first = next(
+		(i for i, part in enumerate(parts) if any(c in part for c in "*?[")), None
+	)
+	if first is None:
+		return [pattern]
+	return Path(*parts[:first]).glob(str(Path(*parts[first:])))
+
+
+def output_path_for(
+	input_file: Path, output_dir: Path, input_root: Path | None, suffix: str = ".png"
+) -> Path:
+	"""
+	Map an input file to its output path inside ``output_dir``.
+
+	The directory structure below ``input_root`` is preserved so that files
+	with the same name in different sub-directories do not overwrite each other.
+
+	Args:
+	    input_file: Path to the input file.
+	    output_dir: Directory receiving the results.
+	    input_root: Common root of the inputs, or None to flatten.
+	    suffix: Extension of the output format.
+
+	Returns:
+	    Path of the output file.
+
+	"""
+	relative = Path(input_file.name)
+	if input_root is not None:
+		with contextlib.suppress(ValueError):
+			relative = input_file.relative_to(input_root)
+	return (output_dir / relative).with_suffix(suffix)
+
+
+def _init_worker(  # noqa: PLR0913, PLR0917
+	memmap_threshold: int | None = None,
+	lut_resolution: int | None = None,
+	metric: str | ColorMetric = "box",
+	feather: int | None = None,
+	despill: bool = True,
+	save_profile: str = DEFAULT_SAVE_PROFILE,
+	crop: bool = False,
+	connected: bool = False,
+	output_format: str | OutputWriter | None = None,
+	cache: ResultCache | None = None,
+	log: StageLog | None = None,
+	digests: bool = False,
+) -> None:
+	"""Build the per-process ImageProcessor once, when a worker starts."""
+	global _worker_processor, _worker_digests  # noqa: PLW0603
+	_worker_digests = digests
+	_worker_processor = ImageProcessor(
+		memmap_threshold=memmap_threshold,
+		lut_resolution=lut_resolution,
+		metric=metric,
+		feather=feather,
+		despill=despill,
+		save_profile=save_profile,
+		crop=crop,
+		connected=connected,
+		output_format=output_format,
+		cache=cache,
+		instrument=log,
+	)
+
+
+def _worker_stages() -> list[StageRecord] | None:
+	"""Return and clear the stages the worker's processor recorded, if any."""
+	log = _worker_processor.instrument
+	if log is None:
+		return None
+	records, log.records = log.records, []
+	return records
+
+
+def _process_task(task: BatchTask) -> FileResult:
+	"""Process one task with the worker's ImageProcessor, capturing failures."""
+	if _worker_processor is None:
+		_init_worker()
+
+	start = time.perf_counter()
+	try:
+		task.output_file.parent.mkdir(parents=True, exist_ok=True)
+		cached = _worker_processor.process_file(
+			task.input_file,
+			task.output_file,
+			task.target_color,
+			task.tolerance,
+			dpi=task.dpi,
+			output_dpi=(task.dpi, task.dpi),
+		)
+		digest = source_digest(task.input_file) if _worker_digests else None
+	except Exception as e:
+		return FileResult(
+			str(task.input_file),
+			str(task.output_file),
+			"error",
+			time.perf_counter() - start,
+			f"{type(e).__name__}: {e}",
+			stages=_worker_stages(),
+		)
+	return FileResult(
+		str(task.input_file),
+		str(task.output_file),
+		"ok",
+		time.perf_counter() - start,
+		cached=cached,
+		stages=_worker_stages(),
+		digest=digest,
+	)
+
+
+def _worker_document(pdf_file: Path) -> "fitz.Document":
+	"""Return this worker's own handle to ``pdf_file``, opening it only once."""
+	doc = _worker_documents.get(pdf_file)
+	if doc is None:
+		import fitz  # noqa: PLC0415
+
+		doc = _worker_documents[pdf_file] = fitz.open(pdf_file)
+	return doc
+
+
+def _process_page(task: PageTask) -> PageOutcome:
+	"""Render and process one PDF page with the worker's own document handle."""
+	if _worker_processor is None:
+		_init_worker()
+
+	name = f"{task.pdf_file}#page={task.page}"
+	output = "" if task.output_file is None else str(task.output_file)
+	start = time.perf_counter()
+	try:
+		result = _worker_processor.render_page_array(
+			_worker_document(task.pdf_file), task.page, task.dpi, task.clip
+		)
+		_worker_processor.make_transparent_array(
+			result, task.target_color, task.tolerance
+		)
+		if task.output_file is not None:
+			_worker_processor.save_array(result, task.output_file, (task.dpi, task.dpi))
+			result = None
+	except Exception as e:
+		seconds = time.perf_counter() - start
+		error = f"{type(e).__name__}: {e}"
+		stages = _worker_stages()
+		return FileResult(name, output, "error", seconds, error, stages=stages), None
+	seconds = time.perf_counter() - start
+	return FileResult(name, output, "ok", seconds, stages=_worker_stages()), result
+
+
+def run_batch(  # noqa: PLR0913, PLR0917
+	tasks: Iterable[BatchTask],
+	workers: int | None = None,
+	on_result: Callable[[FileResult], None] | None = None,
+	memmap_threshold: int | None = None,
+	lut_resolution: int | None = None,
+	metric: str | ColorMetric = "box",
+	feather: int | None = None,
+	despill: bool = True,
+	save_profile: str = DEFAULT_SAVE_PROFILE,
+	crop: bool = False,
+	connected: bool = False,
+	output_format: str | OutputWriter | None = None,
+	cache: ResultCache | None = None,
+	manifest: Manifest | None = None,
+	instrument: Collector | None = None,
+) -> BatchSummary:
+	"""
+	Process tasks across a pool of worker processes.
+
+	Failures are recorded in the summary and never stop the batch.
+
+	Args:
+	    tasks: Tasks to process.
+	    workers: Number of worker processes (default: CPU count). With a single
+	        worker the tasks are processed in the current process.
+	    on_result: Optional callback invoked as each file finishes.
+	    memmap_threshold: Size in bytes from which a worker's RGBA working
+	        array is memory-mapped (see ``ImageProcessor``).
+	    lut_resolution: Mask through a compiled color lookup table of this
+	        resolution, built once per worker (see ``ImageProcessor``).
+	    metric: Color distance metric, by name or instance.
+	    feather: Soft matte width (see ``ImageProcessor``), or None for
+	        binary transparency.
+	    despill: With ``feather``, de-spill the edge pixels.
+	    save_profile: Save profile of the outputs (see ``ImageProcessor``).
+	    crop: Crop the outputs to their non-transparent pixels.
+	    connected: Only remove matching pixels connected to the border of
+	        each image (see ``ImageProcessor``).
+	    output_format: Format of the outputs, by name or writer; None picks
+	        it from the extension of each task's output file.
+	    cache: Result cache shared by the workers; inputs already processed
+	        with the same options are copied from it.
+	    manifest: Manifest of earlier runs. Tasks whose output it shows to
+	        be up to date are reported as "skipped" without being processed,
+	        and the outcome of the others is recorded in it and saved.
+	    instrument: Collector receiving the stages of every file, measured
+	        in the workers (see ``rmbg.instrument``). They are also kept in
+	        each result's ``stages``.
+
+	Returns:
+	    Summary with one result per task, in input order.
+
+	"""
+	tasks = list(tasks)
+	results: list[FileResult | None] = [None] * len(tasks)
+	fingerprints: list[str] = []
+
+	def finish(index: int, result: FileResult) -> None:
+		results[index] = result
+		if instrument is not None:
+			for record in result.stages or ():
+				instrument.record(record)
+		if manifest is not None and result.status != "skipped":
+			task = tasks[index]
+			if result.ok:
+				manifest.record(
+					task.input_file,
+					task.output_file,
+					fingerprints[index],
+					result.digest,
+				)
+			else:
+				manifest.forget(task.output_file)
+		if on_result is not None:
+			on_result(result)
+
+	start = time.perf_counter()
+	pending = list(range(len(tasks)))
+	if manifest is not None:
+		shared = {
+			"lut": lut_resolution,
+			"metric": get_metric(metric).name,
+			"feather": feather,
+			"despill": despill,
+			"save_profile": save_profile,
+			"crop": crop,
+			"connected": connected,
+			"format": output_format,
+		}
+		fingerprints = _fingerprints(tasks, shared)
+		pending = _skip_current(tasks, manifest, fingerprints, finish)
+
+	workers = max(1, workers or os.cpu_count() or 1)
+	workers = min(workers, max(1, len(pending)))
+	options = (
+		memmap_threshold,
+		lut_resolution,
+		metric,
+		feather,
+		despill,
+		save_profile,
+		crop,
+		connected,
+		output_format,
+		cache,
+		_worker_log(instrument),
+		manifest is not None,
+	)
+	try:
+		_process_tasks(tasks, pending, workers, options, finish)
+	finally:
+		if manifest is not None:
+			manifest.save()
+	elapsed = time.perf_counter() - start
+
+	return BatchSummary(results=results, elapsed=elapsed, workers=workers)
+
+
+def _fingerprints(tasks: list[BatchTask], shared: dict) -> list[str]:
+	"""Return the digest of the options every task's output depends on."""
+	return [
+		options_digest(
+			{**shared, "color": t.target_color, "tolerance": t.tolerance, "dpi": t.dpi}
+		)
+		for t in tasks
+	]
+
+
+def _skip_current(
+	tasks: list[BatchTask],
+	manifest: Manifest,
+	fingerprints: list[str],
+	finish: Callable[[int, FileResult], None],
+) -> list[int]:
+	"""Finish the tasks ``manifest`` shows to be up to date as skipped."""
+	pending = []
+	for index, task in enumerate(tasks):
+		if manifest.is_current(task.input_file, task.output_file, fingerprints[index]):
+			skipped = FileResult(
+				str(task.input_file), str(task.output_file), "skipped", 0.0
+			)
+			finish(index, skipped)
+		else:
+			pending.append(index)
+	return pending
+
+
+def _process_tasks(
+	tasks: list[BatchTask],
+	pending: list[int],
+	workers: int,
+	options: tuple,
+	finish: Callable[[int, FileResult], None],
+) -> None:
+	"""Process the pending tasks in this process or in a pool of workers."""
+	if workers == 1:
+		_init_worker(*options)
+		try:
+			for index in pending:
+				finish(index, _process_task(tasks[index]))
+		finally:
+			_reset_worker()
+		return
+
+	with ProcessPoolExecutor(
+		max_workers=workers,
+		initializer=_init_worker,
+		initargs=options,
+	) as pool:
+		futures = {pool.submit(_process_task, tasks[i]): i for i in pending}
+		for future in as_completed(futures):
+			finish(futures[future], future.result())
+
+
+def write_report(summary: BatchSummary, report_path: str | Path) -> None:
+	"""
+	Write the per-file result report as JSON.
+
+	Args:
+	    summary: Batch summary to write.
+	    report_path: Destination of the JSON report.
+
+	"""
+	report_path = Path(report_path)
+	report_path.parent.mkdir(parents=True, exist_ok=True)
+	report_path.write_text(json.dumps(summary.to_dict(), indent=2), encoding="utf-8")
+
+
+def page_output_path(
+	pdf_file: Path, page: int, output_dir: Path, suffix: str = ".png"
+) -> Path:
+	"""
+	Return the numbered path of one PDF page inside ``output_dir``.
+
+	Args:
+	    pdf_file: Path to the PDF file.
+	    page: Page number (0-based).
+	    output_dir: Directory receiving the numbered pages.
+	    suffix: Extension of the output format.
+
+	Returns:
+	    Path such as ``output_dir/drawing-0007.png``.
+
+	"""
+	return output_dir / f"{pdf_file.stem}-{page:04d}{suffix}"
+
+
+def run_pdf(  # noqa: PLR0913, PLR0917
+	pdf_file: Path,
+	output: Path,
+	pages: Iterable[int],
+	target_color: ColorSpec,
+	tolerance: ToleranceSpec = 10,
+	dpi: int = 300,
+	workers: int | None = None,
+	on_result: Callable[[FileResult], None] | None = None,
+	clip: ClipRect | None = None,
+	metric: str | ColorMetric = "box",
+	feather: int | None = None,
+	despill: bool = True,
+	save_profile: str = DEFAULT_SAVE_PROFILE,
+	crop: bool = False,
+	connected: bool = False,
+	output_format: str | OutputWriter | None = None,
+	instrument: Collector | None = None,
+	lut_resolution: int | None = None,
+) -> BatchSummary:
+	"""
+	Process several pages of one PDF, rendering them in parallel.
+
+	Every worker keeps its own open handle to the document, so the PDF is
+	parsed once per worker instead of once per page. With a single worker the
+	pages are rendered in order from one open document in the current process.
+
+	Args:
+	    pdf_file: Path to the PDF file.
+	    output: Directory receiving numbered pages, or a multi-page
+	        ``.tif``/``.tiff`` or ``.pdf`` file receiving all pages.
+	    pages: Page numbers to process (0-based).
+	    target_color: RGB tuple of the color to make transparent, or a
+	        sequence of them.
+	    tolerance: Color matching tolerance (0-255), shared or one per color.
+	    dpi: Resolution the pages are rasterized at and stored with.
+	    workers: Number of worker processes (default: CPU count).
+	    on_result: Optional callback invoked as each page finishes.
+	    clip: Optional (x0, y0, x1, y1) region, in points, rasterized on
+	        every page instead of the whole page.
+	    metric: Color distance metric, by name or instance.
+	    feather: Soft matte width (see ``ImageProcessor``), or None for
+	        binary transparency.
+	    despill: With ``feather``, de-spill the edge pixels.
+	    save_profile: Save profile of the output (see ``ImageProcessor``).
+	    crop: Crop numbered pages to their non-transparent pixels.
+	    connected: Only remove matching pixels connected to the border of
+	        each page (see ``ImageProcessor``).
+	    output_format: Format of the numbered pages or of the multi-page
+	        file, by name or writer (default: PNG pages, or the format of
+	        the multi-page file's extension).
+	    instrument: Collector receiving the stages of every page, measured
+	        in the workers, and the encoding of the multi-page file (see
+	        ``rmbg.instrument``).
+	    lut_resolution: Mask through a compiled color lookup table of this
+	        resolution, built once per worker (see ``ImageProcessor``).
+
+	Returns:
+	    Summary with one result per page, in page order.
+
+	"""
+	pages = list(pages)
+	multipage = output.suffix.lower() in MULTIPAGE_SUFFIXES
+	if multipage:
+		saver = ImageProcessor(
+			save_profile=save_profile,
+			output_format=output_format,
+			instrument=instrument,
+		)
+		output.parent.mkdir(parents=True, exist_ok=True)
+	else:
+		saver = None
+		suffix = get_writer(output_format or "png", save_profile).suffixes[0]
+		output.mkdir(parents=True, exist_ok=True)
+
+	tasks = [
+		PageTask(
+			pdf_file,
+			page,
+			None if multipage else page_output_path(pdf_file, page, output, suffix),
+			target_color,
+			tolerance,
+			dpi,
+			clip,
+		)
+		for page in pages
+	]
+	workers = max(1, workers or os.cpu_count() or 1)
+	workers = min(workers, max(1, len(tasks)))
+	results: list[FileResult] = []
+
+	def collect(
+		outcomes: Iterable[PageOutcome],
+	) -> Iterator[Image.Image]:
+		for result, data in outcomes:
+			results.append(result)
+			if instrument is not None:
+				for record in result.stages or ():
+					instrument.record(record)
+			if on_result is not None:
+				on_result(result)
+			if data is not None:
+				yield Image.fromarray(data)
+
+	options = (
+		None,
+		lut_resolution,
+		metric,
+		feather,
+		despill,
+		save_profile,
+		crop,
+		connected,
+		output_format,
+		None,
+		_worker_log(instrument),
+	)
+	start = time.perf_counter()
+	if workers == 1:
+		_init_worker(*options)
+		try:
+			outcomes = map(_process_page, tasks)
+			_drain(collect(outcomes), output, saver, dpi)
+		finally:
+			_reset_worker()
+	else:
+		with ProcessPoolExecutor(
+			max_workers=workers,
+			initializer=_init_worker,
+			initargs=options,
+		) as pool:
+			outcomes = _bounded_map(pool, _process_page, tasks, 2 * workers)
+			_drain(collect(outcomes), output, saver, dpi)
+	elapsed = time.perf_counter() - start
+
+	return BatchSummary(results=results, elapsed=elapsed, workers=workers)
+
+
+def _bounded_map(
+	pool: Executor,
+	func: Callable[[PageTask], PageOutcome],
+	items: Iterable[PageTask],
+	window: int,
+) -> Iterator[PageOutcome]:
+	"""
+	Map ``func`` over page tasks in ``pool``, in order, a window at a time.
+
+	Unlike ``Executor.map``, which submits every item at once, at most
+	``window`` items are submitted and not yet consumed, and the next one is
+	only submitted once the caller has taken a result. A consumer slower than
+	the workers, such as the encoder of a multi-page file, so holds at most
+	``window`` finished pages instead of the whole document.
+
+	Args:
+	    pool: Executor running ``func``.
+	    func: Function applied to every item.
+	    items: Items to map, submitted in order.
+	    window: Number of items in flight or waiting to be consumed.
+
+	Yields:
+	    The result of ``func`` on every item, in the order of ``items``.
+
+	"""
+	items = iter(items)
+	pending = deque(pool.submit(func, item) for item in islice(items, window))
+	while pending:
+		yield pending.popleft().result()
+		# Refill only now that the previous result has been consumed
+		pending.extend(pool.submit(func, item) for item in islice(items, 1))
+
+
+def _drain(
+	images: Iterable[Image.Image],
+	output: Path,
+	saver: ImageProcessor | None,
+	dpi: int,
+) -> None:
+	"""Consume processed pages, streaming them into ``output`` with ``saver``."""
+	if saver is not None:
+		saver.save_pages(images, output, (dpi, dpi))
+	else:
+		for _ in images:
+			pass
+
+
+def _worker_log(instrument: Collector | None) -> StageLog | None:
+	"""Return the log a worker records its stages in for ``instrument``."""
+	if instrument is None:
+		return None
+	return StageLog(instrument.trace_allocations)
+
+
+def _reset_worker() -> None:
+	"""Close the documents and drop the processor of an in-process worker."""
+	global _worker_processor, _worker_digests  # noqa: PLW0603
+	_worker_processor = None
+	_worker_digests = False
+	while _worker_documents:
+		_, doc = _worker_documents.popitem()
+		doc.close()
@@ -0,0 +1,492 @@
+"""
+Reproducible benchmarks of the processing stages on synthetic inputs.
+
+Every case generates its input locally from a fixed seed: a scan-like image
+(noisy paper white with lines of dark "text") saved as PNG, or a PDF with a
+number of text pages. Each input is then decoded, masked and encoded again
+several times, and every stage is timed separately:
+
+- ``decode``: ``ImageProcessor.load_array``, reading the PNG or rendering the
+  PDF page.
+- ``mask``: ``ImageProcessor.make_transparent_array`` of the paper white.
+- ``encode``: ``ImageProcessor.save_array`` to a PNG file.
+
+Each stage reports latency percentiles over all its samples and its throughput
+in megapixels per second. By default every case runs in a fresh process, so the
+peak resident set size (RSS) reported for it is that case's own. A report can
+be compared against a stored baseline report; stages that got slower, or cases
+that use more memory, by more than a given fraction count as regressions.
+
+Every report also times a fixed reference workload, its ``calibration_ms``.
+Latencies are compared relative to it, so a baseline measured on one machine
+still holds on a faster or slower one, such as a CI runner.
+"""
+
+import json
+import multiprocessing
+import platform
+import sys
+import tempfile
+import time
+import zlib
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from importlib import metadata
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from .core import ImageProcessor
+
+BENCH_COLOR = (255, 255, 255)
+BENCH_TOLERANCE = 16
+BENCH_DPI = 150
+"""Resolution the PDF pages of a case are rendered at."""
+
+DEFAULT_MEGAPIXELS = (1.0, 4.0, 16.0)
+DEFAULT_PDF_PAGES = 8
+DEFAULT_REPEAT = 3
+DEFAULT_MAX_SLOWDOWN = 0.25
+
+STAGES = ("decode", "mask", "encode")
+PERCENTILES = (50, 90, 99)
+
+_CALIBRATION_SHAPE = (1024, 1024)
+_CALIBRATION_REPEAT = 5
+
+# Pages and images have the proportions of ISO 216 paper
+_ASPECT = 2**0.5
+_PAPER_NOISE = 12
+_INK = (28, 30, 52)
+# Text lines: a band of glyph-sized blocks every _LINE_PITCH rows
+_LINE_PITCH = 48
+_LINE_HEIGHT = 22
+_GLYPH_PITCH = 14
+_GLYPH_WIDTH = 9
+
+
+@dataclass(frozen=True)
+class BenchCase:
+	"""One synthetic input: an image, or a PDF with several pages."""
+
+	kind: str
+	"""Either "image" or "pdf"."""
+	megapixels: float
+	"""Size of the image, or of every page as rendered at ``BENCH_DPI``."""
+	pages: int = 1
+
+	@property
+	def name(self) -> str:
+		"""Name of the case in reports, e.g. "image-4mp" or "pdf-8x1mp"."""
+		if self.kind == "pdf":
+			return f"pdf-{self.pages}x{self.megapixels:g}mp"
+		return f"image-{self.megapixels:g}mp"
+
+	@property
+	def shape(self) -> tuple[int, int]:
+		"""Height and width of the image or of a rendered page, in pixels."""
+		width = max(1, round((self.megapixels * 1e6 / _ASPECT) ** 0.5))
+		return max(1, round(width * _ASPECT)), width
+
+
+@dataclass
+class StageTimings:
+	"""Wall times of one stage of a case, one sample per repeat and page."""
+
+	seconds: list[float] = field(default_factory=list)
+	megapixels: float = 0.0
+	"""Megapixels handled by each sample."""
+
+	def percentile(self, q: float) -> float:
+		"""Return the ``q``-th percentile of the samples, in seconds."""
+		return float(np.percentile(self.seconds, q))
+
+	@property
+	def throughput(self) -> float:
+		"""Megapixels per second at the median latency."""
+		median = self.percentile(50)
+		return self.megapixels / median if median > 0 else 0.0
+
+	def to_dict(self) -> dict:
+		"""Return the timings as a JSON-serialisable dictionary."""
+		result = {
+			"samples": len(self.seconds),
+			"mean_ms": round(float(np.mean(self.seconds)) * 1e3, 3),
+		}
+		for q in PERCENTILES:
+			result[f"p{q}_ms"] = round(self.percentile(q) * 1e3, 3)
+		result["megapixels_per_second"] = round(self.throughput, 3)
+		return result
+
+
+@dataclass
+class CaseResult:
+	"""Timings and memory use of one benchmark case."""
+
+	case: BenchCase
+	stages: dict[str, StageTimings]
+	peak_rss: int | None = None
+	"""Peak resident set size in bytes, or None where it cannot be measured."""
+
+	def to_dict(self) -> dict:
+		"""Return the result as a JSON-serialisable dictionary."""
+		height, width = self.case.shape
+		return {
+			"name": self.case.name,
+			"kind": self.case.kind,
+			"megapixels": self.case.megapixels,
+			"pages": self.case.pages,
+			"width": width,
+			"height": height,
+			"peak_rss_bytes": self.peak_rss,
+			"stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+		}
+
+
+@dataclass
+class BenchReport:
+	"""Results of a benchmark run and the environment it ran in."""
+
+	results: list[CaseResult] = field(default_factory=list)
+	repeat: int = DEFAULT_REPEAT
+	isolated: bool = True
+	calibration_ms: float | None = None
+	"""Median time of the reference workload (see ``calibrate``)."""
+
+	def to_dict(self) -> dict:
+		"""Return the report as a JSON-serialisable dictionary."""
+		return {
+			"environment": environment(),
+			"repeat": self.repeat,
+			"isolated": self.isolated,
+			"calibration_ms": self.calibration_ms,
+			"cases": [result.to_dict() for result in self.results],
+		}
+
+
+def environment() -> dict:
+	"""Return the versions and machine details a report was measured with."""
+	versions = {}
+	for package in ("rmbg", "numpy", "pillow", "pymupdf"):
+		try:
+			versions[package] = metadata.version(package)
+		except metadata.PackageNotFoundError:
+			versions[package] = None
+	return {
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"machine": platform.machine(),
+		"cpu_count": multiprocessing.cpu_count(),
+		"packages": versions,
+	}
+
+
+def calibrate(repeat: int = _CALIBRATION_REPEAT) -> float:
+	"""
+	Time a fixed reference workload, as a measure of the machine's speed.
+
+	The workload compresses a synthetic scan with zlib and compares every
+	pixel with numpy, much like encoding and masking do, but runs no rmbg
+	code: a slower rmbg must not slow down its own yardstick.
+
+	Args:
+	    repeat: Number of times the workload runs.
+
+	Returns:
+	    Median wall time of the workload, in milliseconds.
+
+	"""
+	data = synthetic_scan(*_CALIBRATION_SHAPE)
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		zlib.compress(data, 6)
+		np.abs(data.astype(np.int16) - 255).max(axis=2)
+		times.append(time.perf_counter() - start)
+	return round(float(np.median(times)) * 1e3, 3)
+
+
+def speed_ratio(report: dict, baseline: dict) -> float:
+	"""
+	Return how many times slower the machine of ``report`` is than the baseline's.
+
+	Args:
+	    report: New report, as returned by ``BenchReport.to_dict``.
+	    baseline: Stored report to compare against.
+
+	Returns:
+	    Ratio of the two reports' ``calibration_ms``, or 1.0 if either lacks it.
+
+	"""
+	now, before = report.get("calibration_ms"), baseline.get("calibration_ms")
+	return now / before if now and before else 1.0
+
+
+def default_cases(
+	megapixels: Iterable[float] = DEFAULT_MEGAPIXELS,
+	pdf_pages: int = DEFAULT_PDF_PAGES,
+) -> list[BenchCase]:
+	"""
+	Return the standard suite: one image per size and one multi-page PDF.
+
+	Args:
+	    megapixels: Image sizes to benchmark.
+	    pdf_pages: Pages of the PDF case, whose pages have the smallest of
+	        the image sizes; 0 leaves the PDF out.
+
+	Returns:
+	    The cases, smallest image first.
+
+	Raises:
+	    ValueError: If a size is not positive or the page count is negative.
+
+	"""
+	sizes = sorted(set(megapixels))
+	if not sizes or sizes[0] <= 0:
+		raise ValueError("Benchmark sizes must be positive megapixel counts")
+	if pdf_pages < 0:
+		raise ValueError("The number of PDF pages cannot be negative")
+	cases = [BenchCase("image", size) for size in sizes]
+	if pdf_pages:
+		cases.append(BenchCase("pdf", sizes[0], pdf_pages))
+	return cases
+
+
+def synthetic_scan(height: int, width: int, seed: int = 0) -> np.ndarray:
+	"""
+	Return a scan-like RGB image: noisy paper white with lines of dark text.
+
+	Args:
+	    height: Height in pixels.
+	    width: Width in pixels.
+	    seed: Seed of the paper noise, so the same size always gives the same
+	        image.
+
+	Returns:
+	    (H, W, 3) uint8 array.
+
+	"""
+	rng = np.random.default_rng(seed)
+	data = np.empty((height, width, 3), dtype=np.uint8)
+	# Gray noise, one draw per pixel shared by the channels
+	for y0 in range(0, height, 1024):
+		band = data[y0 : y0 + 1024]
+		noise = rng.integers(0, _PAPER_NOISE, (*band.shape[:2], 1), dtype=np.uint8)
+		np.subtract(255, noise, out=band, casting="unsafe")
+
+	margin_y, margin_x = height // 12, width // 10
+	columns = np.zeros(width, dtype=bool)
+	glyphs = np.arange(width - 2 * margin_x) % _GLYPH_PITCH < _GLYPH_WIDTH
+	columns[margin_x : width - margin_x] = glyphs
+	for y0 in range(margin_y, height - margin_y - _LINE_HEIGHT, _LINE_PITCH):
+		data[y0 : y0 + _LINE_HEIGHT, columns] = _INK
+	return data
+
+
+def _write_pdf(case: BenchCase, path: Path) -> None:
+	"""Write a PDF of text pages that render at the size of ``case``."""
+	import fitz  # noqa: PLC0415
+
+	height, width = case.shape
+	scale = 72 / BENCH_DPI
+	page_width, page_height = width * scale, height * scale
+	fontsize = max(4.0, page_width / 80)
+	left, top = page_width / 10, page_height / 12
+	# Helvetica averages about half an em per character
+	characters = int(page_width * 0.8 / (fontsize * 0.5))
+	line = ("The quick brown fox jumps over the lazy dog. " * 100)[:characters]
+	rows = np.arange(top + page_height / 12, page_height * 0.9, fontsize * 1.5)
+	doc = fitz.open()
+	try:
+		for _ in range(case.pages):
+			page = doc.new_page(width=page_width, height=page_height)
+			page.draw_rect(
+				fitz.Rect(left, top, page_width - left, top + page_height / 20),
+				color=None,
+				fill=(0.1, 0.1, 0.2),
+			)
+			for y in rows:
+				page.insert_text((left, y), line, fontsize=fontsize)
+		doc.save(path)
+	finally:
+		doc.close()
+
+
+def write_input(case: BenchCase, directory: Path) -> Path:
+	"""
+	Generate the input of a case in a directory.
+
+	Args:
+	    case: Case to generate the input of.
+	    directory: Existing directory receiving the file.
+
+	Returns:
+	    Path of the PNG image or PDF document.
+
+	"""
+	if case.kind == "pdf":
+		path = directory / f"{case.name}.pdf"
+		_write_pdf(case, path)
+	else:
+		path = directory / f"{case.name}.png"
+		image = Image.fromarray(synthetic_scan(*case.shape))
+		image.save(path, compress_level=1)
+	return path
+
+
+def _peak_rss() -> int | None:
+	"""Return the peak resident set size of this process in bytes."""
+	try:
+		import resource  # noqa: PLC0415
+	except ImportError:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Kilobytes on Linux, bytes on macOS
+	return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_case(case: BenchCase, input_file: Path, repeat: int) -> CaseResult:
+	"""
+	Time the stages of one case on its generated input.
+
+	Args:
+	    case: Case to run.
+	    input_file: Input of the case (see ``write_input``).
+	    repeat: Number of times every page is decoded, masked and encoded.
+
+	Returns:
+	    Timings of every stage and the peak RSS of the current process.
+
+	"""
+	processor = ImageProcessor()
+	height, width = case.shape
+	stages = {name: StageTimings(megapixels=height * width / 1e6) for name in STAGES}
+	output_file = input_file.with_name(f"{case.name}-out.png")
+	pages = range(case.pages) if case.kind == "pdf" else [None]
+	for _ in range(repeat):
+		for page in pages:
+			start = time.perf_counter()
+			data = processor.load_array(input_file, page=page, dpi=BENCH_DPI)
+			decoded = time.perf_counter()
+			processor.make_transparent_array(data, BENCH_COLOR, BENCH_TOLERANCE)
+			masked = time.perf_counter()
+			processor.save_array(data, output_file)
+			encoded = time.perf_counter()
+			stages["decode"].seconds.append(decoded - start)
+			stages["mask"].seconds.append(masked - decoded)
+			stages["encode"].seconds.append(encoded - masked)
+			del data
+	return CaseResult(case, stages, _peak_rss())
+
+
+def run_suite(
+	cases: Iterable[BenchCase],
+	repeat: int = DEFAULT_REPEAT,
+	*,
+	isolate: bool = True,
+	on_result: Callable[[CaseResult], None] | None = None,
+) -> BenchReport:
+	"""
+	Generate the inputs of some cases and benchmark them one after another.
+
+	Args:
+	    cases: Cases to run, in order.
+	    repeat: Number of times every page is decoded, masked and encoded.
+	    isolate: Run every case in a freshly started process, so that its
+	        peak RSS is not inflated by earlier, larger cases. Without it the
+	        reported peak RSS is that of the whole run so far.
+	    on_result: Optional callback invoked as each case finishes.
+
+	Returns:
+	    Report of all cases, in order.
+
+	Raises:
+	    ValueError: If ``repeat`` is less than 1.
+
+	"""
+	if repeat < 1:
+		raise ValueError("Benchmarks must repeat every case at least once")
+	report = BenchReport(repeat=repeat, isolated=isolate, calibration_ms=calibrate())
+	with tempfile.TemporaryDirectory(prefix="rmbg-bench-") as directory:
+		for case in cases:
+			input_file = write_input(case, Path(directory))
+			if isolate:
+				context = multiprocessing.get_context("spawn")
+				with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+					result = pool.submit(run_case, case, input_file, repeat).result()
+			else:
+				result = run_case(case, input_file, repeat)
+			input_file.unlink()
+			report.results.append(result)
+			if on_result is not None:
+				on_result(result)
+	return report
+
+
+def save_report(report: BenchReport, path: str | Path) -> None:
+	"""
+	Write a benchmark report as JSON, e.g. to store it as a baseline.
+
+	Args:
+	    report: Report to write.
+	    path: Destination of the JSON file.
+
+	"""
+	path = Path(path)
+	path.parent.mkdir(parents=True, exist_ok=True)
+	path.write_text(json.dumps(report.to_dict(), indent=2), encoding="utf-8")
+
+
+def load_report(path: str | Path) -> dict:
+	"""Read a report written by ``save_report``, as a dictionary."""
+	return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def find_regressions(
+	report: dict, baseline: dict, max_slowdown: float = DEFAULT_MAX_SLOWDOWN
+) -> list[str]:
+	"""
+	Compare a report against a baseline report.
+
+	Cases are matched by name; cases or stages missing from either report are
+	not compared. A stage regresses when its median latency grew by more than
+	``max_slowdown``, and a case when its peak RSS did. The baseline latencies
+	are first scaled by ``speed_ratio``, so that only the rmbg stages getting
+	slower relative to the reference workload count.
+
+	Args:
+	    report: New report, as returned by ``BenchReport.to_dict``.
+	    baseline: Stored report to compare against.
+	    max_slowdown: Largest tolerated growth, as a fraction (0.25 = 25%).
+
+	Returns:
+	    One message per regression; empty if there are none.
+
+	"""
+	limit = 1 + max_slowdown
+	scale = speed_ratio(report, baseline)
+	previous = {case["name"]: case for case in baseline.get("cases", [])}
+	regressions = []
+	for case in report.get("cases", []):
+		old = previous.get(case["name"])
+		if old is None:
+			continue
+		for stage, timings in case["stages"].items():
+			old_timings = old["stages"].get(stage)
+			if old_timings is None:
+				continue
+			now, before = timings["p50_ms"], old_timings["p50_ms"] * scale
+			if now > before * limit:
+				regressions.append(
+					f"{case['name']} {stage}: median {now:.1f} ms, "
+					f"baseline {before:.1f} ms (+{now / before - 1:.0%})"
+				)
+		now, before = case.get("peak_rss_bytes"), old.get("peak_rss_bytes")
+		if now and before and now > before * limit:
+			regressions.append(
+				f"{case['name']} peak RSS: {now / 2**20:.0f} MiB, "
+				f"baseline {before / 2**20:.0f} MiB (+{now / before - 1:.0%})"
+			)
+	return regressions
@@ -0,0 +1,423 @@
+"""
+Content-addressed on-disk cache of finished outputs.
+
+A result is keyed by a hash of the input file's bytes together with every
+option that changes the output (colors, tolerances, metric, matte, DPI, page,
+clip, format and save profile), so repeated inputs such as templates and
+letterheads are looked up by their content rather than their name. On a hit
+the encoded file is copied out as it is: nothing is decoded, masked or
+encoded.
+
+Entries live in a single SQLite database, which serializes writers from
+several processes with file locks, so batch workers can share one cache; each
+process and thread uses a connection of its own. The total size is bounded:
+when a new entry pushes it past ``max_bytes``, the least recently used entries
+are evicted. Hit, miss, store and eviction counts are kept in the same
+database and add up across processes and runs.
+
+Lookups only read, so they never wait for the writers' lock. A hit marks its
+entry as recently used only once it has aged into the older half of the use
+stamps, and hit and miss counts are kept in memory until the next write, every
+``_FLUSH_EVERY`` lookups, ``stats``, ``close`` or process exit.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from collections.abc import Callable, Iterator, Mapping
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from multiprocessing.util import Finalize
+from pathlib import Path
+from typing import Any, TypeVar
+
+from .pixels import ResolvedSource
+
+DEFAULT_CACHE_SIZE = 1 << 30
+CACHE_FILENAME = "rmbg-cache.sqlite3"
+# Bump when the outputs for the same key would change, to orphan old entries
+_KEY_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+	key TEXT PRIMARY KEY,
+	data BLOB NOT NULL,
+	size INTEGER NOT NULL,
+	used INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+CREATE TABLE IF NOT EXISTS counters (
+	name TEXT PRIMARY KEY,
+	value INTEGER NOT NULL
+);
+"""
+_COUNTERS = ("hits", "misses", "stores", "evictions")
+_BUMP = (
+	"INSERT INTO counters VALUES (?, ?) "
+	"ON CONFLICT (name) DO UPDATE SET value = value + excluded.value"
+)
+# Lookups counted in memory before they are written to the database
+_FLUSH_EVERY = 64
+# A TypeVar, as in aio, so that the module still imports on Python 3.11
+T = TypeVar("T")
+
+# Seconds a connection waits for another process's lock before giving up
+_BUSY_TIMEOUT = 60.0
+
+
+@dataclass(frozen=True)
+class CacheStats:
+	"""Lookup counts and current contents of a result cache."""
+
+	hits: int = 0
+	misses: int = 0
+	stores: int = 0
+	evictions: int = 0
+	entries: int = 0
+	size: int = 0
+
+	@property
+	def hit_rate(self) -> float:
+		"""Fraction of lookups that were hits."""
+		lookups = self.hits + self.misses
+		return self.hits / lookups if lookups else 0.0
+
+	def to_dict(self) -> dict:
+		"""Return the statistics as a JSON-serialisable dictionary."""
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"hit_rate": round(self.hit_rate, 4),
+			"stores": self.stores,
+			"evictions": self.evictions,
+			"entries": self.entries,
+			"bytes": self.size,
+		}
+
+
+def source_digest(source: ResolvedSource) -> str:
+	"""
+	Return the hex digest of an input's bytes.
+
+	Args:
+	    source: Path of the input file, or its contents in memory.
+
+	Returns:
+	    BLAKE2b digest of the bytes, read in chunks for files.
+
+	"""
+	if isinstance(source, Path):
+		with source.open("rb") as file:
+			return hashlib.file_digest(file, "blake2b").hexdigest()
+	return hashlib.blake2b(source).hexdigest()
+
+
+def options_digest(options: Mapping[str, Any]) -> str:
+	"""
+	Return a digest of a set of options, independent of their order.
+
+	Args:
+	    options: Option values, serialized as JSON with ``repr`` as the
+	        fallback for objects such as writers.
+
+	Returns:
+	    Hex digest of the options.
+
+	"""
+	encoded = json.dumps(
+		{"version": _KEY_VERSION, **options}, sort_keys=True, default=repr
+	)
+	return hashlib.blake2b(encoded.encode(), digest_size=20).hexdigest()
+
+
+def cache_key(digest: str, options: Mapping[str, Any]) -> str:
+	"""
+	Combine an input digest and the output options into a cache key.
+
+	Args:
+	    digest: Digest of the input bytes, see ``source_digest``.
+	    options: Every option the output depends on (see ``options_digest``).
+
+	Returns:
+	    Hex key identifying the output.
+
+	"""
+	return options_digest({"input": digest, **options})
+
+
+def _retry_busy(action: Callable[[], T]) -> T:  # noqa: UP047
+	"""
+	Run a database action, retrying while another connection holds a lock.
+
+	SQLite returns SQLITE_BUSY at once, without calling the busy handler, in
+	some cases such as changing the journal mode while another process opens
+	the database.
+	"""
+	deadline = time.monotonic() + _BUSY_TIMEOUT
+	delay = 0.001
+	while True:
+		try:
+			return action()
+		except sqlite3.OperationalError as e:
+			busy = "locked" in str(e) or "busy" in str(e)
+			if not busy or time.monotonic() > deadline:
+				raise
+		time.sleep(delay)
+		delay = min(2 * delay, 0.1)
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+	"""
+	Open the cache database in autocommit mode, creating it if needed.
+
+	The busy timeout is set before anything else, and the database is only
+	switched to WAL while it is not in that mode yet: the mode is stored in
+	the file, so this only happens once, when the database is created.
+	"""
+	connection = sqlite3.connect(path, timeout=_BUSY_TIMEOUT, isolation_level=None)
+	(mode,) = _retry_busy(connection.execute("PRAGMA journal_mode").fetchone)
+	if mode != "wal":
+		_retry_busy(lambda: connection.execute("PRAGMA journal_mode=WAL"))
+	_retry_busy(lambda: connection.executescript(_SCHEMA))
+	return connection
+
+
+class _PendingCounts:
+	"""Hit and miss counts of one process not yet written to the database."""
+
+	def __init__(self, path: Path) -> None:
+		self.path = path
+		self.pid = os.getpid()
+		self._counts: dict[str, int] = {}
+		self._lock = threading.Lock()
+
+	def __bool__(self) -> bool:
+		"""Whether any count is pending."""
+		return bool(self._counts)
+
+	def add(self, name: str) -> int:
+		"""Count one lookup; return how many are now pending."""
+		with self._lock:
+			self._counts[name] = self._counts.get(name, 0) + 1
+			return sum(self._counts.values())
+
+	def take(self) -> dict[str, int]:
+		"""Return the pending counts and forget them."""
+		with self._lock:
+			counts, self._counts = self._counts, {}
+		return counts
+
+	def flush(self) -> None:
+		"""
+		Write the pending counts over a connection of their own.
+
+		Runs at process exit, where an exception would go unnoticed, so counts
+		that still cannot be written once the lock waits are over are reported
+		with a ``RuntimeWarning`` instead.
+		"""
+		if os.getpid() != self.pid or not (counts := self.take()):
+			return
+		try:
+			with closing(_connect(self.path)) as db:
+				_retry_busy(lambda: db.executemany(_BUMP, counts.items()))
+		except sqlite3.Error as e:
+			warnings.warn(
+				f"Cache counts {counts} not written to {self.path}: {e}",
+				RuntimeWarning,
+				stacklevel=2,
+			)
+
+
+class ResultCache:
+	"""Size-bounded LRU cache of encoded outputs, shared between processes."""
+
+	def __init__(
+		self, directory: str | Path, max_bytes: int = DEFAULT_CACHE_SIZE
+	) -> None:
+		"""
+		Open (or create) the cache in a directory.
+
+		Args:
+		    directory: Directory holding the cache database; created if needed.
+		    max_bytes: Total size of the stored outputs above which the least
+		        recently used ones are evicted. Outputs larger than this are
+		        never stored.
+
+		Raises:
+		    ValueError: If ``max_bytes`` is not positive.
+
+		"""
+		if max_bytes <= 0:
+			raise ValueError(f"Cache size must be positive, got {max_bytes}")
+		self.path = Path(directory) / CACHE_FILENAME
+		self.max_bytes = max_bytes
+		self._local = threading.local()
+		self._counts: _PendingCounts | None = None
+
+	def __repr__(self) -> str:
+		"""Return the cache location and size bound."""
+		return f"ResultCache({str(self.path.parent)!r}, max_bytes={self.max_bytes})"
+
+	def __getstate__(self) -> dict:
+		"""Pickle without the connections; each process opens its own."""
+		return {"path": self.path, "max_bytes": self.max_bytes}
+
+	def __setstate__(self, state: dict) -> None:
+		"""Restore a pickled cache, without any open connection."""
+		vars(self).update(state)
+		self._local = threading.local()
+		self._counts = None
+
+	@property
+	def _db(self) -> sqlite3.Connection:
+		"""Connection of this thread to the database, opened on first use."""
+		local = self._local
+		# A connection inherited through fork must not be used by the child
+		if getattr(local, "pid", None) != os.getpid():
+			self.path.parent.mkdir(parents=True, exist_ok=True)
+			# Autocommit mode, with explicit BEGIN IMMEDIATE around every write
+			local.connection = _connect(self.path)
+			local.pid = os.getpid()
+		return local.connection
+
+	@property
+	def _pending(self) -> _PendingCounts:
+		"""Counts of this process not yet written, flushed at the latest on exit."""
+		counts = self._counts
+		if counts is None or counts.pid != os.getpid():
+			counts = self._counts = _PendingCounts(self.path)
+			# Unlike atexit, also runs when a pool worker process exits
+			Finalize(self, counts.flush, exitpriority=0)
+		return counts
+
+	@contextmanager
+	def _transaction(self) -> Iterator[sqlite3.Connection]:
+		"""Run a write transaction that also writes out the pending counts."""
+		db = self._db
+		db.execute("BEGIN IMMEDIATE")
+		try:
+			yield db
+			db.executemany(_BUMP, self._pending.take().items())
+		except BaseException:
+			db.execute("ROLLBACK")
+			raise
+		db.execute("COMMIT")
+
+	def _bump(self, name: str, amount: int = 1) -> None:
+		"""Add to a counter inside the current transaction."""
+		self._db.execute(_BUMP, (name, amount))
+
+	def _tick(self) -> int:
+		"""Return a use stamp later than every stored one."""
+		(latest,) = self._db.execute("SELECT MAX(used) FROM entries").fetchone()
+		return (latest or 0) + 1
+
+	def get(self, key: str) -> bytes | None:
+		"""
+		Look an output up without taking the write lock.
+
+		A hit is marked as the most recently used only when its entry is in the
+		older half of the use stamps, so hot entries are not rewritten on every
+		lookup yet are never the next to be evicted.
+
+		Args:
+		    key: Cache key, see ``cache_key``.
+
+		Returns:
+		    The stored output, or None on a miss.
+
+		"""
+		row = self._db.execute(
+			"SELECT data, used, (SELECT MIN(used) FROM entries), "
+			"(SELECT MAX(used) FROM entries) FROM entries WHERE key = ?",
+			(key,),
+		).fetchone()
+		pending = self._pending.add("misses" if row is None else "hits")
+		stale = row is not None and 2 * (row[1] - row[2]) < row[3] - row[2]
+		if stale or pending >= _FLUSH_EVERY:
+			with self._transaction() as db:
+				if stale:
+					db.execute(
+						"UPDATE entries SET used = ? WHERE key = ?", (self._tick(), key)
+					)
+		return None if row is None else bytes(row[0])
+
+	def put(self, key: str, data: bytes) -> None:
+		"""
+		Store an output, then evict least recently used ones beyond the bound.
+
+		Args:
+		    key: Cache key, see ``cache_key``.
+		    data: Encoded output. Ignored if larger than ``max_bytes``.
+
+		"""
+		if len(data) > self.max_bytes:
+			return
+		with self._transaction() as db:
+			db.execute(
+				"INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+				(key, data, len(data), self._tick()),
+			)
+			self._bump("stores")
+			self._evict()
+
+	def _evict(self) -> None:
+		"""Delete the least recently used entries until within ``max_bytes``."""
+		db = self._db
+		(excess,) = db.execute(
+			"SELECT COALESCE(SUM(size), 0) - ? FROM entries", (self.max_bytes,)
+		).fetchone()
+		if excess <= 0:
+			return
+		evicted = []
+		rows = db.execute("SELECT key, size FROM entries ORDER BY used").fetchall()
+		for key, size in rows:
+			evicted.append((key,))
+			excess -= size
+			if excess <= 0:
+				break
+		db.executemany("DELETE FROM entries WHERE key = ?", evicted)
+		self._bump("evictions", len(evicted))
+
+	def stats(self) -> CacheStats:
+		"""Return the counts accumulated by every process, and the contents."""
+		self.flush()
+		db = self._db
+		counters = dict(db.execute("SELECT name, value FROM counters"))
+		entries, size = db.execute(
+			"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+		).fetchone()
+		return CacheStats(
+			**{name: counters.get(name, 0) for name in _COUNTERS},
+			entries=entries,
+			size=size,
+		)
+
+	def clear(self) -> None:
+		"""Remove every entry and reset the counters."""
+		self._pending.take()
+		db = self._db
+		db.execute("BEGIN IMMEDIATE")
+		db.execute("DELETE FROM entries")
+		db.execute("DELETE FROM counters")
+		db.execute("COMMIT")
+		db.execute("VACUUM")
+
+	def flush(self) -> None:
+		"""Write out the hit and miss counts this process still holds."""
+		counts = self._counts
+		if counts and counts.pid == os.getpid():
+			with self._transaction():
+				pass  # The pending counts are written on commit
+
+	def close(self) -> None:
+		"""Write out pending counts and close this thread's connection."""
+		local = self._local
+		if getattr(local, "pid", None) == os.getpid():
+			self.flush()
+			local.connection.close()
+		local.pid = None
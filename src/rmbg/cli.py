@@ -5,15 +5,92 @@ This module provides a CLI interface for making colors transparent in images
 using Typer for argument parsing and rich for console output.
 """
 
+import contextlib
+import json
+import warnings
+from collections.abc import Sequence
+from functools import lru_cache
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import typer
-from rich.console import Console
-from rich.panel import Panel
 
-from .core import ImageProcessor
+from .batch import (
+	BatchSummary,
+	BatchTask,
+	collect_inputs,
+	output_path_for,
+	run_batch,
+	run_pdf,
+	write_report,
+)
+from .bench import (
+	DEFAULT_MAX_SLOWDOWN,
+	DEFAULT_MEGAPIXELS,
+	DEFAULT_PDF_PAGES,
+	DEFAULT_REPEAT,
+	STAGES,
+	default_cases,
+	find_regressions,
+	load_report,
+	run_suite,
+	save_report,
+)
+from .cache import CACHE_FILENAME, DEFAULT_CACHE_SIZE, ResultCache
+from .core import MULTIPAGE_SUFFIXES, ClipRect, ImageProcessor, validate_options
+from .detect import AUTO, detect_background
+from .instrument import StageMetrics, write_metrics
+from .manifest import MANIFEST_FILENAME, Manifest
+from .masking import ColorSpec, ToleranceSpec
+from .region import Point
+from .streaming import DEFAULT_BAND_ROWS, FullDecodeWarning
+from .writers import DEFAULT_SAVE_PROFILE, get_writer
 
-console = Console()
+# rich and the server are imported by the functions that use them, so that
+# starting the CLI does not pay for them (see tests/test_imports.py)
+if TYPE_CHECKING:
+	from rich.console import Console
+	from rich.progress import Progress
+
+
+@lru_cache(maxsize=1)
+def get_console() -> "Console":
+	"""Return the shared rich console, imported and created on first output."""
+	from rich.console import Console  # noqa: PLC0415
+
+	return Console()
+
+
+def __getattr__(name: str) -> object:
+	"""Create the module-level ``console`` lazily."""
+	if name == "console":
+		return get_console()
+	raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _print_panel(message: str, title: str, border_style: str) -> None:
+	"""Print a message in a titled rich panel."""
+	from rich.panel import Panel  # noqa: PLC0415
+
+	get_console().print(Panel(message, title=title, border_style=border_style))
+
+
+def _progress() -> "Progress":
+	"""Return a progress bar showing completed items and elapsed time."""
+	from rich.progress import (  # noqa: PLC0415
+		BarColumn,
+		MofNCompleteColumn,
+		Progress,
+		TimeElapsedColumn,
+	)
+
+	return Progress(
+		"[progress.description]{task.description}",
+		BarColumn(),
+		MofNCompleteColumn(),
+		TimeElapsedColumn(),
+		console=get_console(),
+	)
 
 
 def parse_color(color_str: str) -> tuple[int, int, int]:
@@ -44,54 +121,848 @@ def parse_color(color_str: str) -> tuple[int, int, int]:
 		raise ValueError("Color must be in format R,G,B or #RRGGBB") from None
 
 
+def parse_targets(
+	color: str | Sequence[str], tolerance: int = 10
+) -> tuple[ColorSpec, ToleranceSpec]:
+	"""
+	Parse one or several target colors, each with an optional tolerance.
+
+	Every entry is a color as accepted by ``parse_color``, optionally followed
+	by ``:TOLERANCE`` to override the shared tolerance for that color, e.g.
+	``"#ffffff"`` or ``"200,200,200:25"``.
+
+	Args:
+	    color: One color string or a sequence of them.
+	    tolerance: Tolerance for entries without their own.
+
+	Returns:
+	    Tuple of (target_color, tolerance): a single RGB tuple and int for one
+	    entry, or a list of RGB tuples and a list of ints for several.
+
+	Raises:
+	    ValueError: If a color or tolerance is invalid.
+
+	"""
+	specs = [color] if isinstance(color, str) else list(color)
+	if not specs:
+		raise ValueError("At least one color is required")
+
+	colors = []
+	tolerances = []
+	for spec in specs:
+		color_str, sep, tolerance_str = spec.partition(":")
+		colors.append(parse_color(color_str.strip()))
+		if not sep:
+			tolerances.append(tolerance)
+			continue
+		try:
+			value = int(tolerance_str)
+		except ValueError:
+			value = -1
+		if not 0 <= value <= 255:  # noqa: PLR2004
+			raise ValueError(f"Tolerance in '{spec}' must be an integer 0-255")
+		tolerances.append(value)
+
+	if len(colors) == 1:
+		return colors[0], tolerances[0]
+	return colors, tolerances
+
+
+def parse_clip(clip_str: str) -> ClipRect:
+	"""
+	Parse a clip region string into a rectangle.
+
+	Args:
+	    clip_str: Region in PDF points, in format "x0,y0,x1,y1".
+
+	Returns:
+	    Tuple of (x0, y0, x1, y1) floats.
+
+	Raises:
+	    ValueError: If the clip string format is invalid.
+
+	"""
+	try:
+		x0, y0, x1, y1 = map(float, clip_str.split(","))
+		if x1 <= x0 or y1 <= y0:
+			raise ValueError
+		return (x0, y0, x1, y1)
+	except ValueError:
+		raise ValueError(
+			"Clip must be in format x0,y0,x1,y1 (points) with x0 < x1 and y0 < y1"
+		) from None
+
+
+def parse_point(point_str: str) -> Point:
+	"""
+	Parse a pixel coordinate string into a point.
+
+	Args:
+	    point_str: Pixel coordinates in format "x,y", counted from the top
+	        left corner.
+
+	Returns:
+	    Tuple of (x, y) integers.
+
+	Raises:
+	    ValueError: If the point string format is invalid.
+
+	"""
+	try:
+		x, y = map(int, point_str.split(","))
+		if x < 0 or y < 0:
+			raise ValueError
+		return (x, y)
+	except ValueError:
+		raise ValueError("Seed must be in format x,y (pixels, 0 or more)") from None
+
+
+def parse_page_range(spec: str, page_count: int) -> list[int]:
+	"""
+	Parse a page range specification into a list of page numbers.
+
+	Args:
+	    spec: Comma separated 0-based pages and ranges, e.g. "0,3-5,10-".
+	        An open-ended range runs to the last page; "all" selects every page.
+	    page_count: Number of pages in the document.
+
+	Returns:
+	    Sorted list of unique page numbers.
+
+	Raises:
+	    ValueError: If the specification is invalid or out of range.
+
+	"""
+	if spec.strip().lower() == "all":
+		return list(range(page_count))
+
+	pages: set[int] = set()
+	try:
+		for part in spec.split(","):
+			first, sep, last = part.strip().partition("-")
+			start = int(first)
+			stop = (int(last) if last else page_count - 1) if sep else start
+			if not 0 <= start <= stop < page_count:
+				raise ValueError
+			pages.update(range(start, stop + 1))
+	except ValueError:
+		raise ValueError(
+			f"Pages must be 0-based numbers or ranges like 0,3-5,10- "
+			f"within 0-{page_count - 1}"
+		) from None
+	return sorted(pages)
+
+
 def main(
 	input_file: Path,
 	output_file: Path,
-	color: str = "255,255,255",
+	color: str | Sequence[str] = "255,255,255",
 	tolerance: int = 10,
 	page: int | None = None,
 	dpi: int = 300,
+	clip: str | None = None,
+	stream: bool = False,
+	band_rows: int = DEFAULT_BAND_ROWS,
+	memmap_above: int | None = None,
+	metric: str = "box",
+	feather: int | None = None,
+	despill: bool = True,
+	save_profile: str = DEFAULT_SAVE_PROFILE,
+	crop: bool = False,
+	output_format: str | None = None,
+	cache_dir: Path | None = None,
+	cache_size: int = DEFAULT_CACHE_SIZE >> 20,
+	auto: bool = False,
+	connected: bool = False,
+	seed: Sequence[str] | None = None,
+	profile: bool = False,
+	metrics_json: Path | None = None,
+	metrics_prom: Path | None = None,
+	trace_allocations: bool = False,
+	lut: int | None = None,
 ) -> None:
 	"""
 	Make a specific color transparent in an image or PDF page.
 
 	Args:
 	    input_file: Path to input image or PDF file.
-	    output_file: Path to output PNG file.
-	    color: Target color in format R,G,B or #RRGGBB (default: white).
+	    output_file: Path to the output file; its extension selects the format
+	        unless ``output_format`` is given.
+	    color: Target color in format R,G,B or #RRGGBB (default: white), or
+	        several of them, each optionally suffixed with ":TOLERANCE".
 	    tolerance: Color matching tolerance (0-255).
 	    page: PDF page number (0-based, default: first page).
-	    dpi: Output DPI for PNG files.
+	    dpi: Resolution PDF pages are rasterized at, and output DPI for PNG files.
+	    clip: Optional PDF page region to rasterize, "x0,y0,x1,y1" in points.
+	    stream: Process the image in bands of rows and write the PNG
+	        incrementally, so memory is bounded by the band size.
+	    band_rows: Number of pixel rows per band when streaming.
+	    memmap_above: Back working arrays of at least this many MiB with a
+	        memory-mapped scratch file instead of heap memory.
+	    metric: Color distance metric; the tolerance is in its units.
+	    feather: Soft matte width: alpha ramps from transparent at the
+	        tolerance to opaque at tolerance + feather.
+	    despill: With ``feather``, remove the background color from the
+	        semi-transparent edge pixels.
+	    save_profile: Save profile: "fast", "balanced" or "smallest".
+	    crop: Crop the output to its pixels that are not fully transparent.
+	    output_format: Output format (default: from the output extension).
+	    cache_dir: Directory of a result cache; an input already processed
+	        with the same options is copied from it.
+	    cache_size: Size bound of the result cache in MiB.
+	    auto: Detect the background colors of the input and the tolerances
+	        to mask them with, instead of using ``color`` and ``tolerance``.
+	    connected: Only remove matching pixels connected to the border of the
+	        image, keeping enclosed areas of the color.
+	    seed: Pixels "x,y" to remove the connected matching area of instead of
+	        the border; implies ``connected``.
+	    profile: Print the time, throughput and bytes of every stage.
+	    metrics_json: Path of a JSON file receiving the stage metrics.
+	    metrics_prom: Path of a Prometheus textfile receiving the stage
+	        metrics, e.g. in the node exporter's textfile directory.
+	    trace_allocations: Also measure the peak memory allocated by every
+	        stage, with ``tracemalloc``.
+	    lut: Resolution of a compiled 3D color lookup table to mask with
+	        (32 or 256).
 
 	"""
 	try:
-		target_color = parse_color(color)
+		target_color, tolerance = (
+			(AUTO, tolerance) if auto else parse_targets(color, tolerance)
+		)
+		clip_rect = parse_clip(clip) if clip else None
+		seeds = [parse_point(point) for point in seed] if seed else None
+		if stream and cache_dir is not None:
+			raise ValueError("The result cache cannot be used with streaming")
+		cache = _open_cache(cache_dir, cache_size)
+		metrics = _open_metrics(profile, metrics_json, metrics_prom, trace_allocations)
 
-		processor = ImageProcessor()
+		processor = ImageProcessor(
+			memmap_threshold=_mib_to_bytes(memmap_above),
+			lut_resolution=lut,
+			metric=metric,
+			feather=feather,
+			despill=despill,
+			save_profile=save_profile,
+			crop=crop,
+			connected=connected,
+			seeds=seeds,
+			output_format=output_format,
+			cache=cache,
+			instrument=metrics,
+		)
 
-		with console.status("Loading image..."):
-			image = processor.load_image(input_file)
+		if stream:
+			with (
+				get_console().status("Streaming image..."),
+				warnings.catch_warnings(record=True) as caught,
+			):
+				warnings.simplefilter("always", FullDecodeWarning)
+				processor.make_transparent_streaming(
+					input_file,
+					output_file,
+					target_color,
+					tolerance,
+					page=page,
+					dpi=dpi,
+					clip=clip_rect,
+					output_dpi=(dpi, dpi),
+					band_rows=band_rows,
+				)
+			for warning in caught:
+				_print_panel(str(warning.message), "Not streamed", "yellow")
+			_report_metrics(metrics, profile, metrics_json, metrics_prom)
+			_print_success(input_file, output_file)
+			return
 
-		with console.status("Processing image..."):
-			result = processor.make_transparent(image, target_color, tolerance)
+		if cache is not None:
+			with get_console().status("Processing image..."):
+				cached = processor.process_file(
+					input_file,
+					output_file,
+					target_color,
+					tolerance,
+					page=page,
+					dpi=dpi,
+					clip=clip_rect,
+					output_dpi=(dpi, dpi),
+				)
+			_report_metrics(metrics, profile, metrics_json, metrics_prom)
+			_print_success(input_file, output_file, cached)
+			return
 
-		with console.status("Saving result..."):
-			processor.save_image(result, output_file, (dpi, dpi))
+		with get_console().status("Loading image..."):
+			data = processor.load_array(input_file, page=page, dpi=dpi, clip=clip_rect)
 
-		console.print(
-			Panel(
-				f"Successfully processed [bold]{input_file}[/] to [bold]{output_file}[/]",
-				title="Success",
-				border_style="green",
-			)
+		with get_console().status("Processing image..."):
+			data = processor.make_transparent_array(data, target_color, tolerance)
+
+		with get_console().status("Saving result..."):
+			processor.save_array(data, output_file, (dpi, dpi))
+
+		_report_metrics(metrics, profile, metrics_json, metrics_prom)
+		_print_success(input_file, output_file)
+
+	except Exception as e:
+		_print_panel(str(e), "Error", "red")
+		raise typer.Exit(1) from None
+
+
+def _mib_to_bytes(mib: int | None) -> int | None:
+	"""Convert an optional size in MiB to bytes."""
+	return None if mib is None else mib * 2**20
+
+
+def _open_cache(cache_dir: Path | None, cache_size: int) -> ResultCache | None:
+	"""Return the result cache in ``cache_dir``, or None without one."""
+	if cache_dir is None:
+		return None
+	return ResultCache(cache_dir, _mib_to_bytes(cache_size))
+
+
+def _open_metrics(
+	profile: bool,
+	metrics_json: Path | None,
+	metrics_prom: Path | None,
+	trace_allocations: bool,
+) -> StageMetrics | None:
+	"""Return the stage metrics to collect, or None when none are asked for."""
+	if not (profile or metrics_json or metrics_prom or trace_allocations):
+		return None
+	return StageMetrics(trace_allocations)
+
+
+def _report_metrics(
+	metrics: StageMetrics | None,
+	profile: bool,
+	metrics_json: Path | None,
+	metrics_prom: Path | None,
+) -> None:
+	"""Print the stage metrics and write them to the files asked for."""
+	if metrics is None:
+		return
+	if metrics_json is not None:
+		metrics_json.parent.mkdir(parents=True, exist_ok=True)
+		metrics_json.write_text(
+			json.dumps(metrics.to_dict(), indent=2), encoding="utf-8"
 		)
+	if metrics_prom is not None:
+		write_metrics(metrics, metrics_prom)
+	if not profile:
+		return
+
+	from rich.table import Table  # noqa: PLC0415
+
+	columns = ["Stage", "Runs", "Wall s", "CPU s", "MP/s", "In MiB", "Out MiB"]
+	traced = any(t.peak_allocated is not None for t in metrics.stages.values())
+	if traced:
+		columns.append("Peak alloc MiB")
+	table = Table(*columns, title="Stages")
+	for name, totals in metrics.stages.items():
+		row = [
+			name,
+			str(totals.count),
+			f"{totals.wall_seconds:.3f}",
+			f"{totals.cpu_seconds:.3f}",
+			f"{totals.throughput:.1f}" if totals.pixels else "-",
+			f"{totals.bytes_in / 2**20:.2f}",
+			f"{totals.bytes_out / 2**20:.2f}",
+		]
+		if traced:
+			peak = totals.peak_allocated
+			row.append("-" if peak is None else f"{peak / 2**20:.1f}")
+		table.add_row(*row)
+	get_console().print(table)
+
+
+def _print_success(input_file: Path, output_file: Path, cached: bool = False) -> None:
+	"""Print the success panel for a single processed file."""
+	source = " (from cache)" if cached else ""
+	_print_panel(
+		f"Successfully processed [bold]{input_file}[/] to [bold]{output_file}[/]"
+		f"{source}",
+		"Success",
+		"green",
+	)
 
+
+def batch(
+	source: Path,
+	output_dir: Path,
+	pattern: str = "*",
+	color: str | Sequence[str] = "255,255,255",
+	tolerance: int = 10,
+	dpi: int = 300,
+	workers: int | None = None,
+	report: Path | None = None,
+	memmap_above: int | None = None,
+	lut: int | None = None,
+	metric: str = "box",
+	feather: int | None = None,
+	despill: bool = True,
+	save_profile: str = DEFAULT_SAVE_PROFILE,
+	crop: bool = False,
+	output_format: str | None = None,
+	cache_dir: Path | None = None,
+	cache_size: int = DEFAULT_CACHE_SIZE >> 20,
+	incremental: bool = False,
+	auto: bool = False,
+	connected: bool = False,
+	profile: bool = False,
+	metrics_json: Path | None = None,
+	metrics_prom: Path | None = None,
+	trace_allocations: bool = False,
+) -> None:
+	"""
+	Make a specific color transparent in every image of a directory or glob.
+
+	Args:
+	    source: Input directory or glob pattern.
+	    output_dir: Directory receiving the results.
+	    pattern: Glob pattern used when ``source`` is a directory.
+	    color: Target color in format R,G,B or #RRGGBB (default: white), or
+	        several of them, each optionally suffixed with ":TOLERANCE".
+	    tolerance: Color matching tolerance (0-255).
+	    dpi: Resolution PDF pages are rasterized at, and output DPI for PNG files.
+	    workers: Number of worker processes (default: CPU count).
+	    report: Path of the JSON report (default: rmbg-report.json in output_dir).
+	    memmap_above: Back working arrays of at least this many MiB with a
+	        memory-mapped scratch file instead of heap memory.
+	    lut: Resolution of a compiled 3D color lookup table to mask with
+	        (32 or 256), built once per worker.
+	    metric: Color distance metric; the tolerance is in its units.
+	    feather: Soft matte width: alpha ramps from transparent at the
+	        tolerance to opaque at tolerance + feather.
+	    despill: With ``feather``, de-spill the semi-transparent edge pixels.
+	    save_profile: Save profile: "fast", "balanced" or "smallest".
+	    crop: Crop the outputs to their pixels that are not fully transparent.
+	    output_format: Format of the results (default: PNG).
+	    cache_dir: Directory of a result cache shared by the workers.
+	    cache_size: Size bound of the result cache in MiB.
+	    incremental: Skip inputs whose output is up to date according to the
+	        manifest in ``output_dir`` from earlier runs, and update it.
+	    auto: Detect the background colors and tolerances of every input
+	        instead of using ``color`` and ``tolerance``.
+	    connected: Only remove matching pixels connected to the border of
+	        each image, keeping enclosed areas of the color.
+	    profile: Print the time, throughput and bytes of every stage.
+	    metrics_json: Path of a JSON file receiving the stage metrics.
+	    metrics_prom: Path of a Prometheus textfile receiving the stage
+	        metrics, e.g. in the node exporter's textfile directory.
+	    trace_allocations: Also measure the peak memory allocated by every
+	        stage, with ``tracemalloc``.
+
+	"""
+	try:
+		target_color, tolerance = (
+			(AUTO, tolerance) if auto else parse_targets(color, tolerance)
+		)
+		cache = _open_cache(cache_dir, cache_size)
+		metrics = _open_metrics(profile, metrics_json, metrics_prom, trace_allocations)
+		validate_options(lut, metric, feather, save_profile, output_format)
+		suffix = get_writer(output_format or "png", save_profile).suffixes[0]
+		inputs = collect_inputs(source, pattern)
+	except Exception as e:
+		_print_panel(str(e), "Error", "red")
+		raise typer.Exit(1) from None
+
+	input_root = source if source.is_dir() else None
+	tasks = [
+		BatchTask(
+			input_file,
+			output_path_for(input_file, output_dir, input_root, suffix),
+			target_color,
+			tolerance,
+			dpi,
+		)
+		for input_file in inputs
+	]
+
+	with _progress() as progress:
+		bar = progress.add_task("Processing images...", total=len(tasks))
+		summary = run_batch(
+			tasks,
+			workers,
+			on_result=lambda _: progress.advance(bar),
+			memmap_threshold=_mib_to_bytes(memmap_above),
+			lut_resolution=lut,
+			metric=metric,
+			feather=feather,
+			despill=despill,
+			save_profile=save_profile,
+			crop=crop,
+			connected=connected,
+			output_format=output_format,
+			cache=cache,
+			manifest=Manifest(output_dir / MANIFEST_FILENAME) if incremental else None,
+			instrument=metrics,
+		)
+
+	_report_metrics(metrics, profile, metrics_json, metrics_prom)
+	report = report or output_dir / "rmbg-report.json"
+	_finish(summary, report, "files")
+
+
+def pdf(
+	input_file: Path,
+	output: Path,
+	pages: str = "all",
+	color: str | Sequence[str] = "255,255,255",
+	tolerance: int = 10,
+	dpi: int = 300,
+	workers: int | None = None,
+	report: Path | None = None,
+	clip: str | None = None,
+	metric: str = "box",
+	feather: int | None = None,
+	despill: bool = True,
+	save_profile: str = DEFAULT_SAVE_PROFILE,
+	crop: bool = False,
+	output_format: str | None = None,
+	auto: bool = False,
+	connected: bool = False,
+	profile: bool = False,
+	metrics_json: Path | None = None,
+	metrics_prom: Path | None = None,
+	trace_allocations: bool = False,
+	lut: int | None = None,
+) -> None:
+	"""
+	Make a specific color transparent on every selected page of a PDF.
+
+	Args:
+	    input_file: Path to input PDF file.
+	    output: Directory receiving numbered pages, or a .tif/.tiff or .pdf
+	        file receiving all pages as one multi-page output.
+	    pages: Pages to process, e.g. "all" or "0,3-5,10-".
+	    color: Target color in format R,G,B or #RRGGBB (default: white), or
+	        several of them, each optionally suffixed with ":TOLERANCE".
+	    tolerance: Color matching tolerance (0-255).
+	    dpi: Resolution the pages are rasterized at and stored with.
+	    workers: Number of worker processes (default: CPU count).
+	    report: Path of the JSON report (default: next to the output).
+	    clip: Optional page region to rasterize, "x0,y0,x1,y1" in points.
+	    metric: Color distance metric; the tolerance is in its units.
+	    feather: Soft matte width: alpha ramps from transparent at the
+	        tolerance to opaque at tolerance + feather.
+	    despill: With ``feather``, de-spill the semi-transparent edge pixels.
+	    save_profile: Save profile: "fast", "balanced" or "smallest".
+	    crop: Crop the outputs to their pixels that are not fully transparent.
+	    output_format: Format of the numbered pages or of the multi-page
+	        file (default: PNG pages, or from the output extension).
+	    auto: Detect the background colors and tolerances of every page
+	        instead of using ``color`` and ``tolerance``.
+	    connected: Only remove matching pixels connected to the border of
+	        each page, keeping enclosed areas of the color.
+	    profile: Print the time, throughput and bytes of every stage.
+	    metrics_json: Path of a JSON file receiving the stage metrics.
+	    metrics_prom: Path of a Prometheus textfile receiving the stage
+	        metrics, e.g. in the node exporter's textfile directory.
+	    trace_allocations: Also measure the peak memory allocated by every
+	        stage, with ``tracemalloc``.
+	    lut: Resolution of a compiled 3D color lookup table to mask with
+	        (32 or 256), built once per worker.
+
+	"""
+	try:
+		target_color, tolerance = (
+			(AUTO, tolerance) if auto else parse_targets(color, tolerance)
+		)
+		clip_rect = parse_clip(clip) if clip else None
+		metrics = _open_metrics(profile, metrics_json, metrics_prom, trace_allocations)
+		validate_options(lut, metric, feather, save_profile, output_format)
+		page_count = ImageProcessor().page_count(input_file)
+		page_numbers = parse_page_range(pages, page_count)
 	except Exception as e:
-		console.print(
-			Panel(
-				str(e),
-				title="Error",
-				border_style="red",
+		_print_panel(str(e), "Error", "red")
+		raise typer.Exit(1) from None
+
+	with _progress() as progress:
+		bar = progress.add_task("Rendering pages...", total=len(page_numbers))
+		summary = run_pdf(
+			input_file,
+			output,
+			page_numbers,
+			target_color,
+			tolerance,
+			dpi,
+			workers,
+			on_result=lambda _: progress.advance(bar),
+			clip=clip_rect,
+			lut_resolution=lut,
+			metric=metric,
+			feather=feather,
+			despill=despill,
+			save_profile=save_profile,
+			crop=crop,
+			connected=connected,
+			output_format=output_format,
+			instrument=metrics,
+		)
+
+	_report_metrics(metrics, profile, metrics_json, metrics_prom)
+	if report is None:
+		multipage = output.suffix.lower() in MULTIPAGE_SUFFIXES
+		report_dir = output.parent if multipage else output
+		report = report_dir / f"{input_file.stem}-report.json"
+	_finish(summary, report, "pages")
+
+
+def serve(
+	host: str = "127.0.0.1",
+	port: int = 8765,
+	socket_path: Path | None = None,
+	workers: int = 1,
+	max_pending: int | None = None,
+	memmap_above: int | None = None,
+	lut: int | None = None,
+	metric: str = "box",
+	feather: int | None = None,
+	despill: bool = True,
+	save_profile: str = DEFAULT_SAVE_PROFILE,
+	crop: bool = False,
+	output_format: str | None = None,
+	quiet: bool = False,
+	max_body: int | None = None,
+) -> None:
+	"""
+	Keep warm workers and process images sent over HTTP until interrupted.
+
+	Args:
+	    host: Address to listen on.
+	    port: TCP port to listen on.
+	    socket_path: Listen on this Unix socket instead of host and port.
+	    workers: Number of requests processed at the same time; several
+	        workers run in separate processes.
+	    max_pending: Maximum number of requests in flight before the server
+	        answers 503 (default: 4 per worker).
+	    memmap_above: Back working arrays of at least this many MiB with a
+	        memory-mapped scratch file instead of heap memory.
+	    lut: Resolution of a compiled 3D color lookup table to mask with
+	        (32 or 256), built once per worker.
+	    metric: Color distance metric; the tolerance is in its units.
+	    feather: Soft matte width: alpha ramps from transparent at the
+	        tolerance to opaque at tolerance + feather.
+	    despill: With ``feather``, de-spill the semi-transparent edge pixels.
+	    save_profile: Save profile: "fast", "balanced" or "smallest".
+	    crop: Crop the outputs to their pixels that are not fully transparent.
+	    output_format: Format of the images returned in responses
+	        (default: PNG).
+	    quiet: Do not log each request.
+	    max_body: Largest request body in MiB, larger ones are refused with
+	        413 (default: 256).
+
+	"""
+	from .server import DEFAULT_MAX_BODY, Dispatcher, RmbgServer  # noqa: PLC0415
+
+	try:
+		with get_console().status("Starting workers..."):
+			dispatcher = Dispatcher(
+				workers,
+				max_pending,
+				memmap_threshold=_mib_to_bytes(memmap_above),
+				lut_resolution=lut,
+				metric=metric,
+				feather=feather,
+				despill=despill,
+				save_profile=save_profile,
+				crop=crop,
+				output_format=output_format,
 			)
+		try:
+			max_bytes = DEFAULT_MAX_BODY if max_body is None else max_body << 20
+			server = RmbgServer(dispatcher, host, port, socket_path, quiet, max_bytes)
+		except BaseException:
+			dispatcher.close()
+			raise
+	except Exception as e:
+		_print_panel(str(e), "Error", "red")
+		raise typer.Exit(1) from None
+
+	with server:
+		_print_panel(
+			f"Listening on [bold]{server.address}[/] with {dispatcher.workers} "
+			f"worker(s), at most {dispatcher.max_pending} requests in flight\n"
+			"POST images to [bold]/process[/], Ctrl+C to stop",
+			"rmbg serve",
+			"green",
+		)
+		with contextlib.suppress(KeyboardInterrupt):
+			server.serve_forever()
+
+
+def cache_stats(cache_dir: Path, clear: bool = False) -> None:
+	"""
+	Print the statistics of a result cache, optionally emptying it.
+
+	Args:
+	    cache_dir: Directory of the result cache.
+	    clear: Remove every entry and reset the counters after printing.
+
+	"""
+	from rich.table import Table  # noqa: PLC0415
+
+	if not (cache_dir / CACHE_FILENAME).exists():
+		_print_panel(f"No result cache in {cache_dir}", "Error", "red")
+		raise typer.Exit(1)
+	cache = ResultCache(cache_dir)
+	stats = cache.stats()
+	table = Table("Statistic", "Value", title=f"Result cache in {cache_dir}")
+	table.add_row("Hits", str(stats.hits))
+	table.add_row("Misses", str(stats.misses))
+	table.add_row("Hit rate", f"{stats.hit_rate:.1%}")
+	table.add_row("Stores", str(stats.stores))
+	table.add_row("Evictions", str(stats.evictions))
+	table.add_row("Entries", str(stats.entries))
+	table.add_row("Size", f"{stats.size / 2**20:.1f} MiB")
+	get_console().print(table)
+	if clear:
+		cache.clear()
+		get_console().print("Cache cleared")
+	cache.close()
+
+
+def detect(
+	input_file: Path,
+	page: int | None = None,
+	dpi: int = 300,
+	metric: str = "box",
+) -> None:
+	"""
+	Print the background colors of an image or PDF page, with tolerances.
+
+	Args:
+	    input_file: Path to input image or PDF file.
+	    page: PDF page number (0-based, default: first page).
+	    dpi: Resolution PDF pages are rasterized at.
+	    metric: Color distance metric the tolerances are suggested in.
+
+	"""
+	from rich.table import Table  # noqa: PLC0415
+
+	try:
+		processor = ImageProcessor(metric=metric)
+		data = processor.load_array(input_file, page=page, dpi=dpi)
+		estimate = detect_background(data, processor.metric)
+	except Exception as e:
+		_print_panel(str(e), "Error", "red")
+		raise typer.Exit(1) from None
+
+	if not estimate.colors:
+		_print_panel(
+			f"No background color found along the edges of {input_file}",
+			"Background",
+			"yellow",
 		)
+		return
+	table = Table("Color", "RGB", "Tolerance", "Coverage", title=str(input_file))
+	for color, tolerance, share in zip(
+		estimate.colors, estimate.tolerances, estimate.coverage, strict=True
+	):
+		hex_color = "#{:02x}{:02x}{:02x}".format(*color)
+		table.add_row(
+			f"[on {hex_color}]    [/] {hex_color}",
+			",".join(map(str, color)),
+			str(tolerance),
+			f"{share:.1%}",
+		)
+	get_console().print(table)
+	options = " ".join(
+		f"--color {','.join(map(str, color))}:{tolerance}"
+		for color, tolerance in zip(estimate.colors, estimate.tolerances, strict=True)
+	)
+	get_console().print(f"Suggested options: {options} --metric {metric}")
+
+
+def bench(
+	output: Path = Path("rmbg-bench.json"),
+	megapixels: Sequence[float] = DEFAULT_MEGAPIXELS,
+	pdf_pages: int = DEFAULT_PDF_PAGES,
+	repeat: int = DEFAULT_REPEAT,
+	baseline: Path | None = None,
+	max_slowdown: float = DEFAULT_MAX_SLOWDOWN,
+	isolate: bool = True,
+) -> None:
+	"""
+	Benchmark decoding, masking and encoding on synthetic inputs.
+
+	Args:
+	    output: Path of the JSON report; store it to use it as a baseline.
+	    megapixels: Sizes of the synthetic images.
+	    pdf_pages: Pages of the synthetic PDF (0 for none).
+	    repeat: Number of times every image or page is processed.
+	    baseline: Report of an earlier run to compare against; regressions
+	        make the command exit non-zero.
+	    max_slowdown: Largest tolerated growth of a stage's median latency
+	        or a case's peak RSS over the baseline, as a fraction.
+	    isolate: Run every case in a fresh process, for per-case peak RSS.
+
+	"""
+	from rich.table import Table  # noqa: PLC0415
+
+	try:
+		cases = default_cases(megapixels, pdf_pages)
+		previous = load_report(baseline) if baseline is not None else None
+		with _progress() as progress:
+			bar = progress.add_task("Benchmarking...", total=len(cases))
+			report = run_suite(
+				cases,
+				repeat,
+				isolate=isolate,
+				on_result=lambda _: progress.advance(bar),
+			)
+		save_report(report, output)
+	except Exception as e:
+		_print_panel(str(e), "Error", "red")
 		raise typer.Exit(1) from None
+
+	columns = ("Case", "Stage", "p50 ms", "p90 ms", "p99 ms", "MP/s", "Peak RSS")
+	caption = f"Reference workload: {report.calibration_ms:.1f} ms"
+	table = Table(*columns, title="rmbg bench", caption=caption)
+	for result in report.results:
+		rss = "-" if result.peak_rss is None else f"{result.peak_rss / 2**20:.0f} MiB"
+		for stage in STAGES:
+			timings = result.stages[stage]
+			table.add_row(
+				result.case.name if stage == STAGES[0] else "",
+				stage,
+				*(f"{timings.percentile(q) * 1e3:.1f}" for q in (50, 90, 99)),
+				f"{timings.throughput:.1f}",
+				rss if stage == STAGES[0] else "",
+			)
+	get_console().print(table)
+	get_console().print(f"Report written to [bold]{output}[/]")
+
+	if previous is None:
+		return
+	regressions = find_regressions(report.to_dict(), previous, max_slowdown)
+	if regressions:
+		_print_panel("\n".join(regressions), f"Regressions against {baseline}", "red")
+		raise typer.Exit(1)
+	_print_panel(
+		f"No stage more than {max_slowdown:.0%} slower than {baseline}",
+		"Baseline",
+		"green",
+	)
+
+
+def _finish(summary: BatchSummary, report: Path, unit: str) -> None:
+	"""Write the report, print the summary and exit non-zero on failures."""
+	write_report(summary, report)
+
+	for result in summary.results:
+		if not result.ok:
+			get_console().print(f"[red]Failed[/] {result.input_file}: {result.error}")
+
+	skipped = f"{summary.skipped} already up to date\n" if summary.skipped else ""
+	cached = f"{summary.cached} copied from the cache\n" if summary.cached else ""
+	_print_panel(
+		f"Processed [bold]{summary.succeeded}[/] of {len(summary.results)} {unit} "
+		f"with {summary.workers} worker(s) in {summary.elapsed:.2f}s "
+		f"([bold]{summary.throughput:.2f}[/] images/sec)\n"
+		f"{skipped}{cached}Report written to [bold]{report}[/]",
+		"Batch complete" if summary.failed == 0 else "Batch completed with errors",
+		"green" if summary.failed == 0 else "yellow",
+	)
+	if summary.failed:
+		raise typer.Exit(1)
@@ -5,27 +5,289 @@ This module provides the fundamental functionality for making specific colors
 transparent in images. It handles both image and PDF input formats.
 """
 
+import io
+from collections.abc import Iterable, Iterator, Sequence
+from functools import cached_property
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import fitz
 import numpy as np
 from PIL import Image
-from rich.console import Console
+
+from .cache import ResultCache, cache_key, source_digest
+from .detect import AUTO, detect_background
+from .encoding import CropBox, crop_to_content
+from .instrument import (
+	Collector,
+	output_size,
+	source_size,
+	span,
+	stream_position,
+)
+from .masking import OPAQUE, ColorSpec, ToleranceSpec
+from .matte import matte_alpha, soft_transparency
+from .metrics import ColorMetric, get_metric, metric_alpha
+from .pixels import (
+	PDF_BASE_DPI,
+	ClipRect,
+	ImageDestination,
+	ImageSource,
+	ResolvedSource,
+	image_to_rgba,
+	open_image,
+	open_pdf,
+	pixmap_to_rgba,
+	resolve_source,
+	scratch_rgba,
+)
+from .region import Point, connected_mask
+from .rules import LUT_RESOLUTIONS, compile_rule
+from .streaming import DEFAULT_BAND_ROWS, open_bands, stream_transparent
+from .writers import (
+	DEFAULT_SAVE_PROFILE,
+	WRITERS,
+	OutputWriter,
+	PngWriter,
+	get_writer,
+	writer_for_path,
+)
+
+if TYPE_CHECKING:
+	import fitz
+	from rich.console import Console
+
+MULTIPAGE_SUFFIXES = frozenset(
+	suffix
+	for writer in WRITERS.values()
+	if writer.multipage
+	for suffix in writer.suffixes
+)
+
+
+def validate_options(
+	lut_resolution: int | None = None,
+	metric: str | ColorMetric = "box",
+	feather: int | None = None,
+	save_profile: str = DEFAULT_SAVE_PROFILE,
+	output_format: str | OutputWriter | None = None,
+) -> None:
+	"""
+	Check the processing options before any work is handed out.
+
+	``ImageProcessor`` runs the same checks when it is built, so a batch can
+	reject bad options up front instead of in every worker.
+
+	Args:
+	    lut_resolution: See ``ImageProcessor``.
+	    metric: See ``ImageProcessor``.
+	    feather: See ``ImageProcessor``.
+	    save_profile: See ``ImageProcessor``.
+	    output_format: See ``ImageProcessor``.
+
+	Raises:
+	    ValueError: If the lookup table resolution, metric, feather, save
+	        profile or output format is not supported.
+
+	"""
+	if lut_resolution is not None and lut_resolution not in LUT_RESOLUTIONS:
+		raise ValueError(
+			f"LUT resolution must be one of {LUT_RESOLUTIONS}, got {lut_resolution}"
+		)
+	if feather is not None and feather <= 0:
+		raise ValueError(f"Feather must be positive, got {feather}")
+	get_metric(metric)
+	# Resolving the PNG writer validates the profile name
+	get_writer("png", save_profile)
+	if output_format is not None:
+		get_writer(output_format, save_profile)
 
 
 class ImageProcessor:
 	"""Core class for processing images and making colors transparent."""
 
-	def __init__(self) -> None:
-		"""Initialize the ImageProcessor."""
-		self._console = Console()
+	def __init__(  # noqa: PLR0913, PLR0917
+		self,
+		memmap_threshold: int | None = None,
+		scratch_dir: str | Path | None = None,
+		lut_resolution: int | None = None,
+		metric: str | ColorMetric = "box",
+		feather: int | None = None,
+		despill: bool = True,
+		save_profile: str = DEFAULT_SAVE_PROFILE,
+		crop: bool = False,
+		output_format: str | OutputWriter | None = None,
+		cache: ResultCache | None = None,
+		connected: bool = False,
+		seeds: Sequence[Point] | None = None,
+		instrument: Collector | None = None,
+	) -> None:
+		"""
+		Initialize the ImageProcessor.
+
+		Args:
+		    memmap_threshold: Size in bytes of the RGBA working array from which
+		        it is backed by a memory-mapped scratch file instead of heap
+		        memory, so the OS can page it out under pressure. None (the
+		        default) keeps every array on the heap.
+		    scratch_dir: Directory for the scratch files (default: the system
+		        temporary directory).
+		    lut_resolution: Mask through a compiled, cached 3D color lookup
+		        table with this many grid points per channel (256 is exact,
+		        32 bins colors in 8x8x8 blocks) instead of comparing channels.
+		        Pays off when the same parameters are applied to many images
+		        or many colors are matched at once.
+		    metric: Color distance metric deciding which pixels match, by name
+		        ("box", "euclidean", "weighted", "cie76", "ciede2000") or as a
+		        ``ColorMetric`` instance. Tolerances are in its units.
+		    feather: Soft matte width. Pixels within the tolerance become fully
+		        transparent and the alpha then ramps up to opaque at
+		        ``tolerance + feather``, instead of a hard 0/255 cut. The matte
+		        is multiplied into any existing alpha. None (the default) keeps
+		        binary transparency.
+		    despill: With ``feather``, remove the background color from the
+		        semi-transparent edge pixels.
+		    save_profile: Save profile trading encode time for file size:
+		        "fast", "balanced" (the default) or "smallest". Each output
+		        format maps it onto its own options; see ``rmbg.writers``.
+		        Streaming output only uses the PNG zlib level.
+		    crop: Crop saved images to the bounding box of the pixels that
+		        are not fully transparent. Not applied to multi-page files or
+		        when streaming.
+		    output_format: Format to save in, by name ("png", "webp", "avif",
+		        "tiff", "pdf") or as an ``OutputWriter`` with its own options.
+		        None (the default) picks the format from the extension of the
+		        output path, and PNG for streams.
+		    cache: Result cache consulted by ``process_file``, so that inputs
+		        already processed with the same options are copied from it
+		        instead of being decoded, masked and encoded again.
+		    connected: Only make matching pixels transparent where they are
+		        connected to the image border, like a flood fill from the
+		        edges, so enclosed areas of the background color (white text
+		        in a logo) are kept. See ``rmbg.region``. Not available when
+		        streaming.
+		    seeds: (x, y) pixel coordinates to flood fill from instead of the
+		        border; implies ``connected``.
+		    instrument: Collector receiving the wall and CPU time, pixels,
+		        bytes and optionally allocations of every stage the processor
+		        runs, such as ``StageMetrics``. See ``rmbg.instrument``.
+
+		Raises:
+		    ValueError: If the lookup table resolution, metric, feather, save
+		        profile or output format is not supported.
+
+		"""
+		validate_options(lut_resolution, metric, feather, save_profile, output_format)
+		self.memmap_threshold = memmap_threshold
+		self.scratch_dir = scratch_dir
+		self.lut_resolution = lut_resolution
+		self.metric = get_metric(metric)
+		self.feather = feather
+		self.despill = despill
+		self.save_profile = save_profile
+		self.crop = crop
+		self.writer = (
+			None if output_format is None else get_writer(output_format, save_profile)
+		)
+		self._default_writer = get_writer("png", save_profile)
+		self.cache = cache
+		self.seeds = None if seeds is None else tuple(map(tuple, seeds))
+		self.connected = connected or self.seeds is not None
+		self.instrument = instrument
 
-	def load_image(self, file_path: str | Path) -> Image.Image:
+	def writer_for(self, output: ImageDestination) -> OutputWriter:
 		"""
-		Load an image from a file path.
+		Return the writer used to save to ``output``.
 
 		Args:
-		    file_path: Path to the image file (PNG, JPG, etc.) or PDF file.
+		    output: Output path or writable binary stream.
+
+		Returns:
+		    The ``output_format`` writer if one was given, else the writer
+		    of the path's extension, or PNG for a stream.
+
+		Raises:
+		    ValueError: If the extension names no supported format.
+
+		"""
+		if self.writer is not None:
+			return self.writer
+		if isinstance(output, str | Path):
+			return writer_for_path(output, self.save_profile)
+		return self._default_writer
+
+	@cached_property
+	def _console(self) -> "Console":
+		"""Rich console for status output, created on first use."""
+		from rich.console import Console  # noqa: PLC0415
+
+		return Console()
+
+	def _outer_tolerance(self, tolerance: ToleranceSpec) -> ToleranceSpec | None:
+		"""Return the soft matte outer tolerance for ``feather``, else None."""
+		if self.feather is None:
+			return None
+		if isinstance(tolerance, int | np.integer):
+			return int(tolerance) + self.feather
+		return [int(t) + self.feather for t in tolerance]
+
+	def _wants_memmap(self, width: int, height: int) -> bool:
+		"""Return whether a width x height RGBA array should be memory-mapped."""
+		nbytes = width * height * 4
+		return self.memmap_threshold is not None and 0 < self.memmap_threshold <= nbytes
+
+	def _load_scratch_array(
+		self,
+		source: ResolvedSource,
+		is_pdf: bool,
+		page: int | None,
+		dpi: int,
+		clip: ClipRect | None,
+	) -> np.ndarray | None:
+		"""
+		Load a file into a memory-mapped RGBA array if it exceeds the threshold.
+
+		The pixels are copied into the scratch file band by band, so a PDF page
+		is never rendered into a full-size heap buffer.
+
+		Returns:
+		    The memory-mapped array, or None if the image is below the threshold.
+
+		"""
+		try:
+			bands = open_bands(source, page, dpi, clip)
+		except ValueError as e:
+			if is_pdf:
+				raise ValueError(f"Failed to load PDF page: {e}") from None
+			raise
+		with bands:
+			if not self._wants_memmap(bands.width, bands.height):
+				return None
+			data = scratch_rgba(bands.height, bands.width, self.scratch_dir)
+			row = 0
+			for band in bands:
+				data[row : row + len(band)] = band
+				row += len(band)
+		return data
+
+	def load_image(
+		self,
+		file_path: ImageSource,
+		page: int | None = None,
+		dpi: int = PDF_BASE_DPI,
+		clip: ClipRect | None = None,
+	) -> Image.Image:
+		"""
+		Load an image from a file path, bytes or a binary stream.
+
+		Args:
+		    file_path: Path to the image file (PNG, JPG, etc.) or PDF file, or
+		        the file's contents as bytes, ``memoryview`` or a readable
+		        binary stream. In-memory PDFs are recognized by their header.
+		    page: PDF page number to load (0-based, default: first page).
+		        Ignored for image files.
+		    dpi: Resolution PDF pages are rasterized at. Ignored for image files.
+		    clip: Optional (x0, y0, x1, y1) region of the PDF page, in points,
+		        to rasterize instead of the whole page. Ignored for image files.
 
 		Returns:
 		    PIL Image object.
@@ -35,25 +297,113 @@ class ImageProcessor:
 		    ValueError: If the file format is not supported.
 
 		"""
-		file_path = Path(file_path)
-		if not file_path.exists():
-			raise FileNotFoundError(f"File not found: {file_path}")
-
-		if file_path.suffix.lower() == ".pdf":
-			return self._load_pdf_page(file_path)
+		source, is_pdf = resolve_source(file_path)
+		if is_pdf:
+			with span(self.instrument, "render") as stage:
+				image = None
+				if self.memmap_threshold is not None:
+					data = self._load_scratch_array(source, True, page, dpi, clip)
+					if data is not None:
+						image = self._wrap_page_array(data, dpi)
+				if image is None:
+					image = self._load_pdf_page(source, page or 0, dpi, clip)
+				if stage.enabled:
+					stage.add(image.width * image.height, source_size(source))
+			return image
 
 		try:
-			return Image.open(file_path)
+			with span(self.instrument, "decode") as stage:
+				image = open_image(source)
+				if stage.enabled:
+					# Decode now instead of on first use, to time it here
+					image.load()
+					stage.add(image.width * image.height, source_size(source))
 		except Exception as e:
 			raise ValueError(f"Failed to load image: {e}") from None
+		return image
+
+	def load_array(
+		self,
+		file_path: ImageSource,
+		page: int | None = None,
+		dpi: int = PDF_BASE_DPI,
+		clip: ClipRect | None = None,
+	) -> np.ndarray:
+		"""
+		Load an image or PDF page as a writable RGBA NumPy array.
+
+		PDF pages are rendered straight into an RGBA pixmap and returned as a
+		view of the pixmap's own buffer, without any intermediate copies.
+		Arrays of at least ``memmap_threshold`` bytes are instead filled band
+		by band into a memory-mapped scratch file.
+
+		Args:
+		    file_path: Path to the image file (PNG, JPG, etc.) or PDF file, or
+		        its contents in memory (see ``load_image``).
+		    page: PDF page number to load (0-based, default: first page).
+		    dpi: Resolution PDF pages are rasterized at.
+		    clip: Optional (x0, y0, x1, y1) PDF page region, in points.
+
+		Returns:
+		    (H, W, 4) uint8 RGBA array.
+
+		Raises:
+		    FileNotFoundError: If the file doesn't exist.
+		    ValueError: If the file format is not supported.
 
-	def _load_pdf_page(self, pdf_path: Path, page_number: int = 0) -> Image.Image:
+		"""
+		source, is_pdf = resolve_source(file_path)
+		with span(self.instrument, "render" if is_pdf else "decode") as stage:
+			data = self._load_array(source, is_pdf, page, dpi, clip)
+			if stage.enabled:
+				stage.add(data.shape[0] * data.shape[1], source_size(source))
+		return data
+
+	def _load_array(
+		self,
+		source: ResolvedSource,
+		is_pdf: bool,
+		page: int | None,
+		dpi: int,
+		clip: ClipRect | None,
+	) -> np.ndarray:
+		"""Load a resolved source as an RGBA array (see ``load_array``)."""
+		if self.memmap_threshold is not None:
+			data = self._load_scratch_array(source, is_pdf, page, dpi, clip)
+			if data is not None:
+				return data
+		if not is_pdf:
+			try:
+				image = open_image(source)
+			except Exception as e:
+				raise ValueError(f"Failed to load image: {e}") from None
+			return image_to_rgba(image)
+
+		doc = None
+		try:
+			doc = open_pdf(source)
+			return self._render_page_array(doc, page or 0, dpi, clip)
+		except Exception as e:
+			raise ValueError(f"Failed to load PDF page: {e}") from None
+		finally:
+			if doc is not None:
+				doc.close()
+
+	def _load_pdf_page(
+		self,
+		pdf_path: ResolvedSource,
+		page_number: int = 0,
+		dpi: int = PDF_BASE_DPI,
+		clip: ClipRect | None = None,
+	) -> Image.Image:
 		"""
 		Load a specific page from a PDF file.
 
 		Args:
-		    pdf_path: Path to the PDF file.
+		    pdf_path: Path to the PDF file, or its bytes.
 		    page_number: Page number to load (0-based).
+		    dpi: Resolution to rasterize the page at.
+		    clip: Optional page region, in points, to rasterize.
 
 		Returns:
 		    PIL Image object of the PDF page.
@@ -64,78 +414,586 @@ class ImageProcessor:
 		"""
 		doc = None
 		try:
-			doc = fitz.open(pdf_path)
-			if page_number >= len(doc):
-				raise ValueError(f"Page number {page_number} out of range")
-
-			page: fitz.Page = doc[page_number]
-			pix: fitz.Pixmap = page.get_pixmap()
-			img: Image.Image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-			return img
+			doc = open_pdf(pdf_path)
+			return self._render_page(doc, page_number, dpi, clip)
 		except Exception as e:
 			raise ValueError(f"Failed to load PDF page: {e}") from None
 		finally:
 			if doc is not None:
 				doc.close()
 
+	def page_count(self, pdf_path: ImageSource) -> int:
+		"""
+		Return the number of pages in a PDF file.
+
+		Args:
+		    pdf_path: Path to the PDF file, or its contents in memory.
+
+		Returns:
+		    Number of pages.
+
+		Raises:
+		    ValueError: If the PDF cannot be opened.
+
+		"""
+		try:
+			with open_pdf(resolve_source(pdf_path)[0]) as doc:
+				return len(doc)
+		except Exception as e:
+			raise ValueError(f"Failed to open PDF: {e}") from None
+
+	def iter_pdf_pages(
+		self,
+		pdf_path: ImageSource,
+		pages: Iterable[int] | None = None,
+		dpi: int = PDF_BASE_DPI,
+		clip: ClipRect | None = None,
+	) -> Iterator[tuple[int, Image.Image]]:
+		"""
+		Render several pages from a single open PDF document.
+
+		The document is opened once and kept open while the pages are rendered,
+		instead of once per page.
+
+		Args:
+		    pdf_path: Path to the PDF file, or its contents in memory.
+		    pages: Page numbers to render (0-based, default: every page).
+		    dpi: Resolution to rasterize the pages at.
+		    clip: Optional page region, in points, to rasterize on every page.
+
+		Yields:
+		    Tuples of page number and PIL Image of that page.
+
+		Raises:
+		    ValueError: If a page number is invalid or the PDF is corrupted.
+
+		"""
+		try:
+			doc = open_pdf(resolve_source(pdf_path)[0])
+		except Exception as e:
+			raise ValueError(f"Failed to open PDF: {e}") from None
+
+		with doc:
+			for page_number in range(len(doc)) if pages is None else pages:
+				try:
+					with span(self.instrument, "render") as stage:
+						image = self._render_page(doc, page_number, dpi, clip)
+						stage.add(image.width * image.height)
+				except Exception as e:
+					raise ValueError(f"Failed to load PDF page: {e}") from None
+				yield page_number, image
+
+	def render_page_array(
+		self,
+		doc: "fitz.Document",
+		page_number: int,
+		dpi: int = PDF_BASE_DPI,
+		clip: ClipRect | None = None,
+	) -> np.ndarray:
+		"""
+		Render one page of a PDF document the caller keeps open.
+
+		Rendering many pages from one open document avoids reparsing the file
+		for every page, as ``load_array`` does.
+
+		Args:
+		    doc: Open PDF document.
+		    page_number: Page number to render (0-based).
+		    dpi: Resolution to rasterize the page at.
+		    clip: Optional (x0, y0, x1, y1) page region in points.
+
+		Returns:
+		    Writable (H, W, 4) uint8 RGBA array, composited over white.
+
+		Raises:
+		    ValueError: If the page number, dpi or clip region is invalid.
+
+		"""
+		with span(self.instrument, "render") as stage:
+			data = self._render_page_array(doc, page_number, dpi, clip)
+			stage.add(data.shape[0] * data.shape[1])
+		return data
+
+	@staticmethod
+	def _render_page(
+		doc: "fitz.Document",
+		page_number: int,
+		dpi: int = PDF_BASE_DPI,
+		clip: ClipRect | None = None,
+	) -> Image.Image:
+		"""
+		Render one page of an open PDF document.
+
+		Args:
+		    doc: Open PDF document.
+		    page_number: Page number to render (0-based).
+		    dpi: Resolution to rasterize the page at.
+		    clip: Optional (x0, y0, x1, y1) page region in points.
+
+		Returns:
+		    RGBA PIL Image object of the PDF page, sharing the pixmap's buffer,
+		    with its ``dpi`` info set.
+
+		Raises:
+		    ValueError: If the page number, dpi or clip region is invalid.
+
+		"""
+		data = ImageProcessor._render_page_array(doc, page_number, dpi, clip)
+		return ImageProcessor._wrap_page_array(data, dpi)
+
+	@staticmethod
+	def _wrap_page_array(data: np.ndarray, dpi: int) -> Image.Image:
+		"""Wrap an RGBA page array in a PIL Image sharing its buffer."""
+		img = Image.frombuffer("RGBA", data.shape[1::-1], data, "raw", "RGBA", 0, 1)
+		img.info["dpi"] = (dpi, dpi)
+		return img
+
+	@staticmethod
+	def _render_page_array(
+		doc: "fitz.Document",
+		page_number: int,
+		dpi: int = PDF_BASE_DPI,
+		clip: ClipRect | None = None,
+	) -> np.ndarray:
+		"""
+		Render one page of an open PDF document into an RGBA array.
+
+		The scale is applied through the pixmap matrix, so the page is rasterized
+		at ``dpi`` rather than rendered at 72 dpi and enlarged afterwards. With a
+		clip region only that part of the page is allocated and rasterized.
+
+		The page is rendered into an RGBA pixmap and returned as a view of the
+		pixmap's buffer, composited over white in place.
+
+		Args:
+		    doc: Open PDF document.
+		    page_number: Page number to render (0-based).
+		    dpi: Resolution to rasterize the page at.
+		    clip: Optional (x0, y0, x1, y1) page region in points.
+
+		Returns:
+		    Writable (H, W, 4) uint8 RGBA array backed by the pixmap.
+
+		Raises:
+		    ValueError: If the page number, dpi or clip region is invalid.
+
+		"""
+		if not 0 <= page_number < len(doc):
+			raise ValueError(f"Page number {page_number} out of range")
+		if dpi <= 0:
+			raise ValueError(f"DPI must be positive, got {dpi}")
+		import fitz  # noqa: PLC0415
+
+		page: fitz.Page = doc[page_number]
+		if clip is not None:
+			clip = fitz.Rect(clip) & page.rect
+			if clip.is_empty:
+				raise ValueError("Clip region does not overlap the page")
+
+		zoom = dpi / PDF_BASE_DPI
+		pix: fitz.Pixmap = page.get_pixmap(
+			matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=True
+		)
+		return pixmap_to_rgba(pix)
+
 	def make_transparent(
 		self,
 		image: Image.Image,
-		target_color: tuple[int, int, int],
-		tolerance: int = 10,
+		target_color: ColorSpec,
+		tolerance: ToleranceSpec = 10,
 	) -> Image.Image:
 		"""
 		Make a specific color transparent in the image.
 
+		The working array is memory-mapped when it reaches ``memmap_threshold``.
+
 		Args:
 		    image: PIL Image object to process.
-		    target_color: RGB tuple of the color to make transparent.
-		    tolerance: Color matching tolerance (0-255).
+		    target_color: RGB tuple of the color to make transparent, or a
+		        sequence of them, or ``AUTO`` to detect the background.
+		    tolerance: Color matching tolerance (0-255), shared or one per color.
 
 		Returns:
 		    PIL Image with transparency.
 
 		"""
-		if image.mode != "RGBA":
-			image = image.convert("RGBA")
+		out = None
+		if self._wants_memmap(image.width, image.height):
+			out = scratch_rgba(image.height, image.width, self.scratch_dir)
+		# The array is a private copy, so the mask can be applied to it in place
+		with span(self.instrument, "convert") as stage:
+			data = image_to_rgba(image, out)
+			stage.add(image.width * image.height)
+		self.make_transparent_array(data, target_color, tolerance)
+
+		# Shares the array's buffer rather than copying it again
+		return Image.fromarray(data)
+
+	def make_transparent_array(
+		self,
+		data: np.ndarray,
+		target_color: ColorSpec,
+		tolerance: ToleranceSpec = 10,
+	) -> np.ndarray:
+		"""
+		Make a specific color transparent in an RGBA array, in place.
 
-		data: np.ndarray[tuple[int, ...], np.dtype[np.Any]] = np.array(image)
+		Args:
+		    data: Writable (H, W, 4) uint8 RGBA array, modified in place.
+		    target_color: RGB tuple of the color to make transparent, or a
+		        sequence of them. ``AUTO`` detects the background colors of
+		        ``data`` (see ``detect_background``) and masks them with the
+		        tolerances suggested for them, ignoring ``tolerance``.
+		    tolerance: Color matching tolerance (0-255), shared or one per color.
 
-		r, g, b, *_ = target_color
-		mask = (
-			(abs(data[:, :, 0] - r) <= tolerance)
-			& (abs(data[:, :, 1] - g) <= tolerance)
-			& (abs(data[:, :, 2] - b) <= tolerance)
-		)
+		Returns:
+		    The same array, with its alpha channel (and, when feathering with
+		    de-spill, its edge colors) updated. Unchanged if ``AUTO`` finds
+		    no background.
+
+		"""
+		with span(self.instrument, "mask") as stage:
+			stage.add(data.shape[0] * data.shape[1])
+			return self._mask(data, target_color, tolerance)
+
+	def _mask(
+		self, data: np.ndarray, target_color: ColorSpec, tolerance: ToleranceSpec
+	) -> np.ndarray:
+		"""Make colors transparent in ``data`` (see ``make_transparent_array``)."""
+		if isinstance(target_color, str) and target_color == AUTO:
+			estimate = detect_background(data, self.metric)
+			if not estimate.colors:
+				return data
+			target_color, tolerance = estimate.target_color, estimate.tolerance
+
+		outer = self._outer_tolerance(tolerance)
+		if outer is not None:
+			matte = None
+			if self.lut_resolution is not None:
+				rule = compile_rule(
+					target_color, tolerance, self.metric, self.lut_resolution, outer
+				)
+				matte = rule.alpha(data)
+			if self.connected:
+				if matte is None:
+					matte = matte_alpha(
+						data, target_color, tolerance, outer, self.metric
+					)
+				# Keep every pixel the matte touches outside the region opaque
+				region = connected_mask(matte < OPAQUE, self.seeds)
+				np.logical_not(region, out=region)
+				matte[region] = 255
+			return soft_transparency(
+				data,
+				target_color,
+				tolerance,
+				outer,
+				self.metric,
+				despill=self.despill,
+				matte=matte,
+			)
+
+		if self.lut_resolution is None:
+			metric_alpha(data, target_color, tolerance, self.metric, inplace=True)
+		else:
+			rule = compile_rule(
+				target_color, tolerance, self.metric, resolution=self.lut_resolution
+			)
+			rule.alpha(data, inplace=True)
+		if self.connected:
+			alpha = data[:, :, 3]
+			region = connected_mask(alpha == 0, self.seeds)
+			np.subtract(region.view(np.uint8), 1, out=alpha)
+		return data
+
+	def make_transparent_streaming(  # noqa: PLR0913, PLR0917
+		self,
+		input_path: ImageSource,
+		output_path: str | Path,
+		target_color: ColorSpec,
+		tolerance: ToleranceSpec = 10,
+		page: int | None = None,
+		dpi: int = PDF_BASE_DPI,
+		clip: ClipRect | None = None,
+		output_dpi: tuple[int, int] = (300, 300),
+		band_rows: int = DEFAULT_BAND_ROWS,
+	) -> tuple[int, int]:
+		"""
+		Make a color transparent without holding the whole image in memory.
 
-		# Create a copy of the data to avoid modifying the original
-		result: np.ndarray[tuple[int, ...], np.dtype[np.Any]] = data.copy()
+		The input is read, masked and written to the PNG in bands of
+		``band_rows`` rows, so peak memory depends on the band size rather than
+		the image size.
 
-		# Set alpha channel to 0 for matching pixels, preserve original alpha for others
-		result[:, :, 3] = np.where(mask, 0, 255)
+		Args:
+		    input_path: Path to the image file or PDF file, or its contents in
+		        memory.
+		    output_path: Path of the PNG file to write.
+		    target_color: RGB tuple of the color to make transparent, or a
+		        sequence of them.
+		    tolerance: Color matching tolerance (0-255), shared or one per color.
+		    page: PDF page number (0-based, default: first page).
+		    dpi: Resolution PDF pages are rasterized at.
+		    clip: Optional (x0, y0, x1, y1) PDF page region, in points.
+		    output_dpi: DPI resolution for the output image.
+		    band_rows: Number of pixel rows processed at a time.
 
-		return Image.fromarray(result)
+		Returns:
+		    Tuple of (width, height) of the written image.
+
+		Raises:
+		    FileNotFoundError: If the input file doesn't exist.
+		    ValueError: If the input or output format is not supported.
+
+		"""
+		writer = self.writer or self._default_writer
+		if not isinstance(writer, PngWriter):
+			# A format the caller chose, not a programming error
+			raise ValueError("Streaming output must be in PNG format")  # noqa: TRY004
+		if isinstance(target_color, str) and target_color == AUTO:
+			raise ValueError("Background detection cannot be used with streaming")
+		if self.connected:
+			raise ValueError("Connected mode cannot be used with streaming")
+		with span(self.instrument, "stream") as stage:
+			width, height = stream_transparent(
+				input_path,
+				output_path,
+				target_color,
+				tolerance,
+				page,
+				dpi,
+				clip,
+				output_dpi,
+				band_rows,
+				compress_level=writer.profile.compress_level,
+				metric=self.metric,
+				outer_tolerance=self._outer_tolerance(tolerance),
+				despill=self.despill,
+			)
+			if stage.enabled:
+				source, _ = resolve_source(input_path)
+				stage.add(
+					width * height, source_size(source), output_size(output_path, 0)
+				)
+		return width, height
 
 	def save_image(
 		self,
 		image: Image.Image,
-		output_path: str | Path,
+		output_path: ImageDestination,
 		dpi: tuple[int, int] = (300, 300),
-	) -> None:
+	) -> CropBox | None:
 		"""
-		Save the processed image to a file.
+		Save the processed image to a file or a binary stream.
+
+		The format is the processor's ``output_format``, or else the one of
+		the path's extension (see ``writer_for``), encoded with the options
+		of ``save_profile``. With ``crop``, the image is first cropped to the
+		pixels that are not fully transparent.
 
 		Args:
 		    image: PIL Image object to save.
-		    output_path: Path where to save the image.
+		    output_path: Path where to save the image, or a writable binary
+		        stream (such as ``io.BytesIO``) that receives the file.
+		    dpi: DPI resolution for the output image.
+
+		Returns:
+		    With ``crop``, the (x0, y0, x1, y1) box of ``image`` that was
+		    saved; otherwise None.
+
+		Raises:
+		    ValueError: If the output format is not supported.
+
+		"""
+		return self._save(image, output_path, dpi, self.writer_for(output_path))
+
+	def _save(
+		self,
+		image: Image.Image,
+		output: ImageDestination,
+		dpi: tuple[int, int],
+		writer: OutputWriter,
+	) -> CropBox | None:
+		"""Crop if asked, then encode ``image`` to ``output`` with ``writer``."""
+		with span(self.instrument, "encode") as stage:
+			box = None
+			if self.crop:
+				image, box = crop_to_content(image)
+			position = stream_position(output) if stage.enabled else 0
+			writer.save(image, output, dpi)
+			if stage.enabled:
+				stage.add(image.width * image.height, 0, output_size(output, position))
+		return box
+
+	def process_file(  # noqa: PLR0913, PLR0917
+		self,
+		input_file: ImageSource,
+		output_path: ImageDestination,
+		target_color: ColorSpec,
+		tolerance: ToleranceSpec = 10,
+		page: int | None = None,
+		dpi: int = PDF_BASE_DPI,
+		clip: ClipRect | None = None,
+		output_dpi: tuple[int, int] = (300, 300),
+	) -> bool:
+		"""
+		Load, mask and save one image or PDF page, through the cache if any.
+
+		With a ``cache``, the input's bytes are hashed together with every
+		option the output depends on. On a hit the stored output is written
+		as it is, skipping decode, masking and encoding; on a miss the result
+		is encoded once, stored and written.
+
+		Args:
+		    input_file: Path to the image or PDF file, or its contents in
+		        memory (see ``load_image``).
+		    output_path: Path of the output file, or a writable binary stream.
+		    target_color: RGB tuple of the color to make transparent, or a
+		        sequence of them, or ``AUTO`` to detect the background.
+		    tolerance: Color matching tolerance (0-255), shared or one per color.
+		    page: PDF page number (0-based, default: first page).
+		    dpi: Resolution PDF pages are rasterized at.
+		    clip: Optional (x0, y0, x1, y1) PDF page region, in points.
+		    output_dpi: DPI resolution for the output image.
+
+		Returns:
+		    Whether the output was copied from the cache.
+
+		Raises:
+		    FileNotFoundError: If the input file doesn't exist.
+		    ValueError: If the input or output format is not supported.
+
+		"""
+		writer = self.writer_for(output_path)
+		key = None
+		if self.cache is not None:
+			input_file, is_pdf = resolve_source(input_file)
+			options = self._cache_options(
+				writer, target_color, tolerance, output_dpi, is_pdf, page, dpi, clip
+			)
+			with span(self.instrument, "cache_lookup") as stage:
+				key = cache_key(source_digest(input_file), options)
+				encoded = self.cache.get(key)
+				if stage.enabled:
+					stage.add(0, source_size(input_file), len(encoded or b""))
+				if encoded is not None:
+					_write_output(encoded, output_path)
+			if encoded is not None:
+				return True
+
+		data = self.load_array(input_file, page, dpi, clip)
+		self.make_transparent_array(data, target_color, tolerance)
+		image = Image.fromarray(data)
+		if key is None:
+			self._save(image, output_path, output_dpi, writer)
+			return False
+
+		buffer = io.BytesIO()
+		self._save(image, buffer, output_dpi, writer)
+		encoded = buffer.getvalue()
+		with span(self.instrument, "cache_store") as stage:
+			stage.add(0, 0, len(encoded))
+			self.cache.put(key, encoded)
+			_write_output(encoded, output_path)
+		return False
+
+	def _cache_options(  # noqa: PLR0913, PLR0917
+		self,
+		writer: OutputWriter,
+		target_color: ColorSpec,
+		tolerance: ToleranceSpec,
+		output_dpi: tuple[int, int],
+		is_pdf: bool,
+		page: int | None,
+		dpi: int,
+		clip: ClipRect | None,
+	) -> dict:
+		"""Return every option the output of ``process_file`` depends on."""
+		options = {
+			"color": target_color,
+			"tolerance": tolerance,
+			"metric": self.metric.name or repr(self.metric),
+			"lut": self.lut_resolution,
+			"feather": self.feather,
+			"despill": self.despill,
+			"crop": self.crop,
+			"connected": self.connected,
+			"seeds": self.seeds,
+			"writer": writer,
+			"output_dpi": output_dpi,
+		}
+		# Page, render DPI and clip only change the pixels of a PDF
+		if is_pdf:
+			options.update(page=page or 0, dpi=dpi, clip=clip)
+		return options
+
+	def save_array(
+		self,
+		data: np.ndarray,
+		output_path: ImageDestination,
+		dpi: tuple[int, int] = (300, 300),
+	) -> CropBox | None:
+		"""
+		Save an RGBA array to a file without copying it into a new image.
+
+		Args:
+		    data: (H, W, 4) uint8 RGBA array to save.
+		    output_path: Path where to save the image, or a writable binary
+		        stream.
 		    dpi: DPI resolution for the output image.
 
+		Returns:
+		    With ``crop``, the (x0, y0, x1, y1) box of ``data`` that was saved;
+		    otherwise None.
+
 		Raises:
 		    ValueError: If the output format is not supported.
 
 		"""
-		output_path = Path(output_path)
-		if output_path.suffix.lower() != ".png":
-			raise ValueError("Output must be in PNG format")
+		return self.save_image(Image.fromarray(data), output_path, dpi)
+
+	def save_pages(
+		self,
+		images: Iterable[Image.Image],
+		output_path: ImageDestination,
+		dpi: tuple[int, int] = (300, 300),
+	) -> int:
+		"""
+		Save several images as the pages of one multi-page TIFF or PDF file.
+
+		Pages are appended to the file one at a time as they are produced, so
+		only the page currently being written has to be held in memory.
 
-		image.save(output_path, "PNG", dpi=dpi)
+		Args:
+		    images: PIL Image objects to save, in page order.
+		    output_path: Path where to save the multi-page file, or a writable
+		        binary stream (with a multi-page ``output_format``).
+		    dpi: DPI resolution for the output pages.
+
+		Returns:
+		    Number of pages written.
+
+		Raises:
+		    ValueError: If the output format is not supported.
+
+		"""
+		writer = self.writer_for(output_path)
+		if not writer.multipage:
+			raise ValueError("Multi-page output must be in TIFF or PDF format")
+
+		count = 0
+		with writer.open_pages(output_path, dpi) as pages:
+			for image in images:
+				with span(self.instrument, "encode") as stage:
+					stage.add(image.width * image.height)
+					pages.add(image)
+				count += 1
+		return count
+
+
+def _write_output(encoded: bytes, output: ImageDestination) -> None:
+	"""Write an encoded file to a path or a binary stream."""
+	if isinstance(output, str | Path):
+		Path(output).write_bytes(encoded)
+	else:
+		output.write(encoded)
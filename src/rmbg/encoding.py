@@ -0,0 +1,168 @@
+"""
+PNG encoding profiles and cropping to the visible content.
+
+For large transparent outputs, encoding the PNG often takes longer than
+masking. A profile picks the trade-off between encode time and file size:
+
+- ``fast``: zlib level 1 and nothing else, so no pass over the pixels is
+  added to the encode.
+- ``balanced``: zlib level 6, PIL's default, and the default here. The pixels
+  are written exactly as they are.
+- ``smallest``: zlib level 9 with PIL's ``optimize`` and the color values of
+  fully transparent pixels cleared to zero. They are invisible, but a masked
+  noisy background otherwise costs as much to compress as the visible image.
+  Images with at most 256 distinct colors, alpha included, are written as
+  exact palette PNGs with per-entry alpha.
+
+Independently of the profile, ``crop_to_content`` cuts an image down to the
+bounding box of its pixels that are not fully transparent, so that nothing is
+encoded for the transparent margins.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+import numpy as np
+from PIL import Image
+
+CropBox = tuple[int, int, int, int]
+
+
+@dataclass(frozen=True)
+class PngProfile:
+	"""Zlib and PNG options trading encode time for file size."""
+
+	name: str
+	compress_level: int
+	optimize: bool = False
+	clear_transparent: bool = False
+	palette: bool = False
+
+
+PNG_PROFILES: dict[str, PngProfile] = {
+	profile.name: profile
+	for profile in (
+		PngProfile("fast", compress_level=1),
+		PngProfile("balanced", compress_level=6),
+		PngProfile(
+			"smallest",
+			compress_level=9,
+			optimize=True,
+			clear_transparent=True,
+			palette=True,
+		),
+	)
+}
+DEFAULT_PNG_PROFILE = "balanced"
+
+
+def get_png_profile(profile: str | PngProfile) -> PngProfile:
+	"""
+	Return a PNG profile from its name (or the profile itself).
+
+	Raises:
+	    ValueError: If no profile of that name exists.
+
+	"""
+	if isinstance(profile, PngProfile):
+		return profile
+	try:
+		return PNG_PROFILES[profile]
+	except KeyError:
+		raise ValueError(
+			f"Unknown PNG profile '{profile}', expected one of {list(PNG_PROFILES)}"
+		) from None
+
+
+def crop_to_content(image: Image.Image) -> tuple[Image.Image, CropBox]:
+	"""
+	Crop an image to the bounding box of its pixels that are not fully transparent.
+
+	Images without an alpha channel, and fully transparent images, are
+	returned whole.
+
+	Args:
+	    image: PIL Image object.
+
+	Returns:
+	    Tuple of the cropped image and its (x0, y0, x1, y1) box in ``image``.
+
+	"""
+	full = (0, 0, *image.size)
+	if "A" not in image.getbands():
+		return image, full
+	box = image.getchannel("A").getbbox()
+	if box is None or box == full:
+		return image, full
+	return image.crop(box), box
+
+
+def clear_transparent(image: Image.Image) -> Image.Image:
+	"""Return an RGBA image whose fully transparent pixels are all (0, 0, 0, 0)."""
+	data = np.array(image)
+	packed = data.view(np.uint32)[:, :, 0]
+	# Byte 3 of the little-endian word is alpha; zero alpha clears the whole word
+	np.putmask(packed, data[:, :, 3] == 0, 0)
+	return Image.fromarray(data)
+
+
+def _palette_image(image: Image.Image) -> tuple[Image.Image, bytes] | None:
+	"""
+	Convert an RGBA image with at most 256 colors to an exact palette image.
+
+	Returns:
+	    Tuple of the "P" image and the alpha of each palette entry, or None if
+	    the image has more than 256 colors.
+
+	"""
+	colors = image.getcolors(256)
+	if colors is None:
+		return None
+	entries = np.array([color for _, color in colors], dtype=np.uint8)
+	keys = entries.view(np.uint32).ravel()
+	order = np.argsort(keys)
+	keys, entries = keys[order], entries[order]
+
+	packed = np.ascontiguousarray(image).view(np.uint32)[:, :, 0]
+	indices = np.searchsorted(keys, packed).astype(np.uint8)
+	paletted = Image.fromarray(indices, "P")
+	paletted.putpalette(entries[:, :3].tobytes())
+	return paletted, entries[:, 3].tobytes()
+
+
+def save_png(
+	image: Image.Image,
+	output: str | Path | BinaryIO,
+	dpi: tuple[int, int] = (300, 300),
+	profile: str | PngProfile = DEFAULT_PNG_PROFILE,
+) -> None:
+	"""
+	Encode an image as PNG with the options of a profile.
+
+	Args:
+	    image: PIL Image object to save.
+	    output: Path or writable binary stream receiving the PNG.
+	    dpi: DPI resolution stored in the file.
+	    profile: Profile, by name or instance.
+
+	Raises:
+	    ValueError: If the profile is unknown.
+
+	"""
+	profile = get_png_profile(profile)
+	options = {}
+	if image.mode == "RGBA":
+		if profile.clear_transparent:
+			image = clear_transparent(image)
+		paletted = _palette_image(image) if profile.palette else None
+		if paletted is not None:
+			image, options["transparency"] = paletted
+	image.save(
+		output,
+		"PNG",
+		dpi=dpi,
+		compress_level=profile.compress_level,
+		optimize=profile.optimize,
+		**options,
+	)
@@ -3,17 +3,41 @@ Streamlit GUI for the image transparency tool.
 
 This module provides a graphical user interface for making colors transparent
 in images using Streamlit and streamlit-image-coordinates for color selection.
+
+Streamlit runs the script again on every widget interaction, so the work is
+memoized across reruns: the processor is built once, each upload is decoded
+(or its PDF page rendered) once, and for each target color the distance of
+every pixel is computed once. Moving the tolerance slider then only compares
+that distance map against the new tolerance.
+
+Only downscaled copies of the upload are shown. Each upload gets a pyramid of
+successively halved levels; the color picker and the result preview show the
+smallest level, which is still at least as wide as they are displayed, so a
+preview costs about the same for a phone photo and a 50 megapixel scan. Picked
+colors are sampled from the full-resolution original, which is masked and
+encoded only when the user asks for the download.
+
+With "connected" ticked, only the matching area touching the image edges, or
+the clicked point, is removed; the preview flood-fills the downscaled mask.
 """
 
 import io
-import tempfile
-from contextlib import suppress
-from pathlib import Path
+from dataclasses import dataclass
 
+import numpy as np
 import streamlit as st
+from PIL import Image
 from streamlit_image_coordinates import streamlit_image_coordinates as sic
 
 from rmbg.core import ImageProcessor
+from rmbg.detect import BackgroundEstimate, detect_background
+from rmbg.metrics import metric_distance
+from rmbg.region import Point, connected_mask
+
+Color = tuple[int, int, int]
+
+DISPLAY_WIDTH = 600
+"""Width the color picker and the result preview are shown at, in pixels."""
 
 
 def hex_to_rgb(hex_color: str) -> tuple[int, int, int]:
@@ -45,6 +69,206 @@ def rgb_to_hex(rgb: tuple[int, int, int]) -> str:
 	return f"#{rgb[0]:02x}{rgb[1]:02x}{rgb[2]:02x}"
 
 
+@st.cache_resource
+def _processor() -> ImageProcessor:
+	"""Return the processor shared by every rerun and session."""
+	return ImageProcessor()
+
+
+@st.cache_resource(max_entries=2)
+def _decoded(upload_id: str, _data: bytes) -> np.ndarray:  # noqa: ARG001 - keys the cache
+	"""
+	Decode an upload into a read-only RGBA array, once per upload.
+
+	Cached as a resource rather than as data, so that reruns share the
+	array instead of unpickling a copy of a possibly huge image.
+
+	Args:
+	    upload_id: Streamlit's id of the upload, which keys the cache.
+	    _data: Contents of the upload (not hashed).
+
+	Returns:
+	    (H, W, 4) uint8 RGBA array.
+
+	"""
+	data = _processor().load_array(_data)
+	data.flags.writeable = False
+	return data
+
+
+@st.cache_resource(max_entries=2)
+def _pyramid(upload_id: str, _pixels: np.ndarray) -> list[np.ndarray]:  # noqa: ARG001 - keys the cache
+	"""
+	Return the levels of an upload's image pyramid, once per upload.
+
+	Level 0 is the full-resolution array and every further level is the
+	previous one halved with a 2x2 box filter, for as long as the result is
+	still at least ``DISPLAY_WIDTH`` wide.
+
+	Args:
+	    upload_id: Streamlit's id of the upload, which keys the cache.
+	    _pixels: Decoded upload (not hashed).
+
+	Returns:
+	    Read-only (H, W, 4) uint8 RGBA arrays, largest first.
+
+	"""
+	levels = [_pixels]
+	while levels[-1].shape[1] // 2 >= DISPLAY_WIDTH:
+		levels.append(np.asarray(Image.fromarray(levels[-1]).reduce(2)))
+	return levels
+
+
+@st.cache_resource(max_entries=2)
+def _background(upload_id: str, _pixels: np.ndarray) -> BackgroundEstimate:  # noqa: ARG001 - keys the cache
+	"""Return the detected background of an upload, once per upload."""
+	return detect_background(_pixels)
+
+
+@st.cache_resource(max_entries=4)
+def _distances(upload_id: str, color: Color, _pixels: np.ndarray) -> np.ndarray:  # noqa: ARG001 - keys the cache
+	"""Return the distance map of an upload's preview to one color, once per color."""
+	distances = metric_distance(_pixels, color, _processor().metric)
+	distances.flags.writeable = False
+	return distances
+
+
+def _transparent(
+	pixels: np.ndarray,
+	distances: np.ndarray,
+	tolerance: int,
+	connected: bool = False,
+	seed: Point | None = None,
+) -> Image.Image:
+	"""
+	Return the pixels with the ones within ``tolerance`` made transparent.
+
+	Args:
+	    pixels: (H, W, 4) uint8 RGBA array.
+	    distances: (H, W) distance map of ``pixels`` to the target color.
+	    tolerance: Largest distance made transparent.
+	    connected: Only make the matching pixels connected to the edges, or
+	        to ``seed``, transparent.
+	    seed: Optional (x, y) pixel to flood fill from instead of the edges.
+
+	Returns:
+	    The masked image.
+
+	"""
+	result = pixels.copy()
+	mask = distances <= tolerance
+	if connected:
+		connected_mask(mask, None if seed is None else [seed], out=mask)
+	np.subtract(mask.view(np.uint8), 1, out=result[:, :, 3])
+	return Image.fromarray(result)
+
+
+@dataclass(frozen=True)
+class _Selection:
+	"""Color chosen in the GUI, with the point it was picked at if any."""
+
+	color: Color | None = None
+	seed: Point | None = None
+	tolerance: int = 10
+
+
+def _swatch(color: str) -> str:
+	"""Return the HTML of a square showing a hex color."""
+	return (
+		f'<div style="width: 50px; height: 50px; background-color: {color}; '
+		'border: 1px solid black;"></div>'
+	)
+
+
+def _click_color(pixels: np.ndarray, preview: np.ndarray) -> _Selection:
+	"""Let the user pick a color by clicking on the preview."""
+	st.markdown("Click on the image below to select a color to make transparent.")
+
+	_l, _r = st.columns([4, 1])
+	with _l:
+		coord = sic(Image.fromarray(preview), width=DISPLAY_WIDTH, key="pil")
+	if coord is None:
+		return _Selection()
+
+	# Sample the full-resolution original, not the downscaled picker
+	height, width = pixels.shape[:2]
+	x = min(int(coord["x"] * width / coord["width"]), width - 1)
+	y = min(int(coord["y"] * height / coord["height"]), height - 1)
+	color = tuple(int(value) for value in pixels[y, x, :3])
+
+	_r.markdown(f"Selected color: {rgb_to_hex(color)}")
+	_r.markdown(_swatch(rgb_to_hex(color)), unsafe_allow_html=True)
+	return _Selection(color, (x, y))
+
+
+def _detected_color(upload_id: str, pixels: np.ndarray) -> _Selection:
+	"""Use the detected background color, with its suggested tolerance."""
+	estimate = _background(upload_id, pixels)
+	if not estimate.colors:
+		st.info("No background color found along the edges of the image.")
+		return _Selection()
+
+	color = estimate.colors[0]
+	st.markdown(
+		f"Detected background: {rgb_to_hex(color)}, about "
+		f"{estimate.coverage[0]:.0%} of the image"
+	)
+	st.markdown(_swatch(rgb_to_hex(color)), unsafe_allow_html=True)
+	return _Selection(color, tolerance=estimate.tolerances[0])
+
+
+def _picked_color() -> _Selection:
+	"""Let the user choose a color with the color picker."""
+	st.markdown("Use the color picker below to select a color to make transparent.")
+
+	picked_color = st.color_picker(
+		"Choose a color", value="#ffffff", key="color_picker"
+	)
+	if not picked_color:
+		return _Selection()
+
+	col1, _ = st.columns([1, 3])
+	with col1:
+		st.markdown(f"Selected color: {picked_color}")
+		st.markdown(_swatch(picked_color), unsafe_allow_html=True)
+	return _Selection(hex_to_rgb(picked_color))
+
+
+def _select_color(
+	upload_id: str, pixels: np.ndarray, preview: np.ndarray
+) -> _Selection:
+	"""Ask how the target color should be selected, then let the user select it."""
+	color_method = st.radio(
+		"Choose how to select the color:",
+		["Color picker", "Click on image", "Detect background"],
+		horizontal=True,
+	)
+	if color_method == "Click on image":
+		return _click_color(pixels, preview)
+	if color_method == "Detect background":
+		return _detected_color(upload_id, pixels)
+	return _picked_color()
+
+
+def _full_resolution(
+	pixels: np.ndarray,
+	target_color: Color,
+	tolerance: int,
+	connected: bool,
+	seed: Point | None,
+) -> bytes:
+	"""Mask and encode the full-resolution upload as PNG."""
+	processor = _processor()
+	if connected:
+		seeds = None if seed is None else [seed]
+		processor = ImageProcessor(connected=True, seeds=seeds)
+	result = pixels.copy()
+	processor.make_transparent_array(result, target_color, tolerance)
+	buf = io.BytesIO()
+	processor.save_image(Image.fromarray(result), buf)
+	return buf.getvalue()
+
+
 def main() -> None:
 	"""Run the Streamlit GUI application."""
 	st.set_page_config(
@@ -68,98 +292,65 @@ def main() -> None:
 		st.info("Please upload a file to begin.")
 		return
 
-	processor = ImageProcessor()
-
 	try:
-		with tempfile.NamedTemporaryFile(
-			delete=False, suffix=Path(uploaded_file.name).suffix
-		) as temp_file:
-			temp_file.write(uploaded_file.getvalue())
-			temp_path = Path(temp_file.name)
-
-		image = processor.load_image(temp_path)
-
-		with suppress(OSError, PermissionError):
-			temp_path.unlink()
-
+		pixels = _decoded(uploaded_file.file_id, uploaded_file.getvalue())
 	except Exception as e:
 		st.error(f"Error loading file: {e}")
 		return
+	pyramid = _pyramid(uploaded_file.file_id, pixels)
+	preview = pyramid[-1]
+	height, width = pixels.shape[:2]
 
 	st.subheader("Color Selection")
 
-	color_method = st.radio(
-		"Choose how to select the color:",
-		["Color picker", "Click on image"],
-		horizontal=True,
-	)
-
-	target_color = None
-	selected_color = None
-
-	if color_method == "Click on image":
-		st.markdown("Click on the image below to select a color to make transparent.")
-
-		_l, _r = st.columns([4, 1])
-		with _l:
-			coord = sic(image, width=600, key="pil")
-
-		if coord is not None:
-			x = int(coord["x"] * image.size[0] / coord["width"])
-			y = int(coord["y"] * image.size[1] / coord["height"])
-
-			target_color = image.getpixel((x, y))
-			selected_color = rgb_to_hex(target_color)
-
-			_r.markdown(f"Selected color: {selected_color}")
-
-			_r.markdown(
-				f'<div style="width: 50px; height: 50px; background-color: {selected_color}; border: 1px solid black;"></div>',
-				unsafe_allow_html=True,
-			)
-	else:
-		st.markdown("Use the color picker below to select a color to make transparent.")
-
-		picked_color = st.color_picker(
-			"Choose a color", value="#ffffff", key="color_picker"
-		)
-
-		if picked_color:
-			target_color = hex_to_rgb(picked_color)
-			selected_color = picked_color
-
-			col1, col2 = st.columns([1, 3])
-			with col1:
-				st.markdown(f"Selected color: {selected_color}")
-				st.markdown(
-					f'<div style="width: 50px; height: 50px; background-color: {selected_color}; border: 1px solid black;"></div>',
-					unsafe_allow_html=True,
-				)
+	selection = _select_color(uploaded_file.file_id, pixels, preview)
+	target_color, seed = selection.color, selection.seed
 
 	tolerance = st.slider(
 		"Color tolerance",
 		min_value=0,
 		max_value=255,
-		value=10,
+		value=selection.tolerance,
 		help="Higher values will match more similar colors",
 	)
 
+	connected = st.checkbox(
+		"Only remove areas connected to the edges",
+		help="Keep enclosed areas of the color, such as the inside of letters. "
+		"With a clicked color, only the area around the clicked point is removed",
+	)
+
 	if target_color is None:
 		st.warning("Please select a color first.")
 		st.stop()
 
-	if st.button("Make Transparent", key="make_transparent_button"):
-		with st.spinner("Processing image..."):
-			result = processor.make_transparent(image, target_color, tolerance)
+	with st.spinner("Measuring color distances..."):
+		distances = _distances(uploaded_file.file_id, tuple(target_color), preview)
 
-			st.subheader("Result")
-			st.image(result)
+	preview_seed = None
+	if seed is not None:
+		preview_seed = (
+			seed[0] * preview.shape[1] // width,
+			seed[1] * preview.shape[0] // height,
+		)
+
+	st.subheader("Result")
+	st.image(
+		_transparent(preview, distances, tolerance, connected, preview_seed),
+		width=DISPLAY_WIDTH,
+		caption=f"Preview at {preview.shape[1]}x{preview.shape[0]}; "
+		f"the download is {width}x{height}",
+	)
 
-			buf = io.BytesIO()
-			result.save(buf, format="PNG")
+	if st.button(
+		"Make Transparent",
+		key="make_transparent_button",
+		help="Mask and encode the full-resolution image for download",
+	):
+		with st.spinner("Processing full-resolution image..."):
 			st.download_button(
 				"Download Result",
-				buf.getvalue(),
+				_full_resolution(pixels, target_color, tolerance, connected, seed),
 				file_name="transparent.png",
 				mime="image/png",
 			)
@@ -0,0 +1,423 @@
+"""
+Per-stage instrumentation of the processing pipeline.
+
+An ``ImageProcessor`` given a collector measures every stage it runs and hands
+the collector one ``StageRecord`` per stage: its wall time, the CPU time of
+the thread running it, the pixels it handled, the bytes it read and wrote and,
+optionally, the peak memory it allocated. The stages are:
+
+- ``decode``: reading an image file into pixels.
+- ``render``: rasterizing a PDF page.
+- ``convert``: copying a decoded image into the RGBA working array.
+- ``mask``: making the target colors transparent.
+- ``encode``: writing the output file (one record per page of multi-page
+  outputs).
+- ``stream``: the whole of a streamed run, whose stages are interleaved by band.
+- ``cache_lookup`` / ``cache_store``: hashing the input and reading, or storing,
+  a cached result.
+
+A collector is any object with a ``record`` method and a ``trace_allocations``
+attribute (see ``Collector``). ``StageMetrics`` adds the records up per stage
+and exports them as a dictionary, or as Prometheus text or OpenMetrics for the
+node exporter's textfile collector; ``StageLog`` keeps every record.
+
+Without a collector, ``span`` returns a shared do-nothing context manager, so
+the stages cost one function call and one attribute check each.
+"""
+
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Protocol, Self
+
+from .atomic import AtomicFile
+from .pixels import ImageDestination, ResolvedSource
+
+
+@dataclass(frozen=True)
+class StageRecord:
+	"""Measurements of one run of one stage."""
+
+	stage: str
+	wall_seconds: float
+	cpu_seconds: float
+	pixels: int = 0
+	bytes_in: int = 0
+	bytes_out: int = 0
+	allocated: int | None = None
+	"""Peak bytes allocated by Python and NumPy during the stage, when traced."""
+
+
+class Collector(Protocol):
+	"""Receiver of stage measurements."""
+
+	trace_allocations: bool
+	"""Whether to trace the memory allocated by every stage (see ``span``)."""
+
+	def record(self, record: StageRecord) -> None:
+		"""Receive the measurements of one finished stage."""
+
+
+class _Tracer:
+	"""
+	Share ``tracemalloc`` between the traced spans of every thread.
+
+	Each thread keeps a stack of the highest memory traced so far by its open
+	spans, innermost last. ``tracemalloc`` has a single, process-wide peak,
+	so before a span resets it, the peak is folded into the innermost open
+	span of every thread, and an exiting span passes its peak on to the span
+	enclosing it. Tracing is started by the first open span if it is not
+	running yet, and then stopped once the last open span exits. Allocations
+	are process-wide too, so spans running at the same time on several
+	threads count each other's allocations.
+	"""
+
+	def __init__(self) -> None:
+		self._lock = threading.Lock()
+		self._local = threading.local()
+		self._stacks: list[list[int]] = []
+		self._open = 0
+		self._started = False
+
+	def _stack(self) -> list[int]:
+		"""Return this thread's stack of open span peaks."""
+		stack = getattr(self._local, "stack", None)
+		if stack is None:
+			stack = self._local.stack = []
+		return stack
+
+	def enter(self) -> int:
+		"""Start measuring the peak of a span; return the memory traced now."""
+		with self._lock:
+			if self._open == 0 and not tracemalloc.is_tracing():
+				tracemalloc.start()
+				self._started = True
+			self._open += 1
+			current, peak = tracemalloc.get_traced_memory()
+			for stack in self._stacks:
+				stack[-1] = max(stack[-1], peak)
+			tracemalloc.reset_peak()
+			stack = self._stack()
+			if not stack:
+				self._stacks.append(stack)
+			stack.append(current)
+			return current
+
+	def exit(self) -> int:
+		"""Return the peak memory traced during this thread's innermost span."""
+		with self._lock:
+			stack = self._stack()
+			peak = max(stack.pop(), tracemalloc.get_traced_memory()[1])
+			if stack:
+				stack[-1] = max(stack[-1], peak)
+			else:
+				self._stacks.remove(stack)
+			self._open -= 1
+			if self._open == 0 and self._started:
+				tracemalloc.stop()
+				self._started = False
+			return peak
+
+
+_TRACER = _Tracer()
+
+
+class _Span:
+	"""Context manager measuring one stage for a collector."""
+
+	__slots__ = (
+		"_cpu",
+		"_traced",
+		"_wall",
+		"bytes_in",
+		"bytes_out",
+		"collector",
+		"pixels",
+		"stage",
+	)
+	enabled = True
+
+	def __init__(self, collector: Collector, stage: str) -> None:
+		self.collector = collector
+		self.stage = stage
+		self.pixels = self.bytes_in = self.bytes_out = 0
+		self._traced: int | None = None
+
+	def add(self, pixels: int = 0, bytes_in: int = 0, bytes_out: int = 0) -> None:
+		"""Count pixels and bytes handled by the stage."""
+		self.pixels += pixels
+		self.bytes_in += bytes_in
+		self.bytes_out += bytes_out
+
+	def __enter__(self) -> Self:
+		if self.collector.trace_allocations:
+			self._traced = _TRACER.enter()
+		self._cpu = time.thread_time()
+		self._wall = time.perf_counter()
+		return self
+
+	def __exit__(self, exc_type: type[BaseException] | None, *_: object) -> None:
+		wall = time.perf_counter() - self._wall
+		cpu = time.thread_time() - self._cpu
+		allocated = None
+		if self._traced is not None:
+			allocated = max(0, _TRACER.exit() - self._traced)
+		if exc_type is not None:
+			return
+		self.collector.record(
+			StageRecord(
+				self.stage,
+				wall,
+				cpu,
+				self.pixels,
+				self.bytes_in,
+				self.bytes_out,
+				allocated,
+			)
+		)
+
+
+class _NoSpan:
+	"""Stand-in for ``_Span`` when nothing is collected."""
+
+	__slots__ = ()
+	enabled = False
+
+	def add(self, pixels: int = 0, bytes_in: int = 0, bytes_out: int = 0) -> None:
+		"""Ignore the counts."""
+
+	def __enter__(self) -> Self:
+		return self
+
+	def __exit__(self, *_: object) -> None:
+		return
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(collector: Collector | None, stage: str) -> _Span | _NoSpan:
+	"""
+	Return a context manager measuring one stage for a collector.
+
+	Stages that raise are not recorded. Counts that take work to find, such
+	as file sizes, should only be added when the span's ``enabled`` is True.
+	Traced spans may nest, and may run on several threads at once: the peak
+	of an inner span counts towards the outer one's too, and spans running
+	at the same time count each other's allocations.
+
+	Args:
+	    collector: Collector receiving the record, or None to measure nothing.
+	    stage: Name of the stage.
+
+	Returns:
+	    The context manager; it has an ``add(pixels, bytes_in, bytes_out)``
+	    method counting what the stage handled.
+
+	"""
+	if collector is None:
+		return _NO_SPAN
+	return _Span(collector, stage)
+
+
+def source_size(source: ResolvedSource) -> int:
+	"""Return the size in bytes of a resolved input path or buffer."""
+	if isinstance(source, Path):
+		return source.stat().st_size
+	return memoryview(source).nbytes
+
+
+def stream_position(output: ImageDestination) -> int:
+	"""Return the position of an output stream before writing, 0 for paths."""
+	if isinstance(output, str | Path):
+		return 0
+	try:
+		return output.tell()
+	except (AttributeError, OSError):
+		return 0
+
+
+def output_size(output: ImageDestination, position: int) -> int:
+	"""Return the bytes written to an output since ``stream_position``."""
+	if isinstance(output, str | Path):
+		return Path(output).stat().st_size
+	try:
+		return output.tell() - position
+	except (AttributeError, OSError):
+		return 0
+
+
+class StageLog:
+	"""Collector keeping every record, in order."""
+
+	def __init__(self, trace_allocations: bool = False) -> None:
+		"""
+		Start an empty log.
+
+		Args:
+		    trace_allocations: Trace the memory allocated by every stage.
+
+		"""
+		self.trace_allocations = trace_allocations
+		self.records: list[StageRecord] = []
+
+	def record(self, record: StageRecord) -> None:
+		"""Append one record; appending to a list is safe from any thread."""
+		self.records.append(record)
+
+
+@dataclass
+class StageTotals:
+	"""Measurements of one stage, added up over all its runs."""
+
+	count: int = 0
+	wall_seconds: float = 0.0
+	cpu_seconds: float = 0.0
+	pixels: int = 0
+	bytes_in: int = 0
+	bytes_out: int = 0
+	peak_allocated: int | None = None
+
+	@property
+	def throughput(self) -> float:
+		"""Megapixels per second of wall time."""
+		if self.wall_seconds <= 0:
+			return 0.0
+		return self.pixels / 1e6 / self.wall_seconds
+
+
+class StageMetrics:
+	"""Collector adding up the records of every stage."""
+
+	def __init__(self, trace_allocations: bool = False) -> None:
+		"""
+		Start with no stages.
+
+		Args:
+		    trace_allocations: Trace the memory allocated by every stage with
+		        ``tracemalloc``, which then only runs during the stages unless
+		        it was already started. Tracing slows down Python
+		        allocations, so it is off by default.
+
+		"""
+		self.trace_allocations = trace_allocations
+		self.stages: dict[str, StageTotals] = {}
+		self._lock = threading.Lock()
+
+	def record(self, record: StageRecord) -> None:
+		"""Add one record to the totals of its stage; safe from any thread."""
+		with self._lock:
+			totals = self.stages.get(record.stage)
+			if totals is None:
+				totals = self.stages[record.stage] = StageTotals()
+			totals.count += 1
+			totals.wall_seconds += record.wall_seconds
+			totals.cpu_seconds += record.cpu_seconds
+			totals.pixels += record.pixels
+			totals.bytes_in += record.bytes_in
+			totals.bytes_out += record.bytes_out
+			if record.allocated is not None:
+				totals.peak_allocated = max(
+					totals.peak_allocated or 0, record.allocated
+				)
+
+	def to_dict(self) -> dict:
+		"""Return the totals as a JSON-serialisable dictionary."""
+		stages = {}
+		with self._lock:
+			for name, totals in self.stages.items():
+				stages[name] = asdict(totals)
+				stages[name]["megapixels_per_second"] = round(totals.throughput, 3)
+		return {"stages": stages}
+
+
+# Exported metric: (name, type, help, StageTotals attribute)
+_EXPORTED = (
+	("stage_runs", "counter", "Number of times the stage ran", "count"),
+	("stage_seconds", "counter", "Wall time spent in the stage", "wall_seconds"),
+	("stage_cpu_seconds", "counter", "CPU time spent in the stage", "cpu_seconds"),
+	("stage_pixels", "counter", "Pixels handled by the stage", "pixels"),
+	("stage_read_bytes", "counter", "Bytes read by the stage", "bytes_in"),
+	("stage_written_bytes", "counter", "Bytes written by the stage", "bytes_out"),
+	(
+		"stage_peak_allocated_bytes",
+		"gauge",
+		"Peak bytes allocated by one run of the stage",
+		"peak_allocated",
+	),
+)
+
+
+def format_metrics(
+	metrics: StageMetrics,
+	*,
+	openmetrics: bool = False,
+	prefix: str = "rmbg",
+	labels: dict[str, str] | None = None,
+) -> str:
+	"""
+	Format stage totals in the Prometheus text or OpenMetrics format.
+
+	Args:
+	    metrics: Totals to export.
+	    openmetrics: Write OpenMetrics (counter families without the
+	        ``_total`` suffix and a final ``# EOF``) instead of the Prometheus
+	        text format read by the node exporter's textfile collector.
+	    prefix: Prefix of every metric name.
+	    labels: Extra labels added to every sample, e.g. the job's name.
+
+	Returns:
+	    The exposition text.
+
+	"""
+	extra = "".join(
+		f',{key}="{_escape(value)}"' for key, value in (labels or {}).items()
+	)
+	lines = []
+	for name, kind, help_text, attribute in _EXPORTED:
+		family = f"{prefix}_{name}"
+		samples = [
+			(stage, getattr(totals, attribute))
+			for stage, totals in sorted(metrics.stages.items())
+			if getattr(totals, attribute) is not None
+		]
+		if not samples:
+			continue
+		suffix = "_total" if kind == "counter" else ""
+		declared = family if openmetrics else family + suffix
+		lines.append(f"# HELP {declared} {help_text}.")
+		lines.append(f"# TYPE {declared} {kind}")
+		for stage, value in samples:
+			lines.append(f'{family}{suffix}{{stage="{_escape(stage)}"{extra}}} {value}')
+	if openmetrics:
+		lines.append("# EOF")
+	return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+	"""Escape a label value for the exposition formats."""
+	return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_metrics(
+	metrics: StageMetrics, path: str | Path, *, openmetrics: bool = False
+) -> None:
+	"""
+	Write stage totals to a metrics file, replacing it atomically.
+
+	The textfile collector may read the file at any time, so it is written
+	next to its destination and renamed over it.
+
+	Args:
+	    metrics: Totals to export.
+	    path: Destination, e.g. ``/var/lib/node_exporter/rmbg.prom``.
+	    openmetrics: Write OpenMetrics instead of the Prometheus text format.
+
+	"""
+	path = Path(path)
+	path.parent.mkdir(parents=True, exist_ok=True)
+	text = format_metrics(metrics, openmetrics=openmetrics)
+	with AtomicFile(path) as file:
+		file.write(text.encode("utf-8"))
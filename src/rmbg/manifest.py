@@ -0,0 +1,155 @@
+"""
+Manifest of batch outputs for make-like incremental re-runs.
+
+The manifest is a small JSON file next to the outputs. For every output it
+records the input it was made from, the input's size, modification time and
+content digest, and a digest of the processing options. An output is up to
+date when it still exists, its options are unchanged and its input is the
+same: same size and modification time or, for inputs that were only touched
+or restored from a backup, same content digest. Checking an unchanged tree
+therefore costs one ``stat`` per file, and inputs are only read again when
+their time stamps moved.
+"""
+
+import json
+from pathlib import Path
+
+from .atomic import AtomicFile
+from .cache import source_digest
+
+MANIFEST_FILENAME = "rmbg-manifest.json"
+_MANIFEST_VERSION = 1
+
+Stamp = tuple[int, int]
+"""Size in bytes and modification time in nanoseconds of an input file."""
+
+
+def _stamp(path: Path) -> Stamp:
+	"""Return the size and modification time of a file."""
+	stat = path.stat()
+	return stat.st_size, stat.st_mtime_ns
+
+
+class Manifest:
+	"""Inputs and options each output in a directory was made from."""
+
+	def __init__(self, path: str | Path) -> None:
+		"""
+		Load a manifest, or start an empty one if the file does not exist.
+
+		A manifest that cannot be read, or was written by another version, is
+		treated as empty, so every output is made again.
+
+		Args:
+		    path: Path of the manifest file.
+
+		"""
+		self.path = Path(path)
+		self.entries: dict[str, dict] = {}
+		self._pending: dict[str, Stamp] = {}
+		try:
+			data = json.loads(self.path.read_text(encoding="utf-8"))
+		except (OSError, ValueError):
+			return
+		if isinstance(data, dict) and data.get("version") == _MANIFEST_VERSION:
+			self.entries = data.get("outputs", {})
+
+	def _name(self, output_file: Path) -> str:
+		"""Return the manifest key of an output: its path below the manifest."""
+		try:
+			return output_file.relative_to(self.path.parent).as_posix()
+		except ValueError:
+			return str(output_file)
+
+	def is_current(self, input_file: Path, output_file: Path, options: str) -> bool:
+		"""
+		Return whether an output is up to date with its input and options.
+
+		The input's size and modification time are remembered, so that
+		``record`` can tell whether the input changed while it was processed.
+
+		Args:
+		    input_file: Path of the input file.
+		    output_file: Path of the output file.
+		    options: Digest of the processing options (see ``options_digest``).
+
+		Returns:
+		    True if ``output_file`` exists and was made from the same input
+		    contents with the same options.
+
+		"""
+		name = self._name(output_file)
+		try:
+			stamp = self._pending[name] = _stamp(input_file)
+		except OSError:
+			return False
+		entry = self.entries.get(name)
+		if (
+			entry is None
+			or entry["input"] != str(input_file)
+			or entry["options"] != options
+			or not output_file.exists()
+		):
+			return False
+		if stamp == (entry["size"], entry["mtime_ns"]):
+			return True
+		if stamp[0] != entry["size"] or source_digest(input_file) != entry["digest"]:
+			return False
+		# Touched but unchanged: keep the output, note the new time
+		entry["mtime_ns"] = stamp[1]
+		return True
+
+	def record(
+		self,
+		input_file: Path,
+		output_file: Path,
+		options: str,
+		digest: str | None = None,
+	) -> None:
+		"""
+		Record that an output was made from its input with some options.
+
+		Nothing is recorded if the input changed since ``is_current`` looked
+		at it, since the output may have been made from either version, nor
+		if it was deleted or renamed in the meantime.
+
+		Args:
+		    input_file: Path of the input file.
+		    output_file: Path of the output file.
+		    options: Digest of the processing options.
+		    digest: Content digest of the input (see ``source_digest``), as
+		        computed by the worker that processed it; read and hashed
+		        here if None.
+
+		"""
+		name = self._name(output_file)
+		expected = self._pending.pop(name, None)
+		try:
+			stamp = _stamp(input_file)
+			if expected in (None, stamp):
+				digest = digest or source_digest(input_file)
+		except OSError:
+			stamp = None
+		if stamp is None or expected not in (None, stamp):
+			self.entries.pop(name, None)
+			return
+		self.entries[name] = {
+			"input": str(input_file),
+			"size": stamp[0],
+			"mtime_ns": stamp[1],
+			"digest": digest,
+			"options": options,
+		}
+
+	def forget(self, output_file: Path) -> None:
+		"""Drop an output, so that it is made again on the next run."""
+		name = self._name(output_file)
+		self._pending.pop(name, None)
+		self.entries.pop(name, None)
+
+	def save(self) -> None:
+		"""Write the manifest, replacing the previous file atomically."""
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		data = {"version": _MANIFEST_VERSION, "outputs": self.entries}
+		with AtomicFile(self.path) as file:
+			file.write(json.dumps(data, indent=1).encode("utf-8"))
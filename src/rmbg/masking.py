@@ -0,0 +1,238 @@
+"""
+Array-level color matching for making colors transparent.
+
+This module works directly on (H, W, 3) or (H, W, 4) uint8 NumPy arrays and
+returns only the mask or alpha plane, so callers decide whether a new image
+is created at all. The arithmetic stays in uint8 without wrapping into wrong
+distances, and a single scratch plane is reused for every channel instead of
+allocating full-size temporaries per channel. Several target colors, each with
+its own tolerance, are matched together rather than in one pass per color.
+"""
+
+from collections.abc import Sequence
+
+import numpy as np
+
+Color = tuple[int, int, int]
+ColorSpec = Color | Sequence[Color]
+ToleranceSpec = int | Sequence[int]
+
+# Channels of an RGBA pixel, and the alpha of an opaque one
+RGBA_CHANNELS = 4
+OPAQUE = 255
+
+# Colors matched per bitmask word by the multi-color lookup tables
+_LUT_WORD_BITS = 64
+# Below this many colors, separate box tests are faster than table lookups
+_LUT_MIN_COLORS = 4
+
+
+def normalize_targets(
+	target_color: ColorSpec, tolerance: ToleranceSpec = 10
+) -> tuple[tuple[Color, ...], tuple[int, ...]]:
+	"""
+	Normalize one or several target colors and their tolerances.
+
+	Args:
+	    target_color: One RGB tuple, or a sequence of RGB tuples.
+	    tolerance: One tolerance shared by every color, or one per color.
+
+	Returns:
+	    Tuple of (colors, tolerances) of equal length.
+
+	Raises:
+	    ValueError: If no color is given or the number of tolerances does not
+	        match the number of colors.
+
+	"""
+	if len(target_color) and isinstance(target_color[0], int | np.integer):
+		target_color = [target_color]
+	colors = tuple(tuple(int(v) for v in color[:3]) for color in target_color)
+	if not colors:
+		raise ValueError("At least one target color is required")
+
+	if isinstance(tolerance, int | np.integer):
+		return colors, (int(tolerance),) * len(colors)
+	tolerances = tuple(int(t) for t in tolerance)
+	if len(tolerances) != len(colors):
+		raise ValueError(f"Got {len(tolerances)} tolerances for {len(colors)} colors")
+	return colors, tolerances
+
+
+def _channel_range(value: int, tolerance: int) -> tuple[int, int]:
+	"""Return the inclusive [low, high] channel range matched by a color."""
+	return min(max(0, value - tolerance), 255), max(0, min(255, value + tolerance))
+
+
+def check_pixels(data: np.ndarray) -> tuple[int, int]:
+	"""
+	Validate a pixel array and return its height and width.
+
+	Args:
+	    data: Array expected to be (H, W, 3) or (H, W, 4) uint8.
+
+	Returns:
+	    Tuple of (height, width).
+
+	Raises:
+	    ValueError: If the array shape or dtype is not supported.
+
+	"""
+	if data.dtype != np.uint8 or data.ndim != 3 or data.shape[2] not in (3, 4):  # noqa: PLR2004
+		raise ValueError(
+			f"Expected an (H, W, 3) or (H, W, 4) uint8 array, "
+			f"got {data.shape} {data.dtype}"
+		)
+	return data.shape[0], data.shape[1]
+
+
+def color_mask(
+	data: np.ndarray,
+	target_color: ColorSpec,
+	tolerance: ToleranceSpec = 10,
+	*,
+	out: np.ndarray | None = None,
+) -> np.ndarray:
+	"""
+	Return a mask of the pixels within tolerance of one or several colors.
+
+	A pixel matches a color when every channel is within that color's
+	tolerance of the corresponding channel. Four or more colors are evaluated
+	together in one pass over the pixels (see ``_multi_color_mask``), so the
+	cost barely grows with the number of colors.
+
+	Args:
+	    data: (H, W, 3) or (H, W, 4) uint8 pixel array.
+	    target_color: RGB tuple of the color to match, or a sequence of them.
+	    tolerance: Color matching tolerance (0-255), shared or one per color.
+	    out: Optional (H, W) bool array to write the mask into.
+
+	Returns:
+	    (H, W) bool mask, True where the pixel matches any of the colors.
+
+	Raises:
+	    ValueError: If the array is not supported or the tolerances do not
+	        match the colors.
+
+	"""
+	height, width = check_pixels(data)
+	colors, tolerances = normalize_targets(target_color, tolerance)
+	if out is None:
+		out = np.empty((height, width), dtype=bool)
+	if len(colors) >= _LUT_MIN_COLORS:
+		return _multi_color_mask(data, colors, tolerances, out)
+
+	scratch = np.empty((height, width), dtype=np.uint8)
+	if len(colors) == 1:
+		return _box_mask(data, colors[0], tolerances[0], out, scratch)
+	# A couple of colors are cheaper as separate box tests than as table lookups
+	hit = np.empty((height, width), dtype=bool)
+	_box_mask(data, colors[0], tolerances[0], out, scratch)
+	for color, color_tolerance in zip(colors[1:], tolerances[1:], strict=True):
+		out |= _box_mask(data, color, color_tolerance, hit, scratch)
+	return out
+
+
+def _box_mask(
+	data: np.ndarray,
+	color: Color,
+	tolerance: int,
+	out: np.ndarray,
+	scratch: np.ndarray,
+) -> np.ndarray:
+	"""Match one color with a per-channel box test, using a uint8 scratch plane."""
+	hit = scratch.view(bool)
+	for channel, value in enumerate(color):
+		low, high = _channel_range(value, tolerance)
+		span = high - low
+		# Unsigned subtraction wraps values below `low` to more than `span`, so
+		# one comparison checks both ends of [low, low + span].
+		np.subtract(data[:, :, channel], np.uint8(low), out=scratch)
+		if channel == 0:
+			np.less_equal(scratch, span, out=out)
+		else:
+			np.less_equal(scratch, span, out=hit)
+			out &= hit
+	return out
+
+
+def _multi_color_mask(
+	data: np.ndarray,
+	colors: tuple[Color, ...],
+	tolerances: tuple[int, ...],
+	out: np.ndarray,
+) -> np.ndarray:
+	"""
+	Match several colors at once with per-channel bitmask lookup tables.
+
+	For each channel a 256-entry table maps a channel value to the set of
+	colors, one bit each, whose range contains it. A pixel matches when the
+	AND of its three table entries is non-zero. Up to 64 colors cost three
+	table gathers and two ANDs per pixel regardless of their number; more
+	colors take one such pass per 64.
+	"""
+	height, width = data.shape[:2]
+	for start in range(0, len(colors), _LUT_WORD_BITS):
+		group = range(start, min(start + _LUT_WORD_BITS, len(colors)))
+		dtype = np.min_scalar_type((1 << len(group)) - 1)
+		luts = np.zeros((3, 256), dtype=dtype)
+		for bit, k in enumerate(group):
+			for channel, value in enumerate(colors[k]):
+				low, high = _channel_range(value, tolerances[k])
+				luts[channel, low : high + 1] |= dtype.type(1 << bit)
+
+		acc = np.empty((height, width), dtype=dtype)
+		scratch = np.empty((height, width), dtype=dtype)
+		np.take(luts[0], data[:, :, 0], out=acc)
+		for channel in (1, 2):
+			np.take(luts[channel], data[:, :, channel], out=scratch)
+			acc &= scratch
+		if start == 0:
+			np.not_equal(acc, 0, out=out)
+		else:
+			out |= acc != 0
+	return out
+
+
+def transparency_alpha(
+	data: np.ndarray,
+	target_color: ColorSpec,
+	tolerance: ToleranceSpec = 10,
+	*,
+	out: np.ndarray | None = None,
+	inplace: bool = False,
+) -> np.ndarray:
+	"""
+	Return the alpha plane that makes one or several colors transparent.
+
+	Matching pixels get alpha 0 and all other pixels alpha 255.
+
+	Args:
+	    data: (H, W, 3) or (H, W, 4) uint8 pixel array.
+	    target_color: RGB tuple of the color to make transparent, or a
+	        sequence of them.
+	    tolerance: Color matching tolerance (0-255), shared or one per color.
+	    out: Optional (H, W) uint8 array to write the alpha plane into.
+	    inplace: Write the alpha plane into the alpha channel of ``data``,
+	        which must then be (H, W, 4).
+
+	Returns:
+	    (H, W) uint8 alpha plane (a view of ``data`` when ``inplace`` is set).
+
+	Raises:
+	    ValueError: If the array or targets are not supported, or ``inplace``
+	        is used without an alpha channel.
+
+	"""
+	height, width = check_pixels(data)
+	if inplace:
+		if data.shape[2] != RGBA_CHANNELS:
+			raise ValueError("inplace=True requires an (H, W, 4) RGBA array")
+		out = data[:, :, 3]
+	elif out is None:
+		out = np.empty((height, width), dtype=np.uint8)
+
+	mask = color_mask(data, target_color, tolerance)
+	# True (1) - 1 wraps to 0 and False (0) - 1 to 255: the alpha in one pass.
+	np.subtract(mask.view(np.uint8), 1, out=out)
+	return out
@@ -0,0 +1,500 @@
+"""
+Color distance metrics for deciding which pixels match a target color.
+
+Each metric is a ``ColorMetric`` strategy that maps pixels into its own
+coordinates once (``prepare``) and then measures their distance to any number
+of targets. The tolerance is expressed in the metric's own units: channel
+levels (0-255) for the RGB metrics and ΔE for the CIE Lab ones.
+
+- ``box``: every channel within the tolerance (the default, and the fastest).
+- ``euclidean``: straight-line distance in RGB.
+- ``weighted``: RGB distance with per-channel weights that follow perceived
+  brightness, so green differences count more than blue ones.
+- ``cie76``: ΔE*ab, the straight-line distance in CIE L*a*b*.
+- ``ciede2000``: CIEDE2000 ΔE00, the most perceptually uniform (and costly).
+
+Pixels are processed in float32 in chunks of rows, so the working memory is
+bounded by the chunk size rather than the image size. The sRGB to Lab
+conversion goes through a cached 256-entry linearization table, and the Lab
+coordinates of each target color are cached.
+"""
+
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+import numpy as np
+
+from .masking import (
+	RGBA_CHANNELS,
+	Color,
+	ColorSpec,
+	ToleranceSpec,
+	check_pixels,
+	color_mask,
+	normalize_targets,
+)
+
+# Pixels evaluated per chunk; every float32 coordinate plane is 768 KiB
+_CHUNK_PIXELS = 1 << 16
+
+# sRGB (D65) to CIE XYZ, with rows pre-divided by the D65 reference white
+_RGB_TO_XYZ = np.array(
+	[
+		[0.4124564, 0.3575761, 0.1804375],
+		[0.2126729, 0.7151522, 0.0721750],
+		[0.0193339, 0.1191920, 0.9503041],
+	],
+	dtype=np.float32,
+) / np.array([[0.95047], [1.0], [1.08883]], dtype=np.float32)
+_LAB_EPSILON = np.float32((6 / 29) ** 3)
+_LAB_SLOPE = np.float32(1 / (3 * (6 / 29) ** 2))
+_LAB_OFFSET = np.float32(4 / 29)
+
+
+@lru_cache(maxsize=1)
+def _linear_table() -> np.ndarray:
+	"""Return the linear-light value of every 8-bit sRGB level."""
+	levels = np.arange(256, dtype=np.float64) / 255
+	# The piecewise sRGB transfer function, constants from IEC 61966-2-1
+	linear = np.where(
+		levels <= 0.04045,  # noqa: PLR2004
+		levels / 12.92,
+		((levels + 0.055) / 1.055) ** 2.4,
+	)
+	return linear.astype(np.float32)
+
+
+def srgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+	"""
+	Convert 8-bit sRGB colors to CIE L*a*b* (D65).
+
+	Args:
+	    rgb: (..., 3) uint8 array.
+
+	Returns:
+	    (..., 3) float32 array of L*, a*, b*.
+
+	"""
+	xyz = _linear_table()[rgb] @ _RGB_TO_XYZ.T
+	# f(t) of the CIE definition: a cube root, linear near black
+	f = np.cbrt(xyz)
+	small = xyz <= _LAB_EPSILON
+	f[small] = xyz[small] * _LAB_SLOPE + _LAB_OFFSET
+	lab = np.empty_like(f)
+	lab[..., 0] = 116 * f[..., 1] - 16
+	lab[..., 1] = 500 * (f[..., 0] - f[..., 1])
+	lab[..., 2] = 200 * (f[..., 1] - f[..., 2])
+	return lab
+
+
+@lru_cache(maxsize=256)
+def _target_lab(color: Color) -> np.ndarray:
+	"""Return the Lab coordinates of one target color, cached per color."""
+	lab = srgb_to_lab(np.array(color, dtype=np.uint8))
+	lab.flags.writeable = False
+	return lab
+
+
+def _squared_distance(coords: np.ndarray, target: np.ndarray) -> np.ndarray:
+	"""Return the squared Euclidean distances of coordinates to a target."""
+	diff = coords - target
+	diff *= diff
+	return diff.sum(axis=-1)
+
+
+class ColorMetric(ABC):
+	"""
+	Strategy for measuring how far pixels are from a target color.
+
+	Subclasses set ``name`` and must implement ``distance``; they may override
+	``prepare``/``target`` to work in another color space, and ``within`` when
+	the tolerance test can skip part of the distance computation.
+	"""
+
+	name = ""
+
+	def prepare(self, rgb: np.ndarray) -> np.ndarray:
+		"""Return the metric coordinates of (N, 3) uint8 pixels."""
+		return rgb.astype(np.float32)
+
+	def target(self, color: Color) -> np.ndarray:
+		"""Return the metric coordinates of a target color."""
+		return np.array(color, dtype=np.float32)
+
+	@abstractmethod
+	def distance(self, coords: np.ndarray, target: np.ndarray) -> np.ndarray:
+		"""Return the (N,) float32 distances of prepared pixels to a target."""
+
+	def within(
+		self, coords: np.ndarray, target: np.ndarray, tolerance: float
+	) -> np.ndarray:
+		"""Return the (N,) bool mask of prepared pixels within tolerance."""
+		return self.distance(coords, target) <= tolerance
+
+	def __repr__(self) -> str:
+		"""Return the metric name."""
+		return f"{type(self).__name__}({self.name!r})"
+
+
+class BoxMetric(ColorMetric):
+	"""Largest per-channel difference (the per-channel box test)."""
+
+	name = "box"
+
+	def distance(self, coords: np.ndarray, target: np.ndarray) -> np.ndarray:
+		"""Return the largest absolute channel difference."""
+		return np.abs(coords - target).max(axis=-1)
+
+
+class EuclideanMetric(ColorMetric):
+	"""Straight-line distance in RGB, optionally with per-channel weights."""
+
+	name = "euclidean"
+
+	def __init__(self, weights: tuple[float, float, float] = (1.0, 1.0, 1.0)) -> None:
+		"""
+		Initialize the metric.
+
+		Args:
+		    weights: Weight of the squared difference of each channel.
+
+		"""
+		self.weights = np.sqrt(np.asarray(weights, dtype=np.float32))
+
+	def prepare(self, rgb: np.ndarray) -> np.ndarray:
+		"""Return the pixels scaled by the square roots of the weights."""
+		return rgb * self.weights
+
+	def target(self, color: Color) -> np.ndarray:
+		"""Return the target scaled like the pixels."""
+		return np.array(color, dtype=np.float32) * self.weights
+
+	def distance(self, coords: np.ndarray, target: np.ndarray) -> np.ndarray:
+		"""Return the weighted Euclidean distance."""
+		return np.sqrt(_squared_distance(coords, target))
+
+	def within(
+		self, coords: np.ndarray, target: np.ndarray, tolerance: float
+	) -> np.ndarray:
+		"""Compare squared distances, skipping the square root."""
+		return _squared_distance(coords, target) <= np.float32(tolerance) ** 2
+
+
+class WeightedRGBMetric(EuclideanMetric):
+	"""
+	RGB distance weighted by the Rec. 601 luma coefficients.
+
+	The weights are scaled to sum to 3, so a difference of d on every channel
+	is as far as it is for the plain Euclidean metric.
+	"""
+
+	name = "weighted"
+
+	def __init__(self) -> None:
+		"""Initialize the metric with the luma weights."""
+		super().__init__((0.299 * 3, 0.587 * 3, 0.114 * 3))
+
+
+class CIE76Metric(ColorMetric):
+	"""ΔE*ab: straight-line distance in CIE L*a*b*."""
+
+	name = "cie76"
+
+	def prepare(self, rgb: np.ndarray) -> np.ndarray:
+		"""Return the Lab coordinates of the pixels."""
+		return srgb_to_lab(rgb)
+
+	def target(self, color: Color) -> np.ndarray:
+		"""Return the cached Lab coordinates of the target."""
+		return _target_lab(color)
+
+	def distance(self, coords: np.ndarray, target: np.ndarray) -> np.ndarray:
+		"""Return ΔE*ab."""
+		return np.sqrt(_squared_distance(coords, target))
+
+	def within(
+		self, coords: np.ndarray, target: np.ndarray, tolerance: float
+	) -> np.ndarray:
+		"""Compare squared distances, skipping the square root."""
+		return _squared_distance(coords, target) <= np.float32(tolerance) ** 2
+
+
+class CIEDE2000Metric(CIE76Metric):
+	"""CIEDE2000 color difference ΔE00 (Sharma, Wu and Dalal, 2005)."""
+
+	name = "ciede2000"
+
+	def distance(self, coords: np.ndarray, target: np.ndarray) -> np.ndarray:
+		"""Return ΔE00."""
+		return ciede2000(coords, target)
+
+	def within(
+		self, coords: np.ndarray, target: np.ndarray, tolerance: float
+	) -> np.ndarray:
+		"""Compare ΔE00 with the tolerance."""
+		return self.distance(coords, target) <= tolerance
+
+
+def ciede2000(lab: np.ndarray, target: np.ndarray) -> np.ndarray:
+	"""
+	Return the CIEDE2000 difference between Lab colors and one target.
+
+	Args:
+	    lab: (N, 3) float32 Lab colors.
+	    target: (3,) Lab target color.
+
+	Returns:
+	    (N,) float32 ΔE00 values.
+
+	"""
+	lab = np.asarray(lab, dtype=np.float32)
+	l1, a1, b1 = lab[..., 0], lab[..., 1], lab[..., 2]
+	l2, a2, b2 = (np.float32(v) for v in target)
+	pow25_7 = np.float32(25.0**7)
+
+	c_mean = (np.hypot(a1, b1) + np.hypot(a2, b2)) / 2
+	c_mean7 = c_mean**7
+	g = 0.5 * (1 - np.sqrt(c_mean7 / (c_mean7 + pow25_7)))
+	a1p = (1 + g) * a1
+	a2p = (1 + g) * a2
+	c1p = np.hypot(a1p, b1)
+	c2p = np.hypot(a2p, b2)
+	h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+	h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+
+	chroma_product = c1p * c2p
+	neutral = chroma_product == 0
+	dhp = h2p - h1p
+	# Hue angles wrap around the circle, in degrees as in the CIEDE2000 formula
+	dhp = np.where(dhp > 180, dhp - 360, np.where(dhp < -180, dhp + 360, dhp))  # noqa: PLR2004
+	dhp[neutral] = 0
+	dl = l2 - l1
+	dc = c2p - c1p
+	dh = 2 * np.sqrt(chroma_product) * np.sin(np.radians(dhp) / 2)
+
+	l_mean = (l1 + l2) / 2
+	cp_mean = (c1p + c2p) / 2
+	h_sum = h1p + h2p
+	h_mean = np.where(
+		np.abs(h1p - h2p) <= 180,  # noqa: PLR2004
+		h_sum / 2,
+		np.where(h_sum < 360, (h_sum + 360) / 2, (h_sum - 360) / 2),  # noqa: PLR2004
+	)
+	h_mean[neutral] = h_sum[neutral]
+
+	t = (
+		1
+		- 0.17 * np.cos(np.radians(h_mean - 30))
+		+ 0.24 * np.cos(np.radians(2 * h_mean))
+		+ 0.32 * np.cos(np.radians(3 * h_mean + 6))
+		- 0.20 * np.cos(np.radians(4 * h_mean - 63))
+	)
+	d_theta = 30 * np.exp(-(((h_mean - 275) / 25) ** 2))
+	cp_mean7 = cp_mean**7
+	r_c = 2 * np.sqrt(cp_mean7 / (cp_mean7 + pow25_7))
+	l_offset = (l_mean - 50) ** 2
+	s_l = 1 + 0.015 * l_offset / np.sqrt(20 + l_offset)
+	s_c = 1 + 0.045 * cp_mean
+	s_h = 1 + 0.015 * cp_mean * t
+	r_t = -np.sin(np.radians(2 * d_theta)) * r_c
+
+	dl /= s_l
+	dc /= s_c
+	dh /= s_h
+	return np.sqrt(dl * dl + dc * dc + dh * dh + r_t * dc * dh).astype(np.float32)
+
+
+METRICS: dict[str, ColorMetric] = {
+	metric.name: metric
+	for metric in (
+		BoxMetric(),
+		EuclideanMetric(),
+		WeightedRGBMetric(),
+		CIE76Metric(),
+		CIEDE2000Metric(),
+	)
+}
+
+
+def register_metric(metric: ColorMetric) -> ColorMetric:
+	"""
+	Make a metric available by name to ``get_metric`` and the CLI.
+
+	Args:
+	    metric: Metric instance with a unique ``name``.
+
+	Returns:
+	    The registered metric.
+
+	"""
+	METRICS[metric.name] = metric
+	return metric
+
+
+def get_metric(metric: str | ColorMetric) -> ColorMetric:
+	"""
+	Return a metric instance from its name (or the instance itself).
+
+	Raises:
+	    ValueError: If no metric of that name is registered.
+
+	"""
+	if isinstance(metric, ColorMetric):
+		return metric
+	try:
+		return METRICS[metric]
+	except KeyError:
+		raise ValueError(
+			f"Unknown metric '{metric}', expected one of {sorted(METRICS)}"
+		) from None
+
+
+def metric_mask(
+	data: np.ndarray,
+	target_color: ColorSpec,
+	tolerance: ToleranceSpec = 10,
+	metric: str | ColorMetric = "box",
+	*,
+	out: np.ndarray | None = None,
+) -> np.ndarray:
+	"""
+	Return a mask of the pixels within tolerance of any color under a metric.
+
+	The box metric uses the integer fast path of ``color_mask``. Other metrics
+	convert one chunk of rows at a time to float32 coordinates, shared by
+	every target color.
+
+	Args:
+	    data: (H, W, 3) or (H, W, 4) uint8 pixel array.
+	    target_color: RGB tuple of the color to match, or a sequence of them.
+	    tolerance: Tolerance in the metric's units, shared or one per color.
+	    metric: Metric name or instance.
+	    out: Optional (H, W) bool array to write the mask into.
+
+	Returns:
+	    (H, W) bool mask, True where the pixel matches any of the colors.
+
+	Raises:
+	    ValueError: If the array, targets or metric are not supported.
+
+	"""
+	metric = get_metric(metric)
+	if isinstance(metric, BoxMetric):
+		return color_mask(data, target_color, tolerance, out=out)
+
+	height, width = check_pixels(data)
+	colors, tolerances = normalize_targets(target_color, tolerance)
+	if out is None:
+		out = np.empty((height, width), dtype=bool)
+	targets = [metric.target(color) for color in colors]
+
+	rows = max(1, _CHUNK_PIXELS // max(width, 1))
+	for y0 in range(0, height, rows):
+		y1 = min(y0 + rows, height)
+		coords = metric.prepare(data[y0:y1, :, :3].reshape(-1, 3))
+		hit = np.zeros(coords.shape[0], dtype=bool)
+		for target, color_tolerance in zip(targets, tolerances, strict=True):
+			hit |= metric.within(coords, target, color_tolerance)
+		out[y0:y1] = hit.reshape(y1 - y0, width)
+	return out
+
+
+def metric_distance(
+	data: np.ndarray,
+	color: Color,
+	metric: str | ColorMetric = "box",
+	*,
+	out: np.ndarray | None = None,
+) -> np.ndarray:
+	"""
+	Return every pixel's distance to one color, rounded up to whole units.
+
+	For a whole-number tolerance ``t``, a pixel matches exactly when its entry
+	is at most ``t``, so the map can be computed once and thresholded again
+	for every tolerance, e.g. while a slider is being dragged.
+
+	Args:
+	    data: (H, W, 3) or (H, W, 4) uint8 pixel array.
+	    color: RGB tuple of the target color.
+	    metric: Metric name or instance.
+	    out: Optional (H, W) uint16 array to write the distances into.
+
+	Returns:
+	    (H, W) uint16 distances in the metric's units, saturating at 65535.
+
+	Raises:
+	    ValueError: If the array or metric is not supported.
+
+	"""
+	metric = get_metric(metric)
+	height, width = check_pixels(data)
+	if out is None:
+		out = np.empty((height, width), dtype=np.uint16)
+	color = tuple(int(c) for c in color[:3])
+	target = metric.target(color)
+
+	rows = max(1, _CHUNK_PIXELS // max(width, 1))
+	for y0 in range(0, height, rows):
+		y1 = min(y0 + rows, height)
+		chunk = data[y0:y1, :, :3]
+		if isinstance(metric, BoxMetric):
+			# Whole channel levels already: |a - b| as max - min stays in uint8
+			largest = None
+			for channel, value in enumerate(color):
+				plane = chunk[:, :, channel]
+				diff = np.maximum(plane, value) - np.minimum(plane, value)
+				largest = (
+					diff if largest is None else np.maximum(largest, diff, out=diff)
+				)
+			out[y0:y1] = largest
+			continue
+		distance = metric.distance(metric.prepare(chunk.reshape(-1, 3)), target)
+		np.ceil(distance, out=distance)
+		np.minimum(distance, np.iinfo(np.uint16).max, out=distance)
+		out[y0:y1] = distance.reshape(y1 - y0, width)
+	return out
+
+
+def metric_alpha(  # noqa: PLR0913
+	data: np.ndarray,
+	target_color: ColorSpec,
+	tolerance: ToleranceSpec = 10,
+	metric: str | ColorMetric = "box",
+	*,
+	out: np.ndarray | None = None,
+	inplace: bool = False,
+) -> np.ndarray:
+	"""
+	Return the alpha plane that makes colors transparent under a metric.
+
+	Matching pixels get alpha 0 and all other pixels alpha 255.
+
+	Args:
+	    data: (H, W, 3) or (H, W, 4) uint8 pixel array.
+	    target_color: RGB tuple of the color to make transparent, or a
+	        sequence of them.
+	    tolerance: Tolerance in the metric's units, shared or one per color.
+	    metric: Metric name or instance.
+	    out: Optional (H, W) uint8 array to write the alpha plane into.
+	    inplace: Write the alpha plane into the alpha channel of ``data``,
+	        which must then be (H, W, 4).
+
+	Returns:
+	    (H, W) uint8 alpha plane (a view of ``data`` when ``inplace`` is set).
+
+	Raises:
+	    ValueError: If the array, targets or metric are not supported, or
+	        ``inplace`` is used without an alpha channel.
+
+	"""
+	height, width = check_pixels(data)
+	if inplace:
+		if data.shape[2] != RGBA_CHANNELS:
+			raise ValueError("inplace=True requires an (H, W, 4) RGBA array")
+		out = data[:, :, 3]
+	elif out is None:
+		out = np.empty((height, width), dtype=np.uint8)
+
+	mask = metric_mask(data, target_color, tolerance, metric)
+	np.subtract(mask.view(np.uint8), 1, out=out)
+	return out
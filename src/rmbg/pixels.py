@@ -0,0 +1,176 @@
+"""
+Conversions between pixmaps, PIL images and RGBA NumPy arrays.
+
+This module keeps pixel data in as few buffers as possible: PDF pixmaps are
+exposed to NumPy without copying, PIL images are widened to RGBA with a
+single allocation, and very large frames can live in memory-mapped scratch
+files instead of anonymous memory.
+"""
+
+import io
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+import numpy as np
+from PIL import Image
+
+if TYPE_CHECKING:
+	import fitz
+
+PDF_BASE_DPI = 72
+ClipRect = tuple[float, float, float, float]
+ImageSource = str | Path | bytes | bytearray | memoryview | BinaryIO
+ImageDestination = str | Path | BinaryIO
+ResolvedSource = Path | bytes | bytearray | memoryview
+
+# PDF readers accept the header anywhere in the first KiB of the file
+_PDF_HEADER_WINDOW = 1024
+
+
+class _PixmapBuffer:
+	"""
+	Expose a pixmap's samples to NumPy without copying them.
+
+	The resulting array keeps this object, and therefore the pixmap that owns
+	the memory, alive for as long as the array (or any view of it) exists.
+	"""
+
+	def __init__(self, pix: "fitz.Pixmap") -> None:
+		self._pix = pix
+		self.__array_interface__ = {
+			"version": 3,
+			"shape": (pix.height, pix.width, pix.n),
+			"strides": (pix.stride, pix.n, 1),
+			"typestr": "|u1",
+			"data": (pix.samples_ptr, False),
+		}
+
+
+def pixmap_to_rgba(pix: "fitz.Pixmap") -> np.ndarray:
+	"""
+	View an RGBA pixmap as an opaque RGBA array composited over white.
+
+	MuPDF renders alpha pixmaps onto a transparent background with
+	premultiplied alpha. Compositing over white is done in place, so the
+	returned array shares the pixmap's buffer.
+
+	Args:
+	    pix: RGB pixmap with an alpha channel.
+
+	Returns:
+	    Writable (H, W, 4) uint8 RGBA array backed by the pixmap.
+
+	"""
+	data = np.asarray(_PixmapBuffer(pix))
+
+	# Premultiplied "over white": c + (255 - a), which cannot overflow as c <= a.
+	alpha = data[:, :, 3]
+	np.subtract(255, alpha, out=alpha)
+	data[:, :, :3] += alpha[:, :, np.newaxis]
+	alpha.fill(255)
+	return data
+
+
+def image_to_rgba(image: Image.Image, out: np.ndarray | None = None) -> np.ndarray:
+	"""
+	Return a writable (H, W, 4) uint8 RGBA array holding the image pixels.
+
+	RGB images are widened directly into the result instead of going through an
+	intermediate RGBA PIL image.
+
+	Args:
+	    image: PIL Image object in any mode.
+	    out: Optional (H, W, 4) uint8 array to write the pixels into.
+
+	Returns:
+	    RGBA pixel array (``out`` when given).
+
+	"""
+	if image.mode == "RGB":
+		data = (
+			np.empty((image.height, image.width, 4), dtype=np.uint8)
+			if out is None
+			else out
+		)
+		data[:, :, :3] = np.asarray(image)
+		data[:, :, 3] = 255
+		return data
+	if image.mode != "RGBA":
+		image = image.convert("RGBA")
+	if out is None:
+		return np.array(image)
+	out[...] = np.asarray(image)
+	return out
+
+
+def scratch_rgba(
+	height: int, width: int, directory: str | Path | None = None
+) -> np.memmap:
+	"""
+	Return an uninitialized (H, W, 4) uint8 array backed by a scratch file.
+
+	The file is created unlinked (or delete-on-close on Windows), so it has no
+	name to clean up and its disk space is released with the last reference
+	to the array. Being file-backed, the pages can be written out by the OS
+	under memory pressure instead of counting against anonymous memory.
+
+	Args:
+	    height: Number of rows.
+	    width: Number of columns.
+	    directory: Directory of the scratch file (default: the system
+	        temporary directory, see ``TMPDIR``).
+
+	Returns:
+	    Writable memory-mapped RGBA array.
+
+	"""
+	with tempfile.TemporaryFile(prefix="rmbg-", dir=directory) as fp:
+		fp.truncate(height * width * 4)
+		# The mapping stays valid after the file object is closed
+		return np.memmap(fp, dtype=np.uint8, mode="r+", shape=(height, width, 4))
+
+
+def resolve_source(source: ImageSource) -> tuple[ResolvedSource, bool]:
+	"""
+	Resolve an image or PDF source to an existing path or an in-memory buffer.
+
+	Bytes-like sources are used as they are, without copying; binary streams
+	are read from their current position to the end.
+
+	Args:
+	    source: Path, bytes-like object or readable binary stream.
+
+	Returns:
+	    Tuple of the path or buffer, and whether it holds a PDF: decided by
+	    the suffix for paths and by the ``%PDF-`` header for buffers.
+
+	Raises:
+	    FileNotFoundError: If a path doesn't exist.
+
+	"""
+	if isinstance(source, str | Path):
+		path = Path(source)
+		if not path.exists():
+			raise FileNotFoundError(f"File not found: {path}")
+		return path, path.suffix.lower() == ".pdf"
+	if not isinstance(source, bytes | bytearray | memoryview):
+		source = source.read()
+	head = bytes(memoryview(source)[:_PDF_HEADER_WINDOW])
+	return source, b"%PDF-" in head
+
+
+def open_pdf(source: str | ResolvedSource) -> "fitz.Document":
+	"""Open a PDF from a path or a resolved in-memory buffer (see ``resolve_source``)."""
+	import fitz  # noqa: PLC0415
+
+	if isinstance(source, str | Path):
+		return fitz.open(source)
+	return fitz.open(stream=source, filetype="pdf")
+
+
+def open_image(source: str | ResolvedSource) -> Image.Image:
+	"""Open an image lazily from a path or a resolved in-memory buffer."""
+	if isinstance(source, str | Path):
+		return Image.open(source)
+	return Image.open(io.BytesIO(source))
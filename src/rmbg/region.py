@@ -0,0 +1,220 @@
+"""
+Connected regions of a mask, for removing only the border-connected background.
+
+Only the background that touches the image border or a seed point is removed.
+A global color match also removes foreground pixels that happen to share the
+background color, such as white text inside a logo. ``connected_mask`` keeps
+only the matching pixels that are 4-connected to the border, or to given seed
+points, like a flood fill from there.
+
+The fill works on horizontal runs of matching pixels instead of single pixels,
+and every step is vectorized, so the cost grows linearly with the image:
+
+1. Runs are found row by row from the transitions of the mask.
+2. A run is linked to each run of the row above that overlaps it. Runs of a
+   row are sorted and disjoint, so the overlapping ones form one index range,
+   found with two ``np.searchsorted`` calls for all runs at once.
+3. Linked runs are merged into components by a union-find on the run graph,
+   hooking the larger root of every link under the smaller one and then
+   jumping pointers until every run points at its root. Each round at least
+   halves the number of components that still have links between them.
+4. The runs whose component has no seed run are cleared from a copy of the
+   mask, through a cumulative sum of +1 at run starts and -1 at run ends over
+   the rows that have such runs only.
+
+Steps 1 and 4 go through the mask in chunks of rows, so apart from the output,
+memory grows with the number of runs rather than the number of pixels.
+"""
+
+from collections.abc import Sequence
+
+import numpy as np
+
+Point = tuple[int, int]
+
+# Pixels per chunk of rows when finding and painting runs
+_CHUNK_PIXELS = 1 << 20
+
+
+def _runs(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+	"""
+	Return the horizontal runs of True pixels in a mask.
+
+	Returns:
+	    Arrays of the row, first column and end column (exclusive) of each
+	    run, sorted by row and then column.
+
+	"""
+	height, width = mask.shape
+	rows_per_chunk = max(1, _CHUNK_PIXELS // max(width, 1))
+	padded = np.zeros((min(rows_per_chunk, height), width + 2), dtype=bool)
+	rows, starts, ends = [], [], []
+	for y0 in range(0, height, rows_per_chunk):
+		y1 = min(y0 + rows_per_chunk, height)
+		chunk = padded[: y1 - y0]
+		chunk[:, 1:-1] = mask[y0:y1]
+		# Transitions alternate between a run's start and its end in every
+		# row; a flat search is much faster than a 2D nonzero()
+		edges = np.flatnonzero(chunk[:, 1:] != chunk[:, :-1])
+		edge_rows, edge_columns = np.divmod(edges, width + 1)
+		rows.append(edge_rows[::2] + y0)
+		starts.append(edge_columns[::2])
+		ends.append(edge_columns[1::2])
+	return np.concatenate(rows), np.concatenate(starts), np.concatenate(ends)
+
+
+def _links(
+	rows: np.ndarray, starts: np.ndarray, ends: np.ndarray, width: int
+) -> tuple[np.ndarray, np.ndarray]:
+	"""
+	Return the pairs of runs in adjacent rows that overlap.
+
+	Returns:
+	    Two equally long arrays of run indices, one pair per link.
+
+	"""
+	# Positions ordered by row, then column, across the whole image
+	stride = width + 1
+	start_keys = rows * stride + starts
+	end_keys = rows * stride + ends
+	above = (rows - 1) * stride
+	# Runs of the row above ending after this run starts...
+	first = np.searchsorted(end_keys, above + starts, side="right")
+	# ...and starting before it ends
+	last = np.searchsorted(start_keys, above + ends, side="left")
+	counts = np.maximum(last - first, 0)
+
+	below = np.repeat(np.arange(len(rows)), counts)
+	offsets = np.arange(len(below)) - np.repeat(np.cumsum(counts) - counts, counts)
+	return below, np.repeat(first, counts) + offsets
+
+
+def _components(count: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+	"""
+	Label the connected components of a graph given as a list of links.
+
+	Args:
+	    count: Number of nodes.
+	    a: First node of each link.
+	    b: Second node of each link.
+
+	Returns:
+	    The root of each node's component, the smallest node index in it.
+
+	"""
+	labels = np.arange(count)
+	while len(a):
+		root_a, root_b = labels[a], labels[b]
+		low = np.minimum(root_a, root_b)
+		high = np.maximum(root_a, root_b)
+		spanning = low != high
+		if not spanning.any():
+			break
+		# Hook roots under smaller roots; no cycles since labels only decrease
+		np.minimum.at(labels, high[spanning], low[spanning])
+		while True:
+			jumped = labels[labels]
+			if np.array_equal(jumped, labels):
+				break
+			labels = jumped
+		# Links within one component stay within it
+		a, b = a[spanning], b[spanning]
+	return labels
+
+
+def _seed_runs(
+	rows: np.ndarray,
+	starts: np.ndarray,
+	ends: np.ndarray,
+	shape: tuple[int, int],
+	seeds: Sequence[Point] | None,
+) -> np.ndarray:
+	"""Return the indices of the runs at the border, or containing a seed."""
+	height, width = shape
+	if seeds is None:
+		edge_rows = (rows == 0) | (rows == height - 1)
+		return np.flatnonzero(edge_rows | (starts == 0) | (ends == width))
+
+	points = np.asarray(seeds, dtype=np.intp).reshape(-1, 2)
+	x, y = points[:, 0], points[:, 1]
+	if ((x < 0) | (x >= width) | (y < 0) | (y >= height)).any():
+		raise ValueError(f"Seed points must lie within the {width}x{height} image")
+	if not len(rows):
+		return np.empty(0, dtype=np.intp)
+	stride = width + 1
+	keys = rows * stride + starts
+	index = np.searchsorted(keys, y * stride + x, side="right") - 1
+	# Seeds on pixels that do not match fill nothing
+	found = (index >= 0) & (rows[index] == y) & (ends[index] > x)
+	return index[found]
+
+
+def _clear(
+	out: np.ndarray, rows: np.ndarray, starts: np.ndarray, ends: np.ndarray
+) -> None:
+	"""Set ``out`` to False on the given runs, visiting only their rows."""
+	height, width = out.shape
+	rows_per_chunk = max(1, _CHUNK_PIXELS // max(width, 1))
+	steps = np.empty(min(rows_per_chunk, height) * width + 1, dtype=np.int8)
+	chunk_rows = np.arange(0, height + rows_per_chunk, rows_per_chunk)
+	bounds = np.searchsorted(rows, chunk_rows)
+	for chunk_index, y0 in enumerate(range(0, height, rows_per_chunk)):
+		first, last = bounds[chunk_index], bounds[chunk_index + 1]
+		if first == last:
+			continue
+		y1 = min(y0 + rows_per_chunk, height)
+		offsets = (rows[first:last] - y0) * width
+		size = (y1 - y0) * width
+		chunk = steps[: size + 1]
+		chunk[:] = 0
+		# Separate assignments, since a run may end where the next one starts
+		chunk[offsets + starts[first:last]] = 1
+		chunk[offsets + ends[first:last]] -= 1
+		cleared = np.cumsum(chunk[:size], dtype=np.int8).view(bool)
+		# a and not b, for booleans
+		np.greater(out[y0:y1], cleared.reshape(y1 - y0, width), out=out[y0:y1])
+
+
+def connected_mask(
+	mask: np.ndarray,
+	seeds: Sequence[Point] | None = None,
+	*,
+	out: np.ndarray | None = None,
+) -> np.ndarray:
+	"""
+	Return the pixels of a mask that are connected to the border or to seeds.
+
+	Pixels are connected through their four direct neighbours, so a region
+	does not leak through the diagonal gaps of a one pixel wide outline.
+
+	Args:
+	    mask: (H, W) bool mask, e.g. the pixels matching a background color.
+	    seeds: Optional (x, y) pixel coordinates to fill from instead of the
+	        border. Seeds on pixels outside the mask fill nothing.
+	    out: Optional (H, W) bool array to write the result into; may be
+	        ``mask`` itself.
+
+	Returns:
+	    (H, W) bool mask of the pixels of ``mask`` in a region that touches
+	    the border of the image, or contains a seed.
+
+	Raises:
+	    ValueError: If the mask is not two-dimensional or a seed lies outside
+	        the image.
+
+	"""
+	if mask.ndim != 2:  # noqa: PLR2004
+		raise ValueError(f"Expected an (H, W) mask, got shape {mask.shape}")
+	rows, starts, ends = _runs(mask)
+	selected = _seed_runs(rows, starts, ends, mask.shape, seeds)
+
+	labels = _components(len(rows), *_links(rows, starts, ends, mask.shape[1]))
+	seeded = np.zeros(len(rows), dtype=bool)
+	seeded[labels[selected]] = True
+	dropped = ~seeded[labels]
+	if out is None:
+		out = mask.copy()
+	elif out is not mask:
+		out[...] = mask
+	_clear(out, rows[dropped], starts[dropped], ends[dropped])
+	return out
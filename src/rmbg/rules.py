@@ -0,0 +1,284 @@
+"""
+Compiled transparency rules backed by a 3D color lookup table.
+
+A rule answers "what alpha does this RGB color get?" for one combination of
+target colors, tolerances and matching metric, either binary or as a soft
+matte between an inner and an outer tolerance. Compiling it evaluates that
+question once for every color of a 256³ (exact) or 32³ (binned) RGB grid and
+stores the answers in an alpha lookup table. Masking an image is then one
+gather from the table per pixel, indexed by the packed RGB value, however many
+colors or however expensive the metric.
+
+Compiled rules are cached with LRU eviction, keyed by (colors, tolerances,
+metric, resolution, outer tolerances), so repeated parameters pay for the
+table only once per process.
+"""
+
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+from .masking import (
+	RGBA_CHANNELS,
+	Color,
+	ColorSpec,
+	ToleranceSpec,
+	check_pixels,
+	normalize_targets,
+)
+from .matte import matte_alpha, normalize_outer
+from .metrics import BoxMetric, ColorMetric, get_metric, metric_mask
+
+LUT_RESOLUTIONS = (32, 256)
+RULE_CACHE_SIZE = 8
+
+# Pixels indexed per chunk, bounding the packed-index scratch buffers to 2 MiB
+_CHUNK_PIXELS = 1 << 18
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+@dataclass(frozen=True, eq=False)
+class TransparencyRule:
+	"""
+	A precomputed alpha lookup table for a set of colors and tolerances.
+
+	Attributes:
+	    colors: Target RGB colors.
+	    tolerances: Tolerance of each color.
+	    metric: Name of the color matching metric.
+	    resolution: Grid points per channel, 256 (exact) or 32 (each table
+	        entry covers an 8x8x8 block of colors and uses its center).
+	    table: Flat uint8 alpha table of ``resolution ** 3`` entries, indexed
+	        by ``b << 2k | g << k | r`` for the k-bit channel values.
+	    outer_tolerances: Outer tolerance of each color for a soft matte, or
+	        None for binary alpha.
+
+	"""
+
+	colors: tuple[Color, ...]
+	tolerances: tuple[int, ...]
+	metric: str
+	resolution: int
+	table: np.ndarray
+	outer_tolerances: tuple[int, ...] | None = None
+
+	@property
+	def nbytes(self) -> int:
+		"""Size of the lookup table in bytes."""
+		return self.table.nbytes
+
+	def alpha(
+		self,
+		data: np.ndarray,
+		*,
+		out: np.ndarray | None = None,
+		inplace: bool = False,
+	) -> np.ndarray:
+		"""
+		Return the alpha plane the rule gives to each pixel.
+
+		Args:
+		    data: (H, W, 3) or (H, W, 4) uint8 pixel array.
+		    out: Optional (H, W) uint8 array to write the alpha plane into.
+		    inplace: Write the alpha plane into the alpha channel of ``data``,
+		        which must then be (H, W, 4).
+
+		Returns:
+		    (H, W) uint8 alpha plane (a view of ``data`` when ``inplace`` is set).
+
+		Raises:
+		    ValueError: If the array is not supported or ``inplace`` is used
+		        without an alpha channel.
+
+		"""
+		height, width = check_pixels(data)
+		if inplace:
+			if data.shape[2] != RGBA_CHANNELS:
+				raise ValueError("inplace=True requires an (H, W, 4) RGBA array")
+			out = data[:, :, 3]
+		elif out is None:
+			out = np.empty((height, width), dtype=np.uint8)
+
+		rows = max(1, _CHUNK_PIXELS // max(width, 1))
+		# intp indices, because np.take would otherwise convert them first
+		index = np.empty((min(rows, height), width), dtype=np.intp)
+		scratch = np.empty_like(index)
+		gathered = np.empty(index.shape, dtype=np.uint8)
+		for y0 in range(0, height, rows):
+			y1 = min(y0 + rows, height)
+			chunk = index[: y1 - y0]
+			self._pack(data[y0:y1], chunk, scratch[: y1 - y0])
+			np.take(self.table, chunk, out=gathered[: y1 - y0], mode="clip")
+			out[y0:y1] = gathered[: y1 - y0]
+		return out
+
+	def mask(self, data: np.ndarray, *, out: np.ndarray | None = None) -> np.ndarray:
+		"""
+		Return a mask of the pixels the rule makes fully transparent.
+
+		Args:
+		    data: (H, W, 3) or (H, W, 4) uint8 pixel array.
+		    out: Optional (H, W) bool array to write the mask into.
+
+		Returns:
+		    (H, W) bool mask, True where the pixel matches.
+
+		"""
+		return np.equal(self.alpha(data), 0, out=out)
+
+	def _pack(self, data: np.ndarray, index: np.ndarray, scratch: np.ndarray) -> None:
+		"""Write the table index of every pixel of ``data`` into ``index``."""
+		bits = self.resolution.bit_length() - 1
+		shift = 8 - bits
+		if (
+			_LITTLE_ENDIAN
+			and data.shape[2] == RGBA_CHANNELS
+			and data.flags.c_contiguous
+		):
+			# Each RGBA pixel read as one little-endian uint32 is r | g << 8 | b << 16
+			packed = data.view(np.uint32)[:, :, 0]
+			if shift == 0:
+				np.bitwise_and(packed, 0xFFFFFF, out=index)
+				return
+			low = (1 << bits) - 1
+			np.right_shift(packed, shift, out=index)
+			index &= low
+			for channel in (1, 2):
+				np.right_shift(
+					packed, channel * 8 + shift - channel * bits, out=scratch
+				)
+				scratch &= low << (channel * bits)
+				index |= scratch
+			return
+
+		np.copyto(index, data[:, :, 2])
+		index >>= shift
+		for channel in (1, 0):
+			index <<= bits
+			np.copyto(scratch, data[:, :, channel])
+			scratch >>= shift
+			index |= scratch
+
+
+def compile_rule(
+	target_color: ColorSpec,
+	tolerance: ToleranceSpec = 10,
+	metric: str | ColorMetric = "box",
+	resolution: int = 256,
+	outer_tolerance: ToleranceSpec | None = None,
+) -> TransparencyRule:
+	"""
+	Return the compiled rule for a set of colors, reusing a cached table.
+
+	Args:
+	    target_color: RGB tuple of the color to make transparent, or a
+	        sequence of them.
+	    tolerance: Color matching tolerance (0-255), shared or one per color.
+	    metric: Color matching metric, by name or instance. The metric is
+	        evaluated once per grid color when the table is built, so masking
+	        costs the same for every metric.
+	    resolution: Grid points per channel of the lookup table (32 or 256).
+	    outer_tolerance: Compile a soft matte ramping from ``tolerance`` to
+	        this outer tolerance (shared or one per color) instead of binary
+	        alpha.
+
+	Returns:
+	    The compiled rule.
+
+	Raises:
+	    ValueError: If the targets, metric or resolution are not supported.
+
+	"""
+	if resolution not in LUT_RESOLUTIONS:
+		raise ValueError(
+			f"LUT resolution must be one of {LUT_RESOLUTIONS}, got {resolution}"
+		)
+	metric = get_metric(metric)
+	colors, tolerances = normalize_targets(target_color, tolerance)
+	outer = None
+	if outer_tolerance is not None:
+		outer = normalize_outer(tolerances, outer_tolerance)
+	return _compile(colors, tolerances, metric, resolution, outer)
+
+
+@lru_cache(maxsize=RULE_CACHE_SIZE)
+def _compile(
+	colors: tuple[Color, ...],
+	tolerances: tuple[int, ...],
+	metric: ColorMetric,
+	resolution: int,
+	outer: tuple[int, ...] | None = None,
+) -> TransparencyRule:
+	"""Build the lookup table of a rule; cached by its parameters."""
+	grid = _grid(resolution)
+	if outer is not None:
+		table = matte_alpha(_grid_colors(grid), colors, tolerances, outer, metric)
+		table = table.reshape(-1)
+	else:
+		if isinstance(metric, BoxMetric):
+			match = _box_table(grid, colors, tolerances)
+		else:
+			match = _metric_table(grid, colors, tolerances, metric)
+		table = np.empty(match.size, dtype=np.uint8)
+		np.subtract(match.reshape(-1).view(np.uint8), 1, out=table)
+	table.flags.writeable = False
+	return TransparencyRule(colors, tolerances, metric.name, resolution, table, outer)
+
+
+def _grid(resolution: int) -> np.ndarray:
+	"""Return the channel value each grid point stands for (block centers)."""
+	step = 256 // resolution
+	return np.arange(resolution, dtype=np.int16) * step + step // 2
+
+
+def _box_table(
+	grid: np.ndarray, colors: tuple[Color, ...], tolerances: tuple[int, ...]
+) -> np.ndarray:
+	"""Return the (b, g, r) match table of the per-channel box test."""
+	match = np.zeros((grid.size,) * 3, dtype=bool)
+	for color, tolerance in zip(colors, tolerances, strict=True):
+		# The matching grid points of each channel are a contiguous run
+		spans = []
+		for value in reversed(color):
+			hits = np.flatnonzero(np.abs(grid - value) <= tolerance)
+			if hits.size == 0:
+				break
+			spans.append(slice(hits[0], hits[-1] + 1))
+		else:
+			match[tuple(spans)] = True
+	return match
+
+
+def _metric_table(
+	grid: np.ndarray,
+	colors: tuple[Color, ...],
+	tolerances: tuple[int, ...],
+	metric: ColorMetric,
+) -> np.ndarray:
+	"""Return the (b, g, r) match table of any metric, evaluated per grid color."""
+	size = grid.size
+	mask = metric_mask(_grid_colors(grid), colors, tolerances, metric)
+	return mask.reshape(size, size, size)
+
+
+def _grid_colors(grid: np.ndarray) -> np.ndarray:
+	"""Return every grid color as a (N, 1, 3) uint8 array in table order."""
+	size = grid.size
+	bits = size.bit_length() - 1
+	index = np.arange(size**3)
+	rgb = np.empty((size**3, 1, 3), dtype=np.uint8)
+	for channel in range(3):
+		rgb[:, 0, channel] = grid[(index >> (channel * bits)) & (size - 1)]
+	return rgb
+
+
+def rule_cache_info() -> tuple[int, int, int, int]:
+	"""Return (hits, misses, maxsize, currsize) of the compiled rule cache."""
+	return _compile.cache_info()
+
+
+def clear_rule_cache() -> None:
+	"""Drop every cached compiled rule."""
+	_compile.cache_clear()
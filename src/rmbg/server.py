@@ -0,0 +1,563 @@
+"""
+Long-running server mode for low-latency single requests.
+
+Running ``rmbg`` once per image spends most of its time on interpreter startup,
+imports and building the ``ImageProcessor``, not on the pixels. ``rmbg serve``
+pays that once: it keeps one or more warm workers and accepts requests over
+localhost HTTP or a Unix socket.
+
+``POST /process`` takes either a JSON body naming the input and optional output
+path::
+
+    {"input": "scan.jpg", "output": "scan.png", "color": ["#ffffff:20"],
+     "tolerance": 10, "page": 0, "dpi": 300}
+
+or the bytes of an image or PDF as the body with the same fields (except
+``input``) as query parameters, e.g. ``/process?color=%23ffffff&tolerance=20``.
+Without an output path the image is returned in the response, as PNG or in
+the server's ``--format``; with one it is written in the format of its
+extension and a JSON body describing the result is returned. Every response
+carries the per-stage timings in a ``Server-Timing`` header. ``GET /health``
+reports the worker limits and the requests in flight.
+
+At most ``workers`` requests are processed at a time; up to ``max_pending``
+requests may be in flight in total, and any beyond that are refused with
+``503 Service Unavailable`` instead of queueing without bound. Bodies larger
+than ``max_body`` bytes are refused with ``413 Content Too Large`` before they
+are read.
+"""
+
+import io
+import json
+import os
+import socketserver
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import TracebackType
+from typing import Self
+from urllib.parse import parse_qs, urlsplit
+
+from . import __version__
+from .cli import parse_targets
+from .core import ImageProcessor
+from .masking import ColorSpec, ToleranceSpec
+from .metrics import ColorMetric
+from .writers import DEFAULT_SAVE_PROFILE, OutputWriter
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BODY = 256 << 20
+
+_processor: ImageProcessor | None = None
+
+
+class ServerBusyError(RuntimeError):
+	"""Raised when a request arrives while ``max_pending`` requests are in flight."""
+
+
+class RequestTooLargeError(ValueError):
+	"""Raised when a request body is larger than the server accepts."""
+
+
+@dataclass(frozen=True)
+class ServeRequest:
+	"""
+	One image to process, from a path or from the bytes of an image or PDF.
+
+	When ``output_file`` is None the encoded image is returned to the caller
+	instead of being written by the worker.
+	"""
+
+	target_color: ColorSpec
+	tolerance: ToleranceSpec = 10
+	input_file: Path | None = None
+	image: bytes | None = None
+	output_file: Path | None = None
+	page: int | None = None
+	dpi: int = 300
+
+
+@dataclass
+class ServeResult:
+	"""Outcome of one request: the encoded image (if returned) and per-stage timings."""
+
+	data: bytes | None
+	timings: dict[str, float]
+	media_type: str = "image/png"
+
+	def server_timing(self) -> str:
+		"""Return the timings as a ``Server-Timing`` header value."""
+		return ", ".join(f"{name};dur={ms:.3f}" for name, ms in self.timings.items())
+
+
+def _init_worker(  # noqa: PLR0913, PLR0917
+	memmap_threshold: int | None = None,
+	lut_resolution: int | None = None,
+	metric: str | ColorMetric = "box",
+	feather: int | None = None,
+	despill: bool = True,
+	save_profile: str = DEFAULT_SAVE_PROFILE,
+	crop: bool = False,
+	output_format: str | OutputWriter | None = None,
+) -> None:
+	"""Build the per-process ImageProcessor once, when a worker starts."""
+	global _processor  # noqa: PLW0603
+	_processor = ImageProcessor(
+		memmap_threshold=memmap_threshold,
+		lut_resolution=lut_resolution,
+		metric=metric,
+		feather=feather,
+		despill=despill,
+		save_profile=save_profile,
+		crop=crop,
+		output_format=output_format,
+	)
+
+
+def _warm_up() -> int:
+	"""Import the PDF engine ahead of the first request and return the worker's PID."""
+	import fitz  # noqa: PLC0415, F401
+
+	return os.getpid()
+
+
+def _milliseconds(start: float) -> float:
+	"""Return the milliseconds elapsed since ``start``, rounded to microseconds."""
+	return round((time.perf_counter() - start) * 1e3, 3)
+
+
+def _process_request(request: ServeRequest) -> ServeResult:
+	"""Load, mask and save or encode one image with the worker's ImageProcessor."""
+	if _processor is None:
+		_init_worker()
+
+	timings = {}
+	start = time.perf_counter()
+	source = request.input_file if request.image is None else request.image
+	data = _processor.load_array(source, request.page, request.dpi)
+	timings["load"] = _milliseconds(start)
+
+	start = time.perf_counter()
+	_processor.make_transparent_array(data, request.target_color, request.tolerance)
+	timings["mask"] = _milliseconds(start)
+
+	start = time.perf_counter()
+	dpi = (request.dpi, request.dpi)
+	if request.output_file is not None:
+		request.output_file.parent.mkdir(parents=True, exist_ok=True)
+		_processor.save_array(data, request.output_file, dpi)
+		timings["save"] = _milliseconds(start)
+		return ServeResult(None, timings)
+	buffer = io.BytesIO()
+	_processor.save_array(data, buffer, dpi)
+	timings["save"] = _milliseconds(start)
+	media_type = _processor.writer_for(buffer).media_type
+	return ServeResult(buffer.getvalue(), timings, media_type)
+
+
+class Dispatcher:
+	"""
+	Warm worker pool with a bound on the number of requests in flight.
+
+	``pending`` is the number of requests currently processing or waiting for
+	a worker.
+
+	With a single worker, requests are processed on one thread of the current
+	process; with several, on a pool of processes that each build their
+	``ImageProcessor`` once at startup.
+	"""
+
+	def __init__(  # noqa: PLR0913, PLR0917
+		self,
+		workers: int = 1,
+		max_pending: int | None = None,
+		memmap_threshold: int | None = None,
+		lut_resolution: int | None = None,
+		metric: str | ColorMetric = "box",
+		feather: int | None = None,
+		despill: bool = True,
+		save_profile: str = DEFAULT_SAVE_PROFILE,
+		crop: bool = False,
+		output_format: str | OutputWriter | None = None,
+	) -> None:
+		"""
+		Start the workers.
+
+		Args:
+		    workers: Number of requests processed at the same time. Several
+		        workers run in separate processes.
+		    max_pending: Maximum number of requests in flight, processing or
+		        waiting for a worker (default: 4 per worker).
+		    memmap_threshold: See ``ImageProcessor``.
+		    lut_resolution: See ``ImageProcessor``.
+		    metric: Color distance metric, by name or instance.
+		    feather: Soft matte width (see ``ImageProcessor``), or None for
+		        binary transparency.
+		    despill: With ``feather``, de-spill the edge pixels.
+		    save_profile: Save profile of the outputs (see ``ImageProcessor``).
+		    crop: Crop the outputs to their non-transparent pixels.
+		    output_format: Format of the images returned in responses, by
+		        name or writer (default: PNG). Output paths are always written
+		        in this format if given, else in the one of their extension.
+
+		Raises:
+		    ValueError: If a count or a processor option is invalid.
+
+		"""
+		if workers < 1:
+			raise ValueError(f"Workers must be at least 1, got {workers}")
+		max_pending = max_pending or 4 * workers
+		if max_pending < workers:
+			raise ValueError(
+				f"max_pending ({max_pending}) must be at least the number of "
+				f"workers ({workers})"
+			)
+		options = (
+			memmap_threshold,
+			lut_resolution,
+			metric,
+			feather,
+			despill,
+			save_profile,
+			crop,
+			output_format,
+		)
+		# Fails here on invalid options rather than in every worker
+		_init_worker(*options)
+
+		self.workers = workers
+		self.max_pending = max_pending
+		self.pending = 0
+		self._lock = threading.Lock()
+		self._executor: Executor
+		if workers == 1:
+			self._executor = ThreadPoolExecutor(max_workers=1)
+		else:
+			self._executor = ProcessPoolExecutor(
+				max_workers=workers, initializer=_init_worker, initargs=options
+			)
+		for future in [self._executor.submit(_warm_up) for _ in range(workers)]:
+			future.result()
+
+	def process(self, request: ServeRequest) -> ServeResult:
+		"""
+		Process one request on a worker, blocking until it is done.
+
+		Args:
+		    request: Image and parameters to process.
+
+		Returns:
+		    Result with the image (unless written to a path) and the timings of
+		    the ``load``, ``mask`` and ``save`` stages, the ``queue`` time spent
+		    waiting for a worker and the ``total``, all in milliseconds.
+
+		Raises:
+		    ServerBusyError: If ``max_pending`` requests are already in flight.
+
+		"""
+		with self._lock:
+			if self.pending >= self.max_pending:
+				raise ServerBusyError(
+					f"Server busy: {self.max_pending} requests already in flight"
+				)
+			self.pending += 1
+		try:
+			start = time.perf_counter()
+			result = self._executor.submit(_process_request, request).result()
+			total = _milliseconds(start)
+		finally:
+			with self._lock:
+				self.pending -= 1
+		result.timings["queue"] = round(
+			max(0.0, total - sum(result.timings.values())), 3
+		)
+		result.timings["total"] = total
+		return result
+
+	def close(self) -> None:
+		"""Stop the workers once the requests in flight are done."""
+		self._executor.shutdown()
+
+
+def _bounded_int(
+	params: dict, name: str, default: int | None, low: int, high: int | None
+) -> int | None:
+	"""Return ``params[name]`` as an int within [low, high], or ``default``."""
+	value = params.get(name)
+	if value is None:
+		return default
+	try:
+		number = int(value)
+	except (TypeError, ValueError):
+		raise ValueError(f"{name} must be an integer, got {value!r}") from None
+	if number < low or (high is not None and number > high):
+		bounds = f"at least {low}" if high is None else f"between {low} and {high}"
+		raise ValueError(f"{name} must be {bounds}, got {number}")
+	return number
+
+
+def parse_request(params: dict, image: bytes | None = None) -> ServeRequest:
+	"""
+	Build a request from JSON fields or query parameters.
+
+	Args:
+	    params: ``input``, ``output``, ``color`` (one string or a list, as
+	        accepted by ``parse_targets``), ``tolerance``, ``page`` and ``dpi``;
+	        all but ``input`` (without an image) are optional.
+	    image: Bytes of an encoded image to process instead of ``input``.
+
+	Returns:
+	    The parsed request.
+
+	Raises:
+	    ValueError: If a field is missing or invalid.
+
+	"""
+	if not image and not params.get("input"):
+		raise ValueError("A request needs an image body or an input path")
+	tolerance = _bounded_int(params, "tolerance", 10, 0, 255)
+	target_color, tolerance = parse_targets(
+		params.get("color", "255,255,255"), tolerance
+	)
+	output = params.get("output")
+	return ServeRequest(
+		target_color,
+		tolerance,
+		input_file=None if image else Path(params["input"]),
+		image=image or None,
+		output_file=None if output is None else Path(output),
+		page=_bounded_int(params, "page", None, 0, None),
+		dpi=_bounded_int(params, "dpi", 300, 72, 1200),
+	)
+
+
+def _error_status(error: Exception) -> HTTPStatus:
+	"""Return the HTTP status reported for a failed request."""
+	if isinstance(error, ServerBusyError):
+		return HTTPStatus.SERVICE_UNAVAILABLE
+	if isinstance(error, RequestTooLargeError):
+		return HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+	if isinstance(error, FileNotFoundError):
+		return HTTPStatus.NOT_FOUND
+	if isinstance(error, (ValueError, TypeError, KeyError)):
+		return HTTPStatus.BAD_REQUEST
+	return HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+	"""Serve ``GET /health`` and ``POST /process`` with the server's dispatcher."""
+
+	server_version = f"rmbg/{__version__}"
+	protocol_version = "HTTP/1.1"
+
+	def do_GET(self) -> None:
+		"""Report that the server is up, with its worker limits."""
+		if urlsplit(self.path).path != "/health":
+			self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Not found: {self.path}"})
+			return
+		dispatcher = self.server.dispatcher
+		self._send_json(
+			HTTPStatus.OK,
+			{
+				"status": "ok",
+				"version": __version__,
+				"workers": dispatcher.workers,
+				"max_pending": dispatcher.max_pending,
+				"pending": dispatcher.pending,
+			},
+		)
+
+	def do_POST(self) -> None:
+		"""Process one image and return it or a JSON description of the output."""
+		url = urlsplit(self.path)
+		try:
+			body = self._read_body()
+			if url.path != "/process":
+				self._send_json(
+					HTTPStatus.NOT_FOUND, {"error": f"Not found: {self.path}"}
+				)
+				return
+			if self.headers.get_content_type() == "application/json":
+				params = json.loads(body or b"{}")
+				if not isinstance(params, dict):
+					raise ValueError("The JSON body must be an object")
+				image = None
+			else:
+				params = {
+					name: values if name == "color" else values[-1]
+					for name, values in parse_qs(url.query).items()
+				}
+				image = body
+			result = self.server.dispatcher.process(parse_request(params, image))
+		except Exception as e:
+			status = _error_status(e)
+			headers = (
+				{"Retry-After": "1"} if status == HTTPStatus.SERVICE_UNAVAILABLE else {}
+			)
+			if isinstance(e, RequestTooLargeError):
+				# The unread body would be taken for the next request
+				self.close_connection = True
+				headers["Connection"] = "close"
+			self._send_json(status, {"error": str(e)}, headers)
+			return
+
+		headers = {"Server-Timing": result.server_timing()}
+		if result.data is not None:
+			self._send(HTTPStatus.OK, result.data, result.media_type, headers)
+		else:
+			self._send_json(
+				HTTPStatus.OK,
+				{"output": str(params["output"]), "timings": result.timings},
+				headers,
+			)
+
+	def _read_body(self) -> bytes:
+		"""
+		Read the request body.
+
+		Raises:
+		    ValueError: If the Content-Length header is invalid.
+		    RequestTooLargeError: If the body is larger than the server's
+		        ``max_body``; it is then left unread.
+
+		"""
+		try:
+			length = int(self.headers.get("Content-Length", 0))
+		except ValueError:
+			length = -1
+		if length < 0:
+			raise ValueError(
+				f"Invalid Content-Length: {self.headers['Content-Length']}"
+			)
+		if length > self.server.max_body:
+			raise RequestTooLargeError(
+				f"Request body of {length} bytes is larger than the "
+				f"{self.server.max_body} bytes accepted"
+			)
+		return self.rfile.read(length)
+
+	def _send_json(
+		self, status: HTTPStatus, payload: dict, headers: dict[str, str] | None = None
+	) -> None:
+		"""Send a JSON response."""
+		body = json.dumps(payload).encode()
+		self._send(status, body, "application/json", headers)
+
+	def _send(
+		self,
+		status: HTTPStatus,
+		body: bytes,
+		content_type: str,
+		headers: dict[str, str] | None = None,
+	) -> None:
+		"""Send a complete response with a body."""
+		self.send_response(status)
+		self.send_header("Content-Type", content_type)
+		self.send_header("Content-Length", str(len(body)))
+		for name, value in (headers or {}).items():
+			self.send_header(name, value)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def address_string(self) -> str:
+		"""Return the client address; Unix socket clients have none."""
+		return self.client_address[0] if self.client_address else "unix"
+
+	def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+		"""Log each request to stderr unless the server is quiet."""
+		if not self.server.quiet:
+			super().log_message(format, *args)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	"""HTTP server listening on a Unix domain socket, one thread per connection."""
+
+	daemon_threads = True
+
+
+class RmbgServer:
+	"""
+	HTTP front end of a ``Dispatcher``, on a localhost port or a Unix socket.
+
+	Use it as a context manager, or call ``close`` when done, to stop the
+	workers and remove the socket file.
+	"""
+
+	def __init__(  # noqa: PLR0913, PLR0917
+		self,
+		dispatcher: Dispatcher,
+		host: str = DEFAULT_HOST,
+		port: int = DEFAULT_PORT,
+		socket_path: str | Path | None = None,
+		quiet: bool = False,
+		max_body: int = DEFAULT_MAX_BODY,
+	) -> None:
+		"""
+		Bind the server; requests are accepted once ``serve_forever`` runs.
+
+		Args:
+		    dispatcher: Workers processing the requests; closed with the server.
+		    host: Address to listen on. Only bind to other than localhost on a
+		        trusted network: requests may read and write any path the
+		        server can.
+		    port: TCP port to listen on, or 0 for any free port.
+		    socket_path: Listen on this Unix socket instead of ``host``/``port``.
+		        A stale socket file left at the path is replaced.
+		    quiet: Do not log each request to stderr.
+		    max_body: Largest request body in bytes; larger ones are refused
+		        with 413 without being read.
+
+		"""
+		self.dispatcher = dispatcher
+		self.socket_path = None if socket_path is None else Path(socket_path)
+		self._server: socketserver.BaseServer
+		if self.socket_path is not None:
+			if self.socket_path.is_socket():
+				self.socket_path.unlink()
+			self._server = _UnixHTTPServer(str(self.socket_path), _RequestHandler)
+		else:
+			self._server = ThreadingHTTPServer((host, port), _RequestHandler)
+		self._server.dispatcher = dispatcher
+		self._server.quiet = quiet
+		self._server.max_body = max_body
+
+	@property
+	def address(self) -> str:
+		"""Return the URL (or ``unix:`` path) the server listens on."""
+		if self.socket_path is not None:
+			return f"unix:{self.socket_path}"
+		host, port = self._server.server_address[:2]
+		return f"http://{host}:{port}"
+
+	def serve_forever(self) -> None:
+		"""Handle requests until ``shutdown`` is called from another thread."""
+		self._server.serve_forever()
+
+	def shutdown(self) -> None:
+		"""Stop ``serve_forever``."""
+		self._server.shutdown()
+
+	def close(self) -> None:
+		"""Close the listening socket and stop the workers."""
+		self._server.server_close()
+		if self.socket_path is not None:
+			self.socket_path.unlink(missing_ok=True)
+		self.dispatcher.close()
+
+	def __enter__(self) -> Self:
+		"""Enter the runtime context."""
+		return self
+
+	def __exit__(
+		self,
+		exc_type: type[BaseException] | None,
+		exc: BaseException | None,
+		traceback: TracebackType | None,
+	) -> None:
+		"""Close the server."""
+		self.close()
@@ -0,0 +1,531 @@
+"""
+Streaming, band-by-band processing for images larger than memory.
+
+Instead of materializing a whole bitmap, the input is read in horizontal bands
+of rows: PDF pages are rasterized one clip rectangle at a time, and images
+whose pixels are stored uncompressed are read band by band through PIL's raw
+tile decoder. Each band is masked and appended to a PNG that is written
+incrementally, so peak memory is bounded by the band size rather than the
+image size. Compressed images such as PNG and JPEG cannot be decoded in bands:
+they are decoded whole, with a ``FullDecodeWarning``.
+"""
+
+import io
+import struct
+import warnings
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+from types import TracebackType
+from typing import Self
+
+import numpy as np
+from PIL import Image
+
+from .atomic import AtomicFile
+from .masking import ColorSpec, ToleranceSpec
+from .matte import soft_transparency
+from .metrics import ColorMetric, metric_alpha
+from .pixels import (
+	PDF_BASE_DPI,
+	ClipRect,
+	ImageSource,
+	ResolvedSource,
+	image_to_rgba,
+	open_image,
+	open_pdf,
+	pixmap_to_rgba,
+	resolve_source,
+)
+
+DEFAULT_BAND_ROWS = 512
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_IDAT_CHUNK_SIZE = 1 << 20
+_RAW_BAND_MODES = frozenset({"L", "LA", "RGB", "RGBA"})
+
+
+class FullDecodeWarning(UserWarning):
+	"""An input streamed in bands had to be decoded as a whole first."""
+
+
+def sub_filter(band: np.ndarray) -> np.ndarray:
+	"""
+	Apply the PNG "Sub" filter to a band of 8-bit rows.
+
+	Each byte is replaced by its difference to the same channel of the pixel
+	on its left, and every row is prefixed with the filter type byte. PDF
+	Flate streams decode the same layout with ``/Predictor 15``.
+
+	Args:
+	    band: (rows, width, channels) uint8 array.
+
+	Returns:
+	    (rows, width * channels + 1) uint8 array of filtered rows.
+
+	"""
+	rows, width, channels = band.shape
+	flat = band.reshape(rows, width * channels)
+	filtered = np.empty((rows, width * channels + 1), dtype=np.uint8)
+	filtered[:, 0] = 1
+	filtered[:, 1 : channels + 1] = flat[:, :channels]
+	np.subtract(
+		flat[:, channels:], flat[:, :-channels], out=filtered[:, channels + 1 :]
+	)
+	return filtered
+
+
+class PngStreamWriter:
+	"""
+	Write an RGBA PNG incrementally, one band of rows at a time.
+
+	The rows go to a temporary file next to the destination, which is only
+	renamed over it once the image is complete, so an error halfway leaves
+	no truncated PNG behind.
+	"""
+
+	def __init__(
+		self,
+		output_path: str | Path,
+		width: int,
+		height: int,
+		dpi: tuple[int, int] = (300, 300),
+		compress_level: int = 6,
+	) -> None:
+		"""
+		Open the temporary output file and write the PNG header.
+
+		Args:
+		    output_path: Path of the PNG file to write.
+		    width: Image width in pixels.
+		    height: Image height in pixels.
+		    dpi: DPI resolution stored in the file.
+		    compress_level: zlib compression level (0-9).
+
+		"""
+		self.width = width
+		self.height = height
+		self._rows = 0
+		self._pending = bytearray()
+		self._compressor = zlib.compressobj(compress_level)
+		self._output = AtomicFile(output_path)
+		self._file = self._output.file
+
+		self._file.write(_PNG_SIGNATURE)
+		self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+		ppm = tuple(int(d / 0.0254 + 0.5) for d in dpi)
+		self._chunk(b"pHYs", struct.pack(">IIB", *ppm, 1))
+
+	def write(self, band: np.ndarray) -> None:
+		"""
+		Append a band of rows to the image.
+
+		Rows are stored with the PNG "Sub" filter (``sub_filter``), which is
+		computed for the whole band at once and compresses much better than
+		unfiltered rows.
+
+		Args:
+		    band: (rows, width, 4) uint8 RGBA array.
+
+		Raises:
+		    ValueError: If the band shape does not match the image.
+
+		"""
+		rows = band.shape[0]
+		if band.shape[1:] != (self.width, 4) or self._rows + rows > self.height:
+			raise ValueError(
+				f"Band of shape {band.shape} does not fit a "
+				f"{self.width}x{self.height} RGBA image at row {self._rows}"
+			)
+
+		filtered = sub_filter(band)
+		self._pending += self._compressor.compress(filtered.data)
+		self._rows += rows
+		while len(self._pending) >= _IDAT_CHUNK_SIZE:
+			self._chunk(b"IDAT", self._pending[:_IDAT_CHUNK_SIZE])
+			del self._pending[:_IDAT_CHUNK_SIZE]
+
+	def close(self) -> None:
+		"""
+		Finish the compressed stream and move the file to its destination.
+
+		Raises:
+		    ValueError: If fewer rows than the image height were written; the
+		        partial file is removed.
+
+		"""
+		if self._file.closed:
+			return
+		try:
+			if self._rows != self.height:
+				raise ValueError(f"Wrote {self._rows} of {self.height} rows")
+			self._pending += self._compressor.flush()
+			self._chunk(b"IDAT", self._pending)
+			self._chunk(b"IEND", b"")
+			self._output.commit()
+		except BaseException:
+			self.abort()
+			raise
+
+	def abort(self) -> None:
+		"""Close and remove the partial file, leaving the destination alone."""
+		self._output.abort()
+
+	def _chunk(self, kind: bytes, data: bytes) -> None:
+		"""Write one PNG chunk."""
+		self._file.write(struct.pack(">I", len(data)))
+		self._file.write(kind)
+		self._file.write(data)
+		self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+	def __enter__(self) -> Self:
+		"""Enter the runtime context."""
+		return self
+
+	def __exit__(
+		self,
+		exc_type: type[BaseException] | None,
+		exc: BaseException | None,
+		traceback: TracebackType | None,
+	) -> None:
+		"""Close the writer, or remove the partial file if an error occurred."""
+		if exc_type is None:
+			self.close()
+		else:
+			self.abort()
+
+
+class PdfBands:
+	"""Rasterize a PDF page in horizontal bands of rows."""
+
+	def __init__(
+		self,
+		pdf_path: str | ResolvedSource,
+		page: int = 0,
+		dpi: int = PDF_BASE_DPI,
+		clip: ClipRect | None = None,
+		band_rows: int = DEFAULT_BAND_ROWS,
+	) -> None:
+		"""
+		Open the page and work out the size of the rendered bitmap.
+
+		Args:
+		    pdf_path: Path to the PDF file, or its bytes.
+		    page: Page number to render (0-based).
+		    dpi: Resolution to rasterize the page at.
+		    clip: Optional (x0, y0, x1, y1) page region in points.
+		    band_rows: Number of pixel rows rendered per band.
+
+		Raises:
+		    ValueError: If the PDF, page, dpi, clip or band size is invalid.
+
+		"""
+		if band_rows <= 0:
+			raise ValueError(f"Band rows must be positive, got {band_rows}")
+		if dpi <= 0:
+			raise ValueError(f"DPI must be positive, got {dpi}")
+		import fitz  # noqa: PLC0415
+
+		try:
+			self._doc = open_pdf(pdf_path)
+		except Exception as e:
+			raise ValueError(f"Failed to open PDF: {e}") from None
+		if not 0 <= page < len(self._doc):
+			self._doc.close()
+			raise ValueError(f"Page number {page} out of range")
+
+		pdf_page = self._doc[page]
+		self._area = pdf_page.rect if clip is None else fitz.Rect(clip) & pdf_page.rect
+		if self._area.is_empty:
+			self._doc.close()
+			raise ValueError("Clip region does not overlap the page")
+
+		self._page = pdf_page
+		self._zoom = dpi / PDF_BASE_DPI
+		self._matrix = fitz.Matrix(self._zoom, self._zoom)
+		self._list = None
+		self._bbox = (self._area * self._matrix).irect
+		self.width = self._bbox.width
+		self.height = self._bbox.height
+		self.band_rows = band_rows
+
+	def __iter__(self) -> Iterator[np.ndarray]:
+		"""
+		Render the page band by band.
+
+		Yields:
+		    (rows, width, 4) uint8 RGBA arrays, top to bottom.
+
+		"""
+		import fitz  # noqa: PLC0415
+
+		if self._list is None:
+			# Parsed once, on first use, and replayed for every band
+			self._list = self._page.get_displaylist()
+		x0, y_start, y_end = self._bbox.x0, self._bbox.y0, self._bbox.y1
+		for y0 in range(y_start, y_end, self.band_rows):
+			y1 = min(y0 + self.band_rows, y_end)
+			# One pixel of margin guards against rounding of the band edges
+			band = fitz.Rect(
+				self._area.x0,
+				max(self._area.y0, (y0 - 1) / self._zoom),
+				self._area.x1,
+				min(self._area.y1, (y1 + 1) / self._zoom),
+			)
+			pix = self._list.get_pixmap(matrix=self._matrix, alpha=True, clip=band)
+			data = pixmap_to_rgba(pix)
+			yield data[y0 - pix.y : y1 - pix.y, x0 - pix.x : x0 - pix.x + self.width]
+
+	def close(self) -> None:
+		"""Close the PDF document."""
+		self._list = self._page = None
+		self._doc.close()
+
+	def __enter__(self) -> Self:
+		"""Enter the runtime context."""
+		return self
+
+	def __exit__(
+		self,
+		exc_type: type[BaseException] | None,
+		exc: BaseException | None,
+		traceback: TracebackType | None,
+	) -> None:
+		"""Close the source."""
+		self.close()
+
+
+class ImageBands:
+	"""
+	Read an image in horizontal bands of rows.
+
+	Images stored as a single uncompressed raster (uncompressed TIFF, BMP,
+	PPM/PGM, ...) are read band by band from disk through PIL's raw decoder.
+	Compressed formats such as PNG and JPEG can only be decoded as a whole;
+	they are decoded once and then converted to RGBA one band at a time.
+	"""
+
+	def __init__(
+		self, image_path: str | ResolvedSource, band_rows: int = DEFAULT_BAND_ROWS
+	) -> None:
+		"""
+		Open the image and inspect how its pixels are stored.
+
+		Args:
+		    image_path: Path to the image file, or the encoded image's bytes.
+		    band_rows: Number of pixel rows read per band.
+
+		Raises:
+		    ValueError: If the image cannot be opened or the band size is invalid.
+
+		"""
+		if band_rows <= 0:
+			raise ValueError(f"Band rows must be positive, got {band_rows}")
+		self._source = Path(image_path) if isinstance(image_path, str) else image_path
+		try:
+			self._image = open_image(self._source)
+		except Exception as e:
+			raise ValueError(f"Failed to load image: {e}") from None
+		self.width, self.height = self._image.size
+		self.band_rows = band_rows
+		self._layout = self._raw_layout()
+
+	@property
+	def format(self) -> str | None:
+		"""Name of the image's file format, as PIL reports it."""
+		return self._image.format
+
+	@property
+	def streamed(self) -> bool:
+		"""Whether bands are read from the raw raster rather than from a full decode."""
+		return self._layout is not None
+
+	def _raw_layout(self) -> tuple[int, str, int, int] | None:
+		"""Return (offset, rawmode, stride, orientation) of a raw raster, if any."""
+		image = self._image
+		if image.mode not in _RAW_BAND_MODES or len(image.tile) != 1:
+			return None
+		tile = image.tile[0]
+		if tile[0] != "raw" or tuple(tile[1]) != (0, 0, self.width, self.height):
+			return None
+
+		args = tile[3]
+		rawmode, stride, orientation = (
+			(args, 0, 1) if isinstance(args, str) else (*args, 0, 1)[:3]
+		)
+		if stride <= 0:
+			try:
+				stride = len(
+					Image.new(image.mode, (self.width, 1)).tobytes("raw", rawmode)
+				)
+			except Exception:
+				return None
+		return tile[2], rawmode, stride, orientation
+
+	def __iter__(self) -> Iterator[np.ndarray]:
+		"""
+		Read the image band by band.
+
+		Yields:
+		    (rows, width, 4) uint8 RGBA arrays, top to bottom.
+
+		"""
+		if self._layout is None:
+			self._image.load()
+			for y0 in range(0, self.height, self.band_rows):
+				y1 = min(y0 + self.band_rows, self.height)
+				yield image_to_rgba(self._image.crop((0, y0, self.width, y1)))
+			return
+
+		offset, rawmode, stride, orientation = self._layout
+		fp = (
+			self._source.open("rb")
+			if isinstance(self._source, Path)
+			else io.BytesIO(self._source)
+		)
+		with fp:
+			for y0 in range(0, self.height, self.band_rows):
+				y1 = min(y0 + self.band_rows, self.height)
+				# Bottom-up rasters store the last row first
+				first_row = y0 if orientation > 0 else self.height - y1
+				fp.seek(offset + first_row * stride)
+				data = fp.read((y1 - y0) * stride)
+				band = Image.frombytes(
+					self._image.mode,
+					(self.width, y1 - y0),
+					data,
+					"raw",
+					rawmode,
+					stride,
+					orientation,
+				)
+				yield image_to_rgba(band)
+
+	def close(self) -> None:
+		"""Close the image file."""
+		self._image.close()
+
+	def __enter__(self) -> Self:
+		"""Enter the runtime context."""
+		return self
+
+	def __exit__(
+		self,
+		exc_type: type[BaseException] | None,
+		exc: BaseException | None,
+		traceback: TracebackType | None,
+	) -> None:
+		"""Close the source."""
+		self.close()
+
+
+def open_bands(
+	input_path: ImageSource,
+	page: int | None = None,
+	dpi: int = PDF_BASE_DPI,
+	clip: ClipRect | None = None,
+	band_rows: int = DEFAULT_BAND_ROWS,
+) -> PdfBands | ImageBands:
+	"""
+	Open an image or PDF page as a source of RGBA bands.
+
+	Args:
+	    input_path: Path to the image file or PDF file, or its contents as
+	        bytes or a binary stream.
+	    page: PDF page number (0-based, default: first page).
+	    dpi: Resolution PDF pages are rasterized at.
+	    clip: Optional (x0, y0, x1, y1) PDF page region, in points.
+	    band_rows: Number of pixel rows per band.
+
+	Returns:
+	    Band source with ``width``, ``height`` and iteration over bands.
+
+	Raises:
+	    FileNotFoundError: If the file doesn't exist.
+	    ValueError: If the file cannot be read.
+
+	"""
+	source, is_pdf = resolve_source(input_path)
+	if is_pdf:
+		return PdfBands(source, page or 0, dpi, clip, band_rows)
+	return ImageBands(source, band_rows)
+
+
+def stream_transparent(  # noqa: PLR0913, PLR0917
+	input_path: ImageSource,
+	output_path: str | Path,
+	target_color: ColorSpec,
+	tolerance: ToleranceSpec = 10,
+	page: int | None = None,
+	dpi: int = PDF_BASE_DPI,
+	clip: ClipRect | None = None,
+	output_dpi: tuple[int, int] = (300, 300),
+	band_rows: int = DEFAULT_BAND_ROWS,
+	compress_level: int = 6,
+	metric: str | ColorMetric = "box",
+	outer_tolerance: ToleranceSpec | None = None,
+	despill: bool = True,
+) -> tuple[int, int]:
+	"""
+	Make a color transparent band by band and write the PNG incrementally.
+
+	Args:
+	    input_path: Path to the image file or PDF file, or its contents as
+	        bytes or a binary stream.
+	    output_path: Path of the PNG file to write.
+	    target_color: RGB tuple of the color to make transparent, or a
+	        sequence of them.
+	    tolerance: Color matching tolerance (0-255), shared or one per color.
+	    page: PDF page number (0-based, default: first page).
+	    dpi: Resolution PDF pages are rasterized at.
+	    clip: Optional (x0, y0, x1, y1) PDF page region, in points.
+	    output_dpi: DPI resolution stored in the output file.
+	    band_rows: Number of pixel rows processed at a time.
+	    compress_level: zlib compression level (0-9).
+	    metric: Color distance metric, by name or instance.
+	    outer_tolerance: Outer tolerance of a soft matte (see
+	        ``soft_transparency``), or None for binary transparency.
+	    despill: With a soft matte, de-spill the edge pixels.
+
+	Returns:
+	    Tuple of (width, height) of the written image.
+
+	Raises:
+	    ValueError: If the output is not a PNG file or the input is invalid.
+
+	Warns:
+	    FullDecodeWarning: If the input is a compressed image, such as a PNG
+	        or JPEG, which is decoded as a whole before it is streamed, so
+	        memory use is not bounded by ``band_rows``.
+
+	"""
+	if Path(output_path).suffix.lower() != ".png":
+		raise ValueError("Output must be in PNG format")
+
+	with (
+		open_bands(input_path, page, dpi, clip, band_rows) as bands,
+		PngStreamWriter(
+			output_path, bands.width, bands.height, output_dpi, compress_level
+		) as writer,
+	):
+		if isinstance(bands, ImageBands) and not bands.streamed:
+			warnings.warn(
+				f"{bands.format or 'These'} images cannot be read in bands: "
+				f"the whole {bands.width}x{bands.height} image is decoded",
+				FullDecodeWarning,
+				stacklevel=2,
+			)
+		for band in bands:
+			if outer_tolerance is None:
+				metric_alpha(band, target_color, tolerance, metric, inplace=True)
+			else:
+				soft_transparency(
+					band,
+					target_color,
+					tolerance,
+					outer_tolerance,
+					metric,
+					despill=despill,
+				)
+			writer.write(band)
+	return bands.width, bands.height
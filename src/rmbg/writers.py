@@ -0,0 +1,618 @@
+"""
+Output writers: the file formats processed images are saved in.
+
+Each format is an ``OutputWriter`` strategy, chosen by name (``--format``) or
+by the extension of the output file. Writers carry their own speed/size knobs
+and map the shared save profiles (``fast``, ``balanced``, ``smallest``) onto
+them:
+
+- ``png``: PNG, with the profile options of ``rmbg.encoding``.
+- ``webp``: lossless WebP with alpha. ``method`` (0-6) and ``quality``
+  (0-100, the compression effort in lossless mode) trade time for size.
+- ``avif``: AVIF at quality 100 with full-resolution chroma and a lossless
+  alpha plane. The colors go through YCbCr, which PIL's encoder cannot skip,
+  so they may be off by one or two levels. ``speed`` (0-10) trades size for
+  time.
+- ``tiff``: lossless TIFF with the ``compression`` scheme of the profile.
+  Several pages go into one multi-page file.
+- ``pdf``: one image per page, with the alpha channel as a soft mask so that
+  the transparency is kept in print workflows. Pages are written to the file
+  as they arrive (``PdfStreamWriter``), so only the current page is held in
+  memory.
+
+As with the PNG profiles, ``smallest`` clears the colors of fully transparent
+pixels in TIFF and PDF output, while ``fast`` adds no pass over the pixels;
+lossless WebP drops them anyway.
+"""
+
+import inspect
+import zlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+from types import TracebackType
+from typing import Any, BinaryIO, ClassVar, Self
+
+import numpy as np
+from PIL import Image, TiffImagePlugin, features
+
+from .atomic import AtomicFile
+from .encoding import (
+	DEFAULT_PNG_PROFILE,
+	PNG_PROFILES,
+	PngProfile,
+	clear_transparent,
+	get_png_profile,
+	save_png,
+)
+from .masking import OPAQUE
+from .streaming import sub_filter
+
+OutputPath = str | Path | BinaryIO
+
+SAVE_PROFILES = tuple(PNG_PROFILES)
+DEFAULT_SAVE_PROFILE = DEFAULT_PNG_PROFILE
+
+
+class PageWriter(ABC):
+	"""Receives the pages of one multi-page file, one at a time."""
+
+	@abstractmethod
+	def add(self, image: Image.Image) -> None:
+		"""Append ``image`` as the next page."""
+
+	def close(self) -> None:  # noqa: B027 - optional to override
+		"""Finish the file."""
+
+	def __enter__(self) -> Self:
+		"""Enter the runtime context."""
+		return self
+
+	def __exit__(
+		self,
+		exc_type: type[BaseException] | None,
+		exc: BaseException | None,
+		traceback: TracebackType | None,
+	) -> None:
+		"""Finish the file."""
+		self.close()
+
+
+class OutputWriter(ABC):
+	"""
+	Strategy for encoding processed images in one file format.
+
+	Subclasses set ``name``, ``suffixes`` and ``media_type``, list the
+	constructor arguments of each save profile in ``profiles`` and must
+	implement ``save``. Multi-page formats also set ``multipage`` and implement
+	``open_pages``, and formats that may change the colors set ``lossless`` to
+	False.
+	"""
+
+	name = ""
+	suffixes: ClassVar[tuple[str, ...]] = ()
+	media_type = "application/octet-stream"
+	multipage = False
+	lossless = True
+	profiles: ClassVar[dict[str, dict[str, Any]]] = {}
+
+	@classmethod
+	def for_profile(cls, profile: str = DEFAULT_SAVE_PROFILE) -> "OutputWriter":
+		"""
+		Create a writer with the knobs of a save profile.
+
+		Writers that list no profiles are created with their defaults.
+
+		Raises:
+		    ValueError: If the profile is unknown.
+
+		"""
+		if not cls.profiles:
+			return cls()
+		try:
+			options = cls.profiles[profile]
+		except KeyError:
+			expected = list(cls.profiles)
+			raise ValueError(
+				f"Unknown save profile '{profile}', expected one of {expected}"
+			) from None
+		return cls(**options)
+
+	@abstractmethod
+	def save(
+		self, image: Image.Image, output: OutputPath, dpi: tuple[int, int]
+	) -> None:
+		"""Encode one image to a path or a writable binary stream."""
+
+	def open_pages(self, output: OutputPath, dpi: tuple[int, int]) -> PageWriter:  # noqa: ARG002
+		"""
+		Start a multi-page file.
+
+		Raises:
+		    ValueError: If the format holds a single image.
+
+		"""
+		raise ValueError(f"{self.name.upper()} output cannot hold several pages")
+
+	def __repr__(self) -> str:
+		"""Return the writer name and options."""
+		options = ", ".join(f"{k}={v!r}" for k, v in vars(self).items())
+		return f"{type(self).__name__}({options})"
+
+
+def _require_feature(feature: str, name: str) -> None:
+	"""Raise if PIL was built without the codec of an output format."""
+	if not features.check(feature):
+		raise ValueError(f"{name} output requires Pillow built with {feature} support")
+
+
+class PngWriter(OutputWriter):
+	"""PNG with the options of a ``PngProfile``."""
+
+	name = "png"
+	suffixes = (".png",)
+	media_type = "image/png"
+	profiles: ClassVar[dict[str, dict[str, Any]]] = {
+		name: {"profile": name} for name in PNG_PROFILES
+	}
+
+	def __init__(self, profile: str | PngProfile = DEFAULT_PNG_PROFILE) -> None:
+		"""
+		Initialize the writer.
+
+		Args:
+		    profile: PNG profile, by name or instance.
+
+		Raises:
+		    ValueError: If the profile is unknown.
+
+		"""
+		self.profile = get_png_profile(profile)
+
+	def save(
+		self, image: Image.Image, output: OutputPath, dpi: tuple[int, int]
+	) -> None:
+		"""Encode one image as PNG."""
+		save_png(image, output, dpi, self.profile)
+
+
+class WebpWriter(OutputWriter):
+	"""WebP with alpha, lossless by default."""
+
+	name = "webp"
+	suffixes = (".webp",)
+	media_type = "image/webp"
+	profiles: ClassVar[dict[str, dict[str, Any]]] = {
+		"fast": {"method": 0, "quality": 10},
+		"balanced": {"method": 5, "quality": 50},
+		"smallest": {"method": 6, "quality": 90},
+	}
+
+	def __init__(
+		self, method: int = 5, quality: int = 50, lossless: bool = True
+	) -> None:
+		"""
+		Initialize the writer.
+
+		Args:
+		    method: Encoder effort from 0 (fastest) to 6 (smallest).
+		    quality: Compression effort in lossless mode, image quality
+		        otherwise (0-100).
+		    lossless: Store the visible pixels exactly. The colors of fully
+		        transparent pixels are not kept.
+
+		"""
+		self.method = method
+		self.quality = quality
+		self.lossless = lossless
+
+	def save(
+		self, image: Image.Image, output: OutputPath, dpi: tuple[int, int]
+	) -> None:
+		"""Encode one image as WebP."""
+		_require_feature("webp", "WebP")
+		image.save(
+			output,
+			"WEBP",
+			lossless=self.lossless,
+			quality=self.quality,
+			method=self.method,
+			dpi=dpi,
+		)
+
+
+class AvifWriter(OutputWriter):
+	"""AVIF with exact alpha and colors at quality 100, 4:4:4."""
+
+	name = "avif"
+	suffixes = (".avif",)
+	media_type = "image/avif"
+	lossless = False
+	profiles: ClassVar[dict[str, dict[str, Any]]] = {
+		"fast": {"speed": 10},
+		"balanced": {"speed": 6},
+		"smallest": {"speed": 4},
+	}
+
+	def __init__(self, speed: int = 6, quality: int = 100) -> None:
+		"""
+		Initialize the writer.
+
+		Args:
+		    speed: Encoder speed from 0 (smallest) to 10 (fastest).
+		    quality: Image quality (0-100); below 100 the colors are lossy.
+
+		"""
+		self.speed = speed
+		self.quality = quality
+
+	def save(
+		self,
+		image: Image.Image,
+		output: OutputPath,
+		dpi: tuple[int, int],  # noqa: ARG002 - AVIF stores no resolution
+	) -> None:
+		"""Encode one image as AVIF."""
+		_require_feature("avif", "AVIF")
+		image.save(
+			output,
+			"AVIF",
+			quality=self.quality,
+			subsampling="4:4:4",
+			speed=self.speed,
+		)
+
+
+class _TiffPages(PageWriter):
+	"""Append pages to a TIFF file, one frame at a time."""
+
+	def __init__(
+		self, output: OutputPath, dpi: tuple[int, int], writer: "TiffWriter"
+	) -> None:
+		"""Open the multi-page TIFF."""
+		self.dpi = dpi
+		self.writer = writer
+		self._tiff = TiffImagePlugin.AppendingTiffWriter(output, new=True)
+
+	def add(self, image: Image.Image) -> None:
+		"""Write ``image`` as the next frame."""
+		self.writer.save(image, self._tiff, self.dpi)
+		self._tiff.newFrame()
+
+	def close(self) -> None:
+		"""Close the file."""
+		self._tiff.close()
+
+
+class TiffWriter(OutputWriter):
+	"""Lossless, optionally multi-page TIFF."""
+
+	name = "tiff"
+	suffixes = (".tif", ".tiff")
+	media_type = "image/tiff"
+	multipage = True
+	profiles: ClassVar[dict[str, dict[str, Any]]] = {
+		"fast": {"compression": "packbits"},
+		"balanced": {"compression": "tiff_adobe_deflate"},
+		"smallest": {"compression": "tiff_adobe_deflate", "clear_transparent": True},
+	}
+
+	def __init__(
+		self, compression: str = "tiff_adobe_deflate", clear_transparent: bool = False
+	) -> None:
+		"""
+		Initialize the writer.
+
+		Args:
+		    compression: PIL name of a lossless TIFF compression, such as
+		        "tiff_adobe_deflate", "tiff_lzw", "packbits" or "raw".
+		    clear_transparent: Set the colors of fully transparent pixels to
+		        zero, which compresses a masked noisy background much better.
+
+		"""
+		self.compression = compression
+		self.clear_transparent = clear_transparent
+
+	def save(
+		self, image: Image.Image, output: OutputPath, dpi: tuple[int, int]
+	) -> None:
+		"""Encode one image as TIFF."""
+		if self.clear_transparent and image.mode == "RGBA":
+			image = clear_transparent(image)
+		image.save(output, "TIFF", dpi=dpi, compression=self.compression)
+
+	def open_pages(self, output: OutputPath, dpi: tuple[int, int]) -> PageWriter:
+		"""Start a multi-page TIFF."""
+		return _TiffPages(output, dpi, self)
+
+
+class PdfStreamWriter(PageWriter):
+	"""
+	Write a PDF incrementally, one image page at a time.
+
+	Each page is written as soon as it is added: the RGB samples as a Flate
+	image, the alpha channel (unless fully opaque) as its soft mask, and a
+	page that draws the image over the whole media box. Only the object
+	offsets are kept until ``close`` writes the page tree and the
+	cross-reference table.
+	"""
+
+	# Objects 1 and 2 are the catalog and the page tree, written last
+	_CATALOG = 1
+	_PAGES = 2
+
+	def __init__(
+		self,
+		output: OutputPath,
+		dpi: tuple[int, int] = (300, 300),
+		compress_level: int = 6,
+		clear_transparent: bool = False,
+	) -> None:
+		"""
+		Open the output and write the PDF header.
+
+		Args:
+		    output: Path of the PDF file, or a writable binary stream.
+		    dpi: Resolution of the images; sets the page size.
+		    compress_level: zlib compression level (0-9).
+		    clear_transparent: Set the colors of fully transparent pixels to
+		        zero before compressing them.
+
+		"""
+		self.dpi = dpi
+		self.compress_level = compress_level
+		self.clear_transparent = clear_transparent
+		self._offsets: dict[int, int] = {}
+		self._kids: list[int] = []
+		self._position = 0
+		# Pages written to a path go to a temporary file, renamed by close
+		self._output = None if hasattr(output, "write") else AtomicFile(output)
+		self._file = output if self._output is None else self._output.file
+		self._write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+	def add(self, image: Image.Image) -> None:
+		"""
+		Append ``image`` as the next page.
+
+		Args:
+		    image: PIL Image object; converted to RGBA if needed.
+
+		"""
+		if image.mode != "RGBA":
+			image = image.convert("RGBA")
+		elif self.clear_transparent:
+			image = clear_transparent(image)
+		data = np.asarray(image)
+		height, width = data.shape[:2]
+		page_width = width * 72 / self.dpi[0]
+		page_height = height * 72 / self.dpi[1]
+
+		smask = b""
+		alpha = data[:, :, 3:]
+		if not np.all(alpha == OPAQUE):
+			mask = self._image_object(alpha, b"/DeviceGray")
+			smask = b"/SMask %d 0 R" % mask
+		picture = self._image_object(data[:, :, :3], b"/DeviceRGB", smask)
+
+		content = b"q %.4f 0 0 %.4f 0 0 cm /Im0 Do Q" % (page_width, page_height)
+		contents = self._object(b"<< /Length %d >>" % len(content), content)
+		self._kids.append(
+			self._object(
+				b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.4f %.4f] "
+				b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+				% (self._PAGES, page_width, page_height, picture, contents)
+			)
+		)
+
+	def close(self) -> None:
+		"""
+		Write the page tree, catalog and cross-reference table.
+
+		A file written by the writer is then moved to its destination.
+
+		Raises:
+		    ValueError: If no page was added; the partial file is removed.
+
+		"""
+		if self._file is None:
+			return
+		try:
+			if not self._kids:
+				raise ValueError("A PDF needs at least one page")
+			kids = b" ".join(b"%d 0 R" % kid for kid in self._kids)
+			self._object(
+				b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._kids)),
+				number=self._PAGES,
+			)
+			catalog = b"<< /Type /Catalog /Pages %d 0 R >>" % self._PAGES
+			self._object(catalog, number=self._CATALOG)
+			start = self._position
+			size = max(self._offsets) + 1
+			self._write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+			for number in range(1, size):
+				self._write(b"%010d 00000 n \n" % self._offsets[number])
+			self._write(
+				b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+				% (size, self._CATALOG, start)
+			)
+		except BaseException:
+			self.abort()
+			raise
+		if self._output is not None:
+			self._output.commit()
+		self._file = None
+
+	def abort(self) -> None:
+		"""Stop writing; a file written by the writer is removed unfinished."""
+		if self._file is None:
+			return
+		if self._output is not None:
+			self._output.abort()
+		self._file = None
+
+	def __exit__(
+		self,
+		exc_type: type[BaseException] | None,
+		exc: BaseException | None,
+		traceback: TracebackType | None,
+	) -> None:
+		"""Finish the file, or remove the partial file if an error occurred."""
+		if exc_type is None:
+			self.close()
+		else:
+			self.abort()
+
+	def _image_object(
+		self, samples: np.ndarray, color_space: bytes, extra: bytes = b""
+	) -> int:
+		"""Write 8-bit samples as a Flate image with PNG "Sub" prediction."""
+		height, width, channels = samples.shape
+		stream = zlib.compress(sub_filter(samples).data, self.compress_level)
+		return self._object(
+			b"<< /Type /XObject /Subtype /Image /Width %d /Height %d "
+			b"/ColorSpace %s /BitsPerComponent 8 %s /Filter /FlateDecode "
+			b"/DecodeParms << /Predictor 15 /Colors %d /BitsPerComponent 8 "
+			b"/Columns %d >> /Length %d >>"
+			% (width, height, color_space, extra, channels, width, len(stream)),
+			stream,
+		)
+
+	def _object(
+		self, dictionary: bytes, stream: bytes | None = None, number: int | None = None
+	) -> int:
+		"""Write one indirect object and return its number."""
+		if number is None:
+			number = max(self._offsets, default=self._PAGES) + 1
+		self._offsets[number] = self._position
+		self._write(b"%d 0 obj\n%s\n" % (number, dictionary))
+		if stream is not None:
+			self._write(b"stream\n")
+			self._write(stream)
+			self._write(b"\nendstream\n")
+		self._write(b"endobj\n")
+		return number
+
+	def _write(self, data: bytes) -> None:
+		"""Write to the output, keeping track of the byte offset."""
+		self._file.write(data)
+		self._position += len(data)
+
+
+class PdfWriter(OutputWriter):
+	"""PDF with one image per page and transparency as a soft mask."""
+
+	name = "pdf"
+	suffixes = (".pdf",)
+	media_type = "application/pdf"
+	multipage = True
+	profiles: ClassVar[dict[str, dict[str, Any]]] = {
+		"fast": {"compress_level": 1},
+		"balanced": {"compress_level": 6},
+		"smallest": {"compress_level": 9, "clear_transparent": True},
+	}
+
+	def __init__(
+		self, compress_level: int = 6, clear_transparent: bool = False
+	) -> None:
+		"""
+		Initialize the writer.
+
+		Args:
+		    compress_level: zlib compression level (0-9) of the page images.
+		    clear_transparent: Set the colors of fully transparent pixels to
+		        zero, which the soft mask hides anyway.
+
+		"""
+		self.compress_level = compress_level
+		self.clear_transparent = clear_transparent
+
+	def save(
+		self, image: Image.Image, output: OutputPath, dpi: tuple[int, int]
+	) -> None:
+		"""Encode one image as a single-page PDF."""
+		with self.open_pages(output, dpi) as pages:
+			pages.add(image)
+
+	def open_pages(self, output: OutputPath, dpi: tuple[int, int]) -> PageWriter:
+		"""Start a multi-page PDF, written page by page."""
+		return PdfStreamWriter(output, dpi, self.compress_level, self.clear_transparent)
+
+
+WRITERS: dict[str, type[OutputWriter]] = {
+	writer.name: writer
+	for writer in (PngWriter, WebpWriter, AvifWriter, TiffWriter, PdfWriter)
+}
+
+
+def describe_formats() -> str:
+	"""Return the names of the output formats, marking the lossy ones."""
+	return ", ".join(
+		name if writer.lossless else f"{name} (lossy colors)"
+		for name, writer in WRITERS.items()
+	)
+
+
+def register_writer(writer: type[OutputWriter]) -> type[OutputWriter]:
+	"""
+	Make an output format available by name and extension.
+
+	Args:
+	    writer: Writer class with a unique ``name``.
+
+	Returns:
+	    The registered class, so this can be used as a decorator.
+
+	Raises:
+	    TypeError: If the class leaves an abstract method unimplemented.
+
+	"""
+	if inspect.isabstract(writer):
+		missing = ", ".join(sorted(writer.__abstractmethods__))
+		raise TypeError(f"Writer {writer.__name__} does not implement {missing}")
+	WRITERS[writer.name] = writer
+	return writer
+
+
+def get_writer(
+	output_format: str | OutputWriter, profile: str = DEFAULT_SAVE_PROFILE
+) -> OutputWriter:
+	"""
+	Return a writer from its format name (or the writer itself).
+
+	Args:
+	    output_format: Format name such as "webp", or a writer instance,
+	        which is returned as is.
+	    profile: Save profile setting the knobs of a writer created by name.
+
+	Raises:
+	    ValueError: If the format or the profile is unknown.
+
+	"""
+	if isinstance(output_format, OutputWriter):
+		return output_format
+	name = output_format.lower()
+	for writer in WRITERS.values():
+		if name == writer.name or f".{name}" in writer.suffixes:
+			return writer.for_profile(profile)
+	raise ValueError(
+		f"Unknown output format '{output_format}', expected one of {list(WRITERS)}"
+	)
+
+
+def writer_for_path(
+	path: str | Path, profile: str = DEFAULT_SAVE_PROFILE
+) -> OutputWriter:
+	"""
+	Return the writer of the format an output path's extension names.
+
+	Raises:
+	    ValueError: If no writer handles the extension.
+
+	"""
+	suffix = Path(path).suffix.lower()
+	for writer in WRITERS.values():
+		if suffix in writer.suffixes:
+			return writer.for_profile(profile)
+	suffixes = [s for writer in WRITERS.values() for s in writer.suffixes]
+	raise ValueError(
+		f"Unsupported output format '{suffix}', expected one of {suffixes}"
+	)
@@ -0,0 +1,37 @@
+"""Fixtures shared by the test modules."""
+
+from collections.abc import Callable, Sequence
+from pathlib import Path
+
+import fitz
+import pytest
+
+Box = tuple[float, float, float, float]
+
+
+@pytest.fixture
+def make_pdf(tmp_path) -> Callable[..., Path]:
+	"""Return a function writing a PDF of filled boxes on white pages."""
+
+	def make(
+		pages: Sequence[Sequence[Box]],
+		name: str = "drawing.pdf",
+		size: tuple[float, float] = (60, 40),
+		fill: tuple[float, ...] = (0.4, 0.4, 0.4),
+	) -> Path:
+		pdf_path = tmp_path / name
+		with fitz.open() as doc:
+			for boxes in pages:
+				page = doc.new_page(width=size[0], height=size[1])
+				for box in boxes:
+					page.draw_rect(fitz.Rect(box), fill=fill)
+			doc.save(pdf_path)
+		return pdf_path
+
+	return make
+
+
+@pytest.fixture
+def sample_pdf(make_pdf) -> Path:
+	"""Create a two page PDF with a gray box on the second page only."""
+	return make_pdf([[], [(10, 10, 30, 30)]])
@@ -0,0 +1,154 @@
+"""Tests for the asyncio front end."""
+
+import asyncio
+import io
+import threading
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import rmbg
+from rmbg.aio import AsyncImageProcessor
+from rmbg.core import ImageProcessor
+from rmbg.instrument import StageMetrics
+
+
+@pytest.fixture
+def png_bytes():
+	"""Encode a white image with a red square."""
+	data = np.full((30, 40, 3), 255, dtype=np.uint8)
+	data[10:20, 10:20] = [200, 0, 0]
+	buffer = io.BytesIO()
+	Image.fromarray(data).save(buffer, "PNG")
+	return buffer.getvalue()
+
+
+def check_result(png):
+	"""Check that the white background of the sample became transparent."""
+	result = np.asarray(Image.open(io.BytesIO(png)))
+	assert result[0, 0].tolist() == [255, 255, 255, 0]
+	assert result[15, 15].tolist() == [200, 0, 0, 255]
+
+
+@pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview, io.BytesIO])
+def test_process_from_memory(png_bytes, wrap):
+	"""Test the whole pipeline on bytes, buffers and streams."""
+
+	async def run() -> bytes:
+		async with AsyncImageProcessor(max_concurrency=2) as processor:
+			return await processor.process(wrap(png_bytes), (255, 255, 255))
+
+	check_result(asyncio.run(run()))
+
+
+def test_steps_with_paths(png_bytes, tmp_path):
+	"""Test loading, masking and saving as separate awaitable steps."""
+	(tmp_path / "in.png").write_bytes(png_bytes)
+
+	async def run() -> bytes:
+		async with AsyncImageProcessor() as processor:
+			image = await processor.load_image(tmp_path / "in.png")
+			result = await processor.make_transparent(image, (255, 255, 255))
+			await processor.save_image(result, tmp_path / "out.png")
+
+			data = await processor.load_array(str(tmp_path / "in.png"))
+			data = await processor.make_transparent_array(data, (255, 255, 255))
+			stream = io.BytesIO()
+			await processor.save_array(data, stream)
+			return stream.getvalue()
+
+	check_result(asyncio.run(run()))
+	check_result((tmp_path / "out.png").read_bytes())
+
+
+def test_errors_propagate(tmp_path):
+	"""Test that failures surface as the processor's exceptions."""
+
+	async def run(source) -> None:
+		processor = AsyncImageProcessor(max_concurrency=1)
+		try:
+			await processor.load_array(source)
+		finally:
+			processor.close()
+
+	with pytest.raises(FileNotFoundError):
+		asyncio.run(run(tmp_path / "missing.png"))
+	with pytest.raises(ValueError, match="Failed to load image"):
+		asyncio.run(run(b"not an image"))
+	with pytest.raises(ValueError, match="must be positive"):
+		AsyncImageProcessor(max_concurrency=-1)
+
+
+def test_bounded_concurrency(png_bytes, monkeypatch):
+	"""Test that no more than max_concurrency calls run at once."""
+	running = 0
+	peak = 0
+	lock = threading.Lock()
+	make_transparent_array = ImageProcessor.make_transparent_array
+
+	def slow(self, data, target_color, tolerance=10) -> np.ndarray:
+		nonlocal running, peak
+		with lock:
+			running += 1
+			peak = max(peak, running)
+		threading.Event().wait(0.02)
+		with lock:
+			running -= 1
+		return make_transparent_array(self, data, target_color, tolerance)
+
+	monkeypatch.setattr(ImageProcessor, "make_transparent_array", slow)
+
+	async def run() -> list[bytes]:
+		async with AsyncImageProcessor(max_concurrency=2) as processor:
+			results = await asyncio.gather(
+				*(processor.process(png_bytes, (255, 255, 255)) for _ in range(8))
+			)
+			assert processor.in_flight == 0
+			return results
+
+	results = asyncio.run(run())
+	assert peak == 2
+	for png in results:
+		check_result(png)
+
+
+def test_shared_instrument(png_bytes):
+	"""Test that concurrent calls can share one traced metrics collector."""
+	metrics = StageMetrics(trace_allocations=True)
+
+	async def run() -> list[bytes]:
+		processor = ImageProcessor(instrument=metrics)
+		async with AsyncImageProcessor(processor, max_concurrency=4) as aio:
+			return await asyncio.gather(
+				*(aio.process(png_bytes, (255, 255, 255)) for _ in range(16))
+			)
+
+	for png in asyncio.run(run()):
+		check_result(png)
+	assert metrics.stages["mask"].count == 16
+	assert metrics.stages["encode"].count == 16
+	assert not tracemalloc.is_tracing()
+
+
+def test_process_pool_executor(png_bytes):
+	"""Test running the pipeline on a caller-provided process pool."""
+
+	async def run(executor) -> bytes:
+		processor = AsyncImageProcessor(ImageProcessor(feather=5), executor)
+		png = await processor.process(png_bytes, (255, 255, 255), 5)
+		processor.close()
+		return png
+
+	with ProcessPoolExecutor(max_workers=1) as executor:
+		png = asyncio.run(run(executor))
+		# The pool belongs to the caller and keeps running
+		assert executor.submit(int, "1").result() == 1
+	check_result(png)
+
+
+def test_package_export():
+	"""Test the lazy package-level export."""
+	assert rmbg.AsyncImageProcessor is AsyncImageProcessor
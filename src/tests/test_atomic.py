@@ -0,0 +1,25 @@
+"""Tests for atomically replaced files."""
+
+import pytest
+
+from rmbg.atomic import AtomicFile
+
+
+def test_atomic_file(tmp_path):
+	"""Test that the destination only changes once the file is complete."""
+	path = tmp_path / "report.json"
+	path.write_bytes(b"old")
+	with AtomicFile(path) as file:
+		file.write(b"new")
+		assert path.read_bytes() == b"old"
+	assert path.read_bytes() == b"new"
+
+	def fail_midway() -> None:
+		with AtomicFile(path) as file:
+			file.write(b"partial")
+			raise RuntimeError("boom")
+
+	with pytest.raises(RuntimeError, match="boom"):
+		fail_midway()
+	assert path.read_bytes() == b"new"
+	assert [p.name for p in tmp_path.iterdir()] == ["report.json"]
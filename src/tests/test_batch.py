@@ -0,0 +1,267 @@
+"""Tests for the batch processing engine."""
+
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+
+from rmbg import batch as batch_module
+from rmbg.__main__ import app
+from rmbg.batch import (
+	BatchTask,
+	_bounded_map,
+	collect_inputs,
+	output_path_for,
+	page_output_path,
+	run_batch,
+	run_pdf,
+	write_report,
+)
+from rmbg.manifest import Manifest
+
+
+@pytest.fixture
+def input_dir(tmp_path):
+	"""Create a directory with a few sample images and an unsupported file."""
+	directory = tmp_path / "inputs"
+	(directory / "nested").mkdir(parents=True)
+	for name in ("a.png", "b.jpg", "nested/c.png"):
+		img_array = np.full((20, 20, 3), 255, dtype=np.uint8)
+		img_array[5:15, 5:15] = [100, 100, 100]
+		Image.fromarray(img_array).save(directory / name)
+	(directory / "notes.txt").write_text("not an image")
+	return directory
+
+
+@pytest.fixture
+def sample_pdf(make_pdf):
+	"""Create a four page PDF with a gray box on every page."""
+	return make_pdf([[(10, 10, 30, 30)]] * 4)
+
+
+def _tasks(inputs, output_dir, root) -> list[BatchTask]:
+	return [
+		BatchTask(path, output_path_for(path, output_dir, root), (255, 255, 255), 10)
+		for path in inputs
+	]
+
+
+def test_collect_inputs_directory(input_dir):
+	"""Test that only supported files are collected from a directory."""
+	assert [p.name for p in collect_inputs(input_dir)] == ["a.png", "b.jpg"]
+	assert len(collect_inputs(input_dir, "**/*")) == 3
+
+
+def test_collect_inputs_glob(input_dir):
+	"""Test collecting inputs from a glob pattern."""
+	inputs = collect_inputs(f"{input_dir}/**/*.png")
+	assert [p.name for p in inputs] == ["a.png", "c.png"]
+	assert collect_inputs(f"{input_dir}/?.jpg") == [input_dir / "b.jpg"]
+	assert collect_inputs(input_dir / "a.png") == [input_dir / "a.png"]
+
+
+def test_collect_inputs_empty(tmp_path):
+	"""Test that an empty source raises."""
+	with pytest.raises(FileNotFoundError, match="No supported input files"):
+		collect_inputs(tmp_path)
+
+
+def test_output_path_preserves_structure(input_dir, tmp_path):
+	"""Test that output paths mirror the input tree with a PNG suffix."""
+	out = output_path_for(input_dir / "nested" / "c.png", tmp_path / "out", input_dir)
+	assert out == tmp_path / "out" / "nested" / "c.png"
+	out = output_path_for(input_dir / "b.jpg", tmp_path / "out", None)
+	assert out == tmp_path / "out" / "b.png"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_batch_continues_past_failures(input_dir, tmp_path, workers):
+	"""Test that failing files are reported without stopping the batch."""
+	broken = input_dir / "broken.png"
+	broken.write_bytes(b"not a png")
+	inputs = [*collect_inputs(input_dir, "**/*")]
+	output_dir = tmp_path / "out"
+
+	seen = []
+	summary = run_batch(_tasks(inputs, output_dir, input_dir), workers, seen.append)
+
+	assert len(seen) == len(inputs) == 4
+	assert summary.succeeded == 3
+	assert summary.failed == 1
+	assert [r.input_file for r in summary.results] == [str(p) for p in inputs]
+	failed = next(r for r in summary.results if not r.ok)
+	assert failed.input_file == str(broken)
+	assert failed.error
+
+	result = np.array(Image.open(output_dir / "nested" / "c.png"))
+	assert result[0, 0, 3] == 0
+	assert result[10, 10, 3] == 255
+	assert summary.throughput > 0
+
+
+def test_write_report(input_dir, tmp_path):
+	"""Test the JSON report contents."""
+	inputs = collect_inputs(input_dir)
+	summary = run_batch(_tasks(inputs, tmp_path / "out", input_dir), workers=1)
+	report = tmp_path / "report.json"
+	write_report(summary, report)
+
+	data = json.loads(report.read_text())
+	assert data["total"] == 2
+	assert data["succeeded"] == 2
+	assert data["images_per_second"] >= 0
+	assert {f["status"] for f in data["files"]} == {"ok"}
+
+
+def test_cli_batch_command(input_dir, tmp_path):
+	"""Test the batch subcommand end to end."""
+	output_dir = tmp_path / "out"
+	result = CliRunner().invoke(
+		app,
+		["batch", str(input_dir), str(output_dir), "--pattern", "**/*", "-w", "1"],
+	)
+
+	assert result.exit_code == 0
+	assert "images/sec" in result.stdout
+	assert (output_dir / "nested" / "c.png").exists()
+	assert (output_dir / "rmbg-report.json").exists()
+
+
+def test_cli_batch_reports_failures(input_dir, tmp_path):
+	"""Test that the batch subcommand exits non-zero when files fail."""
+	(input_dir / "broken.png").write_bytes(b"not a png")
+	result = CliRunner().invoke(
+		app, ["batch", str(input_dir), str(tmp_path / "out"), "-w", "1"]
+	)
+
+	assert result.exit_code == 1
+	assert "broken.png" in result.stdout
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_pdf_numbered_pages(sample_pdf, tmp_path, workers):
+	"""Test rendering selected pages to numbered PNG files."""
+	output_dir = tmp_path / "pages"
+	summary = run_pdf(
+		sample_pdf, output_dir, [0, 2, 3], (255, 255, 255), workers=workers
+	)
+
+	assert summary.succeeded == 3
+	assert [r.input_file for r in summary.results] == [
+		f"{sample_pdf}#page={n}" for n in (0, 2, 3)
+	]
+	assert sorted(p.name for p in output_dir.iterdir()) == [
+		"drawing-0000.png",
+		"drawing-0002.png",
+		"drawing-0003.png",
+	]
+	page = np.array(Image.open(page_output_path(sample_pdf, 2, output_dir)))
+	assert page.shape[:2] == (167, 250)
+	assert page[0, 0, 3] == 0
+	assert page[80, 80, 3] == 255
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_pdf_multipage(sample_pdf, tmp_path, workers):
+	"""Test rendering every page into one multi-page TIFF."""
+	output = tmp_path / "drawing.tiff"
+	summary = run_pdf(
+		sample_pdf,
+		output,
+		range(4),
+		(255, 255, 255),
+		dpi=144,
+		workers=workers,
+		clip=(0, 0, 30, 40),
+	)
+
+	assert summary.succeeded == 4
+	saved = Image.open(output)
+	assert saved.n_frames == 4
+	assert saved.mode == "RGBA"
+	assert saved.size == (60, 80)
+
+
+def test_bounded_map_limits_pages_in_flight():
+	"""Test that pages are only submitted as fast as they are consumed."""
+
+	class CountingPool(ThreadPoolExecutor):
+		submitted = 0
+
+		def submit(self, *args: object, **kwargs: object) -> Future:
+			self.submitted += 1
+			return super().submit(*args, **kwargs)
+
+	with CountingPool(max_workers=2) as pool:
+		results = []
+		for value in _bounded_map(pool, lambda n: n * 2, range(20), 4):
+			results.append(value)
+			# The one just taken plus at most 3 queued or finished behind it
+			assert pool.submitted - len(results) <= 3
+		assert results == [n * 2 for n in range(20)]
+		assert pool.submitted == 20
+
+
+def test_run_pdf_bad_page(sample_pdf, tmp_path):
+	"""Test that an invalid page is reported without stopping the run."""
+	summary = run_pdf(
+		sample_pdf, tmp_path / "pages", [0, 9], (255, 255, 255), workers=1
+	)
+
+	assert summary.succeeded == 1
+	assert "out of range" in summary.results[1].error
+
+
+def test_in_process_worker_is_reset(input_dir, sample_pdf, tmp_path):
+	"""Test that a single worker leaves no processor or open document behind."""
+	inputs = collect_inputs(input_dir)
+	tasks = _tasks(inputs, tmp_path / "out", input_dir)
+	run_batch(tasks, workers=1, manifest=Manifest(tmp_path / "manifest.json"))
+	assert batch_module._worker_processor is None
+	assert not batch_module._worker_digests
+
+	def stop(result) -> None:
+		raise KeyboardInterrupt
+
+	with pytest.raises(KeyboardInterrupt):
+		run_pdf(
+			sample_pdf,
+			tmp_path / "pages",
+			range(4),
+			(255, 255, 255),
+			workers=1,
+			on_result=stop,
+		)
+	assert batch_module._worker_processor is None
+	assert not batch_module._worker_documents
+
+
+def test_cli_pdf_command(sample_pdf, tmp_path):
+	"""Test the pdf subcommand end to end."""
+	output_dir = tmp_path / "pages"
+	result = CliRunner().invoke(
+		app, ["pdf", str(sample_pdf), str(output_dir), "--pages", "1-", "-w", "1"]
+	)
+
+	assert result.exit_code == 0
+	assert "3 pages" in result.stdout
+	assert (output_dir / "drawing-report.json").exists()
+	assert len(list(output_dir.glob("*.png"))) == 3
+
+
+def test_run_batch_memmap(input_dir, tmp_path):
+	"""Test that memory-mapped working arrays give the same output."""
+	inputs = collect_inputs(input_dir, "*.png")
+	heap = run_batch(_tasks(inputs, tmp_path / "heap", input_dir), workers=1)
+	mapped = run_batch(
+		_tasks(inputs, tmp_path / "mapped", input_dir), workers=1, memmap_threshold=1
+	)
+
+	assert heap.failed == mapped.failed == 0
+	for a, b in zip(heap.results, mapped.results, strict=True):
+		assert np.array_equal(
+			np.array(Image.open(a.output_file)), np.array(Image.open(b.output_file))
+		)
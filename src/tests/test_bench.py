@@ -0,0 +1,125 @@
+"""Tests for the benchmark suite."""
+
+import json
+
+import numpy as np
+import pytest
+from typer.testing import CliRunner
+
+from rmbg.__main__ import app
+from rmbg.bench import (
+	STAGES,
+	BenchCase,
+	calibrate,
+	default_cases,
+	find_regressions,
+	load_report,
+	run_suite,
+	save_report,
+	speed_ratio,
+	synthetic_scan,
+)
+
+
+def test_cases_and_inputs():
+	"""Test the standard cases, their sizes and the synthetic scan."""
+	cases = default_cases([4, 1], pdf_pages=3)
+	assert [case.name for case in cases] == ["image-1mp", "image-4mp", "pdf-3x1mp"]
+	height, width = cases[1].shape
+	assert height * width == pytest.approx(4e6, rel=1e-3)
+	assert height > width
+	assert default_cases([1], pdf_pages=0) == [BenchCase("image", 1)]
+	with pytest.raises(ValueError, match="positive"):
+		default_cases([0, 1])
+	with pytest.raises(ValueError, match="negative"):
+		default_cases([1], pdf_pages=-1)
+
+	scan = synthetic_scan(300, 200)
+	assert scan.shape == (300, 200, 3)
+	assert np.array_equal(scan, synthetic_scan(300, 200))
+	assert (scan[:20] > 240).all()
+	assert (scan < 60).any()
+
+
+def test_run_suite(tmp_path):
+	"""Test the report of a small run, in and out of separate processes."""
+	cases = default_cases([0.02, 0.05], pdf_pages=2)
+	finished = []
+	report = run_suite(cases, repeat=2, isolate=False, on_result=finished.append)
+	assert finished == report.results
+	result = report.to_dict()
+	assert [case["name"] for case in result["cases"]] == [c.name for c in cases]
+	assert result["environment"]["packages"]["numpy"] == np.__version__
+	assert result["calibration_ms"] > 0
+	for case in result["cases"]:
+		assert list(case["stages"]) == list(STAGES)
+		for timings in case["stages"].values():
+			assert timings["samples"] == 2 * case["pages"]
+			assert 0 < timings["p50_ms"] <= timings["p90_ms"] <= timings["p99_ms"]
+			assert timings["megapixels_per_second"] > 0
+		assert case["peak_rss_bytes"] > 0
+
+	save_report(report, tmp_path / "nested" / "report.json")
+	assert load_report(tmp_path / "nested" / "report.json")["cases"] == result["cases"]
+
+	isolated = run_suite([BenchCase("image", 0.01)], repeat=1)
+	assert isolated.isolated
+	assert isolated.results[0].peak_rss > 0
+	with pytest.raises(ValueError, match="at least once"):
+		run_suite(cases, repeat=0)
+
+
+def test_find_regressions():
+	"""Test that slower stages and larger peak RSS are reported."""
+
+	def report(decode_ms, rss) -> dict:
+		stages = {"decode": {"p50_ms": decode_ms}, "mask": {"p50_ms": 10.0}}
+		return {"cases": [{"name": "a", "stages": stages, "peak_rss_bytes": rss}]}
+
+	baseline = report(100.0, 100 * 2**20)
+	assert find_regressions(report(120.0, 120 * 2**20), baseline) == []
+	regressions = find_regressions(report(130.0, 130 * 2**20), baseline)
+	assert len(regressions) == 2
+	assert regressions[0].startswith("a decode: median 130.0 ms, baseline 100.0 ms")
+	assert "peak RSS: 130 MiB" in regressions[1]
+	assert find_regressions(report(130.0, None), baseline, max_slowdown=0.5) == []
+	assert find_regressions(report(130.0, None), {"cases": []}) == []
+
+	# On a machine twice as slow, twice the baseline medians is no regression
+	slow, fast = report(200.0, None), report(100.0, None)
+	slow["calibration_ms"], fast["calibration_ms"] = 20.0, 10.0
+	assert speed_ratio(slow, fast) == 2.0
+	assert speed_ratio(slow, baseline) == 1.0
+	assert find_regressions(slow, fast) == []
+	slow["cases"][0]["stages"]["mask"]["p50_ms"] = 30.0
+	assert find_regressions(slow, fast) == [
+		"a mask: median 30.0 ms, baseline 20.0 ms (+50%)"
+	]
+	assert calibrate(repeat=1) > 0
+
+
+def test_cli_bench(tmp_path):
+	"""Test the bench command, its report and the baseline check."""
+	runner = CliRunner()
+	output = tmp_path / "bench.json"
+	args = ["bench", "--megapixels", "0.02", "--pdf-pages", "1", "-r", "1"]
+	args += ["--no-isolate", "--output", str(output)]
+	result = runner.invoke(app, args)
+	assert result.exit_code == 0, result.stdout
+	assert "image-0.02mp" in result.stdout
+	assert "pdf-1x0.02mp" in result.stdout
+	assert "Reference workload" in result.stdout
+
+	baseline = load_report(output)
+	for case in baseline["cases"]:
+		for timings in case["stages"].values():
+			timings["p50_ms"] /= 100
+	(tmp_path / "baseline.json").write_text(json.dumps(baseline))
+	result = runner.invoke(app, [*args, "--baseline", str(tmp_path / "baseline.json")])
+	assert result.exit_code == 1
+	assert "Regressions against" in result.stdout
+
+	(tmp_path / "baseline.json").write_text(json.dumps({"cases": []}))
+	result = runner.invoke(app, [*args, "--baseline", str(tmp_path / "baseline.json")])
+	assert result.exit_code == 0, result.stdout
+	assert "No stage more than 25% slower" in result.stdout
@@ -0,0 +1,268 @@
+"""Tests for the content-addressed result cache."""
+
+import asyncio
+import io
+import pickle
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+
+from rmbg import cache as cache_module
+from rmbg.__main__ import app
+from rmbg.aio import AsyncImageProcessor
+from rmbg.batch import BatchTask, run_batch
+from rmbg.cache import CacheStats, ResultCache, cache_key, source_digest
+from rmbg.core import ImageProcessor
+
+
+@pytest.fixture
+def cache(tmp_path):
+	"""Create a result cache in a temporary directory."""
+	result = ResultCache(tmp_path / "cache", max_bytes=100)
+	yield result
+	result.close()
+
+
+@pytest.fixture
+def letterhead(tmp_path):
+	"""Create a letterhead PNG: a red bar on white."""
+	data = np.full((30, 40, 3), 255, dtype=np.uint8)
+	data[2:8] = [200, 0, 0]
+	path = tmp_path / "letterhead.png"
+	Image.fromarray(data).save(path)
+	return path
+
+
+def fill(directory, worker, count):
+	"""Store ``count`` entries from another process; return its hits."""
+	cache = ResultCache(directory, max_bytes=1000)
+	for index in range(count):
+		cache.put(f"{worker}-{index}", bytes(10))
+	return sum(cache.get(f"{worker}-{index}") is not None for index in range(count))
+
+
+def test_get_put(cache):
+	"""Test storing and looking up outputs, and the counters."""
+	assert cache.get("a") is None
+	cache.put("a", b"alpha")
+	assert cache.get("a") == b"alpha"
+	assert cache.get("b") is None
+
+	stats = cache.stats()
+	assert stats == CacheStats(hits=1, misses=2, stores=1, entries=1, size=5)
+	assert stats.hit_rate == pytest.approx(1 / 3)
+	assert stats.to_dict()["bytes"] == 5
+
+
+def test_lru_eviction(cache):
+	"""Test that the least recently used entries go first, and only as needed."""
+	cache.put("a", bytes(40))
+	cache.put("b", bytes(40))
+	assert cache.get("a") is not None
+	cache.put("c", bytes(40))
+
+	assert cache.get("b") is None
+	assert cache.get("a") is not None
+	assert cache.get("c") is not None
+	assert cache.stats().evictions == 1
+	assert cache.stats().size == 80
+
+	cache.put("huge", bytes(101))
+	assert cache.get("huge") is None
+	assert cache.stats().entries == 2
+
+
+def test_lookups_do_not_write(cache):
+	"""Test that hits on recent entries read past a writer holding the lock."""
+	cache.put("a", b"alpha")
+	cache.put("b", b"beta")
+	writer = sqlite3.connect(cache.path, isolation_level=None)
+	writer.execute("BEGIN IMMEDIATE")
+	cache._db.execute("PRAGMA busy_timeout = 50")
+	try:
+		assert cache.get("b") == b"beta"
+		assert cache.get("c") is None
+		with pytest.raises(sqlite3.OperationalError, match="locked"):
+			cache.get("a")
+	finally:
+		writer.execute("ROLLBACK")
+		writer.close()
+
+	other = ResultCache(cache.path.parent)
+	assert other.stats().hits == 0
+	assert cache.stats() == CacheStats(hits=2, misses=1, stores=2, entries=2, size=9)
+	assert other.stats().hits == 2
+	other.close()
+
+
+def test_clear_and_pickle(cache):
+	"""Test emptying the cache, and that a pickled cache reopens it."""
+	cache.put("a", b"alpha")
+	copy = pickle.loads(pickle.dumps(cache))  # noqa: S301 - our own bytes
+	assert copy.get("a") == b"alpha"
+	copy.close()
+
+	cache.clear()
+	assert cache.stats() == CacheStats()
+	with pytest.raises(ValueError, match="Cache size must be positive"):
+		ResultCache(cache.path.parent, max_bytes=0)
+
+
+def test_concurrent_processes(tmp_path):
+	"""Test that worker processes store into one cache without losing counts."""
+	with ProcessPoolExecutor(4) as pool:
+		hits = list(pool.map(fill, [tmp_path] * 4, range(4), [20] * 4))
+
+	stats = ResultCache(tmp_path).stats()
+	assert stats.stores == 80
+	assert stats.hits == sum(hits)
+	assert stats.size <= 1000
+	assert stats.entries + stats.evictions == 80
+
+
+def test_busy_database(cache, monkeypatch):
+	"""Test that locked databases are retried, and unwritable counts reported."""
+	calls = []
+
+	def locked_twice() -> str:
+		calls.append(None)
+		if len(calls) < 3:
+			raise sqlite3.OperationalError("database is locked")
+		return "done"
+
+	assert cache_module._retry_busy(locked_twice) == "done"
+	with pytest.raises(sqlite3.OperationalError, match="no such table"):
+		cache_module._retry_busy(lambda: cache._db.execute("SELECT * FROM missing"))
+
+	assert cache.get("a") is None
+	counts = cache._pending
+
+	def broken(path) -> None:
+		raise sqlite3.OperationalError("disk I/O error")
+
+	monkeypatch.setattr(cache_module, "_connect", broken)
+	with pytest.warns(RuntimeWarning, match="'misses': 1"):
+		counts.flush()
+
+
+def test_cache_key():
+	"""Test that keys follow the input bytes and every option."""
+	digest = source_digest(b"input")
+	assert digest == source_digest(memoryview(b"input"))
+	key = cache_key(digest, {"color": (255, 255, 255), "tolerance": 10})
+	assert key == cache_key(digest, {"tolerance": 10, "color": [255, 255, 255]})
+	assert key != cache_key(digest, {"color": (255, 255, 255), "tolerance": 11})
+	assert key != cache_key(source_digest(b"other"), {"color": (255, 255, 255)})
+
+
+def test_process_file_hit_skips_work(letterhead, tmp_path, monkeypatch):
+	"""Test that a hit copies the stored output without decoding anything."""
+	processor = ImageProcessor(cache=ResultCache(tmp_path / "cache"))
+	assert not processor.process_file(letterhead, tmp_path / "first.png", (255,) * 3)
+
+	def fail(*args: object, **kwargs: object) -> None:
+		raise AssertionError("decoded on a cache hit")
+
+	monkeypatch.setattr(processor, "load_array", fail)
+	copy = tmp_path / "copy.png"
+	copy.write_bytes(letterhead.read_bytes())
+	assert processor.process_file(copy, tmp_path / "second.png", (255,) * 3)
+	first = (tmp_path / "first.png").read_bytes()
+	assert (tmp_path / "second.png").read_bytes() == first
+
+	buffer = io.BytesIO()
+	assert processor.process_file(letterhead.read_bytes(), buffer, (255,) * 3)
+	assert buffer.getvalue() == first
+
+
+def test_process_file_options_miss(letterhead, tmp_path):
+	"""Test that other options or another format are processed again."""
+	cache = ResultCache(tmp_path / "cache")
+	processor = ImageProcessor(cache=cache)
+	processor.process_file(letterhead, tmp_path / "out.png", (255,) * 3)
+
+	assert not processor.process_file(letterhead, tmp_path / "out.png", (255,) * 3, 20)
+	assert not processor.process_file(letterhead, tmp_path / "out.webp", (255,) * 3)
+	assert not ImageProcessor(cache=cache, feather=5).process_file(
+		letterhead, tmp_path / "out.png", (255,) * 3
+	)
+	assert not ImageProcessor(cache=cache, save_profile="fast").process_file(
+		letterhead, tmp_path / "out.png", (255,) * 3
+	)
+	assert cache.stats().misses == 5
+
+	with Image.open(tmp_path / "out.png") as result:
+		assert result.getpixel((0, 20))[3] == 0
+		assert result.getpixel((0, 4))[3] == 255
+
+
+def test_process_file_pdf_pages(tmp_path, sample_pdf):
+	"""Test that pages of one PDF are cached separately."""
+	processor = ImageProcessor(cache=ResultCache(tmp_path / "cache"))
+	assert not processor.process_file(sample_pdf, tmp_path / "p0.png", (255,) * 3)
+	assert not processor.process_file(
+		sample_pdf, tmp_path / "p1.png", (255,) * 3, page=1
+	)
+	assert processor.process_file(sample_pdf, tmp_path / "again.png", (255,) * 3)
+
+
+def test_batch_shares_cache(letterhead, tmp_path):
+	"""Test that batch workers fill and then hit one shared cache."""
+	tasks = [
+		BatchTask(letterhead, tmp_path / "out" / f"{index}.png", (255, 255, 255))
+		for index in range(4)
+	]
+	cache = ResultCache(tmp_path / "cache")
+	first = run_batch(tasks[:1], workers=1, cache=cache)
+	assert first.cached == 0
+	summary = run_batch(tasks, workers=2, cache=cache)
+
+	assert summary.succeeded == 4
+	assert summary.cached == 4
+	assert summary.to_dict()["cached"] == 4
+	assert cache.stats().hits == 4
+
+
+def test_async_process(letterhead, tmp_path):
+	"""Test that the asyncio front end goes through the cache."""
+
+	async def run() -> list[bytes]:
+		processor = ImageProcessor(cache=ResultCache(tmp_path / "cache"))
+		async with AsyncImageProcessor(processor, max_concurrency=2) as rmbg:
+			return await asyncio.gather(
+				*(rmbg.process(letterhead, (255, 255, 255)) for _ in range(3))
+			)
+
+	results = asyncio.run(run())
+	assert results[0] == results[1] == results[2]
+	assert ResultCache(tmp_path / "cache").stats().stores >= 1
+
+
+def test_cli_cache(letterhead, tmp_path):
+	"""Test --cache on the command line and the cache statistics command."""
+	runner = CliRunner()
+	cache_dir = str(tmp_path / "cache")
+	args = ["main", str(letterhead), str(tmp_path / "out.png"), "--cache", cache_dir]
+	result = runner.invoke(app, args)
+	assert result.exit_code == 0, result.stdout
+	assert "from cache" not in result.stdout
+	result = runner.invoke(app, args)
+	assert result.exit_code == 0, result.stdout
+	assert "from cache" in result.stdout
+
+	result = runner.invoke(app, [*args, "--stream"])
+	assert result.exit_code == 1
+	assert "cannot be used with streaming" in result.stdout
+
+	result = runner.invoke(app, ["cache", cache_dir, "--clear"])
+	assert result.exit_code == 0, result.stdout
+	assert "Hit rate" in result.stdout
+	assert "50.0%" in result.stdout
+	assert ResultCache(tmp_path / "cache").stats().entries == 0
+
+	result = runner.invoke(app, ["cache", str(tmp_path / "missing")])
+	assert result.exit_code == 1
@@ -4,11 +4,12 @@ import warnings
 from pathlib import Path
 from unittest.mock import Mock, patch
 
+import numpy as np
 import pytest
 from PIL import Image
 from typer.testing import CliRunner
 
-from rmbg.cli import main, parse_color
+from rmbg.cli import main, parse_clip, parse_color, parse_page_range, parse_targets
 
 warnings.filterwarnings(
     "ignore", category=DeprecationWarning, module="importlib._bootstrap"
@@ -115,6 +116,63 @@ class TestParseColor:
             parse_color("invalid_format")
 
 
+class TestParsePageRange:
+    """Test the parse_page_range function."""
+
+    def test_all_pages(self):
+        """Test selecting every page."""
+        assert parse_page_range("all", 3) == [0, 1, 2]
+
+    def test_pages_and_ranges(self):
+        """Test mixing single pages, closed and open-ended ranges."""
+        assert parse_page_range("0,3-4,8-", 10) == [0, 3, 4, 8, 9]
+
+    def test_duplicates_are_merged(self):
+        """Test that overlapping selections are returned once, sorted."""
+        assert parse_page_range("4,1-3,2", 5) == [1, 2, 3, 4]
+
+    @pytest.mark.parametrize("spec", ["", "a", "3-1", "5", "-1", "0-5"])
+    def test_invalid_ranges(self, spec):
+        """Test invalid or out-of-range specifications."""
+        with pytest.raises(ValueError, match="Pages must be 0-based"):
+            parse_page_range(spec, 5)
+
+
+class TestParseClip:
+    """Test the parse_clip function."""
+
+    def test_parse_clip(self):
+        """Test parsing a clip rectangle in points."""
+        assert parse_clip("0,10.5,200,300") == (0.0, 10.5, 200.0, 300.0)
+
+    @pytest.mark.parametrize("clip", ["", "1,2,3", "10,0,5,5", "0,0,5,x"])
+    def test_invalid_clip(self, clip):
+        """Test invalid or empty clip rectangles."""
+        with pytest.raises(ValueError, match="Clip must be in format"):
+            parse_clip(clip)
+
+
+class TestParseTargets:
+    """Test the parse_targets function."""
+
+    def test_single_color(self):
+        """Test that one color keeps the single-color form."""
+        assert parse_targets("#ffffff", 12) == ((255, 255, 255), 12)
+        assert parse_targets(["0,0,0:3"], 12) == ((0, 0, 0), 3)
+
+    def test_several_colors(self):
+        """Test several colors with shared and per-color tolerances."""
+        colors, tolerances = parse_targets(["#ffffff", "200,200,200:25"], 10)
+        assert colors == [(255, 255, 255), (200, 200, 200)]
+        assert tolerances == [10, 25]
+
+    @pytest.mark.parametrize("spec", [["#fff:5"], ["0,0,0:"], ["0,0,0:x"], ["0,0,0:256"], []])
+    def test_invalid_targets(self, spec):
+        """Test invalid colors, tolerances and empty lists."""
+        with pytest.raises(ValueError):
+            parse_targets(spec)
+
+
 class TestMainFunction:
     """Test the main function with various scenarios."""
 
@@ -126,9 +184,9 @@ class TestMainFunction:
         mock_processor_class.return_value = mock_processor
         
         # Create a mock image
-        mock_image = Image.new("RGBA", (100, 100), (255, 255, 255, 255))
-        mock_processor.load_image.return_value = mock_image
-        mock_processor.make_transparent.return_value = mock_image
+        mock_data = np.full((100, 100, 4), 255, dtype=np.uint8)
+        mock_processor.load_array.return_value = mock_data
+        mock_processor.make_transparent_array.return_value = mock_data
         
         output_file = tmp_path / "output.png"
         
@@ -136,23 +194,97 @@ class TestMainFunction:
         main(sample_image_file, output_file, "255,255,255", 10)
         
         # Verify calls
-        mock_processor.load_image.assert_called_once_with(sample_image_file)
-        mock_processor.make_transparent.assert_called_once_with(
-            mock_image, (255, 255, 255), 10
+        mock_processor.load_array.assert_called_once_with(
+            sample_image_file, page=None, dpi=300, clip=None
         )
-        mock_processor.save_image.assert_called_once_with(
-            mock_image, output_file, (300, 300)
+        mock_processor.make_transparent_array.assert_called_once_with(
+            mock_data, (255, 255, 255), 10
+        )
+        mock_processor.save_array.assert_called_once_with(
+            mock_data, output_file, (300, 300)
+        )
+
+    @patch("rmbg.cli.ImageProcessor")
+    def test_pdf_page_is_passed_through(self, mock_processor_class, sample_image_file, tmp_path):
+        """Test that the requested PDF page reaches the loader."""
+        mock_processor = Mock()
+        mock_processor_class.return_value = mock_processor
+        mock_data = np.full((100, 100, 4), 255, dtype=np.uint8)
+        mock_processor.load_array.return_value = mock_data
+        mock_processor.make_transparent_array.return_value = mock_data
+
+        main(sample_image_file, tmp_path / "output.png", page=4)
+
+        mock_processor.load_array.assert_called_once_with(
+            sample_image_file, page=4, dpi=300, clip=None
         )
 
+    @patch("rmbg.cli.ImageProcessor")
+    def test_render_dpi_and_clip_are_passed_through(self, mock_processor_class, sample_image_file, tmp_path):
+        """Test that the DPI and clip region reach the loader."""
+        mock_processor = Mock()
+        mock_processor_class.return_value = mock_processor
+        mock_data = np.full((100, 100, 4), 255, dtype=np.uint8)
+        mock_processor.load_array.return_value = mock_data
+        mock_processor.make_transparent_array.return_value = mock_data
+
+        main(sample_image_file, tmp_path / "output.png", dpi=600, clip="0,0,72,144")
+
+        mock_processor.load_array.assert_called_once_with(
+            sample_image_file, page=None, dpi=600, clip=(0.0, 0.0, 72.0, 144.0)
+        )
+
+    @patch("rmbg.cli.ImageProcessor")
+    def test_stream_uses_streaming_path(self, mock_processor_class, sample_image_file, tmp_path):
+        """Test that --stream processes the file without loading it whole."""
+        mock_processor = Mock()
+        mock_processor_class.return_value = mock_processor
+        output_file = tmp_path / "output.png"
+
+        main(sample_image_file, output_file, page=1, dpi=150, stream=True, band_rows=64)
+
+        mock_processor.make_transparent_streaming.assert_called_once_with(
+            sample_image_file,
+            output_file,
+            (255, 255, 255),
+            10,
+            page=1,
+            dpi=150,
+            clip=None,
+            output_dpi=(150, 150),
+            band_rows=64,
+        )
+        mock_processor.load_array.assert_not_called()
+
+    def test_several_colors_end_to_end(self, sample_image_file, tmp_path):
+        """Test removing two colors, each with its own tolerance."""
+        output_file = tmp_path / "output.png"
+
+        main(sample_image_file, output_file, ["#ffffff", "250,5,5:10"], 0)
+
+        result = Image.open(output_file)
+        assert result.getpixel((0, 0))[3] == 0
+        assert result.getpixel((50, 50))[3] == 0
+
+    def test_feather_end_to_end(self, tmp_path):
+        """Test soft edges with de-spill from the command line."""
+        input_file = tmp_path / "input.png"
+        Image.new("RGB", (4, 1), (222, 102, 102)).save(input_file)
+        output_file = tmp_path / "output.png"
+
+        main(input_file, output_file, "#ffffff", 0, feather=255)
+
+        assert Image.open(output_file).getpixel((0, 0)) == (200, 0, 0, 153)
+
     @patch("rmbg.cli.ImageProcessor")
     def test_hex_color_processing(self, mock_processor_class, sample_image_file, tmp_path):
         """Test processing with hex color format."""
         mock_processor = Mock()
         mock_processor_class.return_value = mock_processor
         
-        mock_image = Image.new("RGBA", (100, 100), (255, 255, 255, 255))
-        mock_processor.load_image.return_value = mock_image
-        mock_processor.make_transparent.return_value = mock_image
+        mock_data = np.full((100, 100, 4), 255, dtype=np.uint8)
+        mock_processor.load_array.return_value = mock_data
+        mock_processor.make_transparent_array.return_value = mock_data
         
         output_file = tmp_path / "output.png"
         
@@ -160,8 +292,8 @@ class TestMainFunction:
         main(sample_image_file, output_file, "#FF0000", 15)
         
         # Verify hex color was parsed correctly
-        mock_processor.make_transparent.assert_called_once_with(
-            mock_image, (255, 0, 0), 15
+        mock_processor.make_transparent_array.assert_called_once_with(
+            mock_data, (255, 0, 0), 15
         )
 
     @patch("rmbg.cli.ImageProcessor")
@@ -170,9 +302,9 @@ class TestMainFunction:
         mock_processor = Mock()
         mock_processor_class.return_value = mock_processor
         
-        mock_image = Image.new("RGBA", (100, 100), (255, 255, 255, 255))
-        mock_processor.load_image.return_value = mock_image
-        mock_processor.make_transparent.return_value = mock_image
+        mock_data = np.full((100, 100, 4), 255, dtype=np.uint8)
+        mock_processor.load_array.return_value = mock_data
+        mock_processor.make_transparent_array.return_value = mock_data
         
         output_file = tmp_path / "output.png"
         
@@ -180,8 +312,8 @@ class TestMainFunction:
         main(sample_image_file, output_file, "255,255,255", 10, dpi=600)
         
         # Verify custom DPI was used
-        mock_processor.save_image.assert_called_once_with(
-            mock_image, output_file, (600, 600)
+        mock_processor.save_array.assert_called_once_with(
+            mock_data, output_file, (600, 600)
         )
 
     @patch("rmbg.cli.ImageProcessor")
@@ -198,7 +330,7 @@ class TestMainFunction:
         """Test handling of file not found error."""
         mock_processor = Mock()
         mock_processor_class.return_value = mock_processor
-        mock_processor.load_image.side_effect = FileNotFoundError("File not found")
+        mock_processor.load_array.side_effect = FileNotFoundError("File not found")
         
         input_file = tmp_path / "nonexistent.png"
         output_file = tmp_path / "output.png"
@@ -212,8 +344,8 @@ class TestMainFunction:
         """Test handling of image processing error."""
         mock_processor = Mock()
         mock_processor_class.return_value = mock_processor
-        mock_processor.load_image.return_value = Image.new("RGB", (100, 100))
-        mock_processor.make_transparent.side_effect = ValueError("Processing failed")
+        mock_processor.load_array.return_value = np.zeros((100, 100, 4), np.uint8)
+        mock_processor.make_transparent_array.side_effect = ValueError("Processing failed")
         
         output_file = tmp_path / "output.png"
         
@@ -227,10 +359,10 @@ class TestMainFunction:
         mock_processor = Mock()
         mock_processor_class.return_value = mock_processor
         
-        mock_image = Image.new("RGBA", (100, 100), (255, 255, 255, 255))
-        mock_processor.load_image.return_value = mock_image
-        mock_processor.make_transparent.return_value = mock_image
-        mock_processor.save_image.side_effect = ValueError("Save failed")
+        mock_data = np.full((100, 100, 4), 255, dtype=np.uint8)
+        mock_processor.load_array.return_value = mock_data
+        mock_processor.make_transparent_array.return_value = mock_data
+        mock_processor.save_array.side_effect = ValueError("Save failed")
         
         output_file = tmp_path / "output.png"
         
@@ -244,9 +376,9 @@ class TestMainFunction:
         mock_processor = Mock()
         mock_processor_class.return_value = mock_processor
         
-        mock_image = Image.new("RGBA", (100, 100), (255, 255, 255, 255))
-        mock_processor.load_image.return_value = mock_image
-        mock_processor.make_transparent.return_value = mock_image
+        mock_data = np.full((100, 100, 4), 255, dtype=np.uint8)
+        mock_processor.load_array.return_value = mock_data
+        mock_processor.make_transparent_array.return_value = mock_data
         
         output_file = tmp_path / "output.png"
         
@@ -254,11 +386,11 @@ class TestMainFunction:
         main(sample_image_file, output_file)
         
         # Verify default values were used
-        mock_processor.make_transparent.assert_called_once_with(
-            mock_image, (255, 255, 255), 10
+        mock_processor.make_transparent_array.assert_called_once_with(
+            mock_data, (255, 255, 255), 10
         )
-        mock_processor.save_image.assert_called_once_with(
-            mock_image, output_file, (300, 300)
+        mock_processor.save_array.assert_called_once_with(
+            mock_data, output_file, (300, 300)
         )
 
 
@@ -283,9 +415,9 @@ class TestCLICommandLine:
             mock_processor = Mock()
             mock_processor_class.return_value = mock_processor
             
-            mock_image = Image.new("RGBA", (100, 100), (255, 255, 255, 255))
-            mock_processor.load_image.return_value = mock_image
-            mock_processor.make_transparent.return_value = mock_image
+            mock_data = np.full((100, 100, 4), 255, dtype=np.uint8)
+            mock_processor.load_array.return_value = mock_data
+            mock_processor.make_transparent_array.return_value = mock_data
             
             result = cli_runner.invoke(
                 app, 
@@ -305,9 +437,9 @@ class TestCLICommandLine:
             mock_processor = Mock()
             mock_processor_class.return_value = mock_processor
             
-            mock_image = Image.new("RGBA", (100, 100), (255, 255, 255, 255))
-            mock_processor.load_image.return_value = mock_image
-            mock_processor.make_transparent.return_value = mock_image
+            mock_data = np.full((100, 100, 4), 255, dtype=np.uint8)
+            mock_processor.load_array.return_value = mock_data
+            mock_processor.make_transparent_array.return_value = mock_data
             
             result = cli_runner.invoke(
                 app, 
@@ -322,11 +454,11 @@ class TestCLICommandLine:
             )
             
             assert result.exit_code == 0
-            mock_processor.make_transparent.assert_called_once_with(
-                mock_image, (255, 0, 0), 20
+            mock_processor.make_transparent_array.assert_called_once_with(
+                mock_data, (255, 0, 0), 20
             )
-            mock_processor.save_image.assert_called_once_with(
-                mock_image, output_file, (600, 600)
+            mock_processor.save_array.assert_called_once_with(
+                mock_data, output_file, (600, 600)
             )
 
     def test_cli_invalid_color(self, cli_runner, sample_image_file, tmp_path):
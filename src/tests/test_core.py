@@ -1,7 +1,9 @@
 """Tests for the core image processing functionality."""
 
+import io
 import warnings
 
+import fitz
 import numpy as np
 import pytest
 from PIL import Image
@@ -33,6 +35,13 @@ def sample_image(tmp_path):
 	return Image.fromarray(img_array)
 
 
+@pytest.fixture
+def sample_pdf(make_pdf):
+	"""Create a three page PDF with a differently sized red box on each page."""
+	boxes = [[(10, 10, 10 + size, 10 + size)] for size in (20, 30, 40)]
+	return make_pdf(boxes, "sample.pdf", (100, 100), (1, 0, 0))
+
+
 def test_make_transparent_white(processor, sample_image, tmp_path):
 	"""Test making white color transparent."""
 	result = processor.make_transparent(sample_image, (255, 255, 255), 10)
@@ -70,6 +79,14 @@ def test_make_transparent_red(processor, sample_image, tmp_path):
 	assert np.all(result_array[white_mask, 3] == 255)
 
 
+def test_make_transparent_keeps_distant_colors(processor, sample_image):
+	"""Test that red is not matched as white through uint8 wrap-around."""
+	result = np.array(processor.make_transparent(sample_image, (255, 255, 255), 10))
+
+	assert result[0, 0, 3] == 0
+	assert result[50, 50, 3] == 255
+
+
 def test_save_image(processor, sample_image, tmp_path):
 	"""Test saving processed image."""
 	result = processor.make_transparent(sample_image, (255, 255, 255), 10)
@@ -88,5 +105,235 @@ def test_invalid_output_format(processor, sample_image, tmp_path):
 	result = processor.make_transparent(sample_image, (255, 255, 255), 10)
 
 	output_path = tmp_path / "output.jpg"
-	with pytest.raises(ValueError, match="Output must be in PNG format"):
+	with pytest.raises(ValueError, match=r"Unsupported output format '\.jpg'"):
 		processor.save_image(result, output_path)
+
+
+def test_load_pdf_page(processor, sample_pdf):
+	"""Test that the requested PDF page is rendered."""
+	first = np.array(processor.load_image(sample_pdf))
+	third = np.array(processor.load_image(sample_pdf, page=2))
+
+	assert first.shape[:2] == (100, 100)
+	assert tuple(first[25, 25, :3]) == (255, 0, 0)
+	assert tuple(first[45, 45, :3]) == (255, 255, 255)
+	assert tuple(third[45, 45, :3]) == (255, 0, 0)
+
+
+def test_load_pdf_page_out_of_range(processor, sample_pdf):
+	"""Test loading a page past the end of the document."""
+	with pytest.raises(ValueError, match="Page number 3 out of range"):
+		processor.load_image(sample_pdf, page=3)
+
+
+def test_load_pdf_page_dpi(processor, sample_pdf):
+	"""Test that the render DPI drives the pixmap resolution."""
+	image = processor.load_image(sample_pdf, dpi=144)
+
+	assert image.size == (200, 200)
+	assert image.info["dpi"] == (144, 144)
+	assert tuple(np.array(image)[50, 50]) == (255, 0, 0, 255)
+
+
+def test_load_pdf_page_clip(processor, sample_pdf):
+	"""Test rasterizing only a clip region of the page."""
+	image = processor.load_image(sample_pdf, dpi=288, clip=(0, 0, 25, 50))
+
+	assert image.size == (100, 200)
+	assert tuple(np.array(image)[80, 80]) == (255, 0, 0, 255)
+
+	with pytest.raises(ValueError, match="does not overlap"):
+		processor.load_image(sample_pdf, clip=(200, 200, 300, 300))
+
+
+def test_iter_pdf_pages(processor, sample_pdf):
+	"""Test rendering several pages from one open document."""
+	assert processor.page_count(sample_pdf) == 3
+
+	pages = dict(processor.iter_pdf_pages(sample_pdf))
+	assert sorted(pages) == [0, 1, 2]
+
+	selected = list(processor.iter_pdf_pages(sample_pdf, [2, 0], dpi=36))
+	assert [n for n, _ in selected] == [2, 0]
+	assert selected[0][1].size == (50, 50)
+
+
+def test_save_pages(processor, sample_image, tmp_path):
+	"""Test writing a multi-page TIFF."""
+	result = processor.make_transparent(sample_image, (255, 255, 255), 10)
+	output_path = tmp_path / "pages.tiff"
+
+	assert processor.save_pages([result, result], output_path) == 2
+
+	saved = Image.open(output_path)
+	assert saved.n_frames == 2
+	assert saved.mode == "RGBA"
+
+	with pytest.raises(ValueError, match="must be in TIFF or PDF format"):
+		processor.save_pages([result], tmp_path / "pages.png")
+
+
+def test_load_array_pdf_is_pixmap_view(processor, sample_pdf):
+	"""Test that a PDF page is returned as a writable view of the pixmap."""
+	data = processor.load_array(sample_pdf, page=1, dpi=144)
+
+	assert data.shape == (200, 200, 4)
+	assert data.dtype == np.uint8
+	assert data.flags.writeable
+	assert data.base is not None
+	assert tuple(data[0, 0]) == (255, 255, 255, 255)
+	assert tuple(data[50, 50]) == (255, 0, 0, 255)
+
+
+def test_load_array_pdf_composites_over_white(processor, tmp_path):
+	"""Test that translucent PDF content matches an opaque white-page render."""
+	pdf_path = tmp_path / "translucent.pdf"
+	doc = fitz.open()
+	page = doc.new_page(width=50, height=50)
+	page.draw_rect(fitz.Rect(5, 5, 45, 45), fill=(0, 0, 1), fill_opacity=0.5)
+	page.insert_text((10, 30), "Aa", fontsize=20)
+	doc.save(pdf_path)
+	expected = np.frombuffer(page.get_pixmap().samples, dtype=np.uint8)
+	doc.close()
+
+	data = processor.load_array(pdf_path)
+
+	diff = np.abs(data[:, :, :3].reshape(-1).astype(int) - expected.astype(int))
+	assert diff.max() <= 2
+	assert np.all(data[:, :, 3] == 255)
+
+
+def test_load_array_image(processor, sample_image, tmp_path):
+	"""Test loading RGB and grayscale images as RGBA arrays."""
+	sample_image.save(tmp_path / "rgb.png")
+	sample_image.convert("L").save(tmp_path / "gray.png")
+
+	rgb = processor.load_array(tmp_path / "rgb.png")
+	gray = processor.load_array(tmp_path / "gray.png")
+
+	assert rgb.shape == gray.shape == (100, 100, 4)
+	assert tuple(rgb[50, 50]) == (255, 0, 0, 255)
+	assert np.all(gray[:, :, 3] == 255)
+
+
+def test_make_transparent_array_in_place(processor, sample_pdf, tmp_path):
+	"""Test the array pipeline from PDF page to saved PNG."""
+	data = processor.load_array(sample_pdf)
+	result = processor.make_transparent_array(data, (255, 255, 255), 10)
+
+	assert result is data
+	assert data[0, 0, 3] == 0
+	assert data[25, 25, 3] == 255
+
+	output_path = tmp_path / "page.png"
+	processor.save_array(data, output_path, (72, 72))
+	saved = np.array(Image.open(output_path))
+	assert np.array_equal(saved, data)
+
+
+def test_make_transparent_leaves_input_untouched(processor, sample_image):
+	"""Test that the PIL API does not modify its input image."""
+	rgba = sample_image.convert("RGBA")
+	processor.make_transparent(rgba, (255, 255, 255), 10)
+
+	assert np.all(np.array(rgba)[:, :, 3] == 255)
+
+
+def test_load_array_memmap_above_threshold(
+	processor, sample_pdf, sample_image, tmp_path
+):
+	"""Test that large arrays are memory-mapped with the same pixels."""
+	sample_image.save(tmp_path / "rgb.png")
+	mapped = ImageProcessor(memmap_threshold=100 * 100 * 4, scratch_dir=tmp_path)
+
+	page = mapped.load_array(sample_pdf, page=1, dpi=144)
+	image = mapped.load_array(tmp_path / "rgb.png")
+
+	assert isinstance(page, np.memmap)
+	assert isinstance(image, np.memmap)
+	expected = processor.load_array(sample_pdf, page=1, dpi=144)
+	assert np.abs(page.astype(int) - expected).max() <= 1
+	assert np.array_equal(image, processor.load_array(tmp_path / "rgb.png"))
+
+
+def test_load_array_memmap_below_threshold(sample_image, tmp_path):
+	"""Test that arrays below the threshold stay on the heap."""
+	sample_image.save(tmp_path / "rgb.png")
+	mapped = ImageProcessor(memmap_threshold=100 * 100 * 4 + 1)
+
+	assert not isinstance(mapped.load_array(tmp_path / "rgb.png"), np.memmap)
+
+
+def test_memmap_pdf_image_and_make_transparent(processor, sample_pdf, sample_image):
+	"""Test the PIL API with memory-mapped working arrays."""
+	mapped = ImageProcessor(memmap_threshold=1)
+
+	page = mapped.load_image(sample_pdf, dpi=144)
+	assert page.info["dpi"] == (144, 144)
+	assert page.getpixel((50, 50)) == (255, 0, 0, 255)
+
+	result = mapped.make_transparent(sample_image, (255, 255, 255), 10)
+	expected = processor.make_transparent(sample_image, (255, 255, 255), 10)
+	assert np.array_equal(np.array(result), np.array(expected))
+
+
+def test_memmap_invalid_pdf_page(sample_pdf):
+	"""Test that PDF errors are reported the same way with memory-mapping."""
+	with pytest.raises(ValueError, match="Failed to load PDF page"):
+		ImageProcessor(memmap_threshold=1).load_array(sample_pdf, page=5)
+
+
+def test_make_transparent_several_colors(processor, sample_image):
+	"""Test making white and red transparent together."""
+	result = processor.make_transparent(
+		sample_image, [(255, 255, 255), (250, 0, 0)], [10, 5]
+	)
+	assert np.all(np.array(result)[:, :, 3] == 0)
+
+
+@pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview, io.BytesIO])
+def test_load_image_from_memory(processor, sample_image, wrap):
+	"""Test loading an encoded image from bytes-like objects and streams."""
+	buffer = io.BytesIO()
+	sample_image.save(buffer, "PNG")
+
+	image = processor.load_image(wrap(buffer.getvalue()))
+	assert np.array_equal(np.array(image.convert("RGB")), np.array(sample_image))
+	data = processor.load_array(wrap(buffer.getvalue()))
+	assert data[50, 50].tolist() == [255, 0, 0, 255]
+
+	with pytest.raises(ValueError, match="Failed to load image"):
+		processor.load_image(wrap(b"not an image"))
+
+
+def test_load_pdf_from_memory(processor, sample_pdf):
+	"""Test opening PDFs from a memory buffer, recognized by their header."""
+	pdf_bytes = sample_pdf.read_bytes()
+	expected = processor.load_array(sample_pdf, page=2, dpi=144)
+
+	assert processor.page_count(pdf_bytes) == 3
+	assert np.array_equal(processor.load_array(pdf_bytes, page=2, dpi=144), expected)
+	image = processor.load_image(io.BytesIO(pdf_bytes), page=2, dpi=144)
+	assert np.array_equal(np.array(image), expected)
+	pages = processor.iter_pdf_pages(memoryview(pdf_bytes), [1], dpi=144)
+	assert [number for number, _ in pages] == [1]
+
+	mapped = ImageProcessor(memmap_threshold=1).load_array(pdf_bytes, page=2, dpi=144)
+	assert isinstance(mapped, np.memmap)
+	assert np.abs(mapped.astype(int) - expected).max() <= 1
+	with pytest.raises(ValueError, match="Failed to load PDF page"):
+		processor.load_array(pdf_bytes, page=5)
+
+
+def test_save_to_stream(processor, sample_image):
+	"""Test encoding the PNG into a binary stream."""
+	buffer = io.BytesIO()
+	processor.save_image(sample_image, buffer, (150, 150))
+
+	saved = Image.open(io.BytesIO(buffer.getvalue()))
+	assert saved.format == "PNG"
+	assert saved.info["dpi"] == pytest.approx((150, 150), abs=0.1)
+
+	buffer = io.BytesIO()
+	processor.save_array(np.zeros((2, 3, 4), np.uint8), buffer)
+	assert Image.open(io.BytesIO(buffer.getvalue())).size == (3, 2)
@@ -0,0 +1,130 @@
+"""Tests for automatic background color detection."""
+
+import numpy as np
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+
+from rmbg.__main__ import app
+from rmbg.batch import BatchTask, run_batch
+from rmbg.core import ImageProcessor
+from rmbg.detect import AUTO, BackgroundEstimate, detect_background
+from rmbg.metrics import metric_distance
+
+PAPER = (242, 238, 228)
+
+
+@pytest.fixture
+def scan():
+	"""Create a noisy off-white scan with a dark blue block in the middle."""
+	rng = np.random.default_rng(1)
+	noise = rng.normal(0, 2.5, (300, 400, 1)).round().astype(np.int16)
+	data = np.clip(np.array(PAPER, dtype=np.int16) + noise, 0, 255).astype(np.uint8)
+	data[100:200, 100:300] = [30, 30, 90]
+	return data
+
+
+@pytest.fixture
+def scan_file(scan, tmp_path):
+	"""Save the scan as a PNG file."""
+	path = tmp_path / "scan.png"
+	Image.fromarray(scan).save(path)
+	return path
+
+
+def test_off_white_scan(scan):
+	"""Test that the paper color is found with a tolerance covering its noise."""
+	estimate = detect_background(scan)
+	assert len(estimate.colors) == 1
+	assert np.abs(np.subtract(estimate.colors[0], PAPER)).max() <= 1
+	assert estimate.target_color == estimate.colors[0]
+	assert estimate.tolerance == estimate.tolerances[0]
+
+	matched = metric_distance(scan, estimate.colors[0]) <= estimate.tolerance
+	assert matched[:100].mean() > 0.99
+	assert not matched[100:200, 100:300].any()
+	assert estimate.coverage[0] == pytest.approx(matched.mean(), abs=0.02)
+	assert estimate.to_dict()["colors"] == [list(estimate.colors[0])]
+
+	lab = detect_background(scan, "cie76")
+	assert lab.colors == estimate.colors
+	assert lab.tolerances[0] < estimate.tolerances[0]
+
+
+def test_several_and_no_backgrounds():
+	"""Test two background colors, and images without any."""
+	data = np.full((100, 100, 3), 255, dtype=np.uint8)
+	data[:, 50:] = [0, 0, 200]
+	data[40:60, 20:80] = [10, 200, 10]
+	estimate = detect_background(data)
+	assert sorted(estimate.colors) == [(0, 0, 200), (255, 255, 255)]
+	assert estimate.target_color == list(estimate.colors)
+	assert estimate.tolerance == list(estimate.tolerances)
+	assert detect_background(data, max_colors=1).colors == estimate.colors[:1]
+
+	noise = np.random.default_rng(0).integers(0, 256, (200, 200, 3), dtype=np.uint8)
+	assert detect_background(noise) == BackgroundEstimate()
+
+	transparent = np.zeros((50, 50, 4), dtype=np.uint8)
+	assert detect_background(transparent) == BackgroundEstimate()
+	# Transparent edge pixels do not count against the opaque background
+	transparent[:, 35:] = [255, 255, 255, 255]
+	estimate = detect_background(transparent, min_share=0.5)
+	assert estimate.colors == ((255, 255, 255),)
+
+
+def test_reads_only_samples():
+	"""Test a 1.2 GB image that exists only as a broadcast view of one pixel."""
+	huge = np.broadcast_to(np.array(PAPER, dtype=np.uint8), (20_000, 20_000, 3))
+	estimate = detect_background(huge)
+	assert estimate.colors == (PAPER,)
+	assert estimate.coverage == (1.0,)
+
+
+def test_processor_auto(scan, scan_file, tmp_path):
+	"""Test masking the detected background through the processor."""
+	processor = ImageProcessor()
+	processor.process_file(scan_file, tmp_path / "out.png", AUTO)
+	with Image.open(tmp_path / "out.png") as result:
+		alpha = np.asarray(result)[:, :, 3]
+	assert (alpha[:100] == 0).mean() > 0.99
+	assert (alpha[100:200, 100:300] == 255).all()
+
+	noise = np.random.default_rng(0).integers(0, 256, (50, 50, 4), dtype=np.uint8)
+	noise[:, :, 3] = 255
+	assert (processor.make_transparent_array(noise, AUTO)[:, :, 3] == 255).all()
+
+	with pytest.raises(ValueError, match="cannot be used with streaming"):
+		processor.make_transparent_streaming(scan_file, tmp_path / "s.png", AUTO)
+
+
+def test_batch_auto(scan_file, tmp_path):
+	"""Test that batch workers detect the background of every input."""
+	tasks = [BatchTask(scan_file, tmp_path / "out" / "scan.png", AUTO)]
+	summary = run_batch(tasks, workers=1)
+	assert summary.succeeded == 1
+	with Image.open(tmp_path / "out" / "scan.png") as result:
+		assert result.getpixel((0, 0))[3] == 0
+
+
+def test_cli_auto_and_detect(scan_file, tmp_path):
+	"""Test --auto and the detect command on the command line."""
+	runner = CliRunner()
+	output = tmp_path / "out.png"
+	result = runner.invoke(app, ["main", str(scan_file), str(output), "--auto"])
+	assert result.exit_code == 0, result.stdout
+	with Image.open(output) as image:
+		assert image.getpixel((0, 0))[3] == 0
+
+	result = runner.invoke(app, ["detect", str(scan_file)])
+	assert result.exit_code == 0, result.stdout
+	assert "Suggested options: --color 242,238,228:" in result.stdout
+
+	noise = np.random.default_rng(0).integers(0, 256, (50, 50, 3), dtype=np.uint8)
+	Image.fromarray(noise).save(tmp_path / "noise.png")
+	result = runner.invoke(app, ["detect", str(tmp_path / "noise.png")])
+	assert result.exit_code == 0, result.stdout
+	assert "No background color found" in result.stdout
+
+	result = runner.invoke(app, ["detect", str(scan_file), "--metric", "nope"])
+	assert result.exit_code == 1
@@ -0,0 +1,186 @@
+"""Tests for the PNG save profiles and cropping."""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+
+from rmbg.__main__ import app
+from rmbg.core import ImageProcessor
+from rmbg.encoding import (
+	PNG_PROFILES,
+	PngProfile,
+	crop_to_content,
+	get_png_profile,
+	save_png,
+)
+
+
+@pytest.fixture
+def masked():
+	"""Create an RGBA image with noisy transparent margins around a noisy block."""
+	rng = np.random.default_rng(0)
+	data = rng.integers(0, 256, (40, 50, 4), dtype=np.uint8)
+	data[:, :, 3] = 0
+	data[10:30, 5:25, 3] = 255
+	data[12, 6, 3] = 128
+	return data
+
+
+@pytest.fixture
+def logo():
+	"""Create an RGBA image with three colors, one of them semi-transparent."""
+	data = np.zeros((30, 30, 4), dtype=np.uint8)
+	data[5:25, 5:25] = [200, 0, 0, 255]
+	data[10:20, 10:20] = [0, 0, 200, 100]
+	return data
+
+
+def encode(data, profile):
+	"""Encode ``data`` with a profile and decode it back to an RGBA array."""
+	buffer = io.BytesIO()
+	save_png(Image.fromarray(data), buffer, profile=profile)
+	buffer.seek(0)
+	return np.asarray(Image.open(buffer).convert("RGBA")), buffer
+
+
+def visible(data):
+	"""Return the pixels that are not fully transparent."""
+	return data[data[:, :, 3] > 0]
+
+
+@pytest.mark.parametrize("profile", PNG_PROFILES)
+def test_profiles_keep_visible_pixels(masked, profile):
+	"""Test that every profile stores the visible pixels exactly."""
+	decoded, _ = encode(masked, profile)
+	assert np.array_equal(decoded[:, :, 3], masked[:, :, 3])
+	assert np.array_equal(visible(decoded), visible(masked))
+
+
+def test_transparent_pixels(masked):
+	"""Test that only profiles clearing transparent pixels change them."""
+	hidden = masked[:, :, 3] == 0
+	balanced, _ = encode(masked, "balanced")
+	assert np.array_equal(balanced, masked)
+	fast, _ = encode(masked, "fast")
+	assert np.array_equal(fast, masked)
+	smallest, _ = encode(masked, "smallest")
+	assert not smallest[hidden].any()
+
+
+def test_smaller_files(masked):
+	"""Test that clearing transparent pixels makes the PNG smaller."""
+	sizes = {
+		profile: len(encode(masked, profile)[1].getvalue()) for profile in PNG_PROFILES
+	}
+	assert sizes["smallest"] < sizes["balanced"] < sizes["fast"]
+
+
+def test_palette(logo):
+	"""Test the exact palette PNG written for images with few colors."""
+	decoded, buffer = encode(logo, "smallest")
+	assert Image.open(buffer).mode == "P"
+	assert np.array_equal(visible(decoded), visible(logo))
+	assert np.array_equal(decoded[:, :, 3], logo[:, :, 3])
+
+
+def test_palette_skipped_with_many_colors(masked):
+	"""Test that images with more than 256 colors stay RGBA."""
+	_, buffer = encode(masked, "smallest")
+	assert Image.open(buffer).mode == "RGBA"
+
+
+def test_rgb_image():
+	"""Test that images without alpha are saved unchanged."""
+	data = np.full((8, 8, 3), 7, dtype=np.uint8)
+	for profile in PNG_PROFILES:
+		buffer = io.BytesIO()
+		save_png(Image.fromarray(data), buffer, profile=profile)
+		buffer.seek(0)
+		assert np.array_equal(np.asarray(Image.open(buffer)), data)
+
+
+def test_get_png_profile():
+	"""Test profile lookup by name and instance."""
+	custom = PngProfile("custom", compress_level=3)
+	assert get_png_profile(custom) is custom
+	assert get_png_profile("fast").compress_level == 1
+	with pytest.raises(ValueError, match="Unknown PNG profile 'tiny'"):
+		get_png_profile("tiny")
+	with pytest.raises(ValueError, match="Unknown save profile"):
+		ImageProcessor(save_profile="tiny")
+
+
+def test_crop_to_content(masked):
+	"""Test cropping to the pixels that are not fully transparent."""
+	cropped, box = crop_to_content(Image.fromarray(masked))
+	assert box == (5, 10, 25, 30)
+	assert np.array_equal(np.asarray(cropped), masked[10:30, 5:25])
+
+
+@pytest.mark.parametrize(
+	"image",
+	[
+		Image.new("RGB", (6, 4)),
+		Image.new("RGBA", (6, 4)),
+		Image.new("RGBA", (6, 4), (1, 2, 3, 255)),
+	],
+	ids=["rgb", "transparent", "opaque"],
+)
+def test_crop_to_content_whole(image):
+	"""Test that images without transparent margins are returned whole."""
+	cropped, box = crop_to_content(image)
+	assert cropped is image
+	assert box == (0, 0, 6, 4)
+
+
+def test_processor_save(masked, tmp_path):
+	"""Test that the processor saves with its profile and crop setting."""
+	processor = ImageProcessor(save_profile="smallest", crop=True)
+	box = processor.save_array(masked, tmp_path / "out.png", (150, 150))
+	assert box == (5, 10, 25, 30)
+	with Image.open(tmp_path / "out.png") as result:
+		assert result.size == (20, 20)
+		assert result.info["dpi"] == pytest.approx((150, 150), abs=0.1)
+
+	assert ImageProcessor().save_array(masked, tmp_path / "whole.png") is None
+	with Image.open(tmp_path / "whole.png") as result:
+		assert result.size == (50, 40)
+
+
+def test_cli_options(tmp_path):
+	"""Test --save-profile and --crop on the command line."""
+	data = np.full((40, 50, 3), 255, dtype=np.uint8)
+	data[10:30, 5:25] = [200, 0, 0]
+	Image.fromarray(data).save(tmp_path / "in.png")
+
+	result = CliRunner().invoke(
+		app,
+		[
+			"main",
+			str(tmp_path / "in.png"),
+			str(tmp_path / "out.png"),
+			"--save-profile",
+			"smallest",
+			"--crop",
+		],
+	)
+	assert result.exit_code == 0, result.stdout
+	with Image.open(tmp_path / "out.png") as output:
+		assert output.size == (20, 20)
+		assert output.mode == "P"
+
+	result = CliRunner().invoke(
+		app,
+		[
+			"main",
+			str(tmp_path / "in.png"),
+			str(tmp_path / "out.png"),
+			"--save-profile",
+			"tiny",
+		],
+	)
+	assert result.exit_code == 1
+	assert "Unknown save profile" in result.stdout
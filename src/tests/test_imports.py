@@ -0,0 +1,84 @@
+"""Tests for the import cost of the package and the CLI entry point."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import rmbg
+from rmbg import cli
+from rmbg.cli import main
+from rmbg.core import ImageProcessor
+
+# Cumulative milliseconds allowed for ``import rmbg.__main__``. It measures
+# 150-250 ms with NumPy, Pillow and Typer; loading Streamlit, PyMuPDF and rich
+# eagerly, as before, took 600 ms and more.
+IMPORT_BUDGET_MS = 450
+
+# Modules the CLI must not load until a command actually needs them
+HEAVY_MODULES = ("streamlit", "streamlit_image_coordinates", "fitz", "pymupdf", "rich")
+
+
+def import_times(module: str) -> dict[str, int]:
+	"""
+	Return the cumulative import time in microseconds of every loaded module.
+
+	Args:
+	    module: Module to import in a fresh interpreter.
+
+	Returns:
+	    Mapping of module name to the cumulative time ``-X importtime`` reports.
+
+	"""
+	env = dict(os.environ)
+	env["PYTHONPATH"] = os.pathsep.join(
+		filter(None, [str(Path(rmbg.__file__).parents[1]), env.get("PYTHONPATH")])
+	)
+	result = subprocess.run(  # noqa: S603 - our interpreter, fixed arguments
+		[sys.executable, "-X", "importtime", "-c", f"import {module}"],
+		capture_output=True,
+		text=True,
+		env=env,
+		check=True,
+	)
+	times = {}
+	for line in result.stderr.splitlines():
+		if not line.startswith("import time:") or "cumulative" in line:
+			continue
+		_, cumulative, name = line.removeprefix("import time:").split("|")
+		times[name.strip()] = int(cumulative)
+	return times
+
+
+@pytest.mark.parametrize("module", ["rmbg", "rmbg.__main__"])
+def test_heavy_modules_not_imported(module):
+	"""Test that importing the package or the CLI skips the GUI, PDF and console stack."""
+	loaded = import_times(module)
+
+	assert module in loaded
+	assert not [name for name in loaded if name.split(".")[0] in HEAVY_MODULES]
+
+
+def test_cli_import_budget():
+	"""Test that the CLI entry point imports within the startup budget."""
+	# The best of a few runs, to keep a busy machine from failing the test
+	best = min(import_times("rmbg.__main__")["rmbg.__main__"] for _ in range(3))
+
+	assert best / 1000 <= IMPORT_BUDGET_MS
+
+
+def test_lazy_attributes():
+	"""Test that the public names resolve on first access."""
+	assert rmbg.ImageProcessor is ImageProcessor
+	assert rmbg.cli_main is main
+	assert {"ImageProcessor", "cli_main", "gui_main"} <= set(dir(rmbg))
+	with pytest.raises(AttributeError, match="no attribute 'missing'"):
+		rmbg.missing  # noqa: B018
+
+
+def test_shared_console():
+	"""Test that the CLI's console is created once and shared."""
+	assert cli.get_console() is cli.get_console()
+	assert cli.console is cli.get_console()
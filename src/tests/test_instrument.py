@@ -0,0 +1,277 @@
+"""Tests for the per-stage instrumentation."""
+
+import io
+import json
+import threading
+import tracemalloc
+
+import numpy as np
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+
+from rmbg.__main__ import app
+from rmbg.batch import BatchTask, run_batch, run_pdf
+from rmbg.cache import ResultCache
+from rmbg.core import ImageProcessor
+from rmbg.instrument import (
+	StageLog,
+	StageMetrics,
+	StageRecord,
+	format_metrics,
+	span,
+	write_metrics,
+)
+from rmbg.streaming import FullDecodeWarning
+
+WHITE = (255, 255, 255)
+
+
+@pytest.fixture
+def letterhead(tmp_path):
+	"""Create a letterhead PNG: a red bar on white."""
+	data = np.full((30, 40, 3), 255, dtype=np.uint8)
+	data[2:8] = [200, 0, 0]
+	path = tmp_path / "letterhead.png"
+	Image.fromarray(data).save(path)
+	return path
+
+
+def stages(log):
+	"""Return the stage names of a log's records, in order."""
+	return [record.stage for record in log.records]
+
+
+def test_span():
+	"""Test recording, disabled spans and stages that raise."""
+	log = StageLog()
+	with span(log, "mask") as stage:
+		assert stage.enabled
+		stage.add(pixels=10, bytes_in=3)
+		stage.add(pixels=5, bytes_out=7)
+	(record,) = log.records
+	assert (record.stage, record.pixels, record.bytes_in, record.bytes_out) == (
+		"mask",
+		15,
+		3,
+		7,
+	)
+	assert record.wall_seconds >= 0
+	assert record.cpu_seconds >= 0
+	assert record.allocated is None
+
+	with span(None, "mask") as stage:
+		assert not stage.enabled
+		stage.add(pixels=10)
+	assert span(None, "decode") is span(None, "encode")
+
+	with pytest.raises(RuntimeError), span(log, "encode"):
+		raise RuntimeError("boom")
+	assert stages(log) == ["mask"]
+
+
+def test_trace_allocations():
+	"""Test that traced stages report the memory they allocated."""
+	log = StageLog(trace_allocations=True)
+	with span(log, "mask"):
+		data = np.ones(2**20, dtype=np.uint8)
+	del data
+	assert log.records[0].allocated >= 2**20
+
+
+def test_nested_trace():
+	"""Test that an inner span leaves the outer one's peak, and tracing stops."""
+	log = StageLog(trace_allocations=True)
+	with span(log, "stream"):
+		data = np.ones(2**21, dtype=np.uint8)
+		del data
+		with span(log, "mask"):
+			data = np.ones(2**20, dtype=np.uint8)
+		del data
+	assert stages(log) == ["mask", "stream"]
+	mask, stream = log.records
+	assert 2**20 <= mask.allocated < 2**21
+	assert stream.allocated >= 2**21
+	assert not tracemalloc.is_tracing()
+
+	with pytest.raises(RuntimeError), span(log, "encode"):
+		raise RuntimeError("boom")
+	assert not tracemalloc.is_tracing()
+
+	tracemalloc.start()
+	try:
+		with span(log, "encode"):
+			pass
+		assert tracemalloc.is_tracing()
+	finally:
+		tracemalloc.stop()
+
+
+def test_threaded_trace():
+	"""Test traced spans running on several threads at once."""
+	metrics = StageMetrics(trace_allocations=True)
+	barrier = threading.Barrier(4)
+
+	def work() -> None:
+		barrier.wait()
+		for _ in range(20):
+			with span(metrics, "stream"), span(metrics, "mask"):
+				data = np.ones(2**16, dtype=np.uint8)
+				del data
+
+	threads = [threading.Thread(target=work) for _ in range(4)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert not tracemalloc.is_tracing()
+	assert metrics.stages["mask"].count == 80
+	assert metrics.stages["stream"].count == 80
+	assert metrics.stages["mask"].peak_allocated >= 2**16
+	assert metrics.stages["stream"].peak_allocated >= 2**16
+
+
+def test_metrics_totals_and_export(tmp_path):
+	"""Test the per-stage totals and their dictionary and text exports."""
+	metrics = StageMetrics()
+	metrics.record(StageRecord("mask", 0.5, 0.4, pixels=1_000_000))
+	metrics.record(StageRecord("mask", 1.5, 1.2, pixels=3_000_000))
+	metrics.record(StageRecord("encode", 1.0, 0.9, 1_000_000, 0, 2048, 4096))
+	mask = metrics.stages["mask"]
+	assert (mask.count, mask.wall_seconds, mask.pixels) == (2, 2.0, 4_000_000)
+	assert mask.throughput == pytest.approx(2.0)
+	assert mask.peak_allocated is None
+	assert metrics.stages["encode"].peak_allocated == 4096
+	result = metrics.to_dict()["stages"]
+	assert result["mask"]["megapixels_per_second"] == 2.0
+	assert result["encode"]["bytes_out"] == 2048
+
+	text = format_metrics(metrics, labels={"job": 'scan "a"'})
+	job = 'job="scan \\"a\\""'
+	assert "# TYPE rmbg_stage_seconds_total counter" in text
+	assert f'rmbg_stage_seconds_total{{stage="mask",{job}}} 2.0' in text
+	assert "# TYPE rmbg_stage_peak_allocated_bytes gauge" in text
+	assert f'rmbg_stage_peak_allocated_bytes{{stage="encode",{job}}} 4096' in text
+	assert 'peak_allocated_bytes{stage="mask"' not in text
+	assert "# EOF" not in text
+
+	text = format_metrics(metrics, openmetrics=True, prefix="scan")
+	assert "# TYPE scan_stage_runs counter" in text
+	assert 'scan_stage_runs_total{stage="mask"} 2' in text
+	assert text.endswith("# EOF\n")
+
+	path = tmp_path / "textfile" / "rmbg.prom"
+	write_metrics(metrics, path)
+	assert path.read_text() == format_metrics(metrics)
+	assert [p.name for p in path.parent.iterdir()] == ["rmbg.prom"]
+
+
+def test_processor_stages(letterhead, sample_pdf, tmp_path):
+	"""Test the stages the processor records for images, PDFs and streams."""
+	log = StageLog()
+	processor = ImageProcessor(instrument=log)
+	image = processor.load_image(letterhead)
+	result = processor.make_transparent(image, WHITE)
+	processor.save_image(result, tmp_path / "out.png")
+	assert stages(log) == ["decode", "convert", "mask", "encode"]
+	decode, _, mask, encode = log.records
+	assert decode.pixels == mask.pixels == encode.pixels == 1200
+	assert decode.bytes_in == letterhead.stat().st_size
+	assert encode.bytes_out == (tmp_path / "out.png").stat().st_size
+
+	log.records = []
+	buffer = io.BytesIO(b"header")
+	buffer.seek(6)
+	data = processor.load_array(sample_pdf, page=1, dpi=72)
+	processor.make_transparent_array(data, WHITE)
+	processor.save_array(data, buffer)
+	assert stages(log) == ["render", "mask", "encode"]
+	assert log.records[0].pixels == 60 * 40
+	assert log.records[2].bytes_out == len(buffer.getvalue()) - 6
+
+	log.records = []
+	processor.save_pages(
+		(image for _, image in processor.iter_pdf_pages(sample_pdf, dpi=72)),
+		tmp_path / "out.tif",
+	)
+	assert stages(log) == ["render", "encode", "render", "encode"]
+
+	log.records = []
+	with pytest.warns(FullDecodeWarning):
+		processor.make_transparent_streaming(letterhead, tmp_path / "stream.png", WHITE)
+	(record,) = log.records
+	assert (record.stage, record.pixels) == ("stream", 1200)
+	assert record.bytes_out == (tmp_path / "stream.png").stat().st_size
+
+
+def test_cache_stages(letterhead, tmp_path):
+	"""Test the cache lookup and store stages of ``process_file``."""
+	log = StageLog()
+	cache = ResultCache(tmp_path / "cache")
+	processor = ImageProcessor(cache=cache, instrument=log)
+	assert not processor.process_file(letterhead, tmp_path / "a.png", WHITE)
+	assert stages(log) == ["cache_lookup", "decode", "mask", "encode", "cache_store"]
+	assert log.records[0].bytes_out == 0
+
+	log.records = []
+	assert processor.process_file(letterhead, tmp_path / "b.png", WHITE)
+	(lookup,) = log.records
+	assert lookup.bytes_in == letterhead.stat().st_size
+	assert lookup.bytes_out == (tmp_path / "b.png").stat().st_size
+	cache.close()
+
+
+def test_batch_stages(letterhead, sample_pdf, tmp_path):
+	"""Test that worker stages reach the results and the collector."""
+	metrics = StageMetrics()
+	tasks = [
+		BatchTask(letterhead, tmp_path / "out" / "a.png", WHITE),
+		BatchTask(tmp_path / "missing.png", tmp_path / "out" / "b.png", WHITE),
+	]
+	summary = run_batch(tasks, workers=1, instrument=metrics)
+	assert [record.stage for record in summary.results[0].stages] == [
+		"decode",
+		"mask",
+		"encode",
+	]
+	assert summary.results[1].stages == []
+	assert {name: t.count for name, t in metrics.stages.items()} == {
+		"decode": 1,
+		"mask": 1,
+		"encode": 1,
+	}
+	assert run_batch(tasks[:1], workers=1).results[0].stages is None
+
+	metrics = StageMetrics()
+	summary = run_pdf(
+		sample_pdf, tmp_path / "pages.tif", [0, 1], WHITE, dpi=72, instrument=metrics
+	)
+	assert {name: t.count for name, t in metrics.stages.items()} == {
+		"render": 2,
+		"mask": 2,
+		"encode": 2,
+	}
+	assert metrics.stages["render"].pixels == 2 * 60 * 40
+
+
+def test_cli_metrics(letterhead, tmp_path):
+	"""Test the --profile, --metrics-json and --metrics-prom options."""
+	runner = CliRunner()
+	args = ["main", str(letterhead), str(tmp_path / "out.png"), "--profile"]
+	args += ["--metrics-json", str(tmp_path / "metrics.json")]
+	args += ["--metrics-prom", str(tmp_path / "rmbg.prom"), "--trace-allocations"]
+	result = runner.invoke(app, args)
+	assert result.exit_code == 0, result.stdout
+	assert "Stages" in result.stdout
+	assert "Peak alloc" in result.stdout
+	metrics = json.loads((tmp_path / "metrics.json").read_text())
+	assert list(metrics["stages"]) == ["decode", "mask", "encode"]
+	assert metrics["stages"]["decode"]["pixels"] == 1200
+	prom = (tmp_path / "rmbg.prom").read_text()
+	assert 'rmbg_stage_runs_total{stage="mask"} 1' in prom
+
+	args = ["batch", str(letterhead.parent), str(tmp_path / "batch"), "-w", "1"]
+	result = runner.invoke(app, [*args, "--profile"])
+	assert result.exit_code == 0, result.stdout
+	assert "decode" in result.stdout
+	assert "Peak alloc" not in result.stdout
@@ -0,0 +1,167 @@
+"""Tests for incremental batch re-runs."""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+
+from rmbg import manifest as manifest_module
+from rmbg.__main__ import app
+from rmbg.batch import BatchSummary, BatchTask, output_path_for, run_batch
+from rmbg.cache import source_digest
+from rmbg.manifest import MANIFEST_FILENAME, Manifest
+
+
+@pytest.fixture
+def tree(tmp_path):
+	"""Create a small input tree and its output directory."""
+	inputs = tmp_path / "inputs"
+	(inputs / "nested").mkdir(parents=True)
+	for index, name in enumerate(("a.png", "b.png", "nested/c.png")):
+		data = np.full((20, 20, 3), 255, dtype=np.uint8)
+		data[5:15, 5:15] = [index * 50, 100, 100]
+		Image.fromarray(data).save(inputs / name)
+	return inputs, tmp_path / "outputs"
+
+
+def make_tasks(inputs, outputs, tolerance=10):
+	"""Return one task per input of the tree."""
+	return [
+		BatchTask(
+			path, output_path_for(path, outputs, inputs), (255, 255, 255), tolerance
+		)
+		for path in sorted(inputs.rglob("*.png"))
+	]
+
+
+def run(inputs, outputs, tolerance=10, **kwargs: object) -> BatchSummary:
+	"""Run the tree incrementally with a freshly loaded manifest."""
+	manifest = Manifest(outputs / MANIFEST_FILENAME)
+	tasks = make_tasks(inputs, outputs, tolerance)
+	return run_batch(tasks, workers=1, manifest=manifest, **kwargs)
+
+
+def statuses(summary):
+	"""Return the status of each result, by input file name."""
+	return {Path(r.input_file).name: r.status for r in summary.results}
+
+
+def test_unchanged_tree_is_skipped(tree):
+	"""Test that a second run over an unchanged tree processes nothing."""
+	inputs, outputs = tree
+	first = run(inputs, outputs)
+	assert first.succeeded == 3
+	assert first.skipped == 0
+
+	second = run(inputs, outputs)
+	assert set(statuses(second).values()) == {"skipped"}
+	assert second.succeeded == 3
+	assert second.failed == 0
+	assert second.throughput == 0
+	assert second.to_dict()["skipped"] == 3
+
+	saved = json.loads((outputs / MANIFEST_FILENAME).read_text())
+	assert sorted(saved["outputs"]) == ["a.png", "b.png", "nested/c.png"]
+
+
+def test_changes_are_processed(tree):
+	"""Test that changed inputs, options and missing outputs are made again."""
+	inputs, outputs = tree
+	run(inputs, outputs)
+
+	data = np.zeros((20, 20, 3), dtype=np.uint8)
+	Image.fromarray(data).save(inputs / "a.png")
+	(outputs / "nested" / "c.png").unlink()
+	assert statuses(run(inputs, outputs)) == {
+		"a.png": "ok",
+		"b.png": "skipped",
+		"c.png": "ok",
+	}
+
+	assert set(statuses(run(inputs, outputs, tolerance=20)).values()) == {"ok"}
+	assert set(statuses(run(inputs, outputs, crop=True)).values()) == {"ok"}
+	assert set(statuses(run(inputs, outputs, crop=True)).values()) == {"skipped"}
+
+
+def test_workers_hash_the_inputs(tree, monkeypatch):
+	"""Test that the digests recorded come from the workers' results."""
+	inputs, outputs = tree
+
+	def fail(source) -> None:
+		raise AssertionError(f"{source} hashed again")
+
+	monkeypatch.setattr(manifest_module, "source_digest", fail)
+	summary = run(inputs, outputs)
+	digest = source_digest(inputs / "a.png")
+	assert summary.results[0].digest == digest
+	assert Manifest(outputs / MANIFEST_FILENAME).entries["a.png"]["digest"] == digest
+	assert run_batch(make_tasks(inputs, outputs), workers=1).results[0].digest is None
+
+
+def test_touched_input_is_checked_by_content(tree):
+	"""Test that a new modification time alone does not reprocess a file."""
+	inputs, outputs = tree
+	run(inputs, outputs)
+	stat = (inputs / "b.png").stat()
+	os.utime(inputs / "b.png", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+	manifest = Manifest(outputs / MANIFEST_FILENAME)
+	tasks = make_tasks(inputs, outputs)
+	summary = run_batch(tasks, workers=1, manifest=manifest)
+	assert summary.skipped == 3
+	assert manifest.entries["b.png"]["mtime_ns"] == stat.st_mtime_ns + 10**9
+
+	same_size = bytearray((inputs / "b.png").read_bytes())
+	same_size[-20] ^= 0xFF
+	(inputs / "b.png").write_bytes(same_size)
+	os.utime(inputs / "b.png", ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+	summary = run(inputs, outputs)
+	# The flipped byte breaks the PNG, which shows that it was read again
+	assert statuses(summary)["b.png"] == "error"
+	assert "b.png" not in Manifest(outputs / MANIFEST_FILENAME).entries
+
+
+def test_manifest_edge_cases(tree):
+	"""Test unreadable manifests, missing inputs and inputs moved or changed mid-run."""
+	inputs, outputs = tree
+	outputs.mkdir()
+	(outputs / MANIFEST_FILENAME).write_text("{not json")
+	manifest = Manifest(outputs / MANIFEST_FILENAME)
+	assert manifest.entries == {}
+
+	source, output = inputs / "a.png", outputs / "a.png"
+	assert not manifest.is_current(inputs / "missing.png", output, "options")
+	assert not manifest.is_current(source, output, "options")
+	output.write_bytes(b"made from the old input")
+	source.write_bytes(source.read_bytes() + b"more")
+	manifest.record(source, output, "options")
+	assert "a.png" not in manifest.entries
+
+	manifest.record(source, output, "options")
+	assert manifest.is_current(source, output, "options")
+	assert not manifest.is_current(inputs / "b.png", output, "options")
+	manifest.forget(output)
+	assert not manifest.is_current(source, output, "options")
+
+	manifest.record(source, output, "options")
+	assert manifest.is_current(source, output, "options")
+	source.rename(inputs / "renamed.png")
+	manifest.record(source, output, "options")
+	assert "a.png" not in manifest.entries
+
+
+def test_cli_incremental(tree):
+	"""Test --incremental on the command line."""
+	inputs, outputs = tree
+	args = ["batch", str(inputs), str(outputs), "--pattern", "**/*", "--incremental"]
+	result = CliRunner().invoke(app, [*args, "-w", "1"])
+	assert result.exit_code == 0, result.stdout
+	assert "up to date" not in result.stdout
+
+	result = CliRunner().invoke(app, args)
+	assert result.exit_code == 0, result.stdout
+	assert "3 already up to date" in result.stdout
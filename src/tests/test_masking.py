@@ -0,0 +1,127 @@
+"""Tests for the array-level color matching functions."""
+
+import numpy as np
+import pytest
+
+from rmbg.masking import color_mask, normalize_targets, transparency_alpha
+
+
+@pytest.fixture
+def pixels():
+	"""Create a 2x3 RGB array with colors around white and red."""
+	return np.array(
+		[
+			[[255, 255, 255], [245, 250, 255], [244, 255, 255]],
+			[[255, 0, 0], [0, 0, 0], [250, 5, 10]],
+		],
+		dtype=np.uint8,
+	)
+
+
+def test_color_mask_white(pixels):
+	"""Test matching white with a box tolerance."""
+	mask = color_mask(pixels, (255, 255, 255), 10)
+	assert mask.tolist() == [[True, True, False], [False, False, False]]
+
+
+def test_color_mask_does_not_wrap(pixels):
+	"""Test that channel differences past 255 are not wrapped around."""
+	# With uint8 wrap-around, 0 - 255 == 1 would make red and black "white".
+	assert not color_mask(pixels, (255, 255, 255), 10)[1].any()
+	assert color_mask(pixels, (0, 0, 0), 10).tolist() == [
+		[False, False, False],
+		[False, True, False],
+	]
+
+
+def test_color_mask_tolerance_bounds(pixels):
+	"""Test that the tolerance is inclusive at both ends."""
+	assert color_mask(pixels, (250, 250, 250), 5)[0].tolist() == [True, True, False]
+	assert color_mask(pixels, (250, 5, 5), 5)[1].tolist() == [True, False, True]
+	assert color_mask(pixels, (0, 0, 0), 255).all()
+	assert color_mask(pixels, (255, 255, 255), 0)[0].tolist() == [True, False, False]
+
+
+def test_color_mask_out(pixels):
+	"""Test writing the mask into a caller-provided array."""
+	out = np.zeros((2, 3), dtype=bool)
+	result = color_mask(pixels, (255, 0, 0), 10, out=out)
+	assert result is out
+	assert out.tolist() == [[False, False, False], [True, False, True]]
+
+
+def test_transparency_alpha(pixels):
+	"""Test the alpha plane for an RGB array."""
+	alpha = transparency_alpha(pixels, (255, 255, 255), 10)
+	assert alpha.dtype == np.uint8
+	assert alpha.tolist() == [[0, 0, 255], [255, 255, 255]]
+
+
+def test_transparency_alpha_inplace(pixels):
+	"""Test writing the alpha plane into the alpha channel of an RGBA array."""
+	rgba = np.dstack([pixels, np.full((2, 3), 7, dtype=np.uint8)])
+	alpha = transparency_alpha(rgba, (255, 255, 255), 10, inplace=True)
+
+	assert np.shares_memory(alpha, rgba)
+	assert rgba[:, :, 3].tolist() == [[0, 0, 255], [255, 255, 255]]
+	assert np.array_equal(rgba[:, :, :3], pixels)
+
+
+def test_transparency_alpha_inplace_requires_alpha(pixels):
+	"""Test that in-place mode needs an alpha channel."""
+	with pytest.raises(ValueError, match="requires an"):
+		transparency_alpha(pixels, (255, 255, 255), inplace=True)
+
+
+@pytest.mark.parametrize(
+	"data",
+	[np.zeros((4, 4), np.uint8), np.zeros((4, 4, 2), np.uint8), np.zeros((4, 4, 3))],
+)
+def test_invalid_arrays(data):
+	"""Test that unsupported shapes and dtypes are rejected."""
+	with pytest.raises(ValueError, match="Expected an"):
+		color_mask(data, (0, 0, 0))
+
+
+def test_color_mask_several_colors(pixels):
+	"""Test matching several colors, each with its own tolerance, in one pass."""
+	mask = color_mask(pixels, [(255, 255, 255), (250, 5, 5)], [0, 5])
+	assert mask.tolist() == [[True, False, False], [True, False, True]]
+
+
+def test_color_mask_several_colors_matches_union():
+	"""Test that the multi-color mask is the union of the single-color masks."""
+	rng = np.random.default_rng(0)
+	data = rng.integers(0, 256, (64, 64, 4), dtype=np.uint8)
+	# 70 colors exercise more than one 64-color lookup table word
+	colors = [tuple(c) for c in rng.integers(0, 256, (70, 3))]
+	tolerances = rng.integers(0, 40, 70).tolist()
+
+	for count in (2, 8, 64, 70):
+		union = np.zeros((64, 64), dtype=bool)
+		for color, tolerance in zip(colors[:count], tolerances[:count], strict=True):
+			union |= color_mask(data, color, tolerance)
+		assert union.any()
+		assert np.array_equal(
+			color_mask(data, colors[:count], tolerances[:count]), union
+		)
+
+
+def test_transparency_alpha_several_colors(pixels):
+	"""Test the alpha plane for several colors sharing one tolerance."""
+	alpha = transparency_alpha(pixels, [(255, 255, 255), (0, 0, 0)], 10)
+	assert alpha.tolist() == [[0, 0, 255], [255, 0, 255]]
+
+
+def test_normalize_targets():
+	"""Test normalizing single and multiple targets."""
+	assert normalize_targets((1, 2, 3), 4) == (((1, 2, 3),), (4,))
+	assert normalize_targets(np.array([1, 2, 3]), 4) == (((1, 2, 3),), (4,))
+	assert normalize_targets([(1, 2, 3), (4, 5, 6, 255)], [7, 8]) == (
+		((1, 2, 3), (4, 5, 6)),
+		(7, 8),
+	)
+	with pytest.raises(ValueError, match="At least one"):
+		normalize_targets([])
+	with pytest.raises(ValueError, match="2 tolerances for 1 colors"):
+		normalize_targets((1, 2, 3), [1, 2])
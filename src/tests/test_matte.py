@@ -0,0 +1,176 @@
+"""Tests for soft (feathered) transparency and de-spill."""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from rmbg import matte
+from rmbg.core import ImageProcessor
+from rmbg.matte import matte_alpha, normalize_outer, soft_transparency
+from rmbg.rules import compile_rule
+from rmbg.streaming import stream_transparent
+
+
+@pytest.fixture
+def pixels():
+	"""Create a random RGBA array with a near-white band."""
+	rng = np.random.default_rng(0)
+	data = rng.integers(0, 256, (50, 70, 4), dtype=np.uint8)
+	data[:, :, 3] = 255
+	data[10:30, :, :3] = 255 - rng.integers(0, 40, (20, 70, 3), dtype=np.uint8)
+	return data
+
+
+def test_normalize_outer():
+	"""Test shared and per-color outer tolerances."""
+	assert normalize_outer((5, 10), 20) == (20, 20)
+	assert normalize_outer((5, 10), [6, 30]) == (6, 30)
+	with pytest.raises(ValueError, match="2 outer tolerances for 1 colors"):
+		normalize_outer((5,), [10, 20])
+	with pytest.raises(ValueError, match="must exceed"):
+		normalize_outer((5, 10), 10)
+
+
+def test_matte_ramp():
+	"""Test that alpha ramps linearly between the inner and outer tolerance."""
+	data = np.zeros((1, 6, 3), dtype=np.uint8)
+	data[0] = [[255] * 3, [250] * 3, [245] * 3, [240] * 3, [200, 255, 255], [0] * 3]
+
+	assert matte_alpha(data, (255, 255, 255), 5, 15)[0].tolist() == [
+		0,
+		0,
+		128,
+		255,
+		255,
+		255,
+	]
+	# Per color: the lowest alpha wins
+	both = matte_alpha(data, [(255, 255, 255), (0, 0, 0)], [5, 0], [15, 10])
+	assert both[0].tolist() == [0, 0, 128, 255, 255, 0]
+
+
+def test_matte_metric():
+	"""Test the ramp in the units of another metric."""
+	data = np.array([[[245, 245, 245], [255, 255, 235]]], dtype=np.uint8)
+
+	# Euclidean distances 17.3 and 20 on a 10-30 ramp
+	alpha = matte_alpha(data, (255, 255, 255), 10, 30, "euclidean")
+	assert alpha[0].tolist() == [93, 128]
+
+
+@pytest.mark.parametrize("metric", ["box", "cie76"])
+def test_matte_chunks(pixels, metric, monkeypatch):
+	"""Test that chunking and strided input do not change the matte."""
+	targets = [(255, 255, 255), (0, 0, 0)], [10, 5], 40
+	expected = matte_alpha(pixels, *targets, metric)
+	monkeypatch.setattr(matte, "_CHUNK_PIXELS", 100)
+
+	assert np.array_equal(matte_alpha(pixels, *targets, metric), expected)
+	assert np.array_equal(
+		matte_alpha(pixels[:, ::2], *targets, metric), expected[:, ::2]
+	)
+
+
+def test_despill_restores_foreground():
+	"""Test that an edge pixel mixing red into white gets back its red."""
+	# 60% of (200, 0, 0) over white
+	data = np.array([[[222, 102, 102, 255], [255, 255, 255, 255]]], dtype=np.uint8)
+
+	soft_transparency(data, (255, 255, 255), 0, 255)
+	assert data[0].tolist() == [[200, 0, 0, 153], [255, 255, 255, 0]]
+
+	plain = np.array([[[222, 102, 102, 255]]], dtype=np.uint8)
+	soft_transparency(plain, (255, 255, 255), 0, 255, despill=False)
+	assert plain[0].tolist() == [[222, 102, 102, 153]]
+
+
+def test_despill_uses_nearest_color():
+	"""Test that each edge pixel is de-spilled against its own background."""
+	# 60% of (200, 0, 0) over black, then over white
+	data = np.array([[[120, 0, 0, 255], [222, 102, 102, 255]]], dtype=np.uint8)
+	colors = [(255, 255, 255), (0, 0, 0)]
+
+	expected = soft_transparency(data.copy(), colors, [0, 0], [255, 200])
+	assert expected[0].tolist() == [[200, 0, 0, 153], [200, 0, 0, 153]]
+
+	# The same result from a precomputed matte, with the nearest color looked up
+	precomputed = matte_alpha(data, colors, [0, 0], [255, 200])
+	result = soft_transparency(data, colors, [0, 0], [255, 200], matte=precomputed)
+	assert np.array_equal(result, expected)
+
+
+def test_existing_alpha_is_kept():
+	"""Test that the matte multiplies into the existing alpha."""
+	data = np.array(
+		[[[255, 255, 255, 200], [245, 245, 245, 128], [0, 0, 0, 128]]], dtype=np.uint8
+	)
+
+	soft_transparency(data, (255, 255, 255), 5, 15, despill=False)
+	assert data[0, :, 3].tolist() == [0, 64, 128]
+
+
+def test_soft_transparency_chunks(pixels, monkeypatch):
+	"""Test that chunking and non-contiguous arrays give the same result."""
+	targets = [(255, 255, 255), (30, 30, 30)], 8, 30
+	expected = soft_transparency(pixels.copy(), *targets)
+	monkeypatch.setattr(matte, "_CHUNK_PIXELS", 100)
+
+	assert np.array_equal(soft_transparency(pixels.copy(), *targets), expected)
+	wide = np.zeros((50, 140, 4), dtype=np.uint8)
+	wide[:, ::2] = pixels
+	soft_transparency(wide[:, ::2], *targets)
+	assert np.array_equal(wide[:, ::2], expected)
+
+	with pytest.raises(ValueError, match="requires an"):
+		soft_transparency(pixels[:, :, :3], (0, 0, 0), 0, 10)
+
+
+def test_soft_rule(pixels):
+	"""Test that a compiled soft rule gives the matte of its grid colors."""
+	rule = compile_rule((255, 255, 255), 10, resolution=256, outer_tolerance=30)
+
+	assert rule.outer_tolerances == (30,)
+	assert np.array_equal(
+		rule.alpha(pixels), matte_alpha(pixels, (255, 255, 255), 10, 30)
+	)
+	assert compile_rule((255, 255, 255), 10, resolution=256) is not rule
+
+	binned = compile_rule((255, 255, 255), 10, "euclidean", 32, outer_tolerance=30)
+	centers = (pixels[:, :, :3] // 8 * 8 + 4).astype(np.uint8)
+	assert np.array_equal(
+		binned.alpha(pixels), matte_alpha(centers, (255, 255, 255), 10, 30, "euclidean")
+	)
+
+
+def test_processor_feather(pixels):
+	"""Test feathering through ImageProcessor, with and without a table."""
+	expected = soft_transparency(pixels.copy(), (255, 255, 255), 10, 30)
+
+	result = ImageProcessor(feather=20).make_transparent_array(
+		pixels.copy(), (255, 255, 255), 10
+	)
+	assert np.array_equal(result, expected)
+	result = ImageProcessor(feather=20, lut_resolution=256).make_transparent_array(
+		pixels.copy(), [(255, 255, 255)], [10]
+	)
+	assert np.array_equal(result, expected)
+
+	with pytest.raises(ValueError, match="Feather must be positive"):
+		ImageProcessor(feather=0)
+
+
+def test_stream_feather(tmp_path, pixels):
+	"""Test that streaming applies the same soft matte."""
+	source = tmp_path / "input.bmp"
+	Image.fromarray(pixels[:, :, :3]).save(source)
+	expected = soft_transparency(pixels.copy(), (255, 255, 255), 10, 30)
+
+	stream_transparent(
+		source,
+		tmp_path / "out.png",
+		(255, 255, 255),
+		10,
+		band_rows=7,
+		outer_tolerance=30,
+	)
+	assert np.array_equal(np.asarray(Image.open(tmp_path / "out.png")), expected)
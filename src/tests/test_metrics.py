@@ -0,0 +1,177 @@
+"""Tests for the color distance metrics."""
+
+import numpy as np
+import pytest
+
+from rmbg import metrics
+from rmbg.core import ImageProcessor
+from rmbg.masking import color_mask
+from rmbg.metrics import (
+	METRICS,
+	ColorMetric,
+	ciede2000,
+	get_metric,
+	metric_alpha,
+	metric_distance,
+	metric_mask,
+	register_metric,
+	srgb_to_lab,
+)
+from rmbg.rules import compile_rule
+
+
+@pytest.fixture
+def pixels():
+	"""Create a random RGBA array."""
+	rng = np.random.default_rng(0)
+	return rng.integers(0, 256, (40, 70, 4), dtype=np.uint8)
+
+
+def test_srgb_to_lab():
+	"""Test the Lab coordinates of reference colors."""
+	lab = srgb_to_lab(np.array([[255, 255, 255], [255, 0, 0], [0, 0, 0]], np.uint8))
+	assert lab == pytest.approx(
+		np.array([[100, 0, 0], [53.24, 80.09, 67.20], [0, 0, 0]]), abs=0.01
+	)
+
+
+@pytest.mark.parametrize(
+	("lab1", "lab2", "expected"),
+	[
+		((50, 2.6772, -79.7751), (50, 0, -82.7485), 2.0425),
+		((50, 3.1571, -77.2803), (50, 0, -82.7485), 2.8615),
+		((50, 0, 0), (50, -1, 2), 2.3669),
+		((50, 2.5, 0), (50, 0, -2.5), 4.3065),
+		((50, 2.5, 0), (73, 25, -18), 27.1492),
+		((60.2574, -34.0099, 36.2677), (60.4626, -34.1751, 39.4387), 1.2644),
+	],
+)
+def test_ciede2000_reference_pairs(lab1, lab2, expected):
+	"""Test CIEDE2000 against published reference pairs (Sharma et al.)."""
+	result = ciede2000(np.array([lab1], np.float32), np.array(lab2))
+	assert result[0] == pytest.approx(expected, abs=1e-3)
+
+
+def test_box_metric_is_color_mask(pixels):
+	"""Test that the box metric is the channel-compare fast path."""
+	expected = color_mask(pixels, (120, 60, 200), 40)
+	assert np.array_equal(metric_mask(pixels, (120, 60, 200), 40), expected)
+	box = get_metric("box")
+	coords = box.prepare(pixels[:, :, :3].reshape(-1, 3))
+	within = box.within(coords, box.target((120, 60, 200)), 40)
+	assert np.array_equal(within.reshape(expected.shape), expected)
+
+
+def test_rgb_metrics():
+	"""Test the Euclidean and weighted RGB distances."""
+	data = np.array([[[245, 245, 245], [255, 255, 205], [255, 205, 255]]], np.uint8)
+	white = (255, 255, 255)
+
+	# sqrt(3 * 10**2) = 17.3
+	assert metric_mask(data, white, 17, "euclidean")[0].tolist() == [False] * 3
+	assert metric_mask(data, white, 18, "euclidean")[0].tolist() == [True, False, False]
+	# A blue difference weighs less than a green one
+	assert metric_mask(data, white, 40, "weighted")[0].tolist() == [True, True, False]
+
+
+def test_lab_metrics():
+	"""Test matching by perceptual difference."""
+	data = np.array([[[250, 250, 250], [255, 250, 240], [200, 200, 200]]], np.uint8)
+	white = (255, 255, 255)
+
+	for name in ("cie76", "ciede2000"):
+		assert metric_mask(data, white, 3, name)[0].tolist() == [True, False, False]
+		assert metric_mask(data, white, 8, name)[0].tolist() == [True, True, False]
+	distance = get_metric("ciede2000").distance(
+		srgb_to_lab(data.reshape(-1, 3)), srgb_to_lab(np.array(white, np.uint8))
+	)
+	assert distance[2] > 10
+
+
+@pytest.mark.parametrize("name", sorted(METRICS))
+def test_metric_mask_chunks(pixels, name, monkeypatch):
+	"""Test that chunking and several targets do not change the result."""
+	targets = [(255, 255, 255), (10, 200, 30)], [60, 30]
+	expected = metric_mask(pixels, *targets, name)
+	monkeypatch.setattr(metrics, "_CHUNK_PIXELS", 100)
+
+	assert np.array_equal(metric_mask(pixels, *targets, name), expected)
+	union = metric_mask(pixels, targets[0][0], 60, name) | metric_mask(
+		pixels, targets[0][1], 30, name
+	)
+	assert np.array_equal(expected, union)
+
+
+@pytest.mark.parametrize("name", sorted(METRICS))
+def test_metric_distance_thresholds_like_mask(pixels, name, monkeypatch):
+	"""Test that one distance map gives the mask of every whole tolerance."""
+	monkeypatch.setattr(metrics, "_CHUNK_PIXELS", 100)
+	distances = metric_distance(pixels, (10, 200, 30, 255), name)
+
+	assert distances.dtype == np.uint16
+	for tolerance in (0, 1, 25, 80, 255):
+		expected = metric_mask(pixels, (10, 200, 30), tolerance, name)
+		assert np.array_equal(distances <= tolerance, expected)
+
+
+def test_metric_alpha(pixels):
+	"""Test the alpha plane of a metric, in place."""
+	expected = metric_mask(pixels, (128, 128, 128), 60, "euclidean")
+	alpha = metric_alpha(pixels, (128, 128, 128), 60, "euclidean", inplace=True)
+
+	assert np.shares_memory(alpha, pixels)
+	assert np.array_equal(alpha == 0, expected)
+	with pytest.raises(ValueError, match="requires an"):
+		metric_alpha(pixels[:, :, :3], (0, 0, 0), inplace=True)
+
+
+def test_register_custom_metric(pixels):
+	"""Test plugging in a metric of one's own."""
+
+	class RedMetric(ColorMetric):
+		name = "red-only"
+
+		def distance(self, coords, target) -> np.ndarray:
+			return np.abs(coords[:, 0] - target[0])
+
+	metric = register_metric(RedMetric())
+	try:
+		assert get_metric("red-only") is metric
+		mask = metric_mask(pixels, (0, 0, 0), 10, "red-only")
+		assert np.array_equal(mask, pixels[:, :, 0] <= 10)
+	finally:
+		del METRICS["red-only"]
+	with pytest.raises(ValueError, match="Unknown metric"):
+		get_metric("red-only")
+
+	class Incomplete(ColorMetric):
+		name = "incomplete"
+
+	with pytest.raises(TypeError, match="abstract"):
+		Incomplete()
+
+
+def test_lut_with_metric(pixels):
+	"""Test that a compiled rule evaluates the metric per grid color."""
+	rule = compile_rule([(255, 255, 255), (10, 200, 30)], 20, "cie76", resolution=32)
+	step = 8
+	centers = (pixels[:, :, :3] // step * step + step // 2).astype(np.uint8)
+
+	assert rule.metric == "cie76"
+	assert np.array_equal(
+		rule.mask(pixels),
+		metric_mask(centers, [(255, 255, 255), (10, 200, 30)], 20, "cie76"),
+	)
+
+
+def test_processor_metric(pixels):
+	"""Test selecting the metric on the ImageProcessor."""
+	processor = ImageProcessor(metric="ciede2000")
+	result = processor.make_transparent_array(pixels.copy(), (128, 128, 128), 20)
+
+	assert processor.metric is get_metric("ciede2000")
+	assert np.array_equal(
+		result[:, :, 3] == 0, metric_mask(pixels, (128, 128, 128), 20, "ciede2000")
+	)
+	with pytest.raises(ValueError, match="Unknown metric"):
+		ImageProcessor(metric="nope")
@@ -0,0 +1,157 @@
+"""Tests for connected (flood fill) background removal."""
+
+from collections import deque
+
+import numpy as np
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+
+from rmbg.__main__ import app
+from rmbg.batch import BatchTask, run_batch
+from rmbg.cache import ResultCache
+from rmbg.core import ImageProcessor
+from rmbg.region import connected_mask
+
+WHITE = (255, 255, 255)
+
+
+def flood_fill(mask, seeds=None):
+	"""Return the reference result of ``connected_mask`` from a plain BFS."""
+	height, width = mask.shape
+	if seeds is None:
+		seeds = [
+			(x, y)
+			for y in range(height)
+			for x in range(width)
+			if y in (0, height - 1) or x in (0, width - 1)
+		]
+	filled = np.zeros_like(mask)
+	queue = deque((x, y) for x, y in seeds if mask[y, x])
+	while queue:
+		x, y = queue.popleft()
+		if filled[y, x]:
+			continue
+		filled[y, x] = True
+		for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+			if 0 <= nx < width and 0 <= ny < height and mask[ny, nx]:
+				queue.append((nx, ny))
+	return filled
+
+
+@pytest.fixture
+def logo():
+	"""Create a white image with a black ring around a white hole."""
+	data = np.full((60, 80, 4), 255, dtype=np.uint8)
+	data[10:50, 10:70, :3] = 0
+	data[20:40, 30:50, :3] = 255
+	return data
+
+
+@pytest.mark.parametrize("density", [0.3, 0.55, 0.8])
+def test_matches_flood_fill(density):
+	"""Test random masks against a BFS, from the border and from seeds."""
+	rng = np.random.default_rng(int(density * 10))
+	for _ in range(20):
+		shape = tuple(rng.integers(1, 40, 2))
+		mask = rng.random(shape) < density
+		np.testing.assert_array_equal(connected_mask(mask), flood_fill(mask))
+
+		seeds = [(rng.integers(shape[1]), rng.integers(shape[0])) for _ in range(3)]
+		expected = flood_fill(mask, seeds)
+		np.testing.assert_array_equal(connected_mask(mask, seeds), expected)
+		in_place = mask.copy()
+		assert connected_mask(in_place, seeds, out=in_place) is in_place
+		np.testing.assert_array_equal(in_place, expected)
+
+
+def test_mask_edge_cases():
+	"""Test spirals, diagonal gaps, empty masks and invalid input."""
+	# A one pixel wide diagonal outline does not let the fill through
+	mask = np.ones((5, 5), dtype=bool)
+	mask[[0, 1, 2, 3, 4], [2, 1, 0, 1, 2]] = False
+	mask[[1, 2, 3], [3, 4, 3]] = False
+	assert not connected_mask(mask)[2, 2]
+
+	spiral = np.zeros((41, 41), dtype=bool)
+	spiral[1:-1:2, 1:-1] = True
+	spiral[1:-1, 1] = True
+	spiral[1:-1, -2] = True
+	spiral[0, 1] = True
+	np.testing.assert_array_equal(connected_mask(spiral), flood_fill(spiral))
+
+	empty = np.zeros((10, 10), dtype=bool)
+	assert not connected_mask(empty).any()
+	assert not connected_mask(empty, [(3, 3)]).any()
+
+	with pytest.raises(ValueError, match="within the 10x10 image"):
+		connected_mask(empty, [(10, 0)])
+	with pytest.raises(ValueError, match="Expected an"):
+		connected_mask(np.zeros((2, 2, 2), dtype=bool))
+
+
+def test_processor_connected(logo, tmp_path):
+	"""Test that enclosed areas of the color are kept, and seeds."""
+	default = ImageProcessor().make_transparent_array(logo.copy(), WHITE)
+	assert default[0, 0, 3] == 0
+	assert default[30, 40, 3] == 0
+
+	connected = ImageProcessor(connected=True)
+	for processor in (connected, ImageProcessor(connected=True, lut_resolution=32)):
+		result = processor.make_transparent_array(logo.copy(), WHITE)
+		assert result[0, 0, 3] == 0
+		assert (result[20:40, 30:50, 3] == 255).all()
+
+	seeded = ImageProcessor(seeds=[(40, 30)])
+	assert seeded.connected
+	result = seeded.make_transparent_array(logo.copy(), WHITE)
+	assert result[0, 0, 3] == 255
+	assert (result[20:40, 30:50, 3] == 0).all()
+
+	feathered = ImageProcessor(connected=True, feather=20)
+	result = feathered.make_transparent_array(logo.copy(), WHITE)
+	assert result[0, 0, 3] == 0
+	assert (result[20:40, 30:50, 3] == 255).all()
+
+	path = tmp_path / "logo.png"
+	Image.fromarray(logo).save(path)
+	with pytest.raises(ValueError, match="cannot be used with streaming"):
+		connected.make_transparent_streaming(path, tmp_path / "out.png", WHITE)
+
+	# The cached global result is not reused in connected mode
+	cache = ResultCache(tmp_path / "cache")
+	assert not ImageProcessor(cache=cache).process_file(path, tmp_path / "a.png", WHITE)
+	connected.cache = cache
+	assert not connected.process_file(path, tmp_path / "b.png", WHITE)
+	assert connected.process_file(path, tmp_path / "c.png", WHITE)
+	with Image.open(tmp_path / "b.png") as image:
+		assert image.getpixel((40, 30))[3] == 255
+
+
+def test_batch_and_cli_connected(logo, tmp_path):
+	"""Test --connected and --seed in batch runs and on the command line."""
+	path = tmp_path / "logo.png"
+	Image.fromarray(logo).save(path)
+	output = tmp_path / "out" / "logo.png"
+	summary = run_batch([BatchTask(path, output, WHITE)], workers=1, connected=True)
+	assert summary.succeeded == 1
+	with Image.open(output) as result:
+		assert result.getpixel((40, 30))[3] == 255
+
+	runner = CliRunner()
+	args = ["main", str(path), str(tmp_path / "cli.png")]
+	result = runner.invoke(app, [*args, "--connected"])
+	assert result.exit_code == 0, result.stdout
+	with Image.open(tmp_path / "cli.png") as image:
+		assert image.getpixel((0, 0))[3] == 0
+		assert image.getpixel((40, 30))[3] == 255
+
+	result = runner.invoke(app, [*args, "--seed", "40,30"])
+	assert result.exit_code == 0, result.stdout
+	with Image.open(tmp_path / "cli.png") as image:
+		assert image.getpixel((0, 0))[3] == 255
+		assert image.getpixel((40, 30))[3] == 0
+
+	result = runner.invoke(app, [*args, "--seed", "40"])
+	assert result.exit_code == 1
+	assert "Seed must be in format x,y" in result.stdout
@@ -0,0 +1,150 @@
+"""Tests for compiled lookup-table transparency rules."""
+
+import fitz
+import numpy as np
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+
+from rmbg.__main__ import app
+from rmbg.core import ImageProcessor, validate_options
+from rmbg.masking import color_mask, transparency_alpha
+from rmbg.rules import clear_rule_cache, compile_rule, rule_cache_info
+
+
+@pytest.fixture
+def pixels():
+	"""Create a random RGBA array with a white band."""
+	rng = np.random.default_rng(0)
+	data = rng.integers(0, 256, (60, 80, 4), dtype=np.uint8)
+	data[20:30, :, :3] = 250
+	return data
+
+
+@pytest.fixture
+def targets():
+	"""Return several colors with their own tolerances."""
+	return [(255, 255, 255), (0, 0, 0), (120, 60, 200)], [10, 40, 25]
+
+
+def test_exact_rule_matches_color_mask(pixels, targets):
+	"""Test that a 256-step table gives exactly the channel-compare result."""
+	colors, tolerances = targets
+	rule = compile_rule(colors, tolerances)
+	expected = color_mask(pixels, colors, tolerances)
+
+	assert rule.nbytes == 256**3
+	assert np.array_equal(rule.mask(pixels), expected)
+	assert np.array_equal(rule.mask(np.ascontiguousarray(pixels[:, :, :3])), expected)
+	assert np.array_equal(rule.mask(pixels[:, ::3]), expected[:, ::3])
+
+
+def test_rule_alpha(pixels, targets):
+	"""Test the alpha plane, in place and into a caller-provided array."""
+	colors, tolerances = targets
+	rule = compile_rule(colors, tolerances)
+	expected = transparency_alpha(pixels, colors, tolerances)
+
+	out = np.empty(pixels.shape[:2], dtype=np.uint8)
+	assert rule.alpha(pixels, out=out) is out
+	assert np.array_equal(out, expected)
+
+	alpha = rule.alpha(pixels, inplace=True)
+	assert np.shares_memory(alpha, pixels)
+	assert np.array_equal(pixels[:, :, 3], expected)
+
+	with pytest.raises(ValueError, match="requires an"):
+		rule.alpha(pixels[:, :, :3], inplace=True)
+
+
+def test_binned_rule(pixels):
+	"""Test that a 32-step table matches by 8x8x8 color block."""
+	rule = compile_rule((255, 255, 255), 10, resolution=32)
+
+	assert rule.nbytes == 32**3
+	mask = rule.mask(pixels)
+	assert mask[20:30].all()
+	# 97 falls in the 96-103 block, whose center 100 is outside 97 +- 1
+	assert (
+		not compile_rule((97, 97, 97), 1, resolution=32)
+		.mask(np.full((1, 1, 3), 97, np.uint8))
+		.any()
+	)
+	assert np.array_equal(mask, rule.mask(np.ascontiguousarray(pixels[:, :, :3])))
+
+
+def test_rules_are_cached(targets):
+	"""Test that equal parameters reuse the compiled table."""
+	clear_rule_cache()
+	colors, tolerances = targets
+	first = compile_rule(colors, tolerances)
+	second = compile_rule([list(c) for c in colors], tuple(tolerances))
+
+	assert first is second
+	hits, misses, _, size = rule_cache_info()
+	assert (hits, misses, size) == (1, 1, 1)
+	assert compile_rule(colors, 5) is not first
+
+
+@pytest.mark.parametrize(
+	("kwargs", "message"),
+	[({"resolution": 64}, "resolution"), ({"metric": "nope"}, "Unknown metric")],
+)
+def test_invalid_rules(kwargs, message):
+	"""Test unsupported resolutions and metrics."""
+	with pytest.raises(ValueError, match=message):
+		compile_rule((0, 0, 0), **kwargs)
+
+
+def test_processor_with_lut(pixels, targets):
+	"""Test that ImageProcessor masks through the table when configured."""
+	colors, tolerances = targets
+	expected = ImageProcessor().make_transparent_array(
+		pixels.copy(), colors, tolerances
+	)
+	result = ImageProcessor(lut_resolution=256).make_transparent_array(
+		pixels.copy(), colors, tolerances
+	)
+
+	assert np.array_equal(result, expected)
+	with pytest.raises(ValueError, match="resolution"):
+		ImageProcessor(lut_resolution=100)
+
+
+@pytest.mark.parametrize(
+	("options", "message"),
+	[
+		({"lut_resolution": 100}, "resolution"),
+		({"feather": 0}, "Feather"),
+		({"metric": "nope"}, "metric"),
+		({"save_profile": "nope"}, "profile"),
+		({"output_format": "nope"}, "format"),
+	],
+)
+def test_validate_options(options, message):
+	"""Test that bad options are rejected without building a processor."""
+	validate_options(256, "cie76", 5, "fast", "webp")
+	with pytest.raises(ValueError, match=message):
+		validate_options(**options)
+
+
+def test_cli_lut(tmp_path):
+	"""Test the --lut option of the main and pdf commands."""
+	data = np.full((20, 20, 3), 255, dtype=np.uint8)
+	data[5:15, 5:15] = 0
+	Image.fromarray(data).save(tmp_path / "in.png")
+	with fitz.open() as doc:
+		doc.new_page(width=60, height=40)
+		doc.save(tmp_path / "in.pdf")
+
+	runner = CliRunner()
+	args = ["main", str(tmp_path / "in.png"), str(tmp_path / "out.png")]
+	result = runner.invoke(app, [*args, "--lut", "32"])
+	assert result.exit_code == 0, result.stdout
+	assert np.array_equal(
+		np.array(Image.open(tmp_path / "out.png"))[:, :, 3], (data[:, :, 0] == 0) * 255
+	)
+	args = ["pdf", str(tmp_path / "in.pdf"), str(tmp_path / "pages"), "-w", "1"]
+	result = runner.invoke(app, [*args, "--lut", "256"])
+	assert result.exit_code == 0, result.stdout
+	assert (tmp_path / "pages" / "in-0000.png").exists()
@@ -0,0 +1,279 @@
+"""Tests for the long-running server mode."""
+
+import http.client
+import io
+import json
+import socket
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+
+from rmbg import server
+from rmbg.__main__ import app
+from rmbg.server import (
+	Dispatcher,
+	RmbgServer,
+	ServeRequest,
+	ServeResult,
+	parse_request,
+)
+
+
+class UnixConnection(http.client.HTTPConnection):
+	"""HTTP connection over a Unix domain socket."""
+
+	def __init__(self, path) -> None:
+		super().__init__("localhost")
+		self.path = path
+
+	def connect(self):
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.sock.connect(str(self.path))
+
+
+@pytest.fixture
+def png_bytes():
+	"""Encode a white image with a red square."""
+	data = np.full((30, 40, 3), 255, dtype=np.uint8)
+	data[10:20, 10:20] = [200, 0, 0]
+	buffer = io.BytesIO()
+	Image.fromarray(data).save(buffer, "PNG")
+	return buffer.getvalue()
+
+
+def serve(**kwargs: object) -> RmbgServer:
+	"""Start a single-worker server on a free port in a background thread."""
+	running = RmbgServer(Dispatcher(max_pending=2), port=0, quiet=True, **kwargs)
+	threading.Thread(target=running.serve_forever, daemon=True).start()
+	return running
+
+
+@pytest.fixture
+def live_server():
+	"""Run a server for the duration of a test."""
+	running = serve()
+	yield running
+	running.shutdown()
+	running.close()
+
+
+def request(running, method, path, body=None, headers=None):
+	"""Send one request and return the status, headers and body."""
+	host, port = running.address.removeprefix("http://").split(":")
+	connection = http.client.HTTPConnection(host, int(port), timeout=10)
+	try:
+		connection.request(method, path, body, headers or {})
+		response = connection.getresponse()
+		return response.status, response.headers, response.read()
+	finally:
+		connection.close()
+
+
+def test_parse_request():
+	"""Test parsing and validating request fields."""
+	parsed = parse_request(
+		{"input": "a.jpg", "color": ["#ffffff", "0,0,0:5"], "dpi": "150"}
+	)
+	assert parsed == ServeRequest(
+		[(255, 255, 255), (0, 0, 0)], [10, 5], input_file=parsed.input_file, dpi=150
+	)
+	assert parse_request({}, b"png").image == b"png"
+
+	with pytest.raises(ValueError, match="needs an image body or an input path"):
+		parse_request({})
+	with pytest.raises(ValueError, match="tolerance must be between 0 and 255"):
+		parse_request({"input": "a.jpg", "tolerance": 300})
+	with pytest.raises(ValueError, match="page must be an integer"):
+		parse_request({"input": "a.jpg", "page": "first"})
+
+
+def test_process_image_bytes(live_server, png_bytes):
+	"""Test returning the PNG for image bytes, with per-stage timings."""
+	status, headers, body = request(
+		live_server, "POST", "/process?color=%23ffffff&tolerance=5", png_bytes
+	)
+
+	assert status == 200
+	assert headers["Content-Type"] == "image/png"
+	assert [part.split(";")[0] for part in headers["Server-Timing"].split(", ")] == [
+		"load",
+		"mask",
+		"save",
+		"queue",
+		"total",
+	]
+	result = np.asarray(Image.open(io.BytesIO(body)))
+	assert result[0, 0].tolist() == [255, 255, 255, 0]
+	assert result[15, 15].tolist() == [200, 0, 0, 255]
+
+
+def test_process_paths(live_server, png_bytes, tmp_path):
+	"""Test reading and writing paths named in a JSON body."""
+	(tmp_path / "in.png").write_bytes(png_bytes)
+	payload = {
+		"input": str(tmp_path / "in.png"),
+		"output": str(tmp_path / "out" / "in.png"),
+	}
+
+	status, _, body = request(
+		live_server,
+		"POST",
+		"/process",
+		json.dumps(payload),
+		{"Content-Type": "application/json"},
+	)
+
+	assert status == 200
+	result = json.loads(body)
+	assert result["output"] == payload["output"]
+	assert result["timings"]["total"] >= result["timings"]["mask"]
+	assert Image.open(payload["output"]).getpixel((0, 0)) == (255, 255, 255, 0)
+
+
+@pytest.mark.parametrize(
+	("method", "path", "body", "status", "message"),
+	[
+		("POST", "/process?color=red", b"png", 400, "Color must be"),
+		("POST", "/process", b"not an image", 400, "Failed to load image"),
+		("POST", "/process", b"", 400, "needs an image body"),
+		("POST", "/other", b"", 404, "Not found"),
+		("GET", "/process", None, 404, "Not found"),
+	],
+)
+def test_errors(live_server, method, path, body, status, message):  # noqa: PLR0913, PLR0917
+	"""Test that failed requests get an error status and a JSON message."""
+	result = request(live_server, method, path, body)
+
+	assert result[0] == status
+	assert message in json.loads(result[2])["error"]
+
+
+def test_body_limit(png_bytes):
+	"""Test that oversized bodies are refused unread and bad lengths rejected."""
+	running = serve(max_body=len(png_bytes) - 1)
+	try:
+		status, headers, body = request(running, "POST", "/process", png_bytes)
+		assert status == 413
+		assert headers["Connection"] == "close"
+		assert "larger than the" in json.loads(body)["error"]
+
+		headers = {"Content-Length": "-1"}
+		status, _, body = request(running, "POST", "/process", None, headers)
+		assert status == 400
+		assert "Invalid Content-Length" in json.loads(body)["error"]
+	finally:
+		running.shutdown()
+		running.close()
+
+
+def test_missing_input(live_server, tmp_path):
+	"""Test that a missing input file is a 404."""
+	status, _, body = request(
+		live_server,
+		"POST",
+		"/process",
+		json.dumps({"input": str(tmp_path / "missing.png")}),
+		{"Content-Type": "application/json"},
+	)
+
+	assert status == 404
+	assert "File not found" in json.loads(body)["error"]
+
+
+def test_busy_server_refuses(live_server, png_bytes, monkeypatch):
+	"""Test that requests beyond max_pending are refused instead of queued."""
+	release = threading.Event()
+	started = threading.Semaphore(0)
+	process_request = server._process_request
+
+	def blocking(request) -> ServeResult:
+		started.release()
+		release.wait(10)
+		return process_request(request)
+
+	monkeypatch.setattr(server, "_process_request", blocking)
+	results = []
+	threads = [
+		threading.Thread(
+			target=lambda: results.append(
+				request(live_server, "POST", "/process", png_bytes)
+			)
+		)
+		for _ in range(2)
+	]
+	for thread in threads:
+		thread.start()
+	# One request is processing, the other waits for the single worker
+	assert started.acquire(timeout=10)
+	while live_server.dispatcher.pending < 2:
+		release.wait(0.01)
+	assert json.loads(request(live_server, "GET", "/health")[2])["pending"] == 2
+
+	status, headers, _ = request(live_server, "POST", "/process", png_bytes)
+	release.set()
+	for thread in threads:
+		thread.join()
+
+	assert status == 503
+	assert headers["Retry-After"] == "1"
+	assert [result[0] for result in results] == [200, 200]
+
+
+def test_unix_socket(tmp_path, png_bytes):
+	"""Test serving over a Unix socket, replacing a stale socket file."""
+	path = tmp_path / "rmbg.sock"
+	stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	stale.bind(str(path))
+	stale.close()
+
+	with RmbgServer(Dispatcher(), socket_path=path, quiet=True) as running:
+		threading.Thread(target=running.serve_forever, daemon=True).start()
+		connection = UnixConnection(path)
+		connection.request("POST", "/process", png_bytes)
+		response = connection.getresponse()
+
+		assert running.address == f"unix:{path}"
+		assert response.status == 200
+		assert Image.open(io.BytesIO(response.read())).mode == "RGBA"
+		connection.close()
+		running.shutdown()
+	assert not path.exists()
+
+
+def test_process_pool(png_bytes):
+	"""Test processing on a pool of warm worker processes."""
+	dispatcher = Dispatcher(workers=2, feather=10)
+	try:
+		result = dispatcher.process(ServeRequest((255, 255, 255), 5, image=png_bytes))
+	finally:
+		dispatcher.close()
+
+	assert Image.open(io.BytesIO(result.data)).getpixel((0, 0)) == (255, 255, 255, 0)
+	assert set(result.timings) == {"load", "mask", "save", "queue", "total"}
+
+
+def test_dispatcher_validates_options():
+	"""Test that invalid options fail before any worker starts."""
+	with pytest.raises(ValueError, match="must be at least the number of workers"):
+		Dispatcher(workers=3, max_pending=2)
+	with pytest.raises(ValueError, match="Unknown metric"):
+		Dispatcher(metric="nope")
+
+
+def test_cli_serve(monkeypatch):
+	"""Test that the serve subcommand starts, serves until interrupted and stops."""
+
+	def interrupt(self) -> None:
+		raise KeyboardInterrupt
+
+	monkeypatch.setattr(RmbgServer, "serve_forever", interrupt)
+	result = CliRunner().invoke(app, ["serve", "--port", "0", "--quiet"])
+	assert result.exit_code == 0
+	assert "Listening on http://127.0.0.1:" in result.stdout
+
+	result = CliRunner().invoke(app, ["serve", "-w", "2", "--max-pending", "1"])
+	assert result.exit_code == 1
+	assert "must be at least" in result.stdout
@@ -0,0 +1,221 @@
+"""Tests for band-by-band streaming processing."""
+
+import warnings
+
+import fitz
+import numpy as np
+import pytest
+from PIL import Image
+from typer.testing import CliRunner
+
+from rmbg.__main__ import app
+from rmbg.core import ImageProcessor
+from rmbg.streaming import (
+	FullDecodeWarning,
+	ImageBands,
+	PdfBands,
+	PngStreamWriter,
+	open_bands,
+	stream_transparent,
+)
+
+
+@pytest.fixture
+def rgb_pixels():
+	"""Create a 37x23 RGB array with a white background and colored blocks."""
+	rng = np.random.default_rng(0)
+	data = np.full((37, 23, 3), 255, dtype=np.uint8)
+	data[5:30, 3:15] = rng.integers(0, 200, (25, 12, 3), dtype=np.uint8)
+	data[:, 20] = (250, 252, 248)
+	return data
+
+
+@pytest.fixture
+def sample_pdf(tmp_path):
+	"""Create a one-page PDF with filled rectangles on a white background."""
+	pdf_path = tmp_path / "drawing.pdf"
+	doc = fitz.open()
+	page = doc.new_page(width=100, height=150)
+	page.draw_rect(fitz.Rect(10, 10, 60, 80), fill=(1, 0, 0), width=0)
+	page.draw_rect(fitz.Rect(40, 90, 90, 140), fill=(0, 0, 1), width=0)
+	doc.save(pdf_path)
+	doc.close()
+	return pdf_path
+
+
+def test_png_stream_writer_round_trip(tmp_path):
+	"""Test that a PNG written in bands reads back unchanged."""
+	rng = np.random.default_rng(1)
+	data = rng.integers(0, 256, (50, 31, 4), dtype=np.uint8)
+	output = tmp_path / "out.png"
+
+	with PngStreamWriter(output, 31, 50, dpi=(150, 150)) as writer:
+		for start in range(0, 50, 7):
+			writer.write(data[start : start + 7])
+
+	with Image.open(output) as image:
+		assert image.mode == "RGBA"
+		assert image.info["dpi"] == pytest.approx((150, 150), abs=0.1)
+		assert np.array_equal(np.array(image), data)
+
+
+def test_png_stream_writer_rejects_bad_bands(tmp_path):
+	"""Test that bands of the wrong shape or too many rows are rejected."""
+	writer = PngStreamWriter(tmp_path / "out.png", 4, 2)
+	with pytest.raises(ValueError, match="does not fit"):
+		writer.write(np.zeros((1, 5, 4), np.uint8))
+	with pytest.raises(ValueError, match="does not fit"):
+		writer.write(np.zeros((3, 4, 4), np.uint8))
+	writer.write(np.zeros((1, 4, 4), np.uint8))
+	with pytest.raises(ValueError, match="Wrote 1 of 2 rows"):
+		writer.close()
+	assert list(tmp_path.iterdir()) == []
+
+
+def test_png_stream_writer_error_keeps_destination(tmp_path):
+	"""Test that an error mid-stream leaves no partial PNG at the destination."""
+	output = tmp_path / "out.png"
+	output.write_bytes(b"previous")
+
+	def fail_midway() -> None:
+		with PngStreamWriter(output, 4, 2) as writer:
+			writer.write(np.zeros((1, 4, 4), np.uint8))
+			raise RuntimeError("decode failed")
+
+	with pytest.raises(RuntimeError, match="decode failed"):
+		fail_midway()
+	assert output.read_bytes() == b"previous"
+	assert list(tmp_path.iterdir()) == [output]
+
+
+def test_pdf_bands_match_full_render(sample_pdf):
+	"""Test that stitched PDF bands match a full-page render."""
+	full = ImageProcessor().load_array(sample_pdf, dpi=144)
+	bands = PdfBands(sample_pdf, 0, dpi=144, band_rows=37)
+	try:
+		assert (bands.width, bands.height) == (full.shape[1], full.shape[0])
+		stitched = np.concatenate(list(bands))
+	finally:
+		bands.close()
+
+	assert stitched.shape == full.shape
+	assert np.abs(stitched.astype(int) - full).max() <= 1
+
+
+def test_pdf_bands_clip(sample_pdf):
+	"""Test that a clip region is streamed like a clipped render."""
+	clip = (0, 0, 50, 50)
+	full = ImageProcessor().load_array(sample_pdf, dpi=72, clip=clip)
+	with open_bands(sample_pdf, dpi=72, clip=clip, band_rows=16) as bands:
+		stitched = np.concatenate(list(bands))
+	assert stitched.shape == full.shape == (50, 50, 4)
+	assert tuple(stitched[20, 20]) == (255, 0, 0, 255)
+
+
+@pytest.mark.parametrize(
+	("suffix", "options"),
+	[(".bmp", {}), (".ppm", {}), (".tif", {"compression": "raw"})],
+)
+def test_image_bands_raw(tmp_path, rgb_pixels, suffix, options):
+	"""Test that uncompressed formats are read band by band."""
+	path = tmp_path / f"image{suffix}"
+	Image.fromarray(rgb_pixels).save(path, **options)
+
+	bands = ImageBands(path, band_rows=8)
+	try:
+		assert bands.streamed
+		stitched = np.concatenate(list(bands))
+	finally:
+		bands.close()
+
+	assert np.array_equal(stitched[:, :, :3], rgb_pixels)
+	assert (stitched[:, :, 3] == 255).all()
+
+
+def test_image_bands_fallback(tmp_path, rgb_pixels):
+	"""Test that compressed formats fall back to a single decode."""
+	path = tmp_path / "image.png"
+	Image.fromarray(rgb_pixels).save(path)
+
+	with ImageBands(path, band_rows=8) as bands:
+		assert not bands.streamed
+		stitched = np.concatenate(list(bands))
+	assert np.array_equal(stitched[:, :, :3], rgb_pixels)
+
+
+@pytest.mark.parametrize("suffix", [".bmp", ".png"])
+def test_stream_transparent_matches_make_transparent(tmp_path, rgb_pixels, suffix):
+	"""Test that streaming gives the same result as the in-memory path."""
+	path = tmp_path / f"image{suffix}"
+	Image.fromarray(rgb_pixels).save(path)
+	output = tmp_path / "out.png"
+
+	with warnings.catch_warnings(record=True) as caught:
+		warnings.simplefilter("always")
+		size = stream_transparent(path, output, (255, 255, 255), 10, band_rows=5)
+	assert [w.category for w in caught] == (
+		[FullDecodeWarning] if suffix == ".png" else []
+	)
+
+	processor = ImageProcessor()
+	expected = processor.make_transparent(
+		processor.load_image(path), (255, 255, 255), 10
+	)
+	assert size == (23, 37)
+	with Image.open(output) as result:
+		assert np.array_equal(np.array(result), np.array(expected))
+
+
+def test_stream_transparent_pdf(tmp_path, sample_pdf):
+	"""Test streaming a PDF page to a PNG."""
+	output = tmp_path / "out.png"
+	processor = ImageProcessor()
+	size = processor.make_transparent_streaming(
+		sample_pdf, output, (255, 255, 255), dpi=72, band_rows=20
+	)
+
+	assert size == (100, 150)
+	with Image.open(output) as result:
+		assert result.getpixel((0, 0))[3] == 0
+		assert result.getpixel((30, 40)) == (255, 0, 0, 255)
+		assert result.getpixel((60, 120)) == (0, 0, 255, 255)
+
+
+def test_stream_transparent_errors(tmp_path, sample_pdf):
+	"""Test the errors for bad inputs and outputs."""
+	with pytest.raises(FileNotFoundError):
+		stream_transparent(tmp_path / "missing.png", tmp_path / "out.png", (0, 0, 0))
+	with pytest.raises(ValueError, match="PNG format"):
+		stream_transparent(sample_pdf, tmp_path / "out.jpg", (0, 0, 0))
+	with pytest.raises(ValueError, match="out of range"):
+		stream_transparent(sample_pdf, tmp_path / "out.png", (0, 0, 0), page=3)
+	with pytest.raises(ValueError, match="Band rows"):
+		stream_transparent(sample_pdf, tmp_path / "out.png", (0, 0, 0), band_rows=0)
+
+
+def test_bands_from_memory(tmp_path, rgb_pixels, sample_pdf):
+	"""Test reading raw rasters and PDF pages band by band from bytes."""
+	path = tmp_path / "image.bmp"
+	Image.fromarray(rgb_pixels).save(path)
+
+	with open_bands(path.read_bytes(), band_rows=8) as bands:
+		assert bands.streamed
+		stitched = np.concatenate(list(bands))
+	assert np.array_equal(stitched[:, :, :3], rgb_pixels)
+
+	output = tmp_path / "out.png"
+	stream_transparent(sample_pdf.read_bytes(), output, (255, 255, 255), band_rows=20)
+	with Image.open(output) as result:
+		assert result.getpixel((30, 40)) == (255, 0, 0, 255)
+
+
+def test_cli_stream_warns_on_full_decode(tmp_path, rgb_pixels):
+	"""Test that --stream says when an input is decoded whole."""
+	runner = CliRunner()
+	for suffix in (".png", ".bmp"):
+		path = tmp_path / f"image{suffix}"
+		Image.fromarray(rgb_pixels).save(path)
+		args = ["main", str(path), str(tmp_path / "out.png"), "--stream"]
+		result = runner.invoke(app, args)
+		assert result.exit_code == 0, result.stdout
+		assert ("Not streamed" in result.stdout) == (suffix == ".png")
@@ -0,0 +1,327 @@
+"""Tests for the output format writers."""
+
+import io
+from pathlib import Path
+
+import fitz
+import numpy as np
+import pytest
+from PIL import Image, features
+from typer.testing import CliRunner
+
+from rmbg.__main__ import app
+from rmbg.batch import run_pdf
+from rmbg.core import MULTIPAGE_SUFFIXES, ImageProcessor
+from rmbg.server import Dispatcher, ServeRequest
+from rmbg.writers import (
+	WRITERS,
+	AvifWriter,
+	OutputWriter,
+	PageWriter,
+	PdfStreamWriter,
+	PdfWriter,
+	PngWriter,
+	TiffWriter,
+	WebpWriter,
+	describe_formats,
+	get_writer,
+	register_writer,
+	writer_for_path,
+)
+
+needs_avif = pytest.mark.skipif(not features.check("avif"), reason="no AVIF codec")
+
+
+@pytest.fixture
+def masked():
+	"""Create an RGBA image with transparent noise around a half-transparent block."""
+	rng = np.random.default_rng(0)
+	data = rng.integers(0, 256, (40, 60, 4), dtype=np.uint8)
+	data[:, :, 3] = 0
+	data[10:30, 10:50, 3] = 255
+	data[15:25, 20:40, 3] = 100
+	return data
+
+
+def decode(buffer):
+	"""Decode an encoded image back to an RGBA array."""
+	buffer.seek(0)
+	with Image.open(buffer) as image:
+		return np.asarray(image.convert("RGBA"))
+
+
+def visible(data):
+	"""Return the pixels that are not fully transparent."""
+	return data[data[:, :, 3] > 0]
+
+
+def render(pdf_bytes, page=0):
+	"""Render a PDF page with its transparency to an RGBA array."""
+	with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+		pixmap = doc[page].get_pixmap(alpha=True)
+		shape = (pixmap.height, pixmap.width, pixmap.n)
+		return np.frombuffer(pixmap.samples, np.uint8).reshape(shape).copy()
+
+
+def test_get_writer():
+	"""Test looking writers up by format name, extension and instance."""
+	assert isinstance(get_writer("webp"), WebpWriter)
+	assert isinstance(get_writer("TIF"), TiffWriter)
+	assert get_writer("pdf", "fast").compress_level == 1
+	assert get_writer("png", "smallest").profile.name == "smallest"
+	custom = WebpWriter(method=1)
+	assert get_writer(custom) is custom
+	assert isinstance(writer_for_path("scan.Tiff"), TiffWriter)
+
+	with pytest.raises(ValueError, match="Unknown output format 'jpeg'"):
+		get_writer("jpeg")
+	with pytest.raises(ValueError, match="Unknown save profile 'tiny'"):
+		get_writer("webp", "tiny")
+	with pytest.raises(ValueError, match=r"Unsupported output format '\.jpg'"):
+		writer_for_path("scan.jpg")
+
+
+def test_register_writer(tmp_path):
+	"""Test adding a format by name and extension."""
+
+	class RawWriter(OutputWriter):
+		name = "raw"
+		suffixes = (".rgba",)
+
+		def save(self, image, output, dpi) -> None:
+			Path(output).write_bytes(image.tobytes())
+
+	register_writer(RawWriter)
+	try:
+		processor = ImageProcessor(save_profile="smallest")
+		processor.save_image(Image.new("RGBA", (2, 1)), tmp_path / "out.rgba")
+		assert (tmp_path / "out.rgba").read_bytes() == bytes(8)
+	finally:
+		del WRITERS["raw"]
+
+	class Incomplete(OutputWriter):
+		name = "incomplete"
+
+	with pytest.raises(TypeError, match="does not implement save"):
+		register_writer(Incomplete)
+	with pytest.raises(TypeError, match="abstract"):
+		Incomplete()
+	assert "incomplete" not in WRITERS
+
+	class IncompletePages(PageWriter):
+		pass
+
+	with pytest.raises(TypeError, match="abstract"):
+		IncompletePages()
+
+
+@pytest.mark.parametrize("profile", ["fast", "balanced", "smallest"])
+def test_webp_lossless(masked, profile):
+	"""Test that lossless WebP keeps every visible pixel."""
+	buffer = io.BytesIO()
+	get_writer("webp", profile).save(Image.fromarray(masked), buffer, (300, 300))
+
+	decoded = decode(buffer)
+	assert np.array_equal(decoded[:, :, 3], masked[:, :, 3])
+	assert np.array_equal(visible(decoded), visible(masked))
+
+
+@needs_avif
+def test_avif_keeps_alpha(masked):
+	"""Test that AVIF keeps alpha exactly and colors within two levels."""
+	buffer = io.BytesIO()
+	AvifWriter(speed=10).save(Image.fromarray(masked), buffer, (300, 300))
+
+	decoded = decode(buffer)
+	assert np.array_equal(decoded[:, :, 3], masked[:, :, 3])
+	difference = visible(decoded).astype(int) - visible(masked)
+	assert np.abs(difference).max() <= 2
+
+
+@pytest.mark.parametrize("profile", ["fast", "balanced", "smallest"])
+def test_tiff_lossless(masked, profile):
+	"""Test TIFF profiles, and clearing transparent pixels only where asked."""
+	writer = get_writer("tiff", profile)
+	buffer = io.BytesIO()
+	writer.save(Image.fromarray(masked), buffer, (300, 300))
+
+	decoded = decode(buffer)
+	assert np.array_equal(visible(decoded), visible(masked))
+	hidden = decoded[masked[:, :, 3] == 0]
+	assert hidden.any() != writer.clear_transparent
+
+
+def test_pdf_page(masked):
+	"""Test that a PDF page keeps the image, its size and its transparency."""
+	buffer = io.BytesIO()
+	PdfWriter().save(Image.fromarray(masked), buffer, (144, 144))
+
+	with fitz.open(stream=buffer.getvalue(), filetype="pdf") as doc:
+		assert doc.page_count == 1
+		assert doc[0].rect == fitz.Rect(0, 0, 30, 20)
+	rendered = render(buffer.getvalue())
+	assert rendered.shape == (20, 30, 4)
+	assert rendered[0, 0, 3] == 0
+	assert rendered[6, 6, 3] == 255
+
+
+def test_pdf_stream_writes_pages_as_added(masked):
+	"""Test that each page is written out before the next one is added."""
+	buffer = io.BytesIO()
+	with PdfStreamWriter(buffer, (72, 72)) as pdf:
+		pdf.add(Image.fromarray(masked))
+		first = buffer.tell()
+		assert first > 0
+		pdf.add(Image.new("RGB", (10, 20), (0, 0, 255)))
+		assert buffer.tell() > first
+
+	with fitz.open(stream=buffer.getvalue(), filetype="pdf") as doc:
+		assert doc.page_count == 2
+		assert doc[1].rect == fitz.Rect(0, 0, 10, 20)
+	opaque = render(buffer.getvalue(), 1)
+	assert opaque[5, 5].tolist() == [0, 0, 255, 255]
+
+	with pytest.raises(ValueError, match="at least one page"):
+		PdfStreamWriter(io.BytesIO()).close()
+
+
+def test_pdf_stream_error_keeps_destination(masked, tmp_path):
+	"""Test that a failed PDF leaves the previous output and no partial file."""
+	path = tmp_path / "pages.pdf"
+	path.write_bytes(b"previous")
+
+	def fail_midway() -> None:
+		with PdfStreamWriter(path) as pdf:
+			pdf.add(Image.fromarray(masked))
+			raise RuntimeError("render failed")
+
+	with pytest.raises(RuntimeError, match="render failed"):
+		fail_midway()
+	with pytest.raises(ValueError, match="at least one page"):
+		PdfStreamWriter(path).close()
+	assert [p.name for p in tmp_path.iterdir()] == ["pages.pdf"]
+	assert path.read_bytes() == b"previous"
+
+	with PdfStreamWriter(path) as pdf:
+		pdf.add(Image.fromarray(masked))
+	with fitz.open(path) as doc:
+		assert doc.page_count == 1
+	assert [p.name for p in tmp_path.iterdir()] == ["pages.pdf"]
+
+
+def test_describe_formats():
+	"""Test that the lossy formats are marked in the format list."""
+	assert describe_formats().startswith("png, webp, avif (lossy colors), tiff, pdf")
+
+
+def test_processor_formats(masked, tmp_path):
+	"""Test choosing the format by extension or by ``output_format``."""
+	processor = ImageProcessor()
+	for suffix, mode in [(".webp", "RGBA"), (".tif", "RGBA"), (".png", "RGBA")]:
+		processor.save_array(masked, tmp_path / f"out{suffix}")
+		with Image.open(tmp_path / f"out{suffix}") as saved:
+			assert saved.mode == mode
+	processor.save_array(masked, tmp_path / "out.pdf")
+	assert render((tmp_path / "out.pdf").read_bytes())[0, 0, 3] == 0
+
+	buffer = io.BytesIO()
+	ImageProcessor(output_format="webp").save_array(masked, buffer)
+	assert buffer.getvalue()[8:12] == b"WEBP"
+	assert isinstance(ImageProcessor().writer_for(io.BytesIO()), PngWriter)
+
+	with pytest.raises(ValueError, match="Unknown output format"):
+		ImageProcessor(output_format="gif")
+	with pytest.raises(ValueError, match="Streaming output must be in PNG format"):
+		ImageProcessor(output_format="pdf").make_transparent_streaming(
+			tmp_path / "out.png", tmp_path / "streamed.png", (0, 0, 0)
+		)
+
+
+def test_save_pages_pdf(masked, tmp_path):
+	"""Test streaming several pages into one PDF."""
+	assert ".pdf" in MULTIPAGE_SUFFIXES
+	pages = (Image.fromarray(masked) for _ in range(3))
+	assert ImageProcessor().save_pages(pages, tmp_path / "pages.pdf", (72, 72)) == 3
+
+	with fitz.open(tmp_path / "pages.pdf") as doc:
+		assert doc.page_count == 3
+	with pytest.raises(ValueError, match="TIFF or PDF"):
+		ImageProcessor(output_format="webp").save_pages([], tmp_path / "pages.pdf")
+
+
+def test_run_pdf_formats(tmp_path):
+	"""Test PDF pages into one transparent PDF and into numbered WebP files."""
+	source = tmp_path / "drawing.pdf"
+	with fitz.open() as doc:
+		for _ in range(2):
+			page = doc.new_page(width=60, height=40)
+			page.draw_rect(fitz.Rect(10, 10, 30, 30), fill=(0.4, 0.4, 0.4))
+		doc.save(source)
+
+	summary = run_pdf(
+		source, tmp_path / "clean.pdf", [0, 1], (255, 255, 255), workers=1
+	)
+	assert summary.succeeded == 2
+	with fitz.open(tmp_path / "clean.pdf") as doc:
+		assert doc.page_count == 2
+		# The page size round-trips through whole pixels at 300 dpi
+		assert tuple(doc[0].rect) == pytest.approx((0, 0, 60, 40), abs=0.25)
+	rendered = render((tmp_path / "clean.pdf").read_bytes())
+	assert rendered[0, 0, 3] == 0
+	assert rendered[20, 20, 3] == 255
+
+	run_pdf(
+		source,
+		tmp_path / "pages",
+		[1],
+		(255, 255, 255),
+		workers=1,
+		output_format="webp",
+	)
+	assert [p.name for p in (tmp_path / "pages").iterdir()] == ["drawing-0001.webp"]
+
+
+def test_server_format(tmp_path):
+	"""Test that responses carry the server's output format."""
+	buffer = io.BytesIO()
+	Image.new("RGB", (8, 8), "white").save(buffer, "PNG")
+	dispatcher = Dispatcher(output_format="webp")
+	try:
+		result = dispatcher.process(
+			ServeRequest((255, 255, 255), image=buffer.getvalue())
+		)
+	finally:
+		dispatcher.close()
+	assert result.media_type == "image/webp"
+	assert result.data[8:12] == b"WEBP"
+
+
+def test_cli_format(tmp_path):
+	"""Test --format and output extensions on the command line."""
+	Image.new("RGB", (20, 10), "white").save(tmp_path / "in.png")
+	runner = CliRunner()
+	result = runner.invoke(
+		app, ["main", str(tmp_path / "in.png"), str(tmp_path / "out.pdf")]
+	)
+	assert result.exit_code == 0, result.stdout
+	assert (tmp_path / "out.pdf").read_bytes().startswith(b"%PDF-")
+
+	result = runner.invoke(
+		app,
+		["batch", str(tmp_path), str(tmp_path / "out"), "--format", "webp", "-w", "1"],
+	)
+	assert result.exit_code == 0, result.stdout
+	assert (tmp_path / "out" / "in.webp").exists()
+
+	result = runner.invoke(
+		app,
+		[
+			"main",
+			str(tmp_path / "in.png"),
+			str(tmp_path / "out.png"),
+			"--format",
+			"gif",
+		],
+	)
+	assert result.exit_code == 1
+	assert "Unknown output format" in result.stdout